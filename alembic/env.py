@@ -12,7 +12,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 # Import Base and all models for autogenerate support
 from app.db.base import Base
-from app.models import User, RefreshToken  # noqa: F401
+from app.models import User, RefreshToken, ConversationSession, ConversationMessage, PackStat, PackRanking, PackRankingWatermark, UserCharacterMemory  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,37 @@
+"""Add conversation session message counters
+
+Revision ID: 5c1e9a7d3b24
+Revises: 23ba04ae0d17
+Create Date: 2026-10-19 17:02:11.318520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d3b24'
+down_revision: Union[str, Sequence[str], None] = '23ba04ae0d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversation_sessions', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('conversation_sessions', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing threads: count what is already stored
+    op.execute(
+        "UPDATE conversation_sessions SET "
+        "message_count = (SELECT COUNT(*) FROM conversation_messages m WHERE m.session_id = conversation_sessions.id), "
+        "last_message_at = (SELECT MAX(m.created_at) FROM conversation_messages m "
+        "WHERE m.session_id = conversation_sessions.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversation_sessions', 'last_message_at')
+    op.drop_column('conversation_sessions', 'message_count')
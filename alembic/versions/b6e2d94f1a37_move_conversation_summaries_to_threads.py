@@ -0,0 +1,61 @@
+"""Move conversation summaries to threads
+
+Revision ID: b6e2d94f1a37
+Revises: 8d41c7b2e6f0
+Create Date: 2026-10-19 23:02:11.318420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d94f1a37'
+down_revision: Union[str, Sequence[str], None] = '8d41c7b2e6f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversation_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('conversation_sessions', sa.Column('summarized_until', sa.DateTime(timezone=True), nullable=True))
+    # Existing summaries: a watermark is the created_at of the newest folded
+    # message, so it belongs to the thread holding that message
+    op.execute(
+        "UPDATE conversation_sessions SET "
+        "summary = (SELECT ucm.summary FROM user_character_memories ucm "
+        "WHERE ucm.user_id = conversation_sessions.user_id "
+        "AND ucm.character_id = conversation_sessions.character_id), "
+        "summarized_until = (SELECT ucm.summarized_until FROM user_character_memories ucm "
+        "WHERE ucm.user_id = conversation_sessions.user_id "
+        "AND ucm.character_id = conversation_sessions.character_id) "
+        "WHERE EXISTS (SELECT 1 FROM user_character_memories ucm "
+        "JOIN conversation_messages m ON m.created_at = ucm.summarized_until "
+        "WHERE ucm.user_id = conversation_sessions.user_id "
+        "AND ucm.character_id = conversation_sessions.character_id "
+        "AND m.session_id = conversation_sessions.id)"
+    )
+    op.drop_column('user_character_memories', 'summarized_until')
+    op.drop_column('user_character_memories', 'summary')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('user_character_memories', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('user_character_memories', sa.Column('summarized_until', sa.DateTime(timezone=True), nullable=True))
+    # Thread summaries are not merged back; the newest one of each pair is kept
+    op.execute(
+        "UPDATE user_character_memories SET "
+        "summary = (SELECT cs.summary FROM conversation_sessions cs "
+        "WHERE cs.user_id = user_character_memories.user_id "
+        "AND cs.character_id = user_character_memories.character_id "
+        "AND cs.summarized_until IS NOT NULL ORDER BY cs.summarized_until DESC LIMIT 1), "
+        "summarized_until = (SELECT MAX(cs.summarized_until) FROM conversation_sessions cs "
+        "WHERE cs.user_id = user_character_memories.user_id "
+        "AND cs.character_id = user_character_memories.character_id)"
+    )
+    op.drop_column('conversation_sessions', 'summarized_until')
+    op.drop_column('conversation_sessions', 'summary')
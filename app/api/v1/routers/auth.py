@@ -107,7 +107,11 @@ async def login(
 # =============================================================================
 # POST /auth/refresh - トークン更新
 # =============================================================================
-@router.post(
+# Own router: refresh is admitted even while login / register are shed
+token_router = APIRouter(prefix="/auth", tags=["Auth"])
+
+
+@token_router.post(
     "/refresh",
     response_model=TokenResponse,
     summary="トークン更新",
@@ -1,19 +1,44 @@
 """Catalog router - matching openapi.yaml Catalog paths"""
-from typing import Literal, Optional
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import BaseModel
 
+from app.core.compression import CompressedVariants, PrecompressedResponse
+from app.core.errors import NotFoundException, ValidationException
+from app.core.http_cache import PRIVATE, PUBLIC, cache_headers, conditional, entity_tag
+from app.core.response_cache import catalog_response_cache
+from app.core.singleflight import catalog_flight, coalescing_key
 from app.deps import OnboardedUser, Pagination, Sort
 from app.schemas.catalog import (
+    Pack,
     PackDetailResponse,
     PackItemsResponse,
     PackListResponse,
+    PackUserStatus,
+    PackUserStatusListResponse,
     TagListResponse,
 )
+from app.schemas.common import Character
+from app.schemas.common import Pagination as PaginationInfo
+from app.schemas.purchase import Entitlement
+from app.services.catalog_index import AGE_GROUP_RATINGS, PackQuery, catalog_index, pack_version
+from app.services.character_summaries import character_summaries
+from app.services.pack_search import normalize
+from app.services.pack_stats import Totals, pack_stats
+from app.services.user_blocks import UserBlocks, user_blocks
+from app.services.user_pack_status import user_pack_status
 
 router = APIRouter(prefix="/packs", tags=["Catalog"])
 tags_router = APIRouter(prefix="/tags", tags=["Catalog"])
 
+MAX_USER_STATUS_IDS = 100
+
+# GET /packs/{pack_id}?include=
+PACK_INCLUDES = ("characters", "entitlement", "items")
+
 
 # =============================================================================
 # GET /packs - Pack一覧取得
@@ -36,18 +61,74 @@ async def list_packs(
     type: Optional[Literal["persona", "scenario"]] = Query(None, description="Pack種別"),
     query: Optional[str] = Query(None, description="キーワード検索"),
     tags: Optional[str] = Query(None, description="タグ絞り込み（カンマ区切り）"),
+    tags_match: Literal["all", "any"] = Query("all", description="タグ条件（all: すべて含む / any: いずれか含む）"),
     age_rating: Optional[Literal["all", "r15", "r18"]] = Query(None, description="年齢レーティング"),
 ) -> PackListResponse:
     """
     Pack一覧取得
 
-    TODO: Implement list_packs
-    - Apply age_rating filter based on user's age_group
-    - Filter by type, query, tags
-    - Apply sorting and pagination
-    - Join with tags, creator info
+    Served from the in-process catalog index. Identical concurrent requests
+    (same filters within the same age group and index version) share one
+    computation; the rendered page is cached precompressed. Users who block
+    creators / characters / tags get their own page, filtered in the index.
     """
-    raise NotImplementedError("TODO: Implement list_packs")
+    blocks = await user_blocks.load(user_state.user_id)
+    if blocks.hides_catalog:
+        return await _load_pack_list(
+            user_state.age_group, pagination, sort, type, query, tags, tags_match, age_rating, blocks
+        )
+    key = coalescing_key(
+        "GET /packs",
+        {
+            "version": catalog_index.version,
+            "type": type,
+            "query": normalize(query) if query else None,
+            "tags": tags.split(",") if tags else None,
+            "tags_match": tags_match,
+            "age_rating": age_rating,
+            "sort": sort.sort,
+            "order": sort.order,
+            "cursor": pagination.cursor,
+            "limit": pagination.limit,
+        },
+        partition=user_state.age_group,
+    )
+    return await _cached_response(
+        key,
+        lambda: _load_pack_list(user_state.age_group, pagination, sort, type, query, tags, tags_match, age_rating),
+    )
+
+
+# =============================================================================
+# GET /packs/user-status - Pack所持・お気に入り状態一括取得
+# =============================================================================
+@router.get(
+    "/user-status",
+    response_model=PackUserStatusListResponse,
+    summary="Pack所持・お気に入り状態一括取得",
+    description="一覧ページに表示中のPackについて、所持・お気に入り状態をまとめて取得します。",
+    responses={
+        400: {"description": "バリデーションエラー"},
+        401: {"description": "認証エラー"},
+    },
+)
+async def get_pack_user_statuses(
+    user_state: OnboardedUser,
+    pack_ids: str = Query(..., description="Pack ID（カンマ区切り、最大100件）"),
+) -> PackUserStatusListResponse:
+    """
+    Pack所持・お気に入り状態一括取得
+
+    The per-user counterpart of a (shared, cached) GET /packs page: one
+    batch for the whole page, answered from the user's cached sets.
+    """
+    ids = list(dict.fromkeys(p.strip() for p in pack_ids.split(",") if p.strip()))
+    if not ids or len(ids) > MAX_USER_STATUS_IDS:
+        raise ValidationException(f"pack_idsは1〜{MAX_USER_STATUS_IDS}件で指定してください")
+    statuses = await user_pack_status.load(user_state.user_id, ids)
+    return PackUserStatusListResponse(
+        data=[PackUserStatus(pack_id=pack_id, **status.model_dump()) for pack_id, status in statuses.items()]
+    )
 
 
 # =============================================================================
@@ -57,8 +138,10 @@ async def list_packs(
     "/{pack_id}",
     response_model=PackDetailResponse,
     summary="Pack詳細取得",
-    description="指定したPackの詳細情報を取得します。",
+    description="指定したPackの詳細情報を取得します。includeで構成アイテム・利用権・キャラクターを同梱できます。",
     responses={
+        304: {"description": "変更なし（If-None-Match）"},
+        400: {"description": "バリデーションエラー（include）"},
         401: {"description": "認証エラー"},
         403: {"description": "年齢制限"},
         404: {"description": "Pack not found"},
@@ -66,17 +149,97 @@ async def list_packs(
 )
 async def get_pack(
     pack_id: str,
+    request: Request,
+    response: Response,
     user_state: OnboardedUser,
+    include: Optional[str] = Query(
+        None, description="同梱する関連データ（カンマ区切り: items, entitlement, characters）"
+    ),
 ) -> PackDetailResponse:
     """
     Pack詳細取得
 
-    TODO: Implement get_pack
-    - Fetch pack from database
-    - Check age restriction
-    - Get user's ownership and favorite status
+    The public pack part is an O(1) catalog index lookup (including the
+    age group visibility check, 403 AGE_RESTRICTED); user_status is
+    merged in per caller afterwards. Because of user_status the response
+    is private; its ETag combines the pack version, the live stats and
+    the caller's status bits, all held in memory.
+
+    include bundles what the detail screen would otherwise fetch with
+    further round trips. Every part comes from the same source as its own
+    endpoint (items from this index snapshot, user_status / entitlement
+    from user_pack_status, characters from character_summaries); parts
+    that may hit the DB run concurrently, each on its own session. The
+    ETag then also covers the loaded entitlement and character summaries.
+    """
+    parts = _parse_include(include)
+    index = catalog_index.current
+    pack = index.visible_pack(pack_id, user_state.age_group)
+    items = index.get_items(pack_id) if parts else None
+    character_ids = [i.item_id for i in items if i.item_type == "character"] if "characters" in parts else []
+    user_status, entitlement, characters = await asyncio.gather(
+        user_pack_status.load_one(user_state.user_id, pack_id),
+        user_pack_status.entitlement(user_state.user_id, pack_id) if "entitlement" in parts else _none(),
+        character_summaries.load(character_ids) if "characters" in parts else _none(),
+    )
+    stats = pack_stats.get(pack_id)
+    etag = entity_tag(
+        "pack",
+        pack_id,
+        pack_version(pack),
+        _stats_version(pack, stats),
+        f"{user_status.owned:d}{user_status.favorited:d}",
+        *_include_versions(parts, entitlement, characters),
+    )
+    not_modified = conditional(request, etag, PRIVATE)
+    if not_modified is not None:
+        return not_modified
+    response.headers.update(cache_headers(etag, PRIVATE))
+    if stats is not None:
+        pack = pack.model_copy(update={"stats": stats.to_schema()})
+    return PackDetailResponse(
+        pack=pack,
+        user_status=user_status,
+        items=items if "items" in parts else None,
+        entitlement=entitlement,
+        characters=characters,
+    )
+
+
+def _parse_include(include: Optional[str]) -> Tuple[str, ...]:
+    if not include:
+        return ()
+    parts = tuple(sorted({p.strip() for p in include.split(",") if p.strip()}))
+    unknown = [p for p in parts if p not in PACK_INCLUDES]
+    if unknown:
+        raise ValidationException(f"includeに指定できるのは {', '.join(PACK_INCLUDES)} です")
+    return parts
+
+
+def _include_versions(
+    parts: Tuple[str, ...],
+    entitlement: Optional[Entitlement],
+    characters: Optional[List[Character]],
+) -> List[str]:
     """
-    raise NotImplementedError("TODO: Implement get_pack")
+    ETag parts of the included data
+
+    Items follow the pack version; the entitlement and character summaries
+    do not, so their loaded values are part of the tag.
+    """
+    versions = list(parts)
+    if "entitlement" in parts:
+        versions.append(entitlement.id if entitlement is not None else "none")
+    if "characters" in parts:
+        digest = hashlib.blake2b(digest_size=8)
+        for character in characters:
+            digest.update(character.model_dump_json().encode())
+        versions.append(digest.hexdigest())
+    return versions
+
+
+async def _none() -> None:
+    return None
 
 
 # =============================================================================
@@ -88,21 +251,32 @@ async def get_pack(
     summary="Pack構成アイテム取得",
     description="Packに含まれるキャラクター、イベント等の構成アイテムを取得します。",
     responses={
+        304: {"description": "変更なし（If-None-Match）"},
         401: {"description": "認証エラー"},
+        403: {"description": "年齢制限"},
         404: {"description": "Pack not found"},
     },
 )
 async def get_pack_items(
     pack_id: str,
+    request: Request,
     user_state: OnboardedUser,
 ) -> PackItemsResponse:
     """
-    Pack構成アイテム取得
+    Pack構成アイテム取得（ETag = pack version）
 
-    TODO: Implement get_pack_items
-    - Fetch pack items (characters, events, etc.)
+    The rendered items are shared by every age group, so visibility is
+    checked before the 304 and the cache. Only packs every age group may
+    see are public; shared caches would skip the check for the others.
     """
-    raise NotImplementedError("TODO: Implement get_pack_items")
+    pack = catalog_index.current.visible_pack(pack_id, user_state.age_group)
+    etag = entity_tag("items", pack_id, pack_version(pack))
+    policy = PUBLIC if pack.age_rating == "all" else PRIVATE
+    return conditional(request, etag, policy) or await _cached_response(
+        coalescing_key("GET /packs/{pack_id}/items", {"pack_id": pack_id, "version": catalog_index.version}),
+        lambda: _load_pack_items(pack_id),
+        headers=cache_headers(etag, policy),
+    )
 
 
 # =============================================================================
@@ -114,18 +288,126 @@ async def get_pack_items(
     summary="タグ一覧取得",
     description="利用可能なタグの一覧を取得します。",
     responses={
+        304: {"description": "変更なし（If-None-Match）"},
         401: {"description": "認証エラー"},
     },
 )
 async def list_tags(
+    request: Request,
     user_state: OnboardedUser,
-    type: Optional[Literal["pack", "character"]] = Query(None, description="タグ種別"),
+    type: Optional[Literal["pack", "character"]] = Query(None, description="タグ種別（character は未提供: 常に空）"),
 ) -> TagListResponse:
     """
-    タグ一覧取得
+    タグ一覧取得（ETag = age group + catalog digest; counts change with any publish / unpublish）
+
+    Counts cover only the packs the caller's age group may see, so the
+    rendered list is cached per age group and is private.
+    """
+    age_group = user_state.age_group
+    etag = entity_tag("tags", type or "pack", age_group, f"{catalog_index.current.digest:016x}")
+    return conditional(request, etag, PRIVATE) or await _cached_response(
+        coalescing_key("GET /tags", {"type": type, "version": catalog_index.version}, partition=age_group),
+        lambda: _load_tags(type, age_group),
+        headers=cache_headers(etag, PRIVATE),
+    )
+
+
+# =============================================================================
+# Shared Response Cache
+# =============================================================================
+
+
+async def _cached_response(
+    key: Tuple,
+    loader: Callable[[], Awaitable[BaseModel]],
+    headers: Optional[Dict[str, str]] = None,
+) -> PrecompressedResponse:
+    """Serve a public response from the rendered cache, rendering it once on miss"""
+    variants = catalog_response_cache.get(key)
+    if variants is None:
+        variants = await catalog_flight.do(key, lambda: _render(key, loader))
+    return PrecompressedResponse(variants, headers=headers)
+
+
+async def _render(key: Tuple, loader: Callable[[], Awaitable[BaseModel]]) -> CompressedVariants:
+    model = await loader()
+    variants = CompressedVariants(model.model_dump_json().encode())
+    catalog_response_cache.set(key, variants)
+    return variants
+
+
+# =============================================================================
+# Loaders (shared results - must not contain per-user fields)
+# =============================================================================
+
+
+async def _load_pack_list(
+    age_group: Optional[str],
+    pagination: Pagination,
+    sort: Sort,
+    type: Optional[str],
+    query: Optional[str],
+    tags: Optional[str],
+    tags_match: str,
+    age_rating: Optional[str],
+    blocks: Optional[UserBlocks] = None,
+) -> PackListResponse:
+    """
+    Filter / sort / page the catalog index (age_rating narrows the age group's ratings)
+
+    With blocks the result is per user and must not be cached.
+
+    Stats come from the live counters; favorite_count / conversation_count
+    sort order follows the index and catches up on its next rebuild.
+    """
+    ratings = AGE_GROUP_RATINGS.get(age_group, AGE_GROUP_RATINGS[None])
+    if age_rating is not None:
+        ratings = tuple(r for r in ratings if r == age_rating)
+    text = query.strip() if query else None
+    # The exclusion is over this version's ordinals
+    index = catalog_index.current
+    packs, next_cursor = index.query(
+        PackQuery(
+            ratings=ratings,
+            pack_type=type,
+            tag_ids=tuple(t.strip() for t in tags.split(",") if t.strip()) if tags else (),
+            tags_match=tags_match,
+            text=text,
+            sort=sort.sort,
+            descending=sort.order == "desc",
+            cursor=pagination.cursor,
+            limit=pagination.limit,
+            exclude=blocks.exclusion(index) if blocks is not None else None,
+        )
+    )
+    return PackListResponse(
+        data=pack_stats.apply(packs),
+        pagination=PaginationInfo(next_cursor=next_cursor, has_more=next_cursor is not None),
+    )
+
+
+def _stats_version(pack: Pack, totals: Optional[Totals]) -> str:
+    """Stats part of a pack ETag (live counters, else the indexed stats)"""
+    if totals is not None:
+        return f"{totals.favorites}.{totals.conversations}.{totals.reviews}.{totals.rating_sum}"
+    stats = pack.stats
+    return f"{stats.favorite_count}.{stats.conversation_count}.{stats.review_count}.{stats.average_rating}"
+
+
+async def _load_pack_items(pack_id: str) -> PackItemsResponse:
+    items = catalog_index.current.get_items(pack_id)
+    if items is None:
+        raise NotFoundException("Packが見つかりません")
+    return PackItemsResponse(data=items)
+
+
+async def _load_tags(type: Optional[str], age_group: Optional[str]) -> TagListResponse:
+    """
+    Pack tags with counts of the packs age_group may see (bitmap popcounts)
 
-    TODO: Implement list_tags
-    - Fetch tags with counts
-    - Filter by type if specified
+    type=character is an empty list until character_tags is indexed
+    (documented in openapi.yaml).
     """
-    raise NotImplementedError("TODO: Implement list_tags")
+    if type == "character":
+        return TagListResponse(data=[])
+    return TagListResponse(data=catalog_index.current.tag_counts(age_group))
@@ -1,12 +1,25 @@
 """Conversation router - matching openapi.yaml Conversation paths"""
-from typing import Optional
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Union
 
-from fastapi import APIRouter, Query, status
+from fastapi import APIRouter, Header, Query, Request, status
 from fastapi.responses import StreamingResponse
 
+from app.core.drain import drain_coordinator
+from app.core.errors import (
+    ContentFilteredException,
+    RequestTimeoutException,
+    ServiceUnavailableException,
+    ValidationException,
+)
+from app.core.sse import wait_for_disconnect
 from app.deps import OnboardedUser, Pagination, Sort
 from app.schemas.conversation import (
     CreateThreadRequest,
+    Message,
     MessageListResponse,
     SendMessageRequest,
     SendMessageResponse,
@@ -14,6 +27,14 @@ from app.schemas.conversation import (
     ThreadListResponse,
     ThreadResponse,
 )
+from app.services.catalog_index import catalog_index
+from app.services.generation_guard import generation_guard
+from app.services.llm import LLMError, LLMTimeoutError, llm_provider
+from app.services.reply_stream import FINISH_REASONS, ReplyStream, reply_writes
+from app.services.stream_replay import RedisReplayReader, ReplayReader, stream_replay
+from app.services.turn_pipeline import turn_pipeline
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/threads", tags=["Conversation"])
 
@@ -73,9 +94,10 @@ async def create_thread(
 
     TODO: Implement create_thread
     - Check entitlement (owned or free pack)
-    - Check age restriction
-    - Create conversation_session
+    - Create conversation_session (pack conversation_count comes from the pack_stats recount)
     """
+    # Age restriction: O(1) against the catalog index's per-age-group visible set
+    catalog_index.current.visible_pack(request.pack_id, user_state.age_group)
     raise NotImplementedError("TODO: Implement create_thread")
 
 
@@ -184,6 +206,8 @@ async def list_messages(
         401: {"description": "認証エラー"},
         403: {"description": "他ユーザーのスレッド"},
         408: {"description": "タイムアウト"},
+        409: {"description": "同じスレッド / ユーザーで応答を生成中（request_in_progress）"},
+        422: {"description": "不適切な内容（content_filtered）"},
         503: {"description": "サービス利用不可"},
     },
 )
@@ -195,14 +219,49 @@ async def send_message(
     """
     メッセージ送信
 
-    TODO: Implement send_message
-    - Verify thread ownership
-    - Save user message
-    - Call LLM API
-    - Save assistant message
-    - Update relationship (affection)
+    The same turn pipeline as the stream (app.services.turn_pipeline): the
+    LLM request starts next to the moderation check and is cancelled if
+    the message is flagged; both messages are written in the background,
+    affection and usage after the reply.
     """
-    raise NotImplementedError("TODO: Implement send_message")
+    user_message_id = str(uuid.uuid4())
+    # One generation per thread / GENERATION_MAX_PER_USER per user for the whole call
+    async with generation_guard.hold(user_state.user_id, thread_id) as lease:
+        turn = await turn_pipeline.prepare(thread_id, user_state.user_id, user_message_id, request.content)
+        completion = asyncio.create_task(llm_provider.complete(turn.prompt.messages))
+        try:
+            if (await asyncio.shield(turn.moderation)).flagged:
+                raise ContentFilteredException()
+            # A newer send superseding this one cancels only the LLM request (409)
+            result = await lease.until_superseded(completion)
+        except LLMTimeoutError:
+            raise RequestTimeoutException()
+        except LLMError as exc:
+            logger.warning("LLM request failed for thread %s: %s", thread_id, exc)
+            raise ServiceUnavailableException("応答の生成に失敗しました")
+        finally:
+            if not completion.done():
+                completion.cancel()
+                await asyncio.wait({completion})
+            # Held until the user message is in, so the next send's history has it
+            await asyncio.wait({turn.user_write})
+
+        assistant_message_id = str(uuid.uuid4())
+        finish_reason = result.finish_reason if result.finish_reason in FINISH_REASONS else "stop"
+        reply_writes.save_reply(thread_id, assistant_message_id, result.content, finish_reason)
+        turn_pipeline.finish(turn, result.usage)
+
+    now = datetime.now(timezone.utc)
+    return SendMessageResponse(
+        user_message=Message(id=user_message_id, role="user", content=request.content, created_at=now),
+        assistant_message=Message(
+            id=assistant_message_id,
+            role="character",
+            content=result.content,
+            finish_reason=finish_reason,
+            created_at=now,
+        ),
+    )
 
 
 # =============================================================================
@@ -215,31 +274,118 @@ async def send_message(
     responses={
         401: {"description": "認証エラー"},
         403: {"description": "他ユーザーのスレッド"},
+        404: {"description": "スレッド not found"},
+        409: {"description": "同じスレッド / ユーザーで応答を生成中（request_in_progress）"},
+        422: {"description": "不適切な内容（content_filtered; 並行チェックの場合は error イベント）"},
+        503: {"description": "シャットダウン中"},
     },
 )
 async def send_message_stream(
     thread_id: str,
     user_state: OnboardedUser,
     request: SendMessageRequest,
+    http_request: Request,
 ) -> StreamingResponse:
     """
     メッセージ送信（SSEストリーミング）
 
-    TODO: Implement send_message_stream
-    - Verify thread ownership
-    - Save user message
-    - Stream LLM response as SSE events:
-      - message_start: {user_message_id, assistant_message_id}
-      - content_delta: {delta}
-      - message_done: {assistant_message_id, finish_reason, usage}
-      - error: {code, message}
+    The thread is checked and the prompt built first by the turn pipeline
+    (app.services.turn_pipeline): the character's cached persona prefix,
+    the user's memory and the history the rolling summary does not cover
+    yet, within a token budget (app.services.prompt_builder); what falls out
+    of it is folded into the summary in the background
+    (app.services.context_summaries). The user message is written in the
+    background, and the moderation check runs next to the LLM request: a
+    flagged message ends the stream with an `error` event
+    (content_filtered) before any content_delta. The reply is
+    streamed by app.services.reply_stream (coalesced content_delta frames,
+    client backpressure, assistant message saved after message_done).
+    Every event carries an id; a dropped client reconnects through
+    resume_message_stream with Last-Event-ID. On disconnect the LLM request
+    is closed (after SSE_RESUME_GRACE_SECONDS without a reconnect, when
+    set) and the partial answer saved as interrupted.
+
+    The generation holds the thread's lease (app.services.generation_guard)
+    from before the thread is read until its last event; a
+    send on a busy thread is rejected, queued or supersedes it according
+    to GENERATION_GUARD_POLICY.
+    """
+    drain_coordinator.ensure_accepting()
+
+    lease = await generation_guard.acquire(user_state.user_id, thread_id)
+    try:
+        user_message_id = str(uuid.uuid4())
+        assistant_message_id = str(uuid.uuid4())
+        turn = await turn_pipeline.prepare(thread_id, user_state.user_id, user_message_id, request.content)
+    except BaseException:
+        await lease.release()
+        raise
+
+    reply = ReplyStream(
+        thread_id,
+        user_state.user_id,
+        user_message_id,
+        assistant_message_id,
+        turn.prompt.messages,
+        lease=lease,
+        gate=turn.moderation,
+        user_write=turn.user_write,
+        on_done=lambda usage: turn_pipeline.finish(turn, usage),
+    )
+    return _sse_response(reply.start(), http_request)
+
+
+# =============================================================================
+# GET /threads/{thread_id}/messages/{message_id}:stream - 応答ストリームの再開（SSE）
+# =============================================================================
+@router.get(
+    "/{thread_id}/messages/{message_id}:stream",
+    summary="応答ストリームの再開（SSE）",
+    description="切断された応答ストリームに再接続します。Last-Event-ID より後のイベントを再送し、生成中であれば続きを配信します。",
+    responses={
+        400: {"description": "Last-Event-ID が不正"},
+        401: {"description": "認証エラー"},
+        404: {"description": "ストリーム not found（期限切れ / 他ユーザー）"},
+        409: {"description": "再送できる範囲外（メッセージ履歴から取得）"},
+    },
+)
+async def resume_message_stream(
+    thread_id: str,
+    message_id: str,
+    user_state: OnboardedUser,
+    http_request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID", description="最後に受信したイベントID"),
+) -> StreamingResponse:
+    """
+    応答ストリームの再開（SSE）
+
+    message_id is the assistant_message_id of message_start. Events come
+    from the generation's replay buffer (app.services.stream_replay), so
+    the still-running reply is followed without a second LLM call. Without
+    Last-Event-ID the whole buffered reply is sent from message_start.
     """
+    after = 0
+    if last_event_id is not None:
+        if not last_event_id.strip().isdigit():
+            raise ValidationException("Last-Event-ID が不正です")
+        after = int(last_event_id)
+
+    reader = await stream_replay.resume(message_id, user_state.user_id, thread_id, after)
+    return _sse_response(reader, http_request)
+
+
+def _sse_response(reader: Union[ReplayReader, RedisReplayReader], http_request: Request) -> StreamingResponse:
+    """Stream a replay reader; it is detached as soon as the client disconnects"""
 
     async def event_generator():
-        # TODO: Implement SSE streaming
-        yield 'event: message_start\ndata: {"user_message_id": "msg_001", "assistant_message_id": "msg_002"}\n\n'
-        yield 'event: content_delta\ndata: {"delta": "こんにちは！"}\n\n'
-        yield 'event: message_done\ndata: {"assistant_message_id": "msg_002", "finish_reason": "stop"}\n\n'
+        # Noticed even while the reply waits upstream, not only at the next send
+        watcher = asyncio.create_task(wait_for_disconnect(http_request.receive))
+        watcher.add_done_callback(lambda task: task.cancelled() or reader.close())
+        try:
+            async for event in reader.events():
+                yield event
+        finally:
+            watcher.cancel()
 
     return StreamingResponse(
         event_generator(),
@@ -43,6 +43,7 @@ async def create_purchase(
     - Create purchase record
     - Grant entitlement
     - Cache response for idempotency
+    - After commit: user_pack_status.on_purchase(user_id, pack_id)
     """
     raise NotImplementedError("TODO: Implement create_purchase")
 
@@ -71,6 +72,7 @@ async def restore_purchases(
     TODO: Implement restore_purchases
     - Verify receipt with payment provider
     - Restore entitlements for all valid purchases
+    - After commit: user_pack_status.invalidate(user_id)
     """
     raise NotImplementedError("TODO: Implement restore_purchases")
 
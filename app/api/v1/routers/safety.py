@@ -1,6 +1,9 @@
 """Safety router - matching openapi.yaml Safety paths"""
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Request, Response, status
 
+from app.core.errors import ServiceUnavailableException
+from app.core.http_cache import PUBLIC, cache_headers, conditional, entity_tag
+from app.core.shared_snapshot import master_data_snapshot
 from app.deps import OnboardedUser, Pagination
 from app.schemas.safety import (
     BlockListResponse,
@@ -10,6 +13,7 @@ from app.schemas.safety import (
     ReportReasonListResponse,
     ReportResponse,
 )
+from app.services.master_data import REPORT_REASONS_KEY
 
 router = APIRouter(tags=["Safety"])
 
@@ -23,19 +27,31 @@ router = APIRouter(tags=["Safety"])
     summary="通報理由一覧取得",
     description="通報時に選択できる理由の一覧を取得します。",
     responses={
+        304: {"description": "変更なし（If-None-Match）"},
         401: {"description": "認証エラー"},
+        503: {"description": "マスタデータ未構築"},
     },
 )
 async def list_report_reasons(
+    request: Request,
     user_state: OnboardedUser,
-) -> ReportReasonListResponse:
+) -> Response:
     """
     通報理由一覧取得
 
-    TODO: Implement list_report_reasons
-    - Fetch from m_report_reasons table
+    Served zero-copy from the shared master data snapshot (m_report_reasons),
+    which is rebuilt by one worker per node. The ETag is the snapshot entry's
+    version.
     """
-    raise NotImplementedError("TODO: Implement list_report_reasons")
+    body, version = master_data_snapshot.get_versioned(REPORT_REASONS_KEY)
+    if body is None:
+        raise ServiceUnavailableException("マスタデータを準備中です", retry_after=1)
+    if version is None:
+        return Response(content=body, media_type="application/json")
+    etag = entity_tag("report-reasons", version)
+    return conditional(request, etag, PUBLIC) or Response(
+        content=body, media_type="application/json", headers=cache_headers(etag, PUBLIC)
+    )
 
 
 # =============================================================================
@@ -119,6 +135,7 @@ async def create_block(
     TODO: Implement create_block
     - Check if already blocked
     - Create block record
+    - After commit: user_blocks.on_block(user_id, target_type, target_id)
     """
     raise NotImplementedError("TODO: Implement create_block")
 
@@ -146,5 +163,6 @@ async def delete_block(
     TODO: Implement delete_block
     - Verify ownership
     - Soft delete block
+    - After commit: user_blocks.on_unblock(user_id, block.target_type, block.target_id)
     """
     raise NotImplementedError("TODO: Implement delete_block")
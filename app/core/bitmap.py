@@ -0,0 +1,295 @@
+"""
+Roaring-style compressed bitmaps over dense non-negative integers
+
+Values are split into 2^16 chunks by their high bits. Each chunk is stored
+as whichever container is smaller:
+
+- sparse : sorted array('H') of low bits (<= 4096 values, 2 bytes each)
+- dense  : 8 KiB bitset (bytes; AND / OR / popcount go through int in C,
+           membership is a byte lookup)
+
+Bitmaps are immutable: with_added() / with_removed() return a new bitmap
+sharing every untouched container, so index versions can be derived
+copy-on-write.
+"""
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+Container = Union[array, bytes]
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+ARRAY_MAX = 4096
+DENSE_BYTES = (1 << CHUNK_BITS) // 8
+
+
+# =============================================================================
+# Containers
+# =============================================================================
+
+
+def _dense_from(lows: Iterable[int]) -> bytes:
+    buf = bytearray(DENSE_BYTES)
+    for low in lows:
+        buf[low >> 3] |= 1 << (low & 7)
+    return bytes(buf)
+
+
+def _to_int(dense: bytes) -> int:
+    return int.from_bytes(dense, "little")
+
+
+def _iter_dense(dense: bytes) -> Iterator[int]:
+    for index, byte in enumerate(dense):
+        if byte:
+            base = index << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+
+
+def _pack(lows: List[int]) -> Optional[Container]:
+    """Smallest container for sorted lows (None when empty)"""
+    if not lows:
+        return None
+    if len(lows) <= ARRAY_MAX:
+        return array("H", lows)
+    return _dense_from(lows)
+
+
+def _from_int(bits: int) -> Optional[Container]:
+    count = bits.bit_count()
+    if count == 0:
+        return None
+    dense = bits.to_bytes(DENSE_BYTES, "little")
+    if count <= ARRAY_MAX:
+        return array("H", _iter_dense(dense))
+    return dense
+
+
+def _as_int(container: Container) -> int:
+    return _to_int(container) if isinstance(container, bytes) else _to_int(_dense_from(container))
+
+
+def _cardinality(container: Container) -> int:
+    return _to_int(container).bit_count() if isinstance(container, bytes) else len(container)
+
+
+def _contains(container: Container, low: int) -> bool:
+    if isinstance(container, bytes):
+        return bool(container[low >> 3] >> (low & 7) & 1)
+    i = bisect_left(container, low)
+    return i < len(container) and container[i] == low
+
+
+def _iter(container: Container) -> Iterator[int]:
+    return _iter_dense(container) if isinstance(container, bytes) else iter(container)
+
+
+def _and(a: Container, b: Container) -> Optional[Container]:
+    if isinstance(a, bytes) and isinstance(b, bytes):
+        return _from_int(_to_int(a) & _to_int(b))
+    if isinstance(a, bytes):
+        a, b = b, a
+    if isinstance(b, bytes):
+        return _pack([low for low in a if b[low >> 3] >> (low & 7) & 1])
+    return _pack(sorted(set(a).intersection(b)))
+
+
+def _or(a: Container, b: Container) -> Optional[Container]:
+    if isinstance(a, bytes) or isinstance(b, bytes):
+        return _from_int(_as_int(a) | _as_int(b))
+    return _pack(sorted(set(a).union(b)))
+
+
+def _andnot(a: Container, b: Container) -> Optional[Container]:
+    if isinstance(a, bytes):
+        return _from_int(_to_int(a) & ~_as_int(b))
+    if isinstance(b, bytes):
+        return _pack([low for low in a if not b[low >> 3] >> (low & 7) & 1])
+    return _pack(sorted(set(a).difference(b)))
+
+
+# =============================================================================
+# Bitmap
+# =============================================================================
+
+
+class RoaringBitmap:
+    """Immutable compressed set of non-negative ints"""
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, containers: Optional[Dict[int, Container]] = None) -> None:
+        self._containers: Dict[int, Container] = containers or {}
+
+    @classmethod
+    def from_sorted(cls, values: Iterable[int]) -> "RoaringBitmap":
+        """Build from ascending, de-duplicated values"""
+        containers: Dict[int, Container] = {}
+        for high, group in groupby(values, key=lambda v: v >> CHUNK_BITS):
+            container = _pack([v & CHUNK_MASK for v in group])
+            if container is not None:
+                containers[high] = container
+        return cls(containers)
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[int]) -> "RoaringBitmap":
+        return cls.from_sorted(sorted(set(values)))
+
+    # -------------------------------------------------------------------------
+    # Copy-on-write updates
+    # -------------------------------------------------------------------------
+
+    def with_added(self, value: int) -> "RoaringBitmap":
+        high, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self._containers.get(high)
+        if container is not None and _contains(container, low):
+            return self
+        if container is None:
+            updated: Container = array("H", [low])
+        elif isinstance(container, bytes):
+            buf = bytearray(container)
+            buf[low >> 3] |= 1 << (low & 7)
+            updated = bytes(buf)
+        elif len(container) >= ARRAY_MAX:
+            updated = _dense_from([*container, low])
+        else:
+            updated = array("H", container)
+            updated.insert(bisect_left(updated, low), low)
+        containers = dict(self._containers)
+        containers[high] = updated
+        return RoaringBitmap(containers)
+
+    def with_removed(self, value: int) -> "RoaringBitmap":
+        high, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self._containers.get(high)
+        if container is None or not _contains(container, low):
+            return self
+        containers = dict(self._containers)
+        if isinstance(container, bytes):
+            buf = bytearray(container)
+            buf[low >> 3] &= ~(1 << (low & 7)) & 0xFF
+            updated = _from_int(_to_int(buf))
+        else:
+            updated = array("H", container)
+            updated.remove(low)
+        if updated:
+            containers[high] = updated
+        else:
+            del containers[high]
+        return RoaringBitmap(containers)
+
+    # -------------------------------------------------------------------------
+    # Set algebra
+    # -------------------------------------------------------------------------
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        containers = {}
+        for high in self._containers.keys() & other._containers.keys():
+            container = _and(self._containers[high], other._containers[high])
+            if container is not None:
+                containers[high] = container
+        return RoaringBitmap(containers)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        containers = dict(self._containers)
+        for high, container in other._containers.items():
+            mine = containers.get(high)
+            containers[high] = container if mine is None else _or(mine, container)
+        return RoaringBitmap(containers)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        containers = {}
+        for high, container in self._containers.items():
+            theirs = other._containers.get(high)
+            result = container if theirs is None else _andnot(container, theirs)
+            if result is not None:
+                containers[high] = result
+        return RoaringBitmap(containers)
+
+    @staticmethod
+    def union(bitmaps: Iterable["RoaringBitmap"]) -> "RoaringBitmap":
+        """OR of any number of bitmaps, merged chunk by chunk in one pass"""
+        groups: Dict[int, List[Container]] = {}
+        for bitmap in bitmaps:
+            for high, container in bitmap._containers.items():
+                groups.setdefault(high, []).append(container)
+        containers: Dict[int, Container] = {}
+        for high, group in groups.items():
+            if len(group) == 1:
+                containers[high] = group[0]
+            elif any(isinstance(container, bytes) for container in group):
+                bits = 0
+                for container in group:
+                    bits |= _as_int(container)
+                containers[high] = _from_int(bits)
+            else:
+                lows: Set[int] = set()
+                for container in group:
+                    lows.update(container)
+                containers[high] = _pack(sorted(lows))
+        return RoaringBitmap(containers)
+
+    @staticmethod
+    def intersection(bitmaps: Iterable["RoaringBitmap"]) -> "RoaringBitmap":
+        """AND, smallest first so intermediate results shrink fast"""
+        ordered = sorted(bitmaps, key=len)
+        if not ordered:
+            return RoaringBitmap()
+        result = ordered[0]
+        for bitmap in ordered[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        return result
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """Cardinality (popcount)"""
+        return sum(_cardinality(c) for c in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> CHUNK_BITS)
+        return container is not None and _contains(container, value & CHUNK_MASK)
+
+    def select(self, values: Iterable[int]) -> Set[int]:
+        """Members of values that are in this bitmap (bulk __contains__)"""
+        containers = self._containers
+        selected = set()
+        for value in values:
+            container = containers.get(value >> CHUNK_BITS)
+            if container is None:
+                continue
+            low = value & CHUNK_MASK
+            if isinstance(container, bytes):
+                if container[low >> 3] >> (low & 7) & 1:
+                    selected.add(value)
+            else:
+                i = bisect_left(container, low)
+                if i < len(container) and container[i] == low:
+                    selected.add(value)
+        return selected
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self._containers):
+            base = high << CHUNK_BITS
+            for low in _iter(self._containers[high]):
+                yield base + low
+
+    def size_in_bytes(self) -> int:
+        return sum(
+            DENSE_BYTES if isinstance(c, bytes) else len(c) * c.itemsize
+            for c in self._containers.values()
+        )
+
+
+EMPTY_BITMAP = RoaringBitmap()
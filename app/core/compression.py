@@ -0,0 +1,220 @@
+"""Response compression (gzip, plus brotli / zstd when installed)"""
+import gzip
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+# =============================================================================
+# Encoders (optional dependencies: brotli, zstandard)
+# =============================================================================
+
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda data: gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0),
+}
+
+try:
+    import brotli
+
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+except ImportError:  # pragma: no cover - optional dependency
+    pass
+
+try:
+    import zstandard
+
+    _zstd = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL)
+    ENCODERS["zstd"] = _zstd.compress
+except ImportError:  # pragma: no cover - optional dependency
+    pass
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ("zstd", "br", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported encoding from an Accept-Encoding header
+
+    Args:
+        accept_encoding: Raw header value, e.g. "gzip, br;q=0.9, zstd;q=0"
+
+    Returns:
+        Encoding name, or None if nothing acceptable is supported
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    wildcard = weights.get("*", 0.0)
+    best: Optional[str] = None
+    best_q = 0.0
+    for name in PREFERENCE:
+        if name not in ENCODERS:
+            continue
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    """Whether a media type benefits from compression (SSE is never buffered)"""
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _tag_encoding(headers: MutableHeaders, encoding: str) -> None:
+    """Strong ETags must differ per content coding ("v1" -> "v1-gzip")"""
+    etag = headers.get("etag")
+    if etag is not None and etag.endswith('"'):
+        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+# =============================================================================
+# Precompressed Cache Entries
+# =============================================================================
+
+
+class CompressedVariants:
+    """
+    A rendered response body plus its lazily computed encoded variants
+
+    Stored in response caches so a hot page is compressed at most once per
+    encoding, not once per request.
+    """
+
+    def __init__(self, body: bytes, media_type: str = "application/json") -> None:
+        self.body = body
+        self.media_type = media_type
+        self._encoded: Dict[str, bytes] = {}
+
+    def encode(self, encoding: str) -> bytes:
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = ENCODERS[encoding](self.body)
+            self._encoded[encoding] = encoded
+        return encoded
+
+
+class PrecompressedResponse(Response):
+    """Response served from CompressedVariants, negotiating the encoding itself"""
+
+    def __init__(
+        self,
+        variants: CompressedVariants,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.variants = variants
+        super().__init__(
+            content=variants.body,
+            status_code=status_code,
+            headers=headers,
+            media_type=variants.media_type,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        _add_vary(self.headers)
+        if len(self.variants.body) >= settings.COMPRESSION_MIN_SIZE:
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding is not None:
+                self.body = self.variants.encode(encoding)
+                self.headers["Content-Encoding"] = encoding
+                self.headers["Content-Length"] = str(len(self.body))
+                _tag_encoding(self.headers, encoding)
+        await super().__call__(scope, receive, send)
+
+
+# =============================================================================
+# Middleware
+# =============================================================================
+
+
+class CompressionMiddleware:
+    """
+    Compress complete (single-message) responses above a size threshold
+
+    Compressible responses always get "Vary: Accept-Encoding" so shared
+    caches keep encodings apart.
+
+    Skipped when:
+        - the client accepts no supported encoding
+        - the response already has Content-Encoding (e.g. PrecompressedResponse)
+        - the media type is not compressible, including text/event-stream
+        - the body is streamed in several messages or is below COMPRESSION_MIN_SIZE
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.COMPRESSION_MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+
+            if (
+                encoding is None
+                or "content-encoding" in headers
+                or not is_compressible(content_type)
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                if is_compressible(content_type):
+                    _add_vary(headers)
+                await send(start)
+                await send(message)
+                return
+
+            compressed = ENCODERS[encoding](body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            _tag_encoding(headers, encoding)
+            _add_vary(headers)
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,6 +1,6 @@
 """Application configuration"""
 from functools import lru_cache
-from typing import List
+from typing import Dict, List
 
 from pydantic import AnyHttpUrl
 from pydantic_settings import BaseSettings
@@ -26,6 +26,9 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # In-process metrics (GET /metrics, X-Metrics-Token header; empty = served only with DEBUG, unauthenticated)
+    METRICS_TOKEN: str = ""
+
     # Database (SQLite for development, PostgreSQL for production)
     DATABASE_URL: str = "sqlite:///./aiwill.db"
 
@@ -37,6 +40,169 @@ class Settings(BaseSettings):
     LLM_API_KEY: str = ""
     LLM_TIMEOUT_SECONDS: int = 30
 
+    # LLM client (one pooled connection set per process; HTTP/2 only when h2 is installed)
+    LLM_BASE_URL: str = ""  # empty = provider default
+    LLM_MODEL: str = "gpt-4o-mini"
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_MAX_CONNECTIONS: int = 200
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    LLM_HTTP2: bool = True
+    LLM_PREWARM_CONNECTIONS: int = 4
+
+    # Local stub LLM server (LLM_PROVIDER=stub; python -m app.services.llm.stub)
+    LLM_STUB_PORT: int = 8100
+    LLM_STUB_FIRST_TOKEN_MS: float = 300
+    LLM_STUB_TOKENS_PER_SECOND: float = 50
+    LLM_STUB_REPLY_TOKENS: int = 60
+    LLM_STUB_MODERATION_MS: float = 100
+
+    # Hedged / fallback LLM requests (NFR-P01b first token within 3 s p95, NFR-P10 fallback after 5 s)
+    LLM_FALLBACK_PROVIDER: str = ""  # openai | stub; empty = no alternate (deadlines and breaker only)
+    LLM_FALLBACK_BASE_URL: str = ""
+    LLM_FALLBACK_MODEL: str = ""  # empty = LLM_MODEL
+    LLM_FALLBACK_API_KEY: str = ""  # empty = LLM_API_KEY
+    LLM_HEDGE_PERCENTILE: float = 0.95  # of the primary's recent first-token latencies
+    LLM_HEDGE_DELAY_MS: int = 1500  # until LLM_HEDGE_MIN_SAMPLES latencies are known
+    LLM_HEDGE_MIN_DELAY_MS: int = 200
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_WINDOW: int = 500
+    LLM_WAITING_NOTICE_SECONDS: float = 2.0  # `waiting` SSE event when no token has arrived yet
+    LLM_FIRST_TOKEN_DEADLINE_SECONDS: float = 5.0
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Graceful shutdown (NFR-A06)
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: int = 25
+    SSE_RETRY_MILLISECONDS: int = 3000
+
+    # Reply streaming (content_delta coalescing; delay 0 = one event per LLM chunk)
+    SSE_COALESCE_MAX_CHARS: int = 64
+    SSE_COALESCE_MAX_DELAY_MS: int = 50
+    SSE_STREAM_BUFFER_CHUNKS: int = 64
+
+    # Resumable reply streams (Last-Event-ID replay buffers; backend: memory | redis)
+    SSE_REPLAY_BACKEND: str = "memory"
+    SSE_REPLAY_BUFFER_EVENTS: int = 512
+    SSE_REPLAY_TTL_SECONDS: int = 60
+    SSE_RESUME_GRACE_SECONDS: float = 0.0  # generation keeps running this long without a client for a resume; 0 = cancel at once
+
+    # Prompt assembly (stable persona prefix -> user memory -> recent history)
+    PROMPT_HISTORY_MESSAGES: int = 20  # verbatim window (messages not yet in the rolling summary)
+    PROMPT_HISTORY_TOKEN_BUDGET: int = 2000
+    PROMPT_TOKEN_CACHE_MAX_ENTRIES: int = 100000
+    PERSONA_PROMPT_TTL_SECONDS: int = 300
+    PERSONA_PROMPT_MAX_ENTRIES: int = 10000
+    USER_MEMORY_TTL_SECONDS: int = 300
+    USER_MEMORY_MAX_ENTRIES: int = 50000
+
+    # Rolling conversation summaries (history beyond the verbatim window, compacted in the background)
+    CONTEXT_SUMMARY_KEEP_MESSAGES: int = 10  # left verbatim by a compaction (runs start past PROMPT_HISTORY_MESSAGES)
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 400
+    CONTEXT_SUMMARY_BATCH_MESSAGES: int = 100
+    CONTEXT_SUMMARY_CONCURRENCY: int = 4
+
+    # Input moderation (NFR-C09; provider: "" = off | openai | stub)
+    MODERATION_PROVIDER: str = ""
+    MODERATION_BASE_URL: str = ""  # empty = LLM_BASE_URL / provider default
+    MODERATION_MODEL: str = "omni-moderation-latest"
+    MODERATION_TIMEOUT_SECONDS: float = 2.0
+    MODERATION_FAIL_OPEN: bool = True  # a failed check lets the message through
+
+    # Turn pipeline (steps before the first token run concurrently; False = one after another)
+    TURN_PIPELINE_CONCURRENT: bool = True
+    TURN_STAGE_WINDOW: int = 1000  # samples per stage for the p95 in /metrics
+    AFFECTION_POINTS_PER_TURN: int = 0  # 0 = off; user_character_relationships is not modeled yet
+
+    # Write-behind conversation messages (multi-row INSERT per flush; empty spill dir = <tmp>/aiwill/message-spill)
+    MESSAGE_WRITE_BEHIND: bool = True  # False = one transaction per message
+    MESSAGE_WRITE_FLUSH_MS: float = 5.0
+    MESSAGE_WRITE_BATCH_MAX: int = 500  # rows per INSERT
+    MESSAGE_WRITE_QUEUE_MAX: int = 10000  # queued messages before writers wait
+    MESSAGE_WRITE_ENQUEUE_TIMEOUT_SECONDS: float = 5.0  # wait for room before the message is dropped
+    MESSAGE_WRITE_RETRY_SECONDS: float = 1.0  # after a failed flush
+    MESSAGE_WRITE_SPILL_DIR: str = ""  # use a persistent volume in production
+    MESSAGE_WRITE_SPILL_SEGMENT_BYTES: int = 4 * 1024 * 1024
+    MESSAGE_WRITE_SPILL_FSYNC: bool = True  # fsync the spill log once per flush
+
+    # Generation concurrency (one per thread; policy: queue | reject | supersede; backend: memory | redis)
+    GENERATION_GUARD_POLICY: str = "reject"
+    GENERATION_MAX_PER_USER: int = 3
+    GENERATION_QUEUE_TIMEOUT_SECONDS: float = 10.0  # queue / supersede wait before 409
+    GENERATION_LOCK_BACKEND: str = "memory"
+    GENERATION_LOCK_TTL_SECONDS: float = 30.0  # redis lease, renewed every TTL / 3 while held
+    GENERATION_LOCK_POLL_MS: int = 100  # redis waiters re-check this often
+
+    # Load shedding (event-loop lag / in-flight admission control)
+    LOAD_SHED_ENABLED: bool = True
+    LOOP_LAG_SAMPLE_INTERVAL_MS: int = 50
+    LOAD_SHED_LAG_MS: Dict[str, int] = {"low": 100, "normal": 300}
+    LOAD_SHED_MAX_IN_FLIGHT: Dict[str, int] = {"low": 200, "normal": 500}  # admitted low + normal requests
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 2
+    # Router name -> priority ("low" | "normal" | "critical"). critical is never shed.
+    ROUTER_PRIORITIES: Dict[str, str] = {
+        "auth": "normal",
+        "auth_refresh": "critical",
+        "me": "normal",
+        "catalog": "low",
+        "tags": "low",
+        "conversation": "critical",
+        "purchase": "critical",
+        "memory": "normal",
+        "safety": "normal",
+        "privacy": "low",
+    }
+
+    # Request coalescing (singleflight) for catalog reads
+    SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS: float = 5.0
+
+    # Response compression (brotli / zstd used only when installed)
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # HTTP caching of public catalog / master data responses (revalidated by ETag afterwards)
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 60
+
+    # Rendered catalog response cache (stores precompressed variants)
+    CATALOG_RESPONSE_CACHE_TTL_SECONDS: int = 30
+    CATALOG_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+
+    # Cross-process shared snapshots (mmap; empty dir = /dev/shm/aiwill)
+    SHARED_SNAPSHOT_DIR: str = ""
+    SHARED_SNAPSHOT_CHECK_INTERVAL_SECONDS: float = 1.0
+    MASTER_DATA_REFRESH_SECONDS: int = 300
+
+    # In-process catalog index (full rebuild interval)
+    CATALOG_INDEX_REFRESH_SECONDS: int = 300
+
+    # Pack stats counters (in-memory deltas, write-behind to pack_stats; conversation_count recounted)
+    PACK_STATS_SHARDS: int = 16
+    PACK_STATS_FLUSH_SECONDS: float = 5.0
+    PACK_STATS_RECOUNT_SECONDS: int = 300
+    PACK_STATS_BATCH_RETENTION_SECONDS: int = 86400
+
+    # Pack rankings job (forward-decayed popularity / trending scores, incremental per run)
+    PACK_RANKING_INTERVAL_SECONDS: int = 300
+    PACK_RANKING_POPULARITY_HALF_LIFE_HOURS: float = 720
+    PACK_RANKING_TRENDING_HALF_LIFE_HOURS: float = 24
+    PACK_RANKING_BATCH_SIZE: int = 10000
+    PACK_RANKING_SETTLE_SECONDS: int = 60
+
+    # Per-user owned / favorited pack sets (write-through on this worker; TTL bounds staleness elsewhere)
+    USER_PACK_STATUS_TTL_SECONDS: int = 60
+    USER_PACK_STATUS_MAX_USERS: int = 10000
+    USER_PACK_STATUS_MAX_PACK_NUMBERS: int = 200000
+
+    # Per-user block sets hiding blocked creators / characters / tags from the catalog
+    USER_BLOCKS_TTL_SECONDS: int = 60
+    USER_BLOCKS_MAX_USERS: int = 10000
+
+    # Character summaries embedded in pack detail bundles (include=characters)
+    CHARACTER_SUMMARY_TTL_SECONDS: int = 300
+    CHARACTER_SUMMARY_MAX_ENTRIES: int = 50000
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,219 @@
+"""Graceful shutdown drain for in-flight SSE streams (NFR-A06)"""
+import asyncio
+import logging
+import signal
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Set, TypeVar
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableException
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class StreamTicket:
+    """
+    Handle for one in-flight stream registered with the DrainCoordinator
+
+    The stream generator iterates its upstream through guard() so that an
+    interruption at the drain deadline stops it between two deltas.
+    """
+
+    def __init__(self) -> None:
+        self._interrupted = asyncio.Event()
+
+    @property
+    def interrupted(self) -> bool:
+        """True once the drain deadline has passed for this stream"""
+        return self._interrupted.is_set()
+
+    def interrupt(self) -> None:
+        """Ask the stream to stop at the next delta boundary"""
+        self._interrupted.set()
+
+    async def guard(self, source: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Yield items from source until it is exhausted or the ticket is interrupted
+
+        The pending read on source is cancelled on interruption, so a stalled
+        upstream does not hold the shutdown.
+        """
+        iterator = source.__aiter__()
+        interrupted = asyncio.ensure_future(self._interrupted.wait())
+        next_item: Optional[asyncio.Future] = None
+        try:
+            while not self.interrupted:
+                next_item = asyncio.ensure_future(iterator.__anext__())
+                await asyncio.wait(
+                    {next_item, interrupted},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not next_item.done():
+                    break
+                try:
+                    item = next_item.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            if next_item is not None and not next_item.done():
+                next_item.cancel()
+                # Let the source finish closing (e.g. its upstream response)
+                await asyncio.wait({next_item})
+            interrupted.cancel()
+
+
+class DrainCoordinator:
+    """
+    Coordinates graceful shutdown of long-lived streaming responses
+
+    Strategy:
+        - On SIGTERM (or lifespan shutdown) stop accepting new streams and
+          report not-ready so the load balancer stops routing here
+        - Let active streams finish until the drain deadline
+        - At the deadline interrupt the remaining streams; each stream emits a
+          resumable `error` event and persists its partial answer
+        - The engine is disposed only after drain() returns
+    """
+
+    def __init__(self, timeout_seconds: float, grace_seconds: float = 5.0) -> None:
+        self.timeout_seconds = timeout_seconds
+        self.grace_seconds = grace_seconds
+        self._draining = False
+        self._interrupting = False
+        self._active: Set[StreamTicket] = set()
+        self._idle: Optional[asyncio.Event] = None
+        self._deadline: Optional[asyncio.TimerHandle] = None
+
+    # =========================================================================
+    # State
+    # =========================================================================
+
+    @property
+    def is_draining(self) -> bool:
+        return self._draining
+
+    @property
+    def is_ready(self) -> bool:
+        """Readiness for new traffic (false once draining has started)"""
+        return not self._draining
+
+    @property
+    def active_streams(self) -> int:
+        return len(self._active)
+
+    def ensure_accepting(self) -> None:
+        """
+        Reject new streams while draining
+
+        Raises:
+            ServiceUnavailableException: If shutdown has started
+        """
+        if self._draining:
+            raise ServiceUnavailableException("サーバーが再起動中です。しばらく待ってから再試行してください。")
+
+    # =========================================================================
+    # Stream Registration
+    # =========================================================================
+
+    @asynccontextmanager
+    async def track_stream(self) -> AsyncIterator[StreamTicket]:
+        """Register an in-flight stream for the lifetime of the context"""
+        ticket = StreamTicket()
+        self._active.add(ticket)
+        if self._idle is not None:
+            self._idle.clear()
+        if self._interrupting:
+            ticket.interrupt()
+        try:
+            yield ticket
+        finally:
+            self._active.discard(ticket)
+            if not self._active and self._idle is not None:
+                self._idle.set()
+
+    # =========================================================================
+    # Drain
+    # =========================================================================
+
+    def begin_drain(self) -> None:
+        """Stop accepting new streams and arm the drain deadline (idempotent)"""
+        if self._draining:
+            return
+        self._draining = True
+        logger.info("Draining %d active stream(s)", len(self._active))
+        loop = asyncio.get_running_loop()
+        self._deadline = loop.call_later(self.timeout_seconds, self.interrupt_all)
+
+    def interrupt_all(self) -> None:
+        """Interrupt every active stream (drain deadline reached)"""
+        self._interrupting = True
+        if self._deadline is not None:
+            self._deadline.cancel()
+        if self._active:
+            logger.warning("Drain deadline reached, interrupting %d stream(s)", len(self._active))
+        for ticket in list(self._active):
+            ticket.interrupt()
+
+    async def drain(self) -> None:
+        """
+        Drain active streams before shutdown
+
+        Waits up to timeout_seconds for streams to finish, interrupts the rest,
+        then waits up to grace_seconds for them to persist and close.
+        """
+        self.begin_drain()
+        if await self._wait_idle(self.timeout_seconds):
+            return
+        self.interrupt_all()
+        if not await self._wait_idle(self.grace_seconds):
+            logger.error("%d stream(s) did not close after interruption", len(self._active))
+
+    async def _wait_idle(self, timeout: float) -> bool:
+        if not self._active:
+            return True
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    # =========================================================================
+    # Signals
+    # =========================================================================
+
+    def install_signal_handlers(self) -> None:
+        """
+        Start draining as soon as SIGTERM/SIGINT arrives
+
+        The server's own handler is chained, so uvicorn still stops accepting
+        connections; our drain runs while it waits for open connections.
+        Only possible from the main thread; otherwise drain() in the lifespan
+        shutdown is the fallback.
+        """
+        loop = asyncio.get_running_loop()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self.begin_drain)
+                if callable(previous):
+                    previous(signum, frame)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                return
+
+
+drain_coordinator = DrainCoordinator(timeout_seconds=settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+register_metrics(
+    "drain",
+    lambda: {"draining": drain_coordinator.is_draining, "active_streams": drain_coordinator.active_streams},
+)
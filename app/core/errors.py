@@ -79,6 +79,7 @@ class ErrorCode:
 
     # 422
     UNPROCESSABLE_ENTITY = "unprocessable_entity"
+    CONTENT_FILTERED = "content_filtered"
 
     # 423
     ACCOUNT_LOCKED = "account_locked"
@@ -107,11 +108,12 @@ class APIException(HTTPException):
         code: str,
         message: str,
         details: Optional[List[Dict[str, Any]]] = None,
+        headers: Optional[Dict[str, str]] = None,
     ):
         self.code = code
         self.message = message
         self.details = details or []
-        super().__init__(status_code=status_code, detail=message)
+        super().__init__(status_code=status_code, detail=message, headers=headers)
 
 
 class ValidationException(APIException):
@@ -159,6 +161,17 @@ class NotFoundException(APIException):
         )
 
 
+class RequestTimeoutException(APIException):
+    """408 - Request timeout"""
+
+    def __init__(self, message: str = "応答がタイムアウトしました。再度お試しください。"):
+        super().__init__(
+            status_code=status.HTTP_408_REQUEST_TIMEOUT,
+            code=ErrorCode.REQUEST_TIMEOUT,
+            message=message,
+        )
+
+
 class ConflictException(APIException):
     """409 - Conflict"""
 
@@ -170,6 +183,17 @@ class ConflictException(APIException):
         )
 
 
+class ContentFilteredException(APIException):
+    """422 - Content rejected by moderation"""
+
+    def __init__(self, message: str = "不適切な内容が含まれているため送信できません"):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            code=ErrorCode.CONTENT_FILTERED,
+            message=message,
+        )
+
+
 class RateLimitException(APIException):
     """429 - Rate limit exceeded"""
 
@@ -184,11 +208,12 @@ class RateLimitException(APIException):
 class ServiceUnavailableException(APIException):
     """503 - Service unavailable"""
 
-    def __init__(self, message: str = "サービスが一時的に利用できません"):
+    def __init__(self, message: str = "サービスが一時的に利用できません", retry_after: Optional[int] = None):
         super().__init__(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             code=ErrorCode.SERVICE_UNAVAILABLE,
             message=message,
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
         )
 
 
@@ -198,7 +223,11 @@ class ServiceUnavailableException(APIException):
 
 
 def create_error_response(
-    status_code: int, code: str, message: str, details: Optional[List[Dict[str, Any]]] = None
+    status_code: int,
+    code: str,
+    message: str,
+    details: Optional[List[Dict[str, Any]]] = None,
+    headers: Optional[Dict[str, str]] = None,
 ) -> JSONResponse:
     """Create unified error response"""
     error_details = []
@@ -219,7 +248,7 @@ def create_error_response(
             details=error_details,
         )
     )
-    return JSONResponse(status_code=status_code, content=response.model_dump())
+    return JSONResponse(status_code=status_code, content=response.model_dump(), headers=headers)
 
 
 async def api_exception_handler(request: Request, exc: APIException) -> JSONResponse:
@@ -229,6 +258,7 @@ async def api_exception_handler(request: Request, exc: APIException) -> JSONResp
         code=exc.code,
         message=exc.message,
         details=exc.details,
+        headers=exc.headers,
     )
 
 
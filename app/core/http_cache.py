@@ -0,0 +1,81 @@
+"""
+HTTP conditional requests (ETag / If-None-Match -> 304)
+
+ETags are built from entity versions the server already holds in memory
+(catalog pack versions, snapshot entry versions, live counters), so a
+304 is decided before any DB query or serialization.
+
+Cache policies:
+    PUBLIC  - same body for every caller; shared caches may store it
+              (explicitly public, since the request carries Authorization)
+    PRIVATE - contains per-user fields; only the client may store it and
+              must revalidate every time
+"""
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+from app.core.compression import ENCODERS
+from app.core.config import settings
+
+PUBLIC = "public"
+PRIVATE = "private"
+
+
+def entity_tag(*parts: object) -> str:
+    """Strong ETag from version parts, e.g. entity_tag("pack", pack_id, version)"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _base_tags(header: str) -> Iterable[str]:
+    """If-None-Match entity tags with W/ and the content-coding suffix removed"""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        for encoding in ENCODERS:
+            suffix = f'-{encoding}"'
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        yield tag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match matches etag (weak comparison, any content coding)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in _base_tags(header)
+
+
+def cache_headers(etag: str, policy: str) -> Dict[str, str]:
+    if policy == PUBLIC:
+        return {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}, must-revalidate",
+        }
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+
+
+def not_modified(etag: str, policy: str) -> Response:
+    """304 carrying the same validators / caching headers a 200 would"""
+    headers = cache_headers(etag, policy)
+    if policy == PUBLIC:
+        headers["Vary"] = "Accept-Encoding"
+    else:
+        headers["Vary"] = "Authorization, Accept-Encoding"
+    return Response(status_code=304, headers=headers)
+
+
+def conditional(request: Request, etag: str, policy: str) -> Optional[Response]:
+    """304 response when the client's copy is current, else None"""
+    if is_not_modified(request, etag):
+        return not_modified(etag, policy)
+    return None
@@ -0,0 +1,220 @@
+"""Event-loop lag monitoring and priority-based load shedding"""
+import asyncio
+import logging
+from enum import Enum
+from typing import Dict, List, Optional
+
+from fastapi import Depends, Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableException
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(str, Enum):
+    """Route priority for admission control"""
+    LOW = "low"            # Shed first (catalog browsing, tag lists, exports)
+    NORMAL = "normal"      # Shed under heavy overload
+    CRITICAL = "critical"  # Never shed or counted (conversation streams, auth refresh)
+
+
+# =============================================================================
+# Loop Lag Monitor
+# =============================================================================
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag by measuring how late a periodic sleep wakes up
+
+    The reported lag rises immediately on a spike and decays gradually, so a
+    single quiet sample does not re-open admission mid-overload.
+    """
+
+    def __init__(self, interval_seconds: float, decay: float = 0.8) -> None:
+        self.interval_seconds = interval_seconds
+        self.decay = decay
+        self.lag_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, loop.time() - started - self.interval_seconds)
+            if lag >= self.lag_seconds:
+                self.lag_seconds = lag
+            else:
+                self.lag_seconds = self.lag_seconds * self.decay + lag * (1 - self.decay)
+
+
+# =============================================================================
+# Admission Controller
+# =============================================================================
+
+
+class AdmissionController:
+    """
+    Decides whether a request of a given priority may be admitted
+
+    Inputs:
+        - Event-loop lag from LoopLagMonitor
+        - In-flight count of admitted low / normal requests, per priority
+
+    Critical routes are never counted: a worker holding hundreds of open
+    conversation streams is not overloaded by them, and counting them
+    would shed catalog traffic on an idle event loop.
+    """
+
+    def __init__(
+        self,
+        monitor: LoopLagMonitor,
+        lag_thresholds_ms: Dict[str, int],
+        max_in_flight: Dict[str, int],
+        retry_after_seconds: int,
+        enabled: bool = True,
+    ) -> None:
+        self.monitor = monitor
+        self.lag_thresholds = {Priority(k): v / 1000 for k, v in lag_thresholds_ms.items()}
+        self.max_in_flight = {Priority(k): v for k, v in max_in_flight.items()}
+        self.retry_after_seconds = retry_after_seconds
+        self.enabled = enabled
+        self.in_flight: Dict[Priority, int] = {p: 0 for p in Priority if p is not Priority.CRITICAL}
+        self.shed_count: Dict[Priority, int] = {p: 0 for p in Priority}
+
+    def admit(self, priority: Priority) -> bool:
+        """Return True if a request with this priority should be served"""
+        if not self.enabled or priority is Priority.CRITICAL:
+            return True
+        lag_limit = self.lag_thresholds.get(priority)
+        if lag_limit is not None and self.monitor.lag_seconds > lag_limit:
+            return False
+        in_flight_limit = self.max_in_flight.get(priority)
+        if in_flight_limit is not None and sum(self.in_flight.values()) >= in_flight_limit:
+            return False
+        return True
+
+    def enter(self, scope: Scope, priority: Priority) -> None:
+        """
+        Count an admitted request until AdmissionMiddleware sees it finish
+
+        Requests outside the middleware (no scope["admission"]) are not counted.
+        """
+        admitted = scope.get("admission")
+        if admitted is None:
+            return
+        admitted.append(priority)
+        self.in_flight[priority] += 1
+
+    def leave(self, admitted: List[Priority]) -> None:
+        for priority in admitted:
+            self.in_flight[priority] -= 1
+
+    def check(self, priority: Priority) -> None:
+        """
+        Reject the request if it cannot be admitted
+
+        Raises:
+            ServiceUnavailableException: With Retry-After when shedding
+        """
+        if self.admit(priority):
+            return
+        self.shed_count[priority] += 1
+        raise ServiceUnavailableException(
+            message="混雑しています。しばらく待ってから再試行してください。",
+            retry_after=self.retry_after_seconds,
+        )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "loop_lag_ms": round(self.monitor.lag_seconds * 1000, 2),
+            "in_flight": {p.value: n for p, n in self.in_flight.items()},
+            "shed": {p.value: n for p, n in self.shed_count.items()},
+        }
+
+    async def start(self) -> None:
+        if self.enabled:
+            self.monitor.start()
+
+    async def stop(self) -> None:
+        await self.monitor.stop()
+
+
+admission_controller = AdmissionController(
+    monitor=LoopLagMonitor(interval_seconds=settings.LOOP_LAG_SAMPLE_INTERVAL_MS / 1000),
+    lag_thresholds_ms=settings.LOAD_SHED_LAG_MS,
+    max_in_flight=settings.LOAD_SHED_MAX_IN_FLIGHT,
+    retry_after_seconds=settings.LOAD_SHED_RETRY_AFTER_SECONDS,
+    enabled=settings.LOAD_SHED_ENABLED,
+)
+register_metrics("admission", admission_controller.stats)
+
+
+# =============================================================================
+# Middleware / Dependencies
+# =============================================================================
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware that ends the in-flight count of admitted requests
+
+    The priority is only known after routing, so the admission dependency
+    records it in scope["admission"] and the count is released here, once
+    the response has been sent.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        admitted: List[Priority] = []
+        scope["admission"] = admitted
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave(admitted)
+
+
+def router_dependencies(router_name: str, controller: AdmissionController = admission_controller) -> List:
+    """
+    Admission-control dependencies for a router, per settings.ROUTER_PRIORITIES
+
+    Usage:
+        app.include_router(catalog_router, dependencies=router_dependencies("catalog"))
+
+    Router-level dependencies run before endpoint dependencies, so a shed
+    request is rejected before authentication or any DB work. Critical
+    routers get no dependency: never shed, never counted.
+    """
+    priority = Priority(settings.ROUTER_PRIORITIES.get(router_name, Priority.NORMAL.value))
+    if priority is Priority.CRITICAL:
+        return []
+
+    async def check_admission(request: Request) -> None:
+        controller.check(priority)
+        controller.enter(request.scope, priority)
+
+    return [Depends(check_admission)]
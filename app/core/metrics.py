@@ -0,0 +1,22 @@
+"""In-process metrics registry (exposed at GET /metrics)"""
+from typing import Any, Callable, Dict
+
+MetricsProvider = Callable[[], Dict[str, Any]]
+
+_providers: Dict[str, MetricsProvider] = {}
+
+
+def register_metrics(name: str, provider: MetricsProvider) -> None:
+    """
+    Register a subsystem's metrics snapshot function
+
+    Args:
+        name: Subsystem name (top-level key in the /metrics response)
+        provider: Zero-argument callable returning a JSON-serializable dict
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    """Collect a snapshot from every registered subsystem"""
+    return {name: provider() for name, provider in _providers.items()}
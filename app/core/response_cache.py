@@ -0,0 +1,55 @@
+"""In-process TTL cache of rendered (and precompressed) responses"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.compression import CompressedVariants
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of CompressedVariants keyed by coalescing key
+
+    Entries keep their encoded variants, so hot pages are serialized and
+    compressed only once until they expire.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, CompressedVariants]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        register_metrics(f"response_cache.{name}", self.stats)
+
+    def get(self, key: Hashable) -> Optional[CompressedVariants]:
+        item = self._entries.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, variants: CompressedVariants) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, variants)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+catalog_response_cache = ResponseCache(
+    "catalog",
+    ttl_seconds=settings.CATALOG_RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=settings.CATALOG_RESPONSE_CACHE_MAX_ENTRIES,
+)
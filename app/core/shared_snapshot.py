@@ -0,0 +1,268 @@
+"""
+Cross-process shared snapshots backed by memory-mapped files
+
+One process (the elected builder) writes a versioned snapshot file; every
+uvicorn/gunicorn worker on the node maps the same file read-only, so N
+workers share one copy of hot data in the page cache instead of N heaps.
+
+File layout (little endian):
+    header  : magic(8) | version(u64) | index_offset(u64) | index_length(u64)
+    data    : concatenated values (pre-rendered bytes, e.g. JSON bodies)
+    index   : JSON object {key: [offset, length, entry_version]}
+
+entry_version is a digest of the value taken by the writer, so it only
+changes when that entry's content does (and matches across nodes); it is
+what HTTP ETags for snapshot-served endpoints are built from.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Mapping, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: every worker builds its own snapshot
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AIWSNAP1"
+HEADER = struct.Struct("<8sQQQ")
+
+
+def default_snapshot_dir() -> Path:
+    """Prefer tmpfs (/dev/shm) so snapshots never touch disk"""
+    if settings.SHARED_SNAPSHOT_DIR:
+        return Path(settings.SHARED_SNAPSHOT_DIR)
+    if Path("/dev/shm").is_dir():
+        return Path("/dev/shm/aiwill")
+    return Path(tempfile.gettempdir()) / "aiwill"
+
+
+# =============================================================================
+# Writer
+# =============================================================================
+
+
+def write_snapshot(path: Path, entries: Mapping[str, bytes], version: int) -> None:
+    """
+    Write a snapshot file and atomically swap it into place
+
+    Readers that still map the previous file keep a valid mapping of the
+    old inode until they reload, so the swap never tears a read.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    index: Dict[str, list] = {}
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        offset = HEADER.size
+        for key, value in entries.items():
+            f.write(value)
+            index[key] = [offset, len(value), hashlib.blake2b(value, digest_size=8).hexdigest()]
+            offset += len(value)
+        index_bytes = json.dumps(index, separators=(",", ":")).encode()
+        f.write(index_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, version, offset, len(index_bytes)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# =============================================================================
+# Reader
+# =============================================================================
+
+
+class _MappedState(NamedTuple):
+    stat_key: tuple
+    version: int
+    view: memoryview
+    index: Dict[str, list]
+
+
+class SharedSnapshot:
+    """
+    Read side of a shared snapshot
+
+    get() returns a memoryview into the shared mapping (no copy). The file is
+    re-checked at most every check_interval seconds and remapped when the
+    builder has swapped in a new version.
+    """
+
+    def __init__(self, name: str, directory: Optional[Path] = None, check_interval: float = 1.0) -> None:
+        self.name = name
+        self.path = (directory or default_snapshot_dir()) / f"{name}.snap"
+        self.check_interval = check_interval
+        self._state: Optional[_MappedState] = None
+        self._next_check = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        self._maybe_reload()
+        return self._state.version if self._state else 0
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """Return the value for key as a zero-copy view, or None"""
+        self._maybe_reload()
+        state = self._state
+        location = state.index.get(key) if state else None
+        if location is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, length = location[:2]
+        return state.view[offset:offset + length]
+
+    def get_versioned(self, key: str) -> Tuple[Optional[memoryview], Optional[str]]:
+        """(value, entry_version) of key from the same mapping; (None, None) when absent"""
+        value = self.get(key)
+        if value is None:
+            return None, None
+        location = self._state.index[key]
+        # Files from an older writer have no entry version
+        return value, location[2] if len(location) > 2 else None
+
+    def reload(self) -> None:
+        """Force a re-check of the snapshot file"""
+        self._next_check = 0.0
+        self._maybe_reload()
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._state is not None and self._state.stat_key == stat_key:
+            return
+        try:
+            self._state = self._map(stat_key)
+        except (OSError, ValueError):
+            logger.exception("Failed to map snapshot %s", self.path)
+
+    def _map(self, stat_key: tuple) -> _MappedState:
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_offset, index_length = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            raise ValueError(f"bad snapshot magic in {self.path}")
+        index = json.loads(mapped[index_offset:index_offset + index_length])
+        # The previous mapping is released by GC once no views reference it
+        return _MappedState(stat_key, version, memoryview(mapped), index)
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        return {
+            "version": state.version if state else 0,
+            "keys": len(state.index) if state else 0,
+            "bytes": len(state.view) if state else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# =============================================================================
+# Builder Election
+# =============================================================================
+
+
+SnapshotBuilder = Callable[[], Awaitable[Mapping[str, bytes]]]
+
+
+class SnapshotPublisher:
+    """
+    Periodically rebuilds a snapshot in exactly one process per node
+
+    The worker that holds an exclusive flock on "<name>.lock" is the builder;
+    if it dies the lock is released and another worker takes over. A sidecar
+    can run the same publisher instead of a worker.
+    """
+
+    def __init__(
+        self,
+        snapshot: SharedSnapshot,
+        build: SnapshotBuilder,
+        interval_seconds: float,
+    ) -> None:
+        self.snapshot = snapshot
+        self.build = build
+        self.interval_seconds = interval_seconds
+        self._lock_file = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_builder(self) -> bool:
+        return self._lock_file is not None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def publish(self) -> int:
+        """Build and swap in a new snapshot version; returns the version"""
+        entries = await self.build()
+        version = max(time.time_ns(), self.snapshot.version + 1)
+        await asyncio.to_thread(write_snapshot, self.snapshot.path, entries, version)
+        self.snapshot.reload()
+        return version
+
+    async def _run(self) -> None:
+        while True:
+            if self._try_become_builder():
+                try:
+                    await self.publish()
+                except Exception:
+                    logger.exception("Failed to publish snapshot %s", self.snapshot.name)
+            await asyncio.sleep(self.interval_seconds)
+
+    def _try_become_builder(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            return True
+        self.snapshot.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.snapshot.path.with_suffix(".lock"), "a+b")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+
+master_data_snapshot = SharedSnapshot(
+    "master_data",
+    check_interval=settings.SHARED_SNAPSHOT_CHECK_INTERVAL_SECONDS,
+)
+register_metrics("shared_snapshot.master_data", master_data_snapshot.stats)
@@ -0,0 +1,113 @@
+"""Singleflight request coalescing for identical concurrent reads"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Mapping, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableException
+from app.core.metrics import register_metrics
+
+T = TypeVar("T")
+
+
+def coalescing_key(
+    route: str,
+    params: Mapping[str, Any],
+    partition: Optional[str] = None,
+) -> Tuple:
+    """
+    Build a normalized coalescing key
+
+    Args:
+        route: Route template, e.g. "GET /packs/{pack_id}"
+        params: Path/query parameters that affect the shared result
+        partition: Cache-partition key (e.g. age group) for results that
+            differ between user groups but not between individual users
+
+    Normalization:
+        - None / empty values are dropped
+        - Strings are stripped; list values (e.g. tags) are sorted
+        - Parameters are ordered by name
+    """
+    normalized = []
+    for name in sorted(params):
+        value = params[name]
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, Iterable):
+            value = tuple(sorted({str(v).strip() for v in value} - {""}))
+        normalized.append((name, value))
+    return (route, tuple(normalized), partition)
+
+
+class SingleFlight:
+    """
+    Shares one in-flight computation between concurrent identical requests
+
+    Strategy:
+        - The first caller for a key (the leader) runs the computation
+        - Concurrent callers for the same key await the leader's result
+        - Errors are propagated to every waiter
+        - Waiters are bounded by wait_timeout; a timed-out waiter gets a 503
+          but the leader keeps running for the others
+        - The key is forgotten as soon as the computation settles, so results
+          are never cached here (caching is a separate layer)
+    """
+
+    def __init__(self, name: str, wait_timeout: float) -> None:
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.timeouts = 0
+        register_metrics(f"singleflight.{name}", self.stats)
+
+    async def do(self, key: Tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn once per key among concurrent callers
+
+        Args:
+            key: Normalized key (see coalescing_key)
+            fn: Zero-argument coroutine function computing the shared result
+
+        Returns:
+            The shared result (treat as read-only)
+
+        Raises:
+            ServiceUnavailableException: If waiting exceeded wait_timeout
+        """
+        self.calls += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            self.executions += 1
+            future = asyncio.ensure_future(self._run(key, fn))
+            # Mark the exception retrieved even if every waiter timed out
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._in_flight[key] = future
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ServiceUnavailableException(retry_after=1)
+
+    async def _run(self, key: Tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await fn()
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._in_flight),
+        }
+
+
+catalog_flight = SingleFlight("catalog", wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS)
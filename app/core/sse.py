@@ -0,0 +1,41 @@
+"""Server-Sent Events helpers"""
+from typing import Optional
+
+from pydantic import BaseModel
+from starlette.types import Receive
+
+
+def format_sse_event(
+    event: str,
+    payload: BaseModel,
+    retry_ms: Optional[int] = None,
+) -> str:
+    """
+    Format a single SSE event
+
+    Args:
+        event: Event type (message_start, content_delta, ...)
+        payload: Event payload schema
+        retry_ms: Optional reconnection delay hint for the client
+
+    Returns:
+        SSE-framed event string
+    """
+    lines = [f"event: {event}"]
+    if retry_ms is not None:
+        lines.append(f"retry: {retry_ms}")
+    lines.append(f"data: {payload.model_dump_json(exclude_none=True)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def wait_for_disconnect(receive: Receive) -> None:
+    """
+    Return once the client has disconnected
+
+    Only for requests whose body has already been read (the remaining
+    ASGI messages are then just the disconnect). Lets a stream notice a
+    closed connection while it is waiting upstream, not only at its next
+    send.
+    """
+    while (await receive())["type"] != "http.disconnect":
+        pass
@@ -1,9 +1,11 @@
 """Dependencies for FastAPI dependency injection"""
+import secrets
 from typing import Annotated, Optional
 
 from fastapi import Depends, Header
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from app.core.config import settings
 from app.core.errors import (
     ErrorCode,
     ForbiddenException,
@@ -68,6 +70,24 @@ async def get_optional_user_id(
         return None
 
 
+async def require_metrics_token(
+    metrics_token: Annotated[Optional[str], Header(alias="X-Metrics-Token")] = None,
+) -> None:
+    """
+    Guard GET /metrics with settings.METRICS_TOKEN
+
+    Without a configured token the endpoint is only registered with DEBUG
+    and left open.
+
+    Raises:
+        UnauthenticatedException: If the X-Metrics-Token header does not match
+    """
+    if not settings.METRICS_TOKEN:
+        return
+    if not metrics_token or not secrets.compare_digest(metrics_token, settings.METRICS_TOKEN):
+        raise UnauthenticatedException()
+
+
 # Type aliases for dependency injection
 CurrentUserId = Annotated[str, Depends(get_current_user_id)]
 OptionalUserId = Annotated[Optional[str], Depends(get_optional_user_id)]
@@ -7,7 +7,7 @@ registers routers, and configures middleware and exception handlers.
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -20,16 +20,34 @@ from app.api.v1.routers import (
     purchase_router,
     safety_router,
 )
-from app.api.v1.routers.auth import me_router
+from app.api.v1.routers.auth import me_router, token_router
 from app.api.v1.routers.catalog import tags_router
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.drain import drain_coordinator
 from app.core.errors import (
     APIException,
+    ServiceUnavailableException,
     api_exception_handler,
     generic_exception_handler,
     http_exception_handler,
     validation_exception_handler,
 )
+from app.core.load_shedding import AdmissionMiddleware, admission_controller, router_dependencies
+from app.core.metrics import collect_metrics
+from app.deps import require_metrics_token
+from app.services.catalog_index import catalog_index
+from app.services.context_summaries import context_summaries
+from app.services.generation_guard import generation_guard
+from app.services.llm import llm_provider
+from app.services.master_data import master_data_publisher
+from app.services.message_writes import message_writes
+from app.services.moderation import input_moderation
+from app.services.pack_rankings import pack_rankings
+from app.services.pack_stats import pack_stats
+from app.services.reply_stream import reply_writes
+from app.services.stream_replay import stream_replay
+from app.services.turn_pipeline import turn_pipeline
 
 
 # =============================================================================
@@ -44,14 +62,26 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
 
     Startup:
     - Create database tables (dev only, use alembic in production)
+    - Start draining SSE streams as soon as SIGTERM arrives
+    - Start the event-loop lag monitor for load shedding
+    - Start the master data snapshot publisher (one builder per node)
+    - Build the in-process catalog index and schedule its refresh
+    - Load pack stats counters and schedule their write-behind flush
+    - Open pooled connections to the LLM provider
     
     Shutdown:
-    - Close database connections
+    - Drain in-flight SSE streams (NFR-A06) and finish their message writes
+    - Cancel pending conversation summary jobs
+    - Stop the event-loop lag monitor
+    - Stop the master data snapshot publisher
+    - Stop the catalog index refresh and the pack ranking job
+    - Flush pending pack stats deltas
+    - Close LLM provider, replay mirror (Redis) and database connections
     """
     from app.db.database import engine
     from app.db.base import Base
     # Import models to register them with Base
-    from app.models import User, RefreshToken  # noqa: F401
+    from app.models import User, RefreshToken, ConversationSession, ConversationMessage, PackStat, PackRanking, PackRankingWatermark, UserCharacterMemory  # noqa: F401
 
     # Startup
     print(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
@@ -61,11 +91,36 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
         print("Database tables created (DEBUG mode)")
+
+    drain_coordinator.install_signal_handlers()
+    await message_writes.start()
+    await admission_controller.start()
+    master_data_publisher.start()
+    await catalog_index.start()
+    await pack_stats.start()
+    await pack_rankings.start()
+    if settings.LLM_PREWARM_CONNECTIONS > 0:
+        await llm_provider.warm(settings.LLM_PREWARM_CONNECTIONS)
+        await input_moderation.warm(settings.LLM_PREWARM_CONNECTIONS)
     
     yield
     
     # Shutdown
     print("Shutting down...")
+    await drain_coordinator.drain()
+    await reply_writes.flush()
+    await turn_pipeline.effects.flush()
+    await message_writes.stop()
+    await context_summaries.stop()
+    await admission_controller.stop()
+    await master_data_publisher.stop()
+    await catalog_index.stop()
+    await pack_rankings.stop()
+    await pack_stats.stop()
+    await llm_provider.aclose()
+    await input_moderation.aclose()
+    await stream_replay.aclose()
+    await generation_guard.aclose()
     await engine.dispose()
 
 
@@ -109,6 +164,12 @@ def create_app() -> FastAPI:
             allow_headers=["*"],
         )
 
+    # Compression (skips SSE and small bodies; cached catalog pages arrive precompressed)
+    app.add_middleware(CompressionMiddleware)
+
+    # Load shedding (in-flight request tracking; per-router priorities below)
+    app.add_middleware(AdmissionMiddleware)
+
     # TODO: Add rate limiting middleware
     # TODO: Add request logging middleware
 
@@ -118,27 +179,28 @@ def create_app() -> FastAPI:
     api_prefix = settings.API_V1_PREFIX
 
     # Auth
-    app.include_router(auth_router, prefix=api_prefix)
-    app.include_router(me_router, prefix=api_prefix)
+    app.include_router(auth_router, prefix=api_prefix, dependencies=router_dependencies("auth"))
+    app.include_router(token_router, prefix=api_prefix, dependencies=router_dependencies("auth_refresh"))
+    app.include_router(me_router, prefix=api_prefix, dependencies=router_dependencies("me"))
 
     # Catalog
-    app.include_router(catalog_router, prefix=api_prefix)
-    app.include_router(tags_router, prefix=api_prefix)
+    app.include_router(catalog_router, prefix=api_prefix, dependencies=router_dependencies("catalog"))
+    app.include_router(tags_router, prefix=api_prefix, dependencies=router_dependencies("tags"))
 
     # Conversation
-    app.include_router(conversation_router, prefix=api_prefix)
+    app.include_router(conversation_router, prefix=api_prefix, dependencies=router_dependencies("conversation"))
 
     # Purchase
-    app.include_router(purchase_router, prefix=api_prefix)
+    app.include_router(purchase_router, prefix=api_prefix, dependencies=router_dependencies("purchase"))
 
     # Memory (Clips)
-    app.include_router(memory_router, prefix=api_prefix)
+    app.include_router(memory_router, prefix=api_prefix, dependencies=router_dependencies("memory"))
 
     # Safety
-    app.include_router(safety_router, prefix=api_prefix)
+    app.include_router(safety_router, prefix=api_prefix, dependencies=router_dependencies("safety"))
 
     # Privacy
-    app.include_router(privacy_router, prefix=api_prefix)
+    app.include_router(privacy_router, prefix=api_prefix, dependencies=router_dependencies("privacy"))
 
     # -------------------------------------------------------------------------
     # Health Check
@@ -148,6 +210,26 @@ def create_app() -> FastAPI:
         """Health check endpoint"""
         return {"status": "healthy", "version": settings.APP_VERSION}
 
+    @app.get("/ready", tags=["Health"])
+    async def readiness_check():
+        """Readiness check endpoint (503 while draining for shutdown)"""
+        if not drain_coordinator.is_ready:
+            raise ServiceUnavailableException("シャットダウン中です")
+        return {"status": "ready", "active_streams": drain_coordinator.active_streams}
+
+    # Metrics: internal only (X-Metrics-Token); without a token only in DEBUG
+    if settings.DEBUG or settings.METRICS_TOKEN:
+
+        @app.get(
+            "/metrics",
+            tags=["Health"],
+            include_in_schema=settings.DEBUG,
+            dependencies=[Depends(require_metrics_token)],
+        )
+        async def metrics():
+            """In-process subsystem metrics (coalescing, load shedding, drain, ...)"""
+            return collect_metrics()
+
     return app
 
 
@@ -1,5 +1,9 @@
 """SQLAlchemy models"""
 from .user import User
 from .refresh_token import RefreshToken
+from .conversation import ConversationMessage, ConversationSession
+from .pack_stats import PackStat, PackStatsBatch
+from .pack_ranking import PackRanking, PackRankingWatermark
+from .user_character_memory import UserCharacterMemory
 
-__all__ = ["User", "RefreshToken"]
+__all__ = ["User", "RefreshToken", "ConversationSession", "ConversationMessage", "PackStat", "PackStatsBatch", "PackRanking", "PackRankingWatermark", "UserCharacterMemory"]
@@ -0,0 +1,134 @@
+"""Conversation models - conversation_sessions / conversation_messages"""
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base, TimestampMixin
+
+
+class ConversationSession(Base, TimestampMixin):
+    """
+    Conversation session (thread) between a user and a character
+
+    Note:
+        characters / events are not modeled yet, so character_id and
+        event_id are stored without FK constraints for now.
+        message_count / last_message_at are maintained in batches by the
+        message write-behind queue (app.services.message_writes).
+        summary is the thread's rolling summary: messages older than the
+        verbatim history window are folded into it by the background job
+        of app.services.context_summaries. summarized_until is its
+        watermark: created_at of the newest message already folded in.
+        Only newer messages are read as verbatim history, so a turn never
+        reads the whole thread.
+    """
+    __tablename__ = "conversation_sessions"
+    __table_args__ = (
+        Index("idx_cs_user_char_started", "user_id", "character_id", "started_at"),
+        Index("idx_cs_user_started", "user_id", "started_at"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(36),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    character_id: Mapped[str] = mapped_column(
+        String(36),
+        nullable=False,
+        index=True,
+    )
+    session_type: Mapped[str] = mapped_column(
+        String(20),
+        default="free",
+        nullable=False,
+    )
+    event_id: Mapped[Optional[str]] = mapped_column(
+        String(36),
+        nullable=True,
+    )
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    ended_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+    message_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+    summary: Mapped[Optional[str]] = mapped_column(
+        Text,
+        nullable=True,
+    )
+    summarized_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    def __repr__(self) -> str:
+        return f"<ConversationSession {self.id} user_id={self.user_id}>"
+
+
+class ConversationMessage(Base):
+    """
+    Individual message in a conversation session
+
+    Strategy:
+        - Append-only log (no updated_at / deleted_at per database_design.md)
+        - role is "user" or "character"
+        - finish_reason is set on character messages: stop / length /
+          content_filter, or interrupted when the reply was cut off
+          (client disconnect, LLM failure, shutdown) and content is partial
+    """
+    __tablename__ = "conversation_messages"
+    __table_args__ = (
+        Index("idx_cm_session_created", "session_id", "created_at"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    session_id: Mapped[str] = mapped_column(
+        String(36),
+        ForeignKey("conversation_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    role: Mapped[str] = mapped_column(
+        String(20),
+        nullable=False,
+    )
+    content: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+    )
+    finish_reason: Mapped[Optional[str]] = mapped_column(
+        String(20),
+        nullable=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<ConversationMessage {self.id} role={self.role}>"
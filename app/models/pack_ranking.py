@@ -0,0 +1,80 @@
+"""Pack ranking models - pack_rankings / pack_ranking_watermarks (precomputed sort orders)"""
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Float, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class PackRanking(Base):
+    """
+    Decayed activity score of a pack in one ranking (popularity, trending)
+
+    Strategy:
+        - Written only by the periodic job of app.services.pack_rankings
+        - score is a forward-decayed log score: comparable across packs at
+          any point in time, so it never has to be re-decayed in place
+        - Packs without any event have no row (they sort last)
+
+    Note:
+        packs is not modeled yet, so pack_id has no FK constraint for now.
+    """
+    __tablename__ = "pack_rankings"
+    __table_args__ = (
+        Index("idx_pack_rankings_updated", "updated_at"),
+    )
+
+    ranking: Mapped[str] = mapped_column(
+        String(20),
+        primary_key=True,
+    )
+    pack_id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+    )
+    score: Mapped[float] = mapped_column(
+        Float,
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<PackRanking {self.ranking} {self.pack_id} score={self.score}>"
+
+
+class PackRankingWatermark(Base):
+    """
+    Last event of a source table folded into pack_rankings
+
+    Strategy:
+        - Keyset (event_at, event_id) of the last source row scanned
+        - Advanced in the same transaction as the scores it produced, so a
+          failed run is simply repeated from the previous watermark
+    """
+    __tablename__ = "pack_ranking_watermarks"
+
+    source: Mapped[str] = mapped_column(
+        String(50),
+        primary_key=True,
+    )
+    event_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+    event_id: Mapped[str] = mapped_column(
+        String(36),
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<PackRankingWatermark {self.source} at={self.event_at}>"
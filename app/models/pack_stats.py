@@ -0,0 +1,88 @@
+"""Pack stats models - pack_stats (write-behind counters) / pack_stats_batches (applied flushes)"""
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class PackStat(Base):
+    """
+    Denormalized per-pack counters served on every pack
+
+    Strategy:
+        - favorite / review counters are incremented by the write-behind
+          flush of app.services.pack_stats (never counted per request)
+        - conversation_count is set by the periodic recount over
+          conversation_sessions
+        - average_rating = rating_sum / review_count
+
+    Note:
+        packs is not modeled yet, so pack_id has no FK constraint for now.
+    """
+    __tablename__ = "pack_stats"
+    __table_args__ = (
+        Index("idx_pack_stats_updated", "updated_at"),
+    )
+
+    pack_id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+    )
+    favorite_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+    conversation_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+    review_count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+    rating_sum: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<PackStat {self.pack_id} favorites={self.favorite_count}>"
+
+
+class PackStatsBatch(Base):
+    """
+    Flush batch already added to pack_stats
+
+    Strategy:
+        - Inserted in the same transaction as the batch's deltas, so a
+          retried batch whose first commit succeeded is skipped
+        - Rows older than PACK_STATS_BATCH_RETENTION_SECONDS are pruned
+    """
+    __tablename__ = "pack_stats_batches"
+    __table_args__ = (
+        Index("idx_pack_stats_batches_applied", "applied_at"),
+    )
+
+    batch_id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+    )
+    applied_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<PackStatsBatch {self.batch_id}>"
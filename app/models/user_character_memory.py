@@ -0,0 +1,51 @@
+"""User character memory model - user_character_memories"""
+import uuid
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, ForeignKey, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base, TimestampMixin
+
+
+class UserCharacterMemory(Base, TimestampMixin):
+    """
+    Long-term memory of a user with a character (prompt input, not exposed by the API)
+
+    Shared by every thread of the pair. The rolling summary of a
+    conversation is per thread (conversation_sessions.summary).
+
+    Note:
+        characters is not modeled yet, so character_id has no FK constraint
+        for now.
+    """
+    __tablename__ = "user_character_memories"
+    __table_args__ = (
+        UniqueConstraint("user_id", "character_id", name="user_character_memories_uk"),
+    )
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4()),
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(36),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    character_id: Mapped[str] = mapped_column(
+        String(36),
+        nullable=False,
+    )
+    nickname: Mapped[Optional[str]] = mapped_column(
+        String(50),
+        nullable=True,
+    )
+    preferences: Mapped[Optional[Dict[str, Any]]] = mapped_column(
+        JSON,
+        nullable=True,
+    )
+
+    def __repr__(self) -> str:
+        return f"<UserCharacterMemory user_id={self.user_id} character_id={self.character_id}>"
@@ -5,6 +5,7 @@ from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
 from .common import Character, Creator, Pagination, Tag
+from .purchase import Entitlement
 
 
 # =============================================================================
@@ -76,10 +77,13 @@ class PackListResponse(BaseModel):
 
 
 class PackDetailResponse(BaseModel):
-    """Pack detail response"""
+    """Pack detail response (items / entitlement / characters only with include)"""
 
     pack: Pack
     user_status: UserStatus
+    items: Optional[List[PackItem]] = None
+    entitlement: Optional[Entitlement] = None
+    characters: Optional[List[Character]] = None
 
 
 class PackItemsResponse(BaseModel):
@@ -88,6 +92,20 @@ class PackItemsResponse(BaseModel):
     data: List[PackItem]
 
 
+class PackUserStatus(BaseModel):
+    """User's status for one Pack of a batch"""
+
+    pack_id: str
+    owned: bool
+    favorited: bool
+
+
+class PackUserStatusListResponse(BaseModel):
+    """Batch user status response"""
+
+    data: List[PackUserStatus]
+
+
 class TagListResponse(BaseModel):
     """Tag list response"""
 
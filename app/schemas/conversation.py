@@ -19,6 +19,7 @@ class Message(BaseModel):
     role: Literal["user", "character"]
     content: str
     content_type: Literal["text", "audio"] = "text"
+    finish_reason: Optional[Literal["stop", "length", "content_filter", "interrupted"]] = None
     created_at: datetime
 
 
@@ -136,6 +137,12 @@ class SSEMessageStart(BaseModel):
     assistant_message_id: str
 
 
+class SSEWaiting(BaseModel):
+    """SSE waiting event payload (no token yet after LLM_WAITING_NOTICE_SECONDS)"""
+
+    message: str
+
+
 class SSEContentDelta(BaseModel):
     """SSE content_delta event payload"""
 
@@ -168,3 +175,5 @@ class SSEError(BaseModel):
 
     code: str
     message: str
+    resumable: bool = False
+    assistant_message_id: Optional[str] = None
@@ -1,4 +1,5 @@
 """Service layer"""
 from .auth import AuthService
+from .conversation import ConversationService
 
-__all__ = ["AuthService"]
+__all__ = ["AuthService", "ConversationService"]
@@ -0,0 +1,654 @@
+"""
+In-process catalog index (published packs)
+
+The published catalog changes rarely and fits in RAM, so list_packs,
+get_pack and get_pack_items are answered from an immutable, versioned
+index instead of joining packs / pack_tags / m_tags / creators per view.
+
+- Attributes are stored column-wise (array per attribute, indexed by ordinal)
+- Every supported sort key has a precomputed ascending order of ordinals
+  (popularity / trending scores come from app.services.pack_rankings)
+- Rebuilds and ranking updates produce a new version copy-on-write;
+  readers keep using the version they started with
+- The packs visible to each age group are precomputed per version, so a
+  rating change is reflected by the same publish that carries it
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from itertools import combinations
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bitmap import EMPTY_BITMAP, RoaringBitmap
+from app.core.config import settings
+from app.core.errors import (
+    ErrorCode,
+    ForbiddenException,
+    NotFoundException,
+    ServiceUnavailableException,
+    ValidationException,
+)
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.schemas.catalog import Pack, PackItem
+from app.schemas.common import Tag
+from app.services.pack_search import PackSearchIndex
+
+logger = logging.getLogger(__name__)
+
+AGE_RATINGS = ("all", "r15", "r18")
+
+# Ratings visible to each age group (openapi.yaml GET /packs age_rating)
+AGE_GROUP_RATINGS: Dict[Optional[str], Tuple[str, ...]] = {
+    "u13": ("all",),
+    "u18": ("all", "r15"),
+    "adult": ("all", "r15", "r18"),
+    None: ("all",),
+}
+
+# Every non-empty rating combination (age groups, narrowed by age_rating)
+RATING_SETS = tuple(frozenset(c) for n in range(1, len(AGE_RATINGS) + 1) for c in combinations(AGE_RATINGS, n))
+
+# Precomputed decayed scores (app.services.pack_rankings)
+RANKING_SORTS = ("popularity", "trending")
+SORT_KEYS = ("created_at", "price", "favorite_count", "conversation_count", "name") + RANKING_SORTS
+DEFAULT_SORT = "created_at"
+# Only meaningful with a query; always best match first
+RELEVANCE_SORT = "relevance"
+
+LIVE = "live"
+
+# Block target types that hide packs (user blocks do not affect the catalog)
+BLOCK_TARGETS = ("creator", "character", "tag")
+
+# Ranking score of packs without any event (sorted last)
+UNRANKED = float("-inf")
+
+# Rebuild from scratch once this share of ordinals are tombstones
+COMPACT_RATIO = 0.25
+
+
+def pack_version(pack: Pack) -> int:
+    """
+    Entity version of a pack (packs.updated_at in microseconds)
+
+    The pack write path bumps packs.updated_at whenever the pack, its items
+    or its tags change, so the version is the same in every worker.
+    """
+    return int((pack.updated_at or pack.created_at).timestamp() * 1_000_000)
+
+
+def _pack_digest(pack: Pack) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(f"{pack.id}:{pack_version(pack)}".encode(), digest_size=8).digest(), "little"
+    )
+
+
+def _encode_cursor(sort: str, value: Any, pack_id: str) -> str:
+    raw = json.dumps([sort, value, pack_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, pack_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValidationException("カーソルが不正です")
+    if cursor_sort != sort:
+        raise ValidationException("カーソルとソートキーが一致しません")
+    return value, pack_id
+
+
+@dataclass(frozen=True)
+class PackQuery:
+    """Filters, ordering and page of a list_packs call"""
+
+    ratings: Tuple[str, ...]
+    pack_type: Optional[str] = None
+    tag_ids: Tuple[str, ...] = ()
+    # "all": pack has every tag, "any": at least one
+    tags_match: Literal["all", "any"] = "all"
+    text: Optional[str] = None
+    sort: str = DEFAULT_SORT
+    descending: bool = True
+    cursor: Optional[str] = None
+    limit: int = 20
+    # Ordinals hidden from this caller (blocked content); skipped while filling the page
+    exclude: Optional[RoaringBitmap] = None
+
+
+# =============================================================================
+# Immutable Index
+# =============================================================================
+
+
+class CatalogIndex:
+    """
+    One immutable version of the published catalog
+
+    Never mutate an instance after construction; use with_published() /
+    with_ranking() to derive the next version.
+
+    Filters are bitmaps over ordinals ("live", "rating:<r>", "type:<t>",
+    "tag:<id>"); a filter combination is a few bitmap operations and tag
+    counts are popcounts. "creator:<id>" and "character:<id>" (with the
+    tag bitmaps) let a user's blocks be compiled into one exclusion bitmap.
+
+    rankings holds the ranking scores (ranking -> pack id -> score) the
+    ranking columns were built from, so rebuilds and derived versions keep
+    them.
+
+    rating_sets holds, per rating combination, the live ordinals with one
+    of those ratings: an age group's visible packs are one bitmap, shared
+    by list_packs filtering and the get_pack / create_thread check.
+
+    digest is an order-independent 64-bit XOR of (pack id, pack version) over
+    live packs: it changes with any publish, unpublish or pack update and is
+    identical in every worker that indexed the same rows.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        packs: List[Pack],
+        items: Dict[str, List[PackItem]],
+        bitmaps: Optional[Dict[str, RoaringBitmap]] = None,
+        sort_orders: Optional[Dict[str, array]] = None,
+        columns: Optional[Dict[str, Any]] = None,
+        ordinals: Optional[Dict[str, int]] = None,
+        tags: Optional[Dict[str, Tag]] = None,
+        search: Optional[PackSearchIndex] = None,
+        digest: Optional[int] = None,
+        rankings: Optional[Dict[str, Dict[str, float]]] = None,
+        rating_sets: Optional[Dict[FrozenSet[str], RoaringBitmap]] = None,
+    ) -> None:
+        self.version = version
+        self.packs = packs
+        self.items = items
+        self.rankings = rankings if rankings is not None else {}
+        self.bitmaps = bitmaps if bitmaps is not None else self._build_bitmaps(packs, items)
+        self.live = self.bitmaps[LIVE]
+        self.rating_sets = rating_sets if rating_sets is not None else self._build_rating_sets()
+        if ordinals is None:
+            ordinals = {packs[ordinal].id: ordinal for ordinal in self.live}
+        self.ordinals = ordinals
+        self.tags = tags if tags is not None else {tag.id: tag for pack in packs for tag in pack.tags}
+        self.columns = columns if columns is not None else self._build_columns(packs, self.rankings)
+        self.sort_orders = sort_orders if sort_orders is not None else self._build_sort_orders()
+        # Copied on write by with_published(); dead ordinals stay until _compacted() and are filtered on read
+        self.search = search if search is not None else PackSearchIndex.build(packs)
+        if digest is None:
+            digest = 0
+            for ordinal in ordinals.values():
+                digest ^= _pack_digest(packs[ordinal])
+        self.digest = digest
+
+    @classmethod
+    def build(
+        cls,
+        version: int,
+        packs: Iterable[Pack],
+        items: Mapping[str, List[PackItem]],
+        rankings: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> "CatalogIndex":
+        return cls(version, list(packs), dict(items), rankings=rankings)
+
+    # -------------------------------------------------------------------------
+    # Construction
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _bitmap_keys(pack: Pack, items: Sequence[PackItem]) -> List[str]:
+        keys = [f"rating:{pack.age_rating}", f"type:{pack.pack_type}", f"creator:{pack.creator.id}"]
+        keys.extend(f"tag:{tag.id}" for tag in pack.tags)
+        keys.extend({f"character:{item.item_id}" for item in items if item.item_type == "character"})
+        return keys
+
+    @classmethod
+    def _build_bitmaps(cls, packs: Sequence[Pack], items: Mapping[str, List[PackItem]]) -> Dict[str, RoaringBitmap]:
+        members: Dict[str, List[int]] = {}
+        for ordinal, pack in enumerate(packs):
+            for key in cls._bitmap_keys(pack, items.get(pack.id, [])):
+                members.setdefault(key, []).append(ordinal)
+        bitmaps = {key: RoaringBitmap.from_sorted(ordinals) for key, ordinals in members.items()}
+        bitmaps[LIVE] = RoaringBitmap.from_sorted(range(len(packs)))
+        return bitmaps
+
+    def _build_rating_sets(self) -> Dict[FrozenSet[str], RoaringBitmap]:
+        """Live ordinals per rating combination (old ordinals of re-rated packs are not live)"""
+        by_rating = {r: self.bitmaps.get(f"rating:{r}", EMPTY_BITMAP) & self.live for r in AGE_RATINGS}
+        return {ratings: RoaringBitmap.union(by_rating[r] for r in ratings) for ratings in RATING_SETS}
+
+    @staticmethod
+    def _column_values(pack: Pack, rankings: Mapping[str, Mapping[str, float]]) -> Dict[str, Any]:
+        values = {
+            "price": pack.price,
+            "created_at": int(pack.created_at.timestamp() * 1_000_000),
+            "favorite_count": pack.stats.favorite_count,
+            "conversation_count": pack.stats.conversation_count,
+            "name": pack.name,
+        }
+        for ranking in RANKING_SORTS:
+            values[ranking] = rankings.get(ranking, {}).get(pack.id, UNRANKED)
+        return values
+
+    @classmethod
+    def _build_columns(cls, packs: Sequence[Pack], rankings: Mapping[str, Mapping[str, float]]) -> Dict[str, Any]:
+        columns: Dict[str, Any] = {
+            "price": array("q"),
+            "created_at": array("q"),
+            "favorite_count": array("q"),
+            "conversation_count": array("q"),
+            "name": [],
+        }
+        for ranking in RANKING_SORTS:
+            columns[ranking] = array("d")
+        for pack in packs:
+            for name, value in cls._column_values(pack, rankings).items():
+                columns[name].append(value)
+        return columns
+
+    def _sort_key(self, sort: str) -> Callable[[int], Tuple[Any, str]]:
+        column = self.columns[sort]
+        packs = self.packs
+        return lambda ordinal: (column[ordinal], packs[ordinal].id)
+
+    def _build_sort_orders(self) -> Dict[str, array]:
+        live = list(self.live)
+        return {sort: array("l", sorted(live, key=self._sort_key(sort))) for sort in SORT_KEYS}
+
+    # -------------------------------------------------------------------------
+    # Copy-on-write updates
+    # -------------------------------------------------------------------------
+
+    def with_published(self, version: int, pack: Pack, items: List[PackItem]) -> "CatalogIndex":
+        """New version with pack added (or replaced, when already published)"""
+        old = self.ordinals.get(pack.id)
+        packs = self.packs + [pack]
+        ordinal = len(packs) - 1
+
+        bitmaps = dict(self.bitmaps)
+        live = bitmaps[LIVE].with_added(ordinal)
+        bitmaps[LIVE] = live.with_removed(old) if old is not None else live
+        for key in self._bitmap_keys(pack, items):
+            bitmaps[key] = bitmaps.get(key, EMPTY_BITMAP).with_added(ordinal)
+
+        columns = {name: column[:] for name, column in self.columns.items()}
+        for name, value in self._column_values(pack, self.rankings).items():
+            columns[name].append(value)
+        all_items = dict(self.items)
+        all_items[pack.id] = items
+        ordinals = dict(self.ordinals)
+        ordinals[pack.id] = ordinal
+        tags = dict(self.tags)
+        tags.update((tag.id, tag) for tag in pack.tags)
+
+        search = self.search.copy()
+        search.add(ordinal, pack)
+
+        digest = self.digest ^ _pack_digest(pack)
+        if old is not None:
+            digest ^= _pack_digest(self.packs[old])
+
+        sort_orders = {}
+        for sort, order in self.sort_orders.items():
+            column = columns[sort]
+            order = order[:]
+            if old is not None:
+                order.remove(old)
+            insort(order, ordinal, key=lambda o: (column[o], packs[o].id))
+            sort_orders[sort] = order
+
+        index = CatalogIndex(
+            version,
+            packs,
+            all_items,
+            bitmaps=bitmaps,
+            sort_orders=sort_orders,
+            columns=columns,
+            ordinals=ordinals,
+            tags=tags,
+            search=search,
+            digest=digest,
+            rankings=self.rankings,
+        )
+        return index._compacted()
+
+    def with_ranking(self, version: int, ranking: str, scores: Mapping[str, float]) -> "CatalogIndex":
+        """New version with ranking scores of some packs changed (others keep theirs)"""
+        rankings = dict(self.rankings)
+        rankings[ranking] = {**rankings.get(ranking, {}), **scores}
+        column = self.columns[ranking][:]
+        ordinals = self.ordinals
+        for pack_id, score in scores.items():
+            ordinal = ordinals.get(pack_id)
+            if ordinal is not None:
+                column[ordinal] = score
+        columns = dict(self.columns)
+        columns[ranking] = column
+        packs = self.packs
+        sort_orders = dict(self.sort_orders)
+        # The previous order is mostly still sorted, which Timsort finishes in near-linear time
+        sort_orders[ranking] = array("l", sorted(self.sort_orders[ranking], key=lambda o: (column[o], packs[o].id)))
+        return CatalogIndex(
+            version,
+            packs,
+            self.items,
+            bitmaps=self.bitmaps,
+            sort_orders=sort_orders,
+            columns=columns,
+            ordinals=ordinals,
+            tags=self.tags,
+            search=self.search,
+            digest=self.digest,
+            rankings=rankings,
+            rating_sets=self.rating_sets,
+        )
+
+    def _compacted(self) -> "CatalogIndex":
+        dead = len(self.packs) - len(self.ordinals)
+        if dead <= max(1000, int(len(self.packs) * COMPACT_RATIO)):
+            return self
+        return CatalogIndex.build(self.version, [self.packs[o] for o in self.live], self.items, self.rankings)
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def get_pack(self, pack_id: str) -> Optional[Pack]:
+        ordinal = self.ordinals.get(pack_id)
+        return self.packs[ordinal] if ordinal is not None else None
+
+    def get_items(self, pack_id: str) -> Optional[List[PackItem]]:
+        if pack_id not in self.ordinals:
+            return None
+        return self.items.get(pack_id, [])
+
+    def visible(self, age_group: Optional[str]) -> RoaringBitmap:
+        """Live ordinals an age group may see (unknown / unset age group = u13 view)"""
+        ratings = AGE_GROUP_RATINGS.get(age_group, AGE_GROUP_RATINGS[None])
+        return self.rating_sets[frozenset(ratings)]
+
+    def is_visible(self, pack_id: str, age_group: Optional[str]) -> bool:
+        ordinal = self.ordinals.get(pack_id)
+        return ordinal is not None and ordinal in self.visible(age_group)
+
+    def visible_pack(self, pack_id: str, age_group: Optional[str]) -> Pack:
+        """
+        Published pack an age group may open
+
+        Raises:
+            NotFoundException: If the pack is not published
+            ForbiddenException: If the pack's rating is above the age group (AGE_RESTRICTED)
+        """
+        pack = self.get_pack(pack_id)
+        if pack is None:
+            raise NotFoundException("Packが見つかりません")
+        if not self.is_visible(pack_id, age_group):
+            raise ForbiddenException("このコンテンツは年齢制限があります", code=ErrorCode.AGE_RESTRICTED)
+        return pack
+
+    def tag_counts(self, age_group: Optional[str]) -> List[Tag]:
+        """Tags with the number of packs the age group may see carrying them, most used first"""
+        visible = self.visible(age_group)
+        counted = []
+        for tag_id, tag in self.tags.items():
+            count = len(self.bitmaps.get(f"tag:{tag_id}", EMPTY_BITMAP) & visible)
+            if count:
+                counted.append(Tag(id=tag.id, name=tag.name, count=count))
+        counted.sort(key=lambda tag: (-tag.count, tag.name))
+        return counted
+
+    def blocked(self, targets: Iterable[Tuple[str, str]]) -> RoaringBitmap:
+        """
+        Ordinals hidden by (target_type, target_id) blocks
+
+        Packs by a blocked creator, containing a blocked character or
+        carrying a blocked tag.
+        """
+        bitmaps = self.bitmaps
+        keys = (f"{target_type}:{target_id}" for target_type, target_id in targets if target_type in BLOCK_TARGETS)
+        return RoaringBitmap.union(bitmaps[key] for key in keys if key in bitmaps)
+
+    def query(self, q: PackQuery) -> Tuple[List[Pack], Optional[str]]:
+        """
+        Filter, sort and page the catalog
+
+        Small candidate sets (selective filters or text matches) are sorted
+        directly; large ones are found by walking the precomputed order.
+
+        Returns:
+            (page of packs, next cursor or None)
+        """
+        sort = q.sort if q.sort in SORT_KEYS or (q.sort == RELEVANCE_SORT and q.text) else DEFAULT_SORT
+        descending = q.descending or sort == RELEVANCE_SORT
+
+        candidates: Optional[RoaringBitmap] = self._filter(q)
+        selected: Optional[Collection[int]] = candidates
+        scores: Dict[int, float] = {}
+        if q.text:
+            matches = self._text_matches(q, scored=sort == RELEVANCE_SORT)
+            if isinstance(matches, dict):
+                scores = matches
+            if candidates is not None and len(candidates) < len(matches):
+                selected = set(candidates).intersection(matches)
+            elif candidates is not None:
+                selected = candidates.select(matches)
+            elif len(self.ordinals) < len(self.packs):
+                selected = self.live.select(matches)
+            else:
+                selected = matches
+
+        if sort == RELEVANCE_SORT:
+            packs = self.packs
+            key: Callable[[int], Tuple[Any, str]] = lambda o: (scores[o], packs[o].id)
+            order: Sequence[int] = sorted(selected, key=key)
+            selected = None
+        else:
+            key = self._sort_key(sort)
+            order = self.sort_orders[sort]
+            # Walking the order finds limit hits in about limit * n / |selected| steps
+            if selected is not None and len(selected) ** 2 < 4 * (q.limit + 1) * len(order):
+                order = sorted(selected, key=key)
+                selected = None
+
+        if descending:
+            end = len(order)
+            if q.cursor:
+                end = bisect_left(order, tuple(_decode_cursor(q.cursor, sort)), key=key)
+            positions = range(end - 1, -1, -1)
+        else:
+            start = 0
+            if q.cursor:
+                start = bisect_right(order, tuple(_decode_cursor(q.cursor, sort)), key=key)
+            positions = range(start, len(order))
+
+        exclude = q.exclude
+        page: List[int] = []
+        for position in positions:
+            ordinal = order[position]
+            if (selected is None or ordinal in selected) and (exclude is None or ordinal not in exclude):
+                page.append(ordinal)
+                if len(page) > q.limit:
+                    break
+
+        next_cursor = None
+        if len(page) > q.limit:
+            page.pop()
+            last = page[-1]
+            next_cursor = _encode_cursor(sort, key(last)[0], self.packs[last].id)
+        return [self.packs[ordinal] for ordinal in page], next_cursor
+
+    def _filter(self, q: PackQuery) -> Optional[RoaringBitmap]:
+        """Live ordinals passing rating / type / tag filters (None = no filter)"""
+        bitmaps = self.bitmaps
+        parts: List[RoaringBitmap] = []
+        ratings = frozenset(q.ratings)
+        if ratings != frozenset(AGE_RATINGS):
+            parts.append(self.rating_sets.get(ratings, EMPTY_BITMAP))
+        if q.pack_type is not None:
+            parts.append(bitmaps.get(f"type:{q.pack_type}", EMPTY_BITMAP))
+        if q.tag_ids:
+            tag_bitmaps = [bitmaps.get(f"tag:{t}", EMPTY_BITMAP) for t in q.tag_ids]
+            if q.tags_match == "any":
+                parts.append(RoaringBitmap.union(tag_bitmaps))
+            else:
+                parts.extend(tag_bitmaps)
+        if not parts:
+            return None
+        return RoaringBitmap.intersection(parts + [self.live])
+
+    def _text_matches(self, q: PackQuery, scored: bool) -> Union[Dict[int, float], Set[int]]:
+        """Ordinals matching q.text (ordinal -> relevance when scored)"""
+        if scored:
+            return self.search.search(q.text)
+        return self.search.match(q.text)
+
+
+# =============================================================================
+# Index Holder
+# =============================================================================
+
+
+class CatalogIndexManager:
+    """
+    Owns the current CatalogIndex version for this process
+
+    A full rebuild runs at startup and every interval_seconds; pack
+    changes are picked up there (there is no pack admin write path to
+    push them sooner). Ranking scores are kept here as well, so a rebuild
+    starts from the latest ones.
+    """
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self._index: Optional[CatalogIndex] = None
+        self._version = 0
+        self._rankings: Dict[str, Dict[str, float]] = {}
+        self._write_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    @property
+    def current(self) -> CatalogIndex:
+        if self._index is None:
+            raise ServiceUnavailableException("カタログを準備中です", retry_after=1)
+        return self._index
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    async def refresh(self) -> CatalogIndex:
+        """Full rebuild from the database"""
+        async with AsyncSessionLocal() as db:
+            packs = await _load_published_packs(db)
+            items = await _load_pack_items(db)
+        async with self._write_lock:
+            # Sorting 100k rows takes long enough to stall the event loop
+            index = await asyncio.to_thread(CatalogIndex.build, self._next_version(), packs, items, self._rankings)
+            self._index = index
+            self.rebuilds += 1
+            return index
+
+    async def update_ranking(self, ranking: str, scores: Mapping[str, float]) -> None:
+        """Call with the packs whose ranking score changed"""
+        async with self._write_lock:
+            self._rankings = {**self._rankings, ranking: {**self._rankings.get(ranking, {}), **scores}}
+            if self._index is not None:
+                self._index = await asyncio.to_thread(self._index.with_ranking, self._next_version(), ranking, scores)
+                self.incremental_updates += 1
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Initial catalog index build failed")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Catalog index refresh failed")
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "version": self._version,
+            "packs": len(index) if index else 0,
+            "ordinals": len(index.packs) if index else 0,
+            "rebuilds": self.rebuilds,
+            "incremental_updates": self.incremental_updates,
+        }
+
+
+# =============================================================================
+# Loaders (TODO: catalog tables are not modeled yet)
+# =============================================================================
+
+
+async def _load_published_packs(db: AsyncSession) -> List[Pack]:
+    """
+    TODO: SELECT packs.*, creators.display_name, pack_stats, tags
+          FROM packs JOIN creators ON creators.id = packs.creator_id
+          LEFT JOIN pack_tags / m_tags (aggregated per pack)
+          WHERE packs.status = 2 AND packs.deleted_at IS NULL
+    """
+    return []
+
+
+async def _load_pack_items(db: AsyncSession) -> Dict[str, List[PackItem]]:
+    """
+    TODO: SELECT pack_items.* (+ item name/description per item_type)
+          FROM pack_items JOIN packs ON packs.id = pack_items.pack_id
+          WHERE packs.status = 2 AND pack_items.deleted_at IS NULL
+    """
+    return {}
+
+
+catalog_index = CatalogIndexManager(interval_seconds=settings.CATALOG_INDEX_REFRESH_SECONDS)
+register_metrics("catalog_index", catalog_index.stats)
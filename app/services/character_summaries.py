@@ -0,0 +1,120 @@
+"""
+Character summaries (id, name, avatar_url) for pack detail bundles
+
+GET /packs/{pack_id}?include=characters shows the pack's characters as
+cards. Characters change independently of packs (avatar updates), so
+they are not part of the catalog index; instead:
+
+- Summaries are cached per character id with a TTL (deleted characters
+  are cached as absent too)
+- The ids a request misses are loaded with one query on the cache's own
+  session; concurrent requests missing the same ids share that load
+- Character edits call invalidate(); other workers pick the change up
+  within the TTL
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.core.singleflight import SingleFlight
+from app.db.database import AsyncSessionLocal
+from app.schemas.common import Character
+
+CharacterLoader = Callable[[AsyncSession, Sequence[str]], Awaitable[Iterable[Character]]]
+
+
+class CharacterSummaryCache:
+    """LRU + TTL cache of character summaries"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        load_characters: Optional[CharacterLoader] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self.load_characters = load_characters or _load_characters
+        # character_id -> (summary or None if missing, expires_at)
+        self._entries: "OrderedDict[str, Tuple[Optional[Character], float]]" = OrderedDict()
+        self._flight = SingleFlight("character_summaries", wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS)
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def load(self, character_ids: Sequence[str]) -> List[Character]:
+        """
+        Summaries of character_ids in the given order
+
+        Returns:
+            Characters that exist, without duplicates (missing / deleted ids are skipped)
+        """
+        now = time.monotonic()
+        found: Dict[str, Optional[Character]] = {}
+        missing = []
+        for character_id in dict.fromkeys(character_ids):
+            entry = self._entries.get(character_id)
+            if entry is not None and entry[1] >= now:
+                self._entries.move_to_end(character_id)
+                found[character_id] = entry[0]
+            else:
+                missing.append(character_id)
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            key = tuple(sorted(missing))
+            found.update(await self._flight.do(("character_summaries", key), lambda: self._fill(key)))
+        characters = (found[character_id] for character_id in dict.fromkeys(character_ids))
+        return [character for character in characters if character is not None]
+
+    async def _fill(self, character_ids: Tuple[str, ...]) -> Dict[str, Optional[Character]]:
+        async with self.session_factory() as db:
+            rows = await self.load_characters(db, character_ids)
+        self.loads += 1
+        loaded: Dict[str, Optional[Character]] = dict.fromkeys(character_ids)
+        loaded.update((character.id, character) for character in rows)
+        expires_at = time.monotonic() + self.ttl_seconds
+        for character_id, character in loaded.items():
+            self._entries[character_id] = (character, expires_at)
+            self._entries.move_to_end(character_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return loaded
+
+    def invalidate(self, character_id: str) -> None:
+        """Character updated or deleted"""
+        self._entries.pop(character_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+        }
+
+
+# =============================================================================
+# Loader (TODO: characters is not modeled yet)
+# =============================================================================
+
+
+async def _load_characters(db: AsyncSession, character_ids: Sequence[str]) -> Iterable[Character]:
+    """
+    TODO: SELECT id, name, avatar_url FROM characters
+          WHERE id IN :character_ids AND deleted_at IS NULL
+    """
+    return []
+
+
+character_summaries = CharacterSummaryCache(
+    ttl_seconds=settings.CHARACTER_SUMMARY_TTL_SECONDS,
+    max_entries=settings.CHARACTER_SUMMARY_MAX_ENTRIES,
+)
+register_metrics("character_summaries", character_summaries.stats)
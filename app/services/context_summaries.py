@@ -0,0 +1,178 @@
+"""
+Rolling conversation summaries (conversation_sessions.summary)
+
+A turn's prompt carries the thread's rolling summary plus only the
+messages newer than its watermark (summarized_until), at most
+PROMPT_HISTORY_MESSAGES of them and within PROMPT_HISTORY_TOKEN_BUDGET.
+Whatever falls out of that window is handed to this job, so reading
+history stays O(window) however long the thread gets:
+
+- schedule() is called by the turn with the created_at of the newest
+  message it left out; the turn itself never waits for the LLM
+- Summary and watermark belong to the thread, so threads of the same user
+  and character never fold or skip each other's messages
+- One job per thread at a time; schedules arriving meanwhile only move
+  its target forward
+- A run folds up to CONTEXT_SUMMARY_BATCH_MESSAGES of the oldest
+  unsummarized messages into the summary (one LLM completion), then
+  advances the watermark - conditionally on the watermark it started
+  from, so two workers compacting the same thread cannot fold a message
+  twice. Runs repeat until the target is reached
+- No DB session is held during the LLM call. A failed run leaves the
+  watermark where it was; the next overflowing turn schedules it again
+- Shutdown cancels pending jobs for the same reason
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+from app.services.llm import ChatMessage, LLMProvider, llm_provider
+
+logger = logging.getLogger(__name__)
+
+SPEAKERS = {"user": "ユーザー", "character": "キャラクター"}
+
+SUMMARY_INSTRUCTIONS = (
+    "あなたはキャラクターとユーザーの会話を記録する係です。"
+    "これまでの要約と新しい会話ログを統合し、今後の会話に必要な事実"
+    "（出来事、約束、ユーザーの好みや状況、関係性の変化）を残した要約を日本語で書いてください。"
+    "挨拶や重複は省き、要約本文だけを出力してください。"
+)
+
+
+def render_transcript(summary: Optional[str], messages: List[ConversationMessage]) -> str:
+    lines = [f"# これまでの要約\n{summary or '（なし）'}", "# 新しい会話ログ"]
+    lines += [f"{SPEAKERS.get(m.role, m.role)}: {m.content}" for m in messages]
+    return "\n".join(lines)
+
+
+class ContextSummarizer:
+    """Background compaction of history into the rolling summary"""
+
+    def __init__(
+        self,
+        provider: LLMProvider = llm_provider,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        batch_messages: int = settings.CONTEXT_SUMMARY_BATCH_MESSAGES,
+        max_tokens: int = settings.CONTEXT_SUMMARY_MAX_TOKENS,
+        concurrency: int = settings.CONTEXT_SUMMARY_CONCURRENCY,
+    ) -> None:
+        self.provider = provider
+        self.session_factory = session_factory
+        self.batch_messages = batch_messages
+        self.max_tokens = max_tokens
+        self._slots = asyncio.Semaphore(concurrency)
+        # thread_id -> fold messages up to this created_at
+        self._targets: Dict[str, datetime] = {}
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self.scheduled = 0
+        self.runs = 0
+        self.folded = 0
+        self.conflicts = 0
+        self.failed = 0
+
+    def schedule(self, thread_id: str, through: datetime) -> None:
+        """Fold the unsummarized messages of thread_id up to `through` (inclusive)"""
+        current = self._targets.get(thread_id)
+        if current is None or through > current:
+            self._targets[thread_id] = through
+        self.scheduled += 1
+        if thread_id not in self._jobs:
+            self._jobs[thread_id] = asyncio.create_task(self._drain(thread_id))
+
+    async def _drain(self, thread_id: str) -> None:
+        try:
+            async with self._slots:
+                while thread_id in self._targets:
+                    through = self._targets[thread_id]
+                    try:
+                        more = await self._compact(thread_id, through)
+                    except Exception:
+                        self.failed += 1
+                        logger.exception("Summary of thread %s failed", thread_id)
+                        more = False
+                    if not more and self._targets.get(thread_id) == through:
+                        del self._targets[thread_id]
+        finally:
+            self._jobs.pop(thread_id, None)
+
+    async def _compact(self, thread_id: str, through: datetime) -> bool:
+        """One run; True if messages up to `through` remain unsummarized"""
+        async with self.session_factory() as db:
+            thread = await db.get(ConversationSession, thread_id)
+            if thread is None:
+                return False
+            summary, watermark = thread.summary, thread.summarized_until
+            query = select(ConversationMessage).where(
+                ConversationMessage.session_id == thread_id,
+                ConversationMessage.created_at <= through,
+            )
+            if watermark is not None:
+                query = query.where(ConversationMessage.created_at > watermark)
+            messages = list(
+                (await db.scalars(query.order_by(ConversationMessage.created_at).limit(self.batch_messages))).all()
+            )
+        if not messages:
+            return False
+
+        self.runs += 1
+        completion = await self.provider.complete(
+            [
+                ChatMessage(role="system", content=SUMMARY_INSTRUCTIONS),
+                ChatMessage(role="user", content=render_transcript(summary, messages)),
+            ],
+            max_tokens=self.max_tokens,
+        )
+        summary = completion.content.strip()
+        if not summary:
+            return False
+
+        # Stored only if the watermark is still the one this run started from
+        condition = (
+            ConversationSession.summarized_until.is_(None)
+            if watermark is None
+            else ConversationSession.summarized_until == watermark
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(ConversationSession)
+                .where(ConversationSession.id == thread_id, condition)
+                .values(summary=summary, summarized_until=messages[-1].created_at)
+            )
+            if result.rowcount != 1:
+                self.conflicts += 1
+                return False
+            await db.commit()
+        self.folded += len(messages)
+        return len(messages) == self.batch_messages
+
+    async def stop(self) -> None:
+        """Cancel pending jobs (their watermarks stay; later turns schedule them again)"""
+        jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        self._targets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._targets),
+            "running": len(self._jobs),
+            "scheduled": self.scheduled,
+            "runs": self.runs,
+            "folded_messages": self.folded,
+            "conflicts": self.conflicts,
+            "failed": self.failed,
+        }
+
+
+context_summaries = ContextSummarizer()
+register_metrics("context_summaries", context_summaries.stats)
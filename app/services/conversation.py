@@ -0,0 +1,82 @@
+"""Conversation service"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.conversation import ConversationMessage, ConversationSession
+
+
+class ConversationService:
+    """Conversation service handling message persistence"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # =========================================================================
+    # Sessions
+    # =========================================================================
+
+    async def get_session(self, session_id: str) -> Optional[ConversationSession]:
+        """Conversation session (thread) by ID, or None"""
+        return await self.db.get(ConversationSession, session_id)
+
+    # =========================================================================
+    # Messages
+    # =========================================================================
+
+    async def recent_messages(
+        self,
+        session_id: str,
+        limit: int,
+        after: Optional[datetime] = None,
+    ) -> List[ConversationMessage]:
+        """
+        Latest messages of a session, oldest first
+
+        Uses idx_cm_session_created (newest `limit` rows, then reversed).
+
+        Args:
+            session_id: Conversation session (thread) ID
+            limit: Maximum number of messages
+            after: Only messages created after this (e.g. a summary watermark)
+        """
+        query = select(ConversationMessage).where(ConversationMessage.session_id == session_id)
+        if after is not None:
+            query = query.where(ConversationMessage.created_at > after)
+        result = await self.db.execute(query.order_by(ConversationMessage.created_at.desc()).limit(limit))
+        return list(reversed(result.scalars().all()))
+
+    async def save_message(
+        self,
+        session_id: str,
+        role: str,
+        content: str,
+        message_id: Optional[str] = None,
+        finish_reason: Optional[str] = None,
+    ) -> ConversationMessage:
+        """
+        Append a message to a conversation session
+
+        Args:
+            session_id: Conversation session (thread) ID
+            role: "user" or "character"
+            content: Message content
+            message_id: Pre-allocated message ID (e.g. announced in message_start)
+            finish_reason: Why a character reply ended ("interrupted" = partial)
+
+        Returns:
+            Created ConversationMessage
+        """
+        message = ConversationMessage(
+            session_id=session_id,
+            role=role,
+            content=content,
+            finish_reason=finish_reason,
+        )
+        if message_id:
+            message.id = message_id
+        self.db.add(message)
+        await self.db.flush()
+        return message
@@ -0,0 +1,516 @@
+"""
+Generation concurrency guard for the conversation routes
+
+Parallel sends on one thread interleave its history and pay the LLM
+more than once for the same context, so a reply generation holds a lease:
+
+- One generation per thread
+- At most GENERATION_MAX_PER_USER generations per user (across threads)
+
+A send that finds its thread or user busy is handled by
+GENERATION_GUARD_POLICY:
+
+    reject     - 409 request_in_progress at once
+    queue      - wait (up to GENERATION_QUEUE_TIMEOUT_SECONDS, then 409);
+                 waiters get the thread (or the user's free slot) in
+                 arrival order, and only the first in line is woken
+    supersede  - stop the generation running on the thread (a stream's
+                 partial answer is saved as interrupted, a plain send
+                 answers 409) and take over; a send still waiting for the
+                 thread is dropped the same way, and a user at the limit
+                 on other threads is still rejected
+
+The lease is taken before the user message is committed, so a rejected
+send leaves nothing behind, and released when the generation ends - for
+streams that is after the last event, not when the response returns.
+
+Backends (GENERATION_LOCK_BACKEND):
+    memory - leases of this worker only (one worker per user, or sticky
+             routing)
+    redis  - leases shared by every node: the thread key with a lease TTL
+             and a sorted set of the user's leases, both changed by one
+             Lua script. Held leases are renewed every
+             GENERATION_LOCK_TTL_SECONDS / 3, so a crashed node's leases
+             expire. Supersede is published on a channel and the node
+             holding the lease cancels its generation. Arrival order
+             holds among the waiters of one node; across nodes they
+             poll. Needs the redis package; without it the memory
+             backend is used.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.errors import ConflictException, ErrorCode
+from app.core.metrics import register_metrics
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - optional dependency
+    aioredis = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+POLICIES = ("queue", "reject", "supersede")
+
+# try_acquire() results
+ACQUIRED = None
+THREAD_BUSY = "thread"
+USER_BUSY = "user"
+
+
+def _in_progress() -> ConflictException:
+    return ConflictException("前のメッセージへの応答を生成中です", code=ErrorCode.REQUEST_IN_PROGRESS)
+
+
+def _superseded() -> ConflictException:
+    return ConflictException("新しいメッセージが送信されたため応答を中止しました", code=ErrorCode.REQUEST_IN_PROGRESS)
+
+
+async def _wait_event(event: asyncio.Event, timeout: float) -> None:
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+class GenerationLease:
+    """
+    A held generation slot; release() is idempotent
+
+    A supersede is only signalled: the holder either binds a callback that
+    stops its generation (bind) or awaits the generation through
+    until_superseded().
+    """
+
+    def __init__(self, guard: "GenerationGuard", user_id: str, thread_id: str, token: str) -> None:
+        self.guard = guard
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.token = token
+        self.acquired_at = time.monotonic()
+        self.superseded = False
+        self.released = False
+        self._on_supersede: Optional[Callable[[], None]] = None
+        self._superseded = asyncio.Event()
+
+    def bind(self, on_supersede: Callable[[], None]) -> None:
+        """Stop the generation with on_supersede (at once if already superseded)"""
+        self._on_supersede = on_supersede
+        if self.superseded:
+            on_supersede()
+
+    def supersede(self) -> None:
+        self.superseded = True
+        self._superseded.set()
+        if self._on_supersede is not None:
+            self._on_supersede()
+
+    async def until_superseded(self, generation: "asyncio.Future[T]") -> T:
+        """
+        Result of the generation, unless the lease is superseded first
+
+        Raises:
+            ConflictException: request_in_progress - superseded; only the
+                generation is cancelled, the caller's task goes on
+        """
+        signal = asyncio.ensure_future(self._superseded.wait())
+        try:
+            await asyncio.wait({generation, signal}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            signal.cancel()
+        if not generation.done():
+            generation.cancel()
+            await asyncio.wait({generation})
+            raise _superseded()
+        return generation.result()
+
+    async def release(self) -> None:
+        if not self.released:
+            self.released = True
+            await self.guard.release(self)
+
+
+# =============================================================================
+# Backends
+# =============================================================================
+
+
+class MemoryGenerationLocks:
+    """Leases of this worker"""
+
+    name = "memory"
+
+    def __init__(self, max_per_user: int) -> None:
+        self.max_per_user = max_per_user
+        self._threads: Dict[str, GenerationLease] = {}
+        self._users: Dict[str, int] = {}
+        self._changed = asyncio.Event()
+        self.lost = 0
+
+    async def try_acquire(self, lease: GenerationLease) -> Optional[str]:
+        if lease.thread_id in self._threads:
+            return THREAD_BUSY
+        if self._users.get(lease.user_id, 0) >= self.max_per_user:
+            return USER_BUSY
+        self._threads[lease.thread_id] = lease
+        self._users[lease.user_id] = self._users.get(lease.user_id, 0) + 1
+        return ACQUIRED
+
+    async def release(self, lease: GenerationLease) -> None:
+        if self._threads.get(lease.thread_id) is not lease:
+            return
+        del self._threads[lease.thread_id]
+        count = self._users.pop(lease.user_id) - 1
+        if count:
+            self._users[lease.user_id] = count
+        # Wakes the waiters first in line (GenerationGuard keeps the rest asleep)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def supersede(self, thread_id: str) -> None:
+        holder = self._threads.get(thread_id)
+        if holder is not None:
+            holder.supersede()
+
+    def wait_changed(self, timeout: float) -> Awaitable[None]:
+        """Done at the first release after this call, or after timeout"""
+        return _wait_event(self._changed, timeout)
+
+    async def aclose(self) -> None:
+        pass
+
+    def held(self) -> int:
+        return len(self._threads)
+
+
+# KEYS: thread key, user set; ARGV: token, now ms, ttl ms, max per user
+_ACQUIRE = """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then return 1 end
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then return 2 end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2] + ARGV[3], ARGV[1])
+redis.call('PEXPIRE', KEYS[2], ARGV[3])
+return 0
+"""
+
+# KEYS: thread key, user set; ARGV: token
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 0
+"""
+
+# KEYS: thread key, user set; ARGV: token, now ms, ttl ms
+_RENEW = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2] + ARGV[3], ARGV[1])
+redis.call('PEXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+class RedisGenerationLocks:
+    """
+    Leases shared through Redis
+
+    Keys:
+        gen:thread:{thread_id}   token of the holding lease (PX lease TTL)
+        gen:user:{user_id}       sorted set token -> lease expiry (ms)
+    Channel:
+        gen:supersede            thread ids whose generation is to be cancelled
+
+    Waiters poll every GENERATION_LOCK_POLL_MS (releases on this node wake
+    them at once). User-set scores use this node's clock.
+    """
+
+    name = "redis"
+    channel = "gen:supersede"
+
+    def __init__(self, url: str, max_per_user: int, ttl_seconds: float, poll_seconds: float) -> None:
+        self._client = aioredis.from_url(url, decode_responses=True)
+        self.max_per_user = max_per_user
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.poll_seconds = poll_seconds
+        self._acquire = self._client.register_script(_ACQUIRE)
+        self._release = self._client.register_script(_RELEASE)
+        self._renew = self._client.register_script(_RENEW)
+        self._held: Dict[str, GenerationLease] = {}
+        self._changed = asyncio.Event()
+        self._renewer: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self.lost = 0
+
+    @staticmethod
+    def _keys(lease: GenerationLease) -> list:
+        return [f"gen:thread:{lease.thread_id}", f"gen:user:{lease.user_id}"]
+
+    async def try_acquire(self, lease: GenerationLease) -> Optional[str]:
+        self._start()
+        result = await self._acquire(
+            keys=self._keys(lease),
+            args=[lease.token, int(time.time() * 1000), self.ttl_ms, self.max_per_user],
+        )
+        if result == 1:
+            return THREAD_BUSY
+        if result == 2:
+            return USER_BUSY
+        self._held[lease.token] = lease
+        return ACQUIRED
+
+    async def release(self, lease: GenerationLease) -> None:
+        self._held.pop(lease.token, None)
+        try:
+            await self._release(keys=self._keys(lease), args=[lease.token])
+        except RedisError:
+            # The lease TTL frees it
+            logger.warning("Failed to release generation lease of thread %s", lease.thread_id, exc_info=True)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def supersede(self, thread_id: str) -> None:
+        await self._client.publish(self.channel, thread_id)
+
+    def wait_changed(self, timeout: float) -> Awaitable[None]:
+        """Done at the first release on this node after this call, or after the poll interval"""
+        return _wait_event(self._changed, min(timeout, self.poll_seconds))
+
+    def _start(self) -> None:
+        if self._renewer is None:
+            self._renewer = asyncio.create_task(self._renew_loop())
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _renew_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            leases = list(self._held.values())
+            if not leases:
+                continue
+            now = int(time.time() * 1000)
+            try:
+                async with self._client.pipeline(transaction=False) as pipe:
+                    for lease in leases:
+                        await self._renew(keys=self._keys(lease), args=[lease.token, now, self.ttl_ms], client=pipe)
+                    results = await pipe.execute()
+            except RedisError:
+                logger.warning("Failed to renew %d generation leases", len(leases), exc_info=True)
+                continue
+            for lease, renewed in zip(leases, results):
+                if not renewed and lease.token in self._held:
+                    # Expired and taken by another send: stop generating
+                    self.lost += 1
+                    self._held.pop(lease.token, None)
+                    lease.supersede()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    for lease in list(self._held.values()):
+                        if lease.thread_id == message["data"]:
+                            lease.supersede()
+            except asyncio.CancelledError:
+                raise
+            except RedisError:
+                logger.warning("Generation supersede subscription failed; retrying", exc_info=True)
+                await asyncio.sleep(1)
+
+    async def aclose(self) -> None:
+        for task in (self._renewer, self._listener):
+            if task is not None:
+                task.cancel()
+        await self._client.aclose()
+
+    def held(self) -> int:
+        return len(self._held)
+
+
+# =============================================================================
+# Guard
+# =============================================================================
+
+
+class _Waiter:
+    """A queued acquire; `turn` wakes it (its predecessor left, or it was superseded)"""
+
+    def __init__(self, lease: GenerationLease, busy: str) -> None:
+        self.lease = lease
+        self.busy = busy
+        self.turn = asyncio.Event()
+
+
+class GenerationGuard:
+    """Leases of reply generations under GENERATION_GUARD_POLICY"""
+
+    def __init__(
+        self,
+        backend: Any,
+        policy: str = settings.GENERATION_GUARD_POLICY,
+        queue_timeout_seconds: float = settings.GENERATION_QUEUE_TIMEOUT_SECONDS,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown GENERATION_GUARD_POLICY: {policy}")
+        self.backend = backend
+        self.policy = policy
+        self.queue_timeout = queue_timeout_seconds
+        # Acquires waiting on this node, in arrival order
+        self._waiters: Deque[_Waiter] = deque()
+        self.acquired = 0
+        self.rejected = 0
+        self.queued = 0
+        self.superseded = 0
+        self._wait_seconds = 0.0
+
+    async def acquire(self, user_id: str, thread_id: str) -> GenerationLease:
+        """
+        Lease for one generation on thread_id
+
+        Raises:
+            ConflictException: request_in_progress (busy under reject,
+                queue timeout, user limit under supersede, or superseded
+                while waiting)
+        """
+        lease = GenerationLease(self, user_id, thread_id, uuid.uuid4().hex)
+        # Waiters already queued for the thread (or the user's limit) go first
+        busy = self._ahead(lease, USER_BUSY) or await self.backend.try_acquire(lease)
+        if busy is ACQUIRED:
+            self.acquired += 1
+            return lease
+        if self.policy == "reject" or (self.policy == "supersede" and busy == USER_BUSY):
+            self.rejected += 1
+            raise _in_progress()
+
+        started = time.monotonic()
+        deadline = started + self.queue_timeout
+        self.queued += 1
+        if busy == THREAD_BUSY and self.policy == "supersede":
+            self.superseded += 1
+            for waiter in self._waiters:
+                if waiter.lease.thread_id == thread_id:
+                    waiter.lease.supersede()
+                    waiter.turn.set()
+            await self.backend.supersede(thread_id)
+        waiter = _Waiter(lease, busy)
+        self._waiters.append(waiter)
+        try:
+            while True:
+                if lease.superseded:
+                    self.rejected += 1
+                    raise _superseded()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise _in_progress()
+                if self._ahead(lease, waiter.busy, before=waiter):
+                    await self._sleep(waiter, remaining, first=False)
+                    continue
+                waiter.busy = await self.backend.try_acquire(lease)
+                if waiter.busy is ACQUIRED:
+                    break
+                await self._sleep(waiter, remaining, first=True)
+        finally:
+            self._waiters.remove(waiter)
+            self._wait_seconds += time.monotonic() - started
+            self._wake()
+        self.acquired += 1
+        return lease
+
+    def _ahead(self, lease: GenerationLease, busy: str, before: Optional[_Waiter] = None) -> Optional[str]:
+        """THREAD_BUSY / USER_BUSY if a waiter queued before `before` (or at all) goes first, else None"""
+        for other in self._waiters:
+            if other is before:
+                break
+            if other.lease.thread_id == lease.thread_id:
+                return THREAD_BUSY
+            if busy == USER_BUSY and other.busy == USER_BUSY and other.lease.user_id == lease.user_id:
+                return USER_BUSY
+        return None
+
+    async def _sleep(self, waiter: _Waiter, timeout: float, first: bool) -> None:
+        """Until the waiter's turn; the first in line also wakes on a backend change"""
+        waits = {asyncio.ensure_future(waiter.turn.wait())}
+        if first:
+            waits.add(asyncio.ensure_future(self.backend.wait_changed(timeout)))
+        try:
+            await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for wait in waits:
+                wait.cancel()
+        waiter.turn.clear()
+
+    def _wake(self) -> None:
+        """A waiter left: wake the ones now first in line"""
+        for waiter in self._waiters:
+            if not self._ahead(waiter.lease, waiter.busy, before=waiter):
+                waiter.turn.set()
+
+    async def release(self, lease: GenerationLease) -> None:
+        await self.backend.release(lease)
+
+    @asynccontextmanager
+    async def hold(self, user_id: str, thread_id: str) -> AsyncIterator[GenerationLease]:
+        """
+        Lease for the body of a request
+
+        A supersede does not cancel the request: await the generation
+        through lease.until_superseded(), which cancels only the generation
+        and raises 409.
+        """
+        lease = await self.acquire(user_id, thread_id)
+        try:
+            yield lease
+        finally:
+            await lease.release()
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "policy": self.policy,
+            "held": self.backend.held(),
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "queued": self.queued,
+            "superseded": self.superseded,
+            "waiting": len(self._waiters),
+            "lost": self.backend.lost,
+            "avg_wait_ms": round(self._wait_seconds / self.queued * 1000, 1) if self.queued else None,
+        }
+
+
+def create_generation_guard() -> GenerationGuard:
+    """Guard for GENERATION_LOCK_BACKEND (memory | redis)"""
+    if settings.GENERATION_LOCK_BACKEND == "redis":
+        if aioredis is None:
+            logger.warning("GENERATION_LOCK_BACKEND=redis but redis is not installed; generation leases stay in memory")
+        else:
+            return GenerationGuard(RedisGenerationLocks(
+                settings.REDIS_URL,
+                settings.GENERATION_MAX_PER_USER,
+                settings.GENERATION_LOCK_TTL_SECONDS,
+                settings.GENERATION_LOCK_POLL_MS / 1000,
+            ))
+    elif settings.GENERATION_LOCK_BACKEND != "memory":
+        raise ValueError(f"Unknown GENERATION_LOCK_BACKEND: {settings.GENERATION_LOCK_BACKEND}")
+    return GenerationGuard(MemoryGenerationLocks(settings.GENERATION_MAX_PER_USER))
+
+
+generation_guard = create_generation_guard()
+register_metrics("generation_guard", generation_guard.stats)
@@ -0,0 +1,84 @@
+"""LLM providers (LLM_PROVIDER: openai | stub, optional LLM_FALLBACK_PROVIDER)"""
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.services.llm.base import (
+    ChatMessage,
+    HTTPProvider,
+    LLMChunk,
+    LLMCompletion,
+    LLMError,
+    LLMProvider,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    LLMUsage,
+)
+from app.services.llm.dispatch import CircuitBreaker, LLMDispatcher
+from app.services.llm.openai import OPENAI_BASE_URL, OpenAIProvider
+from app.services.llm.tokens import MESSAGE_OVERHEAD_TOKENS, TokenCounts, count_tokens, token_counts
+
+
+def create_provider(name: str, base_url: str = "", model: str = "", api_key: str = "") -> LLMProvider:
+    """
+    Provider for LLM_PROVIDER (or LLM_FALLBACK_PROVIDER)
+
+    stub is the OpenAI-compatible local server of app.services.llm.stub,
+    reached through the same pooled client as the real provider.
+    """
+    if name == "openai":
+        return OpenAIProvider(
+            base_url=base_url or OPENAI_BASE_URL,
+            model=model or settings.LLM_MODEL,
+            api_key=api_key,
+        )
+    if name == "stub":
+        provider = OpenAIProvider(
+            base_url=base_url or f"http://127.0.0.1:{settings.LLM_STUB_PORT}/v1",
+            model="stub",
+        )
+        provider.name = "stub"
+        return provider
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
+
+
+def create_dispatcher() -> LLMDispatcher:
+    """The primary provider, then the fallback when LLM_FALLBACK_PROVIDER is set"""
+    providers = [
+        create_provider(settings.LLM_PROVIDER, settings.LLM_BASE_URL, settings.LLM_MODEL, settings.LLM_API_KEY),
+    ]
+    if settings.LLM_FALLBACK_PROVIDER:
+        fallback = create_provider(
+            settings.LLM_FALLBACK_PROVIDER,
+            settings.LLM_FALLBACK_BASE_URL,
+            settings.LLM_FALLBACK_MODEL,
+            settings.LLM_FALLBACK_API_KEY or settings.LLM_API_KEY,
+        )
+        if fallback.name == providers[0].name:
+            fallback.name = f"{fallback.name}-fallback"
+        providers.append(fallback)
+    return LLMDispatcher(providers)
+
+
+llm_provider: LLMProvider = create_dispatcher()
+register_metrics("llm", llm_provider.stats)
+
+__all__ = [
+    "ChatMessage",
+    "CircuitBreaker",
+    "HTTPProvider",
+    "LLMChunk",
+    "LLMCompletion",
+    "LLMDispatcher",
+    "LLMError",
+    "LLMProvider",
+    "LLMTimeoutError",
+    "LLMUnavailableError",
+    "LLMUsage",
+    "MESSAGE_OVERHEAD_TOKENS",
+    "OpenAIProvider",
+    "TokenCounts",
+    "count_tokens",
+    "create_dispatcher",
+    "create_provider",
+    "llm_provider",
+    "token_counts",
+]
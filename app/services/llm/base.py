@@ -0,0 +1,272 @@
+"""
+LLM provider interface and the pooled HTTP client shared by providers
+
+Every conversation turn is one streamed completion, so the connection
+to the provider is on the critical path of every reply:
+
+- One httpx.AsyncClient per provider for the whole process: connections
+  are kept alive and reused (HTTP/2 multiplexes streams over one
+  connection when h2 is installed)
+- warm() opens connections at startup so the first replies do not pay
+  for TCP / TLS setup
+- Replies are async iterators of LLMChunk; leaving the iteration early
+  (client gone, cancellation) closes the upstream response
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Protocol, Sequence
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    HTTP2_AVAILABLE = False
+
+
+# =============================================================================
+# Messages / Chunks
+# =============================================================================
+
+
+@dataclass(frozen=True)
+class ChatMessage:
+    """One prompt message"""
+
+    role: Literal["system", "user", "assistant"]
+    content: str
+
+
+@dataclass(frozen=True)
+class LLMUsage:
+    """Token usage of one completion"""
+
+    prompt_tokens: int
+    completion_tokens: int
+
+
+@dataclass(frozen=True)
+class LLMChunk:
+    """
+    One streamed piece of a completion
+
+    delta is empty on the final chunk, which carries finish_reason and,
+    when the provider reports it, usage.
+    """
+
+    delta: str = ""
+    finish_reason: Optional[str] = None
+    usage: Optional[LLMUsage] = None
+
+
+@dataclass(frozen=True)
+class LLMCompletion:
+    """A whole (non-streamed) completion"""
+
+    content: str
+    finish_reason: str
+    usage: Optional[LLMUsage] = None
+
+
+# =============================================================================
+# Errors
+# =============================================================================
+
+
+class LLMError(Exception):
+    """Provider call failed"""
+
+    # Another attempt (or another provider) may succeed
+    retryable = False
+
+
+class LLMUnavailableError(LLMError):
+    """Provider unreachable, overloaded (429) or failing (5xx)"""
+
+    retryable = True
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """No response / next chunk within the timeout"""
+
+
+# =============================================================================
+# Provider Interface
+# =============================================================================
+
+
+class LLMProvider(Protocol):
+    name: str
+
+    def stream(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        """Stream a completion token by token"""
+        ...
+
+    async def complete(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> LLMCompletion:
+        ...
+
+    async def warm(self, connections: int) -> None:
+        """Open connections ahead of the first request"""
+        ...
+
+    async def aclose(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class HTTPProvider:
+    """
+    Base for providers reached over HTTP
+
+    Subclasses implement stream() with self.client; the client (and its
+    connection pool) is created on first use and shared by every request.
+    """
+
+    name = "http"
+    # Cheap authenticated GET used to open pooled connections
+    warm_path = "/models"
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = "",
+        timeout_seconds: float = settings.LLM_TIMEOUT_SECONDS,
+        connect_timeout_seconds: float = settings.LLM_CONNECT_TIMEOUT_SECONDS,
+        max_connections: int = settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry_seconds: float = settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        http2: bool = settings.LLM_HTTP2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.active_streams = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.warmed = 0
+        self._first_token_seconds = 0.0
+        self._first_tokens = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport,
+            )
+        return self._client
+
+    def stream(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        raise NotImplementedError
+
+    async def complete(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> LLMCompletion:
+        """Collect a streamed completion (one code path for both call styles)"""
+        parts: List[str] = []
+        finish_reason = "stop"
+        usage = None
+        async for chunk in self.stream(messages, max_tokens=max_tokens):
+            parts.append(chunk.delta)
+            finish_reason = chunk.finish_reason or finish_reason
+            usage = chunk.usage or usage
+        return LLMCompletion(content="".join(parts), finish_reason=finish_reason, usage=usage)
+
+    async def warm(self, connections: int) -> None:
+        """
+        Open up to connections pooled connections (one with HTTP/2)
+
+        Failures are logged, not raised: the provider may come up after us.
+        """
+        count = 1 if self.http2 else max(1, min(connections, self.limits.max_keepalive_connections or connections))
+        results = await asyncio.gather(
+            *(self.client.get(self.warm_path) for _ in range(count)),
+            return_exceptions=True,
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        self.warmed += count - len(failed)
+        if failed:
+            logger.warning("LLM provider %s: %d/%d warm-up requests failed: %r", self.name, len(failed), count, failed[0])
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -------------------------------------------------------------------------
+    # Helpers for subclasses
+    # -------------------------------------------------------------------------
+
+    def _record_first_token(self, started: float) -> None:
+        self._first_token_seconds += time.perf_counter() - started
+        self._first_tokens += 1
+
+    def _error(self, exc: Exception) -> LLMError:
+        """Map an httpx exception to an LLMError (and count it)"""
+        self.errors += 1
+        if isinstance(exc, httpx.TimeoutException):
+            self.timeouts += 1
+            return LLMTimeoutError(f"{self.name}: timed out ({type(exc).__name__})")
+        if isinstance(exc, httpx.TransportError):
+            return LLMUnavailableError(f"{self.name}: {type(exc).__name__}: {exc}")
+        return LLMError(f"{self.name}: {exc}")
+
+    def _status_error(self, status_code: int, body: bytes) -> LLMError:
+        self.errors += 1
+        message = f"{self.name}: HTTP {status_code}: {body[:200].decode(errors='replace')}"
+        if status_code == 429 or status_code >= 500:
+            return LLMUnavailableError(message)
+        return LLMError(message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "http2": self.http2,
+            "requests": self.requests,
+            "active_streams": self.active_streams,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "warmed_connections": self.warmed,
+            "avg_first_token_ms": (
+                round(self._first_token_seconds / self._first_tokens * 1000, 1) if self._first_tokens else None
+            ),
+        }
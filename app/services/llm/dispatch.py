@@ -0,0 +1,302 @@
+"""
+Latency-aware LLM dispatch: deadlines, hedged requests, circuit breakers
+
+NFR-P01b wants the answer to start within 3 s (p95) and NFR-P10 a
+fallback after 5 s. One upstream call bounded only by LLM_TIMEOUT_SECONDS
+cannot promise either, so every stream goes through LLMDispatcher:
+
+Stages of one request (measured from the call):
+
+    hedge delay       the LLM_HEDGE_PERCENTILE of the primary's recent
+                      first-token latencies (LLM_HEDGE_DELAY_MS until
+                      LLM_HEDGE_MIN_SAMPLES are known). No first token by
+                      then: the same request goes to the next provider
+                      too, and whichever streams first wins
+    retryable error   (503, 429, connection failure) the next provider is
+                      tried at once instead of waiting for the hedge delay
+    first-token       LLM_FIRST_TOKEN_DEADLINE_SECONDS without a first
+    deadline          token from any attempt: all are cancelled and
+                      LLMTimeoutError is raised (the reply's fallback)
+
+The losing attempt is cancelled as soon as a winner streams, which closes
+its upstream response. After the first token the winner's own read
+timeout applies.
+
+Circuit breakers (one per provider): LLM_BREAKER_FAILURES consecutive
+failures (retryable errors, or no first token by the deadline) open the
+circuit; an open provider is skipped for LLM_BREAKER_RESET_SECONDS, then
+one probe request decides whether it closes again. A request with every
+circuit open fails at once.
+
+With a single provider there is nothing to hedge to; deadlines and the
+breaker still apply.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.llm.base import (
+    ChatMessage,
+    LLMChunk,
+    LLMCompletion,
+    LLMError,
+    LLMProvider,
+    LLMTimeoutError,
+    LLMUnavailableError,
+)
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker of one provider"""
+
+    def __init__(self, failures: int, reset_seconds: float) -> None:
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """May a request go to this provider now (claims the probe when half-open)"""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """An allowed request ended without a verdict (cancelled)"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "opens": self.opens}
+
+
+class FirstTokenLatency:
+    """Recent first-token latencies of one provider"""
+
+    def __init__(self, window: int) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int) -> Optional[float]:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class _Attempt:
+    """One provider's try at a request, up to its first chunk"""
+
+    def __init__(self, provider: LLMProvider, messages: Sequence[ChatMessage], max_tokens: Optional[int]) -> None:
+        self.provider = provider
+        self.chunks = provider.stream(messages, max_tokens=max_tokens)
+        self.started = time.perf_counter()
+        self.first: "asyncio.Task[LLMChunk]" = asyncio.ensure_future(self.chunks.__anext__())
+
+    async def close(self) -> None:
+        """Cancel (closes the upstream response)"""
+        if not self.first.done():
+            self.first.cancel()
+        try:
+            await self.first
+        except BaseException:
+            pass
+        await self.chunks.aclose()
+
+
+class LLMDispatcher:
+    """LLMProvider over a primary and fallback providers (see module docstring)"""
+
+    def __init__(
+        self,
+        providers: Sequence[LLMProvider],
+        first_token_deadline_seconds: float = settings.LLM_FIRST_TOKEN_DEADLINE_SECONDS,
+        hedge_percentile: float = settings.LLM_HEDGE_PERCENTILE,
+        hedge_delay_seconds: float = settings.LLM_HEDGE_DELAY_MS / 1000,
+        hedge_min_delay_seconds: float = settings.LLM_HEDGE_MIN_DELAY_MS / 1000,
+        hedge_min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES,
+        breaker_failures: int = settings.LLM_BREAKER_FAILURES,
+        breaker_reset_seconds: float = settings.LLM_BREAKER_RESET_SECONDS,
+    ) -> None:
+        if not providers:
+            raise ValueError("LLMDispatcher needs at least one provider")
+        self.providers = list(providers)
+        self.name = self.providers[0].name
+        self.first_token_deadline = first_token_deadline_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay_seconds
+        self.hedge_min_delay = hedge_min_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers = [CircuitBreaker(breaker_failures, breaker_reset_seconds) for _ in self.providers]
+        self.latencies = [FirstTokenLatency(window=settings.LLM_HEDGE_WINDOW) for _ in self.providers]
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.deadline_timeouts = 0
+        self.rejected = 0
+
+    def hedge_after(self, index: int) -> float:
+        """Seconds to wait for provider index's first token before hedging"""
+        observed = self.latencies[index].percentile(self.hedge_percentile, self.hedge_min_samples)
+        delay = self.hedge_delay if observed is None else observed
+        return min(max(delay, self.hedge_min_delay), self.first_token_deadline)
+
+    async def stream(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.first_token_deadline
+        remaining = list(range(len(self.providers)))
+        attempts: Dict[int, _Attempt] = {}
+        winner: Optional[int] = None
+        first: Optional[LLMChunk] = None
+        last_error: Optional[LLMError] = None
+
+        def start_next() -> bool:
+            while remaining:
+                index = remaining.pop(0)
+                if self.breakers[index].allow():
+                    attempts[index] = _Attempt(self.providers[index], messages, max_tokens)
+                    return True
+            return False
+
+        if not start_next():
+            self.rejected += 1
+            raise LLMUnavailableError("all LLM providers are unavailable (circuits open)")
+        primary = next(iter(attempts))
+        hedge_at = loop.time() + self.hedge_after(primary)
+        try:
+            while winner is None:
+                pending = {a.first: i for i, a in attempts.items() if not a.first.done()}
+                if not pending:
+                    if not start_next():
+                        raise last_error or LLMUnavailableError("all LLM providers failed")
+                    self.fallbacks += 1
+                    continue
+                now = loop.time()
+                wake = min(deadline, hedge_at) if remaining else deadline
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wake - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if loop.time() >= deadline:
+                        self.deadline_timeouts += 1
+                        for index in pending.values():
+                            self.breakers[index].record_failure()
+                        raise LLMTimeoutError(f"no first token within {self.first_token_deadline:.1f} s")
+                    hedge_at = float("inf")
+                    if start_next():
+                        self.hedges += 1
+                    continue
+                for task in done:
+                    index = pending[task]
+                    exc = task.exception()
+                    if exc is None:
+                        if winner is None:
+                            winner, first = index, task.result()
+                        continue
+                    if isinstance(exc, StopAsyncIteration):
+                        exc = LLMError(f"{self.providers[index].name}: empty stream")
+                    if not isinstance(exc, LLMError):
+                        raise exc
+                    if not exc.retryable:
+                        raise exc
+                    self.breakers[index].record_failure()
+                    last_error = exc
+                    logger.warning("LLM provider %s failed, trying the next one: %s", self.providers[index].name, exc)
+        finally:
+            for index, attempt in attempts.items():
+                if index != winner:
+                    self.breakers[index].release()
+                    await attempt.close()
+
+        attempt = attempts[winner]
+        self.breakers[winner].record_success()
+        self.latencies[winner].record(time.perf_counter() - attempt.started)
+        if winner != primary:
+            self.hedge_wins += 1
+        try:
+            yield first
+            async for chunk in attempt.chunks:
+                yield chunk
+        except LLMError as exc:
+            if exc.retryable:
+                self.breakers[winner].record_failure()
+            raise
+        finally:
+            await attempt.chunks.aclose()
+
+    async def complete(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> LLMCompletion:
+        parts: List[str] = []
+        finish_reason = "stop"
+        usage = None
+        async for chunk in self.stream(messages, max_tokens=max_tokens):
+            parts.append(chunk.delta)
+            finish_reason = chunk.finish_reason or finish_reason
+            usage = chunk.usage or usage
+        return LLMCompletion(content="".join(parts), finish_reason=finish_reason, usage=usage)
+
+    async def warm(self, connections: int) -> None:
+        await asyncio.gather(*(provider.warm(connections) for provider in self.providers))
+
+    async def aclose(self) -> None:
+        for provider in self.providers:
+            await provider.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "deadline_timeouts": self.deadline_timeouts,
+            "rejected": self.rejected,
+            "providers": [
+                {
+                    **provider.stats(),
+                    "breaker": breaker.stats(),
+                    "hedge_after_ms": round(self.hedge_after(i) * 1000, 1),
+                }
+                for i, (provider, breaker) in enumerate(zip(self.providers, self.breakers))
+            ],
+        }
@@ -0,0 +1,82 @@
+"""OpenAI-compatible chat completions provider (also used for the local stub server)"""
+import json
+import time
+from typing import AsyncIterator, Optional, Sequence
+
+import httpx
+
+from app.core.config import settings
+from app.services.llm.base import ChatMessage, HTTPProvider, LLMChunk, LLMError, LLMUsage
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class OpenAIProvider(HTTPProvider):
+    """
+    POST /chat/completions with stream=true
+
+    The response is SSE: one `data: {json}` line per chunk and a final
+    `data: [DONE]`. Usage arrives on a last chunk without choices
+    (stream_options.include_usage).
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, model: str = settings.LLM_MODEL, **kwargs) -> None:
+        super().__init__(base_url, **kwargs)
+        self.model = model
+
+    async def stream(
+        self,
+        messages: Sequence[ChatMessage],
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        body = {
+            "model": self.model,
+            "messages": [{"role": m.role, "content": m.content} for m in messages],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+
+        self.requests += 1
+        self.active_streams += 1
+        started = time.perf_counter()
+        first = True
+        finish_reason: Optional[str] = None
+        usage: Optional[LLMUsage] = None
+        try:
+            # Leaving this block early (consumer stopped iterating) closes the
+            # response; an unfinished HTTP/1.1 connection is dropped, not reused
+            async with self.client.stream("POST", "/chat/completions", json=body) as response:
+                if response.status_code != 200:
+                    raise self._status_error(response.status_code, await response.aread())
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        raise LLMError(f"{self.name}: malformed stream chunk")
+                    if event.get("usage"):
+                        usage = LLMUsage(
+                            prompt_tokens=event["usage"].get("prompt_tokens", 0),
+                            completion_tokens=event["usage"].get("completion_tokens", 0),
+                        )
+                    for choice in event.get("choices") or ():
+                        finish_reason = choice.get("finish_reason") or finish_reason
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            if first:
+                                self._record_first_token(started)
+                                first = False
+                            yield LLMChunk(delta=delta)
+        except httpx.HTTPError as exc:
+            raise self._error(exc) from exc
+        finally:
+            self.active_streams -= 1
+        yield LLMChunk(finish_reason=finish_reason or "stop", usage=usage)
@@ -0,0 +1,203 @@
+"""
+Deterministic local LLM server (OpenAI-compatible) for offline load tests
+
+Usage:
+    python -m app.services.llm.stub [--port 8100] [--first-token-ms 300] [--tokens-per-second 50] [--reply-tokens 60]
+        [--first-token-sigma 0] [--slow-ratio 0] [--slow-first-token-ms 0] [--error-ratio 0] [--seed 0]
+        [--moderation-ms 100]
+
+Then run the API with LLM_PROVIDER=stub (LLM_BASE_URL defaults to
+http://127.0.0.1:8100/v1). The reply to a conversation is a pure function
+of its last message, so runs are reproducible; latency is first-token
+delay plus one token every 1/tokens_per_second.
+
+Injected latency / failures (seeded, per request): the first-token delay
+is log-normal around --first-token-ms with --first-token-sigma, a
+--slow-ratio of requests wait --slow-first-token-ms instead (a slow
+tail), and an --error-ratio of requests get HTTP 503.
+
+Moderation answers after --moderation-ms and flags inputs containing one
+of STUB_FLAGGED_WORDS.
+
+Endpoints:
+    GET  /v1/models
+    POST /v1/chat/completions   (stream true / false, max_tokens)
+    POST /v1/moderations
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.core.config import settings
+
+# Reply fragments (roughly one token each)
+VOCABULARY = (
+    "うん", "、", "そう", "だね", "。", "今日", "は", "すごく", "楽しかった", "よ", "！", "ねえ",
+    "あなた", "と", "話す", "の", "って", "なんだか", "落ち着く", "な", "また", "明日", "も",
+    "聞かせて", "ほしい", "ふふ", "そっか", "本当", "に", "ありがとう", "嬉しい", "…",
+)
+
+# Inputs containing any of these are flagged by /v1/moderations
+STUB_FLAGGED_WORDS = ("殺す", "死ね")
+
+
+def reply_tokens(messages: List[Dict[str, Any]], count: int) -> List[str]:
+    """Deterministic reply: seeded by the last message"""
+    last = messages[-1].get("content", "") if messages else ""
+    seed = int.from_bytes(hashlib.blake2b(str(last).encode(), digest_size=8).digest(), "little")
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough count (~2 characters per token for Japanese)"""
+    return sum(len(str(m.get("content", ""))) for m in messages) // 2 + 4 * len(messages)
+
+
+def create_stub_app(
+    first_token_ms: float = settings.LLM_STUB_FIRST_TOKEN_MS,
+    tokens_per_second: float = settings.LLM_STUB_TOKENS_PER_SECOND,
+    reply_length: int = settings.LLM_STUB_REPLY_TOKENS,
+    first_token_sigma: float = 0.0,
+    slow_ratio: float = 0.0,
+    slow_first_token_ms: float = 0.0,
+    error_ratio: float = 0.0,
+    seed: int = 0,
+    moderation_ms: float = settings.LLM_STUB_MODERATION_MS,
+) -> Starlette:
+    """ASGI app of the stub server (also usable in process via httpx.ASGITransport)"""
+    interval = 1 / tokens_per_second if tokens_per_second > 0 else 0.0
+    state = {"requests": 0, "active": 0, "cancelled": 0, "errors": 0, "moderations": 0}
+    rng = random.Random(seed)
+
+    def first_token_delay() -> float:
+        if slow_ratio and rng.random() < slow_ratio:
+            return slow_first_token_ms / 1000
+        if first_token_sigma:
+            return first_token_ms / 1000 * rng.lognormvariate(0, first_token_sigma)
+        return first_token_ms / 1000
+
+    async def models(request: Request) -> JSONResponse:
+        return JSONResponse({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        limit = body.get("max_tokens") or reply_length
+        tokens = reply_tokens(messages, min(reply_length, limit))
+        finish_reason = "length" if limit < reply_length else "stop"
+        usage = {"prompt_tokens": prompt_tokens(messages), "completion_tokens": len(tokens)}
+        state["requests"] += 1
+        if error_ratio and rng.random() < error_ratio:
+            state["errors"] += 1
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+        first_token = first_token_delay()
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + interval * max(0, len(tokens) - 1))
+            return JSONResponse({
+                "id": f"stub-{state['requests']}",
+                "object": "chat.completion",
+                "model": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+
+        async def events() -> AsyncIterator[str]:
+            state["active"] += 1
+            completed = False
+            try:
+                started = time.perf_counter()
+                await asyncio.sleep(first_token)
+                for i, token in enumerate(tokens):
+                    # Paced against the start, so slow consumers do not stretch the schedule
+                    delay = started + first_token + i * interval - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    yield _chunk({"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+                yield _chunk({"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    yield _chunk({"choices": [], "usage": usage})
+                yield "data: [DONE]\n\n"
+                completed = True
+            finally:
+                state["active"] -= 1
+                if not completed:
+                    state["cancelled"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def moderations(request: Request) -> JSONResponse:
+        body = await request.json()
+        state["moderations"] += 1
+        await asyncio.sleep(moderation_ms / 1000)
+        flagged = any(word in str(body.get("input", "")) for word in STUB_FLAGGED_WORDS)
+        return JSONResponse({
+            "id": f"modr-{state['moderations']}",
+            "model": "stub",
+            "results": [{"flagged": flagged, "categories": {"violence": flagged}}],
+        })
+
+    async def stats(request: Request) -> JSONResponse:
+        return JSONResponse(state)
+
+    app = Starlette(routes=[
+        Route("/v1/models", models),
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/moderations", moderations, methods=["POST"]),
+        Route("/stats", stats),
+    ])
+    app.state.stub = state
+    return app
+
+
+def _chunk(payload: Dict[str, Any]) -> str:
+    payload = {"object": "chat.completion.chunk", "model": "stub", **payload}
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Deterministic local LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=settings.LLM_STUB_PORT)
+    parser.add_argument("--first-token-ms", type=float, default=settings.LLM_STUB_FIRST_TOKEN_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.LLM_STUB_TOKENS_PER_SECOND)
+    parser.add_argument("--reply-tokens", type=int, default=settings.LLM_STUB_REPLY_TOKENS)
+    parser.add_argument("--first-token-sigma", type=float, default=0.0)
+    parser.add_argument("--slow-ratio", type=float, default=0.0)
+    parser.add_argument("--slow-first-token-ms", type=float, default=0.0)
+    parser.add_argument("--error-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--moderation-ms", type=float, default=settings.LLM_STUB_MODERATION_MS)
+    args = parser.parse_args()
+    app = create_stub_app(
+        args.first_token_ms,
+        args.tokens_per_second,
+        args.reply_tokens,
+        first_token_sigma=args.first_token_sigma,
+        slow_ratio=args.slow_ratio,
+        slow_first_token_ms=args.slow_first_token_ms,
+        error_ratio=args.error_ratio,
+        seed=args.seed,
+        moderation_ms=args.moderation_ms,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Token counting for prompt budgets
+
+Uses tiktoken (o200k_base, the encoding of current OpenAI chat models)
+when it is installed and its encoding file is available; otherwise an
+estimate of one token per non-ASCII character (Japanese is roughly one
+character per token) plus one per four ASCII characters. Counts are
+only used for budgeting, so the estimate errs high.
+
+Counting is not free for long texts, so token_counts caches the count of
+each prompt segment under a stable key (persona digest, memory digest,
+message id) and a segment is counted once, not on every turn.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+TIKTOKEN_ENCODING = "o200k_base"
+
+# Per-message framing of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_UNSET = object()
+_encoding: Any = _UNSET
+
+
+def _tiktoken_encoding() -> Any:
+    global _encoding
+    if _encoding is _UNSET:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception:  # pragma: no cover - optional dependency (or no encoding file offline)
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of text (tiktoken, or the estimate)"""
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return len(text) - ascii_chars + (ascii_chars + 3) // 4
+
+
+class TokenCounts:
+    """LRU of token counts by segment key"""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, key: str, text: str) -> int:
+        """
+        Tokens of text, counted once per key
+
+        The key must change whenever the text does (content digest, or
+        the id of an immutable message).
+        """
+        tokens = self._counts.get(key)
+        if tokens is not None:
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = self._counts[key] = count_tokens(text)
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def get(self, key: str) -> Optional[int]:
+        return self._counts.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokenizer": "tiktoken" if _encoding not in (_UNSET, None) else "estimate",
+            "entries": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_counts = TokenCounts(max_entries=settings.PROMPT_TOKEN_CACHE_MAX_ENTRIES)
+register_metrics("token_counts", token_counts.stats)
@@ -0,0 +1,52 @@
+"""
+Master data snapshot (m_report_reasons)
+
+Only keys that an endpoint serves are written. Tags come from the catalog
+index (app/services/catalog_index.py), which each worker builds for itself
+and which is not part of the shared snapshot.
+"""
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.shared_snapshot import SnapshotPublisher, master_data_snapshot
+from app.db.database import AsyncSessionLocal
+from app.schemas.safety import ReportReason, ReportReasonListResponse
+
+# Snapshot keys (values are pre-rendered JSON)
+REPORT_REASONS_KEY = "report_reasons"
+
+
+async def build_master_data_snapshot() -> Dict[str, bytes]:
+    """
+    Render all master data into snapshot entries
+
+    Returns:
+        Mapping of snapshot key to JSON bytes
+    """
+    async with AsyncSessionLocal() as db:
+        reasons = await _load_report_reasons(db)
+
+    return {
+        REPORT_REASONS_KEY: ReportReasonListResponse(data=reasons).model_dump_json().encode(),
+    }
+
+
+# =============================================================================
+# Loaders (TODO: m_report_reasons is not modeled yet)
+# =============================================================================
+
+
+async def _load_report_reasons(db: AsyncSession) -> List[ReportReason]:
+    """
+    TODO: SELECT id, reason_code AS code, label AS name FROM m_report_reasons ORDER BY sort_order
+    """
+    return []
+
+
+master_data_publisher = SnapshotPublisher(
+    master_data_snapshot,
+    build_master_data_snapshot,
+    interval_seconds=settings.MASTER_DATA_REFRESH_SECONDS,
+)
@@ -0,0 +1,556 @@
+"""
+Write-behind persistence of conversation messages
+
+Each turn stored its user message and reply as transactions of their own
+on the request path; at scale conversation_messages inserts are most of
+the primary's write load. Messages are queued in memory instead, and a
+writer task stores whatever accumulated every MESSAGE_WRITE_FLUSH_MS as
+one transaction:
+
+- one INSERT into conversation_messages for up to MESSAGE_WRITE_BATCH_MAX
+  rows (ON CONFLICT (id) DO NOTHING, so a replayed message is not stored
+  twice), sent as multi-row VALUES pages by SQLAlchemy's insertmanyvalues
+  with RETURNING id
+- one counter UPDATE per thread (message_count, last_message_at) for the
+  rows actually inserted, executed as a single executemany
+
+Bounded: at MESSAGE_WRITE_QUEUE_MAX queued messages put() waits for the
+next flush, and gives up (the message is lost, counted as dropped) after
+MESSAGE_WRITE_ENQUEUE_TIMEOUT_SECONDS.
+
+Crash safety: put() appends the message to a local append-only spill log
+before it is queued (written straight to the OS, so it survives a crash
+of the process; fsync'd once per flush when MESSAGE_WRITE_SPILL_FSYNC, so
+at most one interval is exposed to a crash of the host). Segments are
+deleted once all of their messages are committed. At startup a worker
+replays the segments no live worker holds (flock), skipping the messages
+already stored.
+
+Read-your-writes: queued and in-flight messages stay in a per-thread
+overlay until committed; history reads merge it (merge()), so the next
+turn of a thread sees its previous one at once. Commits keep the order of
+put() and created_at is stamped there, so the overlay is always newer
+than what is stored for the thread.
+
+MESSAGE_WRITE_BEHIND=false writes each message in a transaction of its
+own (same statements, one row); scripts/bench_message_writes.py compares
+the two.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+
+logger = logging.getLogger(__name__)
+
+_messages = ConversationMessage.__table__
+_sessions = ConversationSession.__table__
+# Counters of one thread, executed once per thread in a batch
+_COUNTERS = (
+    update(_sessions)
+    .where(_sessions.c.id == bindparam("thread"))
+    .values(
+        message_count=_sessions.c.message_count + bindparam("count"),
+        last_message_at=bindparam("last"),
+        updated_at=bindparam("now"),
+    )
+)
+
+
+def spill_directory() -> Path:
+    if settings.MESSAGE_WRITE_SPILL_DIR:
+        return Path(settings.MESSAGE_WRITE_SPILL_DIR)
+    return Path(tempfile.gettempdir()) / "aiwill" / "message-spill"
+
+
+def _row(message: ConversationMessage) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "role": message.role,
+        "content": message.content,
+        "finish_reason": message.finish_reason,
+        "created_at": message.created_at,
+    }
+
+
+def _record(message: ConversationMessage) -> Dict[str, Any]:
+    """Spill log form of a message"""
+    return {**_row(message), "created_at": message.created_at.isoformat()}
+
+
+def _message(record: Dict[str, Any]) -> ConversationMessage:
+    return ConversationMessage(**{**record, "created_at": datetime.fromisoformat(record["created_at"])})
+
+
+def _fsync_all(files: List[IO[bytes]]) -> None:
+    for file in files:
+        os.fsync(file.fileno())
+
+
+# =============================================================================
+# Spill Log
+# =============================================================================
+
+
+@dataclass
+class _Segment:
+    number: int
+    path: Path
+    file: IO[bytes]
+    size: int = 0
+    # Appended messages not committed yet
+    pending: int = 0
+
+
+class SpillLog:
+    """
+    Append-only local log of queued messages (JSON lines in segment files)
+
+    The worker appending to a segment holds an exclusive flock on it until
+    the segment is deleted or the worker exits, so recovery only claims
+    segments of workers that are gone.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_bytes: int = settings.MESSAGE_WRITE_SPILL_SEGMENT_BYTES,
+        fsync: bool = settings.MESSAGE_WRITE_SPILL_FSYNC,
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._segments: Dict[int, _Segment] = {}
+        self._current: Optional[_Segment] = None
+        self._unsynced: Set[int] = set()
+        self._next = 0
+        self.appended_bytes = 0
+        self.syncs = 0
+
+    def append(self, message: ConversationMessage) -> int:
+        """Log a message; returns its segment number"""
+        segment = self._current
+        if segment is None or segment.size >= self.segment_bytes:
+            segment = self._rotate()
+        line = (json.dumps(_record(message), ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        segment.file.write(line)  # unbuffered: in the OS page cache when this returns
+        segment.size += len(line)
+        segment.pending += 1
+        self._unsynced.add(segment.number)
+        self.appended_bytes += len(line)
+        return segment.number
+
+    def _rotate(self) -> _Segment:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        number = self._next
+        self._next += 1
+        path = self.directory / f"{time.time_ns():020d}-{os.getpid()}-{number}.jsonl"
+        file = open(path, "ab", buffering=0)
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        segment = self._current = self._segments[number] = _Segment(number, path, file)
+        return segment
+
+    async def sync(self) -> None:
+        """fsync the segments appended to since the last sync (off the event loop)"""
+        if not self.fsync or not self._unsynced:
+            return
+        files = [self._segments[number].file for number in self._unsynced if number in self._segments]
+        self._unsynced.clear()
+        # Segments are only closed by committed() / close(), never while this runs
+        await asyncio.to_thread(_fsync_all, files)
+        self.syncs += 1
+
+    def committed(self, counts: Dict[int, int]) -> None:
+        """Messages (count per segment) are stored; drop the segments left with none"""
+        for number, count in counts.items():
+            segment = self._segments.get(number)
+            if segment is not None:
+                segment.pending -= count
+        for segment in list(self._segments.values()):
+            if segment.pending > 0:
+                continue
+            if segment is self._current:
+                # Drained: start over in place instead of growing it
+                os.ftruncate(segment.file.fileno(), 0)
+                segment.size = 0
+            else:
+                self._remove(segment)
+
+    def _remove(self, segment: _Segment) -> None:
+        segment.path.unlink(missing_ok=True)
+        segment.file.close()
+        del self._segments[segment.number]
+        self._unsynced.discard(segment.number)
+        if segment is self._current:
+            self._current = None
+
+    def claim_orphans(self) -> Iterator[Tuple[Path, IO[bytes]]]:
+        """Segments no live worker holds, each locked while it is yielded"""
+        if not self.directory.is_dir():
+            return
+        own = {segment.path for segment in self._segments.values()}
+        for path in sorted(self.directory.glob("*.jsonl")):
+            if path in own:
+                continue
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                continue  # recovered by another worker meanwhile
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+            try:
+                if path.exists():
+                    yield path, file
+            finally:
+                file.close()
+
+    @staticmethod
+    def read(file: IO[bytes]) -> List[ConversationMessage]:
+        """Messages of a segment; a line torn by the crash is skipped"""
+        messages = []
+        for line in file:
+            try:
+                messages.append(_message(json.loads(line)))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Skipped an unreadable spill log line (%d bytes)", len(line))
+        return messages
+
+    def close(self) -> None:
+        """Close every segment; those with uncommitted messages stay for recovery"""
+        for segment in list(self._segments.values()):
+            if segment.pending <= 0:
+                self._remove(segment)
+            else:
+                segment.file.close()
+        self._segments.clear()
+        self._current = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "segments": len(self._segments),
+            "appended_bytes": self.appended_bytes,
+            "syncs": self.syncs,
+        }
+
+
+# =============================================================================
+# Queue
+# =============================================================================
+
+
+class _Entry:
+    __slots__ = ("message", "segment")
+
+    def __init__(self, message: ConversationMessage, segment: int) -> None:
+        self.message = message
+        self.segment = segment
+
+
+class MessageWriteQueue:
+    """Write-behind queue of conversation messages (see the module docstring)"""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        enabled: bool = settings.MESSAGE_WRITE_BEHIND,
+        spill: Optional[SpillLog] = None,
+        flush_ms: float = settings.MESSAGE_WRITE_FLUSH_MS,
+        batch_max: int = settings.MESSAGE_WRITE_BATCH_MAX,
+        queue_max: int = settings.MESSAGE_WRITE_QUEUE_MAX,
+        enqueue_timeout_seconds: float = settings.MESSAGE_WRITE_ENQUEUE_TIMEOUT_SECONDS,
+        retry_seconds: float = settings.MESSAGE_WRITE_RETRY_SECONDS,
+    ) -> None:
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.spill = spill
+        self.flush_seconds = flush_ms / 1000
+        self.batch_max = max(batch_max, 1)
+        self.queue_max = max(queue_max, 1)
+        self.enqueue_timeout_seconds = enqueue_timeout_seconds
+        self.retry_seconds = retry_seconds
+        bind = session_factory.kw.get("bind")
+        # created_at as the database returns it (SQLite drops the offset), so the
+        # overlay sorts and compares with stored rows
+        self._naive = bind is not None and bind.dialect.name == "sqlite"
+        self._queue: List[_Entry] = []
+        self._overlay: Dict[str, Dict[str, ConversationMessage]] = {}
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.waits = 0
+        self.dropped = 0
+        self.failures = 0
+        self.recovered = 0
+        self._batch_seconds = 0.0
+
+    # -------------------------------------------------------------------------
+    # Writes / reads
+    # -------------------------------------------------------------------------
+
+    def _now(self) -> datetime:
+        now = datetime.now(timezone.utc)
+        return now.replace(tzinfo=None) if self._naive else now
+
+    async def put(
+        self,
+        thread_id: str,
+        role: str,
+        content: str,
+        message_id: Optional[str] = None,
+        finish_reason: Optional[str] = None,
+    ) -> ConversationMessage:
+        """
+        Store a message: queued (returns once it is in the spill log) or,
+        when write-behind is off, committed
+
+        Raises:
+            asyncio.TimeoutError: No room in the queue within the enqueue timeout
+        """
+        message = ConversationMessage(
+            id=message_id or str(uuid.uuid4()),
+            session_id=thread_id,
+            role=role,
+            content=content,
+            finish_reason=finish_reason,
+            created_at=self._now(),
+        )
+        if not self.enabled:
+            await self._write([message])
+            self.written += 1
+            return message
+        if len(self._queue) >= self.queue_max:
+            self.waits += 1
+            try:
+                await asyncio.wait_for(self._until_room(), self.enqueue_timeout_seconds)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                raise
+            # Stamped again: messages put while this one waited are older
+            message.created_at = self._now()
+        self._enqueue(message)
+        return message
+
+    async def _until_room(self) -> None:
+        while len(self._queue) >= self.queue_max:
+            self._room.clear()
+            await self._room.wait()
+
+    def _enqueue(self, message: ConversationMessage) -> None:
+        segment = self.spill.append(message) if self.spill is not None else -1
+        self._queue.append(_Entry(message, segment))
+        self._overlay.setdefault(message.session_id, {})[message.id] = message
+        self.enqueued += 1
+        self._wake.set()
+
+    def merge(self, thread_id: str, rows: List[ConversationMessage], limit: int) -> List[ConversationMessage]:
+        """
+        rows (newest stored messages of a thread, oldest first) with the
+        thread's uncommitted messages; the newest `limit`
+        """
+        queued = self._overlay.get(thread_id)
+        if not queued:
+            return rows
+        stored = {row.id for row in rows}
+        merged = rows + [message for message in queued.values() if message.id not in stored]
+        merged.sort(key=lambda message: message.created_at)
+        return merged[-limit:]
+
+    # -------------------------------------------------------------------------
+    # Flush
+    # -------------------------------------------------------------------------
+
+    async def flush(self) -> int:
+        """Store everything queued; returns messages written"""
+        written = 0
+        async with self._lock:
+            if self.spill is not None and self._queue:
+                await self.spill.sync()
+            while self._queue:
+                batch = self._queue[:self.batch_max]
+                started = time.perf_counter()
+                try:
+                    await self._write([entry.message for entry in batch])
+                except Exception:
+                    # Left at the front of the queue (and in the spill log) for the retry
+                    self.failures += 1
+                    raise
+                # Only appended to meanwhile, so the batch is still the head
+                del self._queue[:len(batch)]
+                self._batch_seconds += time.perf_counter() - started
+                self.batches += 1
+                written += len(batch)
+                for entry in batch:
+                    queued = self._overlay.get(entry.message.session_id)
+                    if queued is not None:
+                        queued.pop(entry.message.id, None)
+                        if not queued:
+                            del self._overlay[entry.message.session_id]
+                if self.spill is not None:
+                    self.spill.committed(Counter(entry.segment for entry in batch))
+                self._room.set()
+            self.written += written
+        return written
+
+    async def _write(self, messages: List[ConversationMessage]) -> None:
+        try:
+            await self._insert(messages)
+        except IntegrityError:
+            if len(messages) == 1:
+                self.dropped += 1
+                logger.error("Dropped message %s of thread %s: rejected by the database",
+                             messages[0].id, messages[0].session_id)
+                return
+            # A row the batch cannot take (e.g. its thread was deleted): one by one
+            for message in messages:
+                await self._write([message])
+
+    async def _insert(self, messages: List[ConversationMessage]) -> None:
+        now = self._now()
+        async with self.session_factory() as db:
+            insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+            # One statement for the batch: compiled once and cached, executed as
+            # multi-row VALUES pages (insertmanyvalues). RETURNING lists only the
+            # rows inserted, not those ON CONFLICT skipped (already stored)
+            inserted = set((await db.scalars(
+                insert(_messages).on_conflict_do_nothing(index_elements=[_messages.c.id]).returning(_messages.c.id),
+                [_row(message) for message in messages],
+            )).all())
+            counters: Dict[str, List[Any]] = {}
+            for message in messages:
+                if message.id not in inserted:
+                    continue
+                counter = counters.get(message.session_id)
+                if counter is None:
+                    counters[message.session_id] = [1, message.created_at]
+                else:
+                    counter[0] += 1
+                    counter[1] = max(counter[1], message.created_at)
+            if counters:
+                await db.execute(
+                    _COUNTERS,
+                    [{"thread": thread_id, "count": count, "last": last, "now": now}
+                     for thread_id, (count, last) in counters.items()],
+                )
+            await db.commit()
+
+    async def _stored_ids(self, ids: List[str]) -> Set[str]:
+        stored: Set[str] = set()
+        async with self.session_factory() as db:
+            for start in range(0, len(ids), self.batch_max):
+                chunk = ids[start:start + self.batch_max]
+                stored.update((await db.scalars(
+                    select(ConversationMessage.id).where(ConversationMessage.id.in_(chunk))
+                )).all())
+        return stored
+
+    # -------------------------------------------------------------------------
+    # Recovery / lifecycle
+    # -------------------------------------------------------------------------
+
+    async def recover(self) -> int:
+        """Queue the unstored messages of orphaned spill segments; returns how many"""
+        if self.spill is None:
+            return 0
+        recovered = 0
+        for path, file in self.spill.claim_orphans():
+            messages = {message.id: message for message in SpillLog.read(file)}
+            stored = await self._stored_ids(list(messages))
+            for message in messages.values():
+                if message.id not in stored:
+                    # Re-logged in a segment of ours before the orphan goes
+                    self._enqueue(message)
+                    recovered += 1
+            path.unlink(missing_ok=True)
+        if recovered:
+            logger.warning("Recovered %d unwritten messages from the spill log", recovered)
+        self.recovered += recovered
+        return recovered
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.recover()
+        except Exception:
+            logger.exception("Message spill log recovery failed; orphaned segments are kept")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Cancelled between flushes, never halfway through one
+            async with self._lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final message flush failed; %d messages left in the spill log", len(self._queue))
+        if self.spill is not None:
+            self.spill.close()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.flush_seconds)  # let the batch fill
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Message flush failed; retrying in %.1f s", self.retry_seconds)
+                await asyncio.sleep(self.retry_seconds)
+                self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": len(self._queue),
+            "overlay_threads": len(self._overlay),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else None,
+            "avg_batch_ms": round(self._batch_seconds / self.batches * 1000, 2) if self.batches else None,
+            "waits": self.waits,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "recovered": self.recovered,
+            "spill": self.spill.stats() if self.spill is not None else None,
+        }
+
+
+message_writes = MessageWriteQueue(spill=SpillLog(spill_directory()) if settings.MESSAGE_WRITE_BEHIND else None)
+register_metrics("message_writes", message_writes.stats)
@@ -0,0 +1,140 @@
+"""
+Input moderation of user messages (NFR-C09)
+
+MODERATION_PROVIDER:
+    ""      - off: every message passes
+    openai  - POST /moderations of the OpenAI API (MODERATION_MODEL)
+    stub    - the same endpoint of the local stub server
+              (app.services.llm.stub; flags its STUB_FLAGGED_WORDS)
+
+The check runs next to the speculative LLM request of a turn
+(app.services.turn_pipeline), so its latency is hidden behind the time
+to first token; a flagged message cancels the request before any token
+reaches the client. A failed or timed-out check lets the message through
+when MODERATION_FAIL_OPEN (counted as failed), and blocks it otherwise.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.services.llm import HTTPProvider, LLMError
+from app.services.llm.openai import OPENAI_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModerationResult:
+    """Verdict on one message"""
+
+    flagged: bool
+    categories: Tuple[str, ...] = ()
+
+
+PASSED = ModerationResult(flagged=False)
+
+
+class OpenAIModerator(HTTPProvider):
+    """POST /moderations over the pooled provider client"""
+
+    name = "openai-moderation"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, model: str = settings.MODERATION_MODEL, **kwargs) -> None:
+        super().__init__(base_url, **kwargs)
+        self.model = model
+
+    async def check(self, text: str) -> ModerationResult:
+        self.requests += 1
+        try:
+            response = await self.client.post("/moderations", json={"model": self.model, "input": text})
+        except httpx.HTTPError as exc:
+            raise self._error(exc) from exc
+        if response.status_code != 200:
+            raise self._status_error(response.status_code, response.content)
+        results = response.json().get("results") or [{}]
+        categories = tuple(sorted(name for name, hit in (results[0].get("categories") or {}).items() if hit))
+        return ModerationResult(flagged=bool(results[0].get("flagged")), categories=categories)
+
+
+class InputModeration:
+    """Moderation checks with the fail-open policy and stats"""
+
+    def __init__(self, moderator: Optional[OpenAIModerator], fail_open: bool = settings.MODERATION_FAIL_OPEN) -> None:
+        self.moderator = moderator
+        self.fail_open = fail_open
+        self.checks = 0
+        self.flagged = 0
+        self.failed = 0
+        self._seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.moderator is not None
+
+    async def check(self, text: str) -> ModerationResult:
+        if self.moderator is None:
+            return PASSED
+        started = time.perf_counter()
+        self.checks += 1
+        try:
+            result = await self.moderator.check(text)
+        except LLMError as exc:
+            self.failed += 1
+            logger.warning("Moderation check failed (%s): %s", "passed" if self.fail_open else "blocked", exc)
+            result = PASSED if self.fail_open else ModerationResult(flagged=True, categories=("unavailable",))
+        finally:
+            self._seconds += time.perf_counter() - started
+        if result.flagged:
+            self.flagged += 1
+        return result
+
+    async def warm(self, connections: int) -> None:
+        if self.moderator is not None:
+            await self.moderator.warm(connections)
+
+    async def aclose(self) -> None:
+        if self.moderator is not None:
+            await self.moderator.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.moderator.name if self.moderator is not None else None,
+            "checks": self.checks,
+            "flagged": self.flagged,
+            "failed": self.failed,
+            "avg_ms": round(self._seconds / self.checks * 1000, 1) if self.checks else None,
+        }
+
+
+def create_moderator(name: str) -> Optional[OpenAIModerator]:
+    """Moderator for MODERATION_PROVIDER (None: off)"""
+    if not name:
+        return None
+    timeouts = {
+        "timeout_seconds": settings.MODERATION_TIMEOUT_SECONDS,
+        "connect_timeout_seconds": min(settings.LLM_CONNECT_TIMEOUT_SECONDS, settings.MODERATION_TIMEOUT_SECONDS),
+    }
+    if name == "openai":
+        return OpenAIModerator(
+            base_url=settings.MODERATION_BASE_URL or settings.LLM_BASE_URL or OPENAI_BASE_URL,
+            api_key=settings.LLM_API_KEY,
+            **timeouts,
+        )
+    if name == "stub":
+        moderator = OpenAIModerator(
+            base_url=settings.MODERATION_BASE_URL or f"http://127.0.0.1:{settings.LLM_STUB_PORT}/v1",
+            model="stub",
+            **timeouts,
+        )
+        moderator.name = "stub-moderation"
+        return moderator
+    raise ValueError(f"Unknown MODERATION_PROVIDER: {name}")
+
+
+input_moderation = InputModeration(create_moderator(settings.MODERATION_PROVIDER))
+register_metrics("moderation", input_moderation.stats)
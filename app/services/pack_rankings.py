@@ -0,0 +1,353 @@
+"""
+Precomputed pack rankings (popularity / trending sort of GET /packs)
+
+Time-decayed activity scores over conversation_sessions and entitlements
+are far too expensive to aggregate per request, so a periodic job folds
+new events into a per-pack score and the catalog index serves the
+resulting order with keyset pagination like any other sort key.
+
+Scores use forward decay: an event of weight w at time t contributes
+w * 2 ** ((t - EPOCH) / half_life). Decaying every score by the same
+factor does not change the order, so a score never has to be re-decayed;
+a run only adds the events that arrived since the last one. Scores are
+kept as natural logs so they stay finite for any t.
+
+- Each source has a keyset watermark (event_at, event_id); a run scans
+  only rows after it, in batches, up to now - settle_seconds so rows
+  still being committed are not skipped
+- Scores and the watermark of a batch are written in one transaction;
+  on PostgreSQL the watermark row is locked FOR UPDATE, so workers take
+  turns and an event is folded exactly once
+- After each run every worker reloads the scores changed since its last
+  reload (its own and other workers') into the catalog index
+"""
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models.pack_ranking import PackRanking, PackRankingWatermark
+from app.services.catalog_index import CatalogIndexManager, catalog_index
+
+logger = logging.getLogger(__name__)
+
+# Reference time of the forward-decayed scores (never change: stored scores depend on it)
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+LN2 = math.log(2)
+
+# (pack_id, occurred_at, weight)
+RankingEvent = Tuple[str, datetime, float]
+# (event_at, event_id) of the last source row scanned
+Watermark = Tuple[datetime, str]
+# (events, watermark after this batch; None = nothing left before until)
+EventBatch = Tuple[List[RankingEvent], Optional[Watermark]]
+EventSource = Callable[[AsyncSession, Watermark, datetime, int], Awaitable[Optional[EventBatch]]]
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite drops the offset; values are always written in UTC
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def log_add(a: float, b: float) -> float:
+    """log(exp(a) + exp(b)) without overflow"""
+    if a < b:
+        a, b = b, a
+    if b == -math.inf:
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+
+def decayed_score(score: float, half_life_seconds: float, at: float) -> float:
+    """Plain decayed score (sum of decayed weights) of a stored log score at epoch time at"""
+    return math.exp(score - (at - EPOCH) / half_life_seconds * LN2)
+
+
+def fold(events: Iterable[RankingEvent], half_life_seconds: float) -> Dict[str, float]:
+    """
+    Log scores of a batch of events, per pack
+
+    Weights are summed relative to the newest event of the batch (factors
+    in (0, 1], no overflow) and moved to the epoch scale once per pack.
+    """
+    events = list(events)
+    if not events:
+        return {}
+    newest = max(_utc(occurred_at).timestamp() for _, occurred_at, _ in events)
+    sums: Dict[str, float] = {}
+    for pack_id, occurred_at, weight in events:
+        factor = 2.0 ** ((_utc(occurred_at).timestamp() - newest) / half_life_seconds)
+        sums[pack_id] = sums.get(pack_id, 0.0) + weight * factor
+    offset = (newest - EPOCH) / half_life_seconds * LN2
+    return {pack_id: math.log(total) + offset for pack_id, total in sums.items() if total > 0}
+
+
+# =============================================================================
+# Ranking Job
+# =============================================================================
+
+
+class PackRankingJob:
+    """
+    Periodic, incremental ranking job (runs in every worker; see module docstring)
+
+    scores mirrors pack_rankings (ranking -> pack id -> log score) and is
+    pushed to the catalog index as it changes.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        half_lives: Mapping[str, float],
+        batch_size: int,
+        settle_seconds: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        sources: Optional[Mapping[str, EventSource]] = None,
+        index: CatalogIndexManager = catalog_index,
+    ) -> None:
+        self.interval_seconds = interval_seconds
+        self.half_lives = dict(half_lives)
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.session_factory = session_factory
+        self.sources = dict(sources) if sources is not None else dict(_SOURCES)
+        self.index = index
+        self.scores: Dict[str, Dict[str, float]] = {ranking: {} for ranking in self.half_lives}
+        self._loaded_until: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.events = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_run_seconds = 0.0
+
+    @staticmethod
+    def _insert(db: AsyncSession) -> Callable:
+        return postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+
+    # -------------------------------------------------------------------------
+    # Run
+    # -------------------------------------------------------------------------
+
+    async def run(self, until: Optional[datetime] = None) -> int:
+        """
+        Fold every source's new events into pack_rankings, then reload
+
+        Returns:
+            Number of events folded by this worker
+        """
+        started = asyncio.get_running_loop().time()
+        until = until or datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        folded = 0
+        async with self._lock:
+            for source, load_events in self.sources.items():
+                while True:
+                    count = await self._run_batch(source, load_events, until)
+                    if count is None:
+                        break
+                    folded += count
+            self.runs += 1
+        await self.reload()
+        self.last_run_seconds = asyncio.get_running_loop().time() - started
+        return folded
+
+    async def _run_batch(self, source: str, load_events: EventSource, until: datetime) -> Optional[int]:
+        """Fold one batch of source; None when the source has nothing new"""
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            # The row must exist to be locked; (epoch 0, "") precedes every event
+            await db.execute(
+                self._insert(db)(PackRankingWatermark)
+                .values(source=source, event_at=datetime.fromtimestamp(0, timezone.utc), event_id="", updated_at=now)
+                .on_conflict_do_nothing(index_elements=[PackRankingWatermark.source])
+            )
+            query = select(PackRankingWatermark).where(PackRankingWatermark.source == source)
+            if db.bind.dialect.name == "postgresql":
+                # One worker at a time folds a given source
+                query = query.with_for_update()
+            row = (await db.execute(query)).scalar_one()
+            watermark = (_utc(row.event_at), row.event_id)
+
+            batch = await load_events(db, watermark, until, self.batch_size)
+            if batch is None or batch[1] is None:
+                await db.rollback()
+                return None
+            events, next_watermark = batch
+
+            rows = []
+            for ranking, half_life in self.half_lives.items():
+                added = fold(events, half_life)
+                if not added:
+                    continue
+                # Current values from the table, not this worker's copy, which may
+                # miss another worker's batch that committed since our last reload
+                current = {}
+                pack_ids = list(added)
+                for start in range(0, len(pack_ids), 1000):
+                    result = await db.execute(
+                        select(PackRanking.pack_id, PackRanking.score).where(
+                            PackRanking.ranking == ranking,
+                            PackRanking.pack_id.in_(pack_ids[start:start + 1000]),
+                        )
+                    )
+                    current.update(result.all())
+                for pack_id, score in added.items():
+                    rows.append({
+                        "ranking": ranking,
+                        "pack_id": pack_id,
+                        "score": log_add(current.get(pack_id, -math.inf), score),
+                        "updated_at": now,
+                    })
+            if rows:
+                # executemany with one cached statement; a multi-VALUES insert of
+                # this size spends more time compiling than executing
+                stmt = self._insert(db)(PackRanking.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[PackRanking.ranking, PackRanking.pack_id],
+                    set_={"score": stmt.excluded.score, "updated_at": stmt.excluded.updated_at},
+                )
+                await db.execute(stmt, rows)
+
+            stmt = self._insert(db)(PackRankingWatermark).values(
+                source=source, event_at=next_watermark[0], event_id=next_watermark[1], updated_at=now
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[PackRankingWatermark.source],
+                set_={"event_at": stmt.excluded.event_at, "event_id": stmt.excluded.event_id, "updated_at": now},
+            )
+            await db.execute(stmt)
+            await db.commit()
+
+        self.batches += 1
+        self.events += len(events)
+        return len(events)
+
+    async def reload(self) -> int:
+        """Pull pack_rankings rows changed since the last reload into the catalog index"""
+        async with self._lock:
+            async with self.session_factory() as db:
+                query = select(PackRanking.ranking, PackRanking.pack_id, PackRanking.score, PackRanking.updated_at)
+                if self._loaded_until is not None:
+                    # Overlap so rows committed late with an earlier updated_at are not missed
+                    query = query.where(PackRanking.updated_at >= self._loaded_until - timedelta(seconds=60))
+                rows = (await db.execute(query)).all()
+            changed: Dict[str, Dict[str, float]] = {}
+            for ranking, pack_id, score, updated_at in rows:
+                scores = self.scores.get(ranking)
+                if scores is None:
+                    continue
+                if scores.get(pack_id) != score:
+                    scores[pack_id] = score
+                    changed.setdefault(ranking, {})[pack_id] = score
+                updated_at = _utc(updated_at)
+                if self._loaded_until is None or updated_at > self._loaded_until:
+                    self._loaded_until = updated_at
+            for ranking, scores in changed.items():
+                await self.index.update_ranking(ranking, scores)
+            return len(rows)
+
+    # -------------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------------
+
+    async def start(self) -> None:
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception("Initial pack rankings load failed")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                self.failures += 1
+                logger.exception("Pack ranking run failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "packs": {ranking: len(scores) for ranking, scores in self.scores.items()},
+            "runs": self.runs,
+            "batches": self.batches,
+            "events": self.events,
+            "failures": self.failures,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+
+# =============================================================================
+# Event Sources (TODO: pack_items / user_entitlements are not modeled yet)
+# =============================================================================
+
+
+async def _load_session_events(
+    db: AsyncSession, watermark: Watermark, until: datetime, limit: int
+) -> Optional[EventBatch]:
+    """
+    TODO: WITH s AS (SELECT id, character_id, started_at FROM conversation_sessions
+                     WHERE (started_at, id) > (:event_at, :event_id) AND started_at < :until
+                     ORDER BY started_at, id LIMIT :limit)
+          SELECT pi.pack_id, s.started_at, 1.0 FROM s
+          JOIN pack_items pi ON pi.item_type = 'character' AND pi.item_id = s.character_id
+          WHERE pi.deleted_at IS NULL
+          -- watermark = (started_at, id) of the last row of s
+
+    Returns None (source unavailable) until pack_items exists.
+    """
+    return None
+
+
+async def _load_entitlement_events(
+    db: AsyncSession, watermark: Watermark, until: datetime, limit: int
+) -> Optional[EventBatch]:
+    """
+    TODO: SELECT entitlement_id, created_at, 3.0, id FROM user_entitlements
+          WHERE entitlement_type = 'pack' AND (created_at, id) > (:event_at, :event_id)
+            AND created_at < :until
+          ORDER BY created_at, id LIMIT :limit
+          -- watermark = (created_at, id) of the last row
+
+    Returns None (source unavailable) until user_entitlements exists.
+    """
+    return None
+
+
+_SOURCES: Dict[str, EventSource] = {
+    "conversation_sessions": _load_session_events,
+    "user_entitlements": _load_entitlement_events,
+}
+
+pack_rankings = PackRankingJob(
+    interval_seconds=settings.PACK_RANKING_INTERVAL_SECONDS,
+    # Keys must match catalog_index.RANKING_SORTS
+    half_lives={
+        "popularity": settings.PACK_RANKING_POPULARITY_HALF_LIFE_HOURS * 3600,
+        "trending": settings.PACK_RANKING_TRENDING_HALF_LIFE_HOURS * 3600,
+    },
+    batch_size=settings.PACK_RANKING_BATCH_SIZE,
+    settle_seconds=settings.PACK_RANKING_SETTLE_SECONDS,
+)
+register_metrics("pack_rankings", pack_rankings.stats)
@@ -0,0 +1,267 @@
+"""
+Japanese-aware pack search (GET /packs ?query=)
+
+Whitespace tokenization does not work for Japanese, so text is normalized
+(NFKC, case folding, katakana -> hiragana) and indexed as overlapping
+character n-grams (bigrams by default), in an in-process inverted index
+with delta/varint compressed postings and BM25 ranking.
+"""
+import math
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+
+from app.schemas.catalog import Pack
+
+# Katakana (ァ..ヶ) -> hiragana (ぁ..ゖ); "ー" and other marks are kept
+_KANA_TABLE = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+# Field weights folded into term frequencies (BM25F-style)
+FIELD_WEIGHTS = (("name", 3), ("tags", 2), ("creator", 2), ("description", 1))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Decoded posting lists kept for hot terms
+DECODED_CACHE_SIZE = 512
+
+
+def normalize(text: str) -> str:
+    """NFKC + case folding + katakana to hiragana"""
+    return unicodedata.normalize("NFKC", text).casefold().translate(_KANA_TABLE)
+
+
+def _runs(text: str) -> Iterator[str]:
+    """Split normalized text on anything that is not a letter, digit or "ー\""""
+    run: List[str] = []
+    for char in text:
+        if char.isalnum() or char == "ー":
+            run.append(char)
+        elif run:
+            yield "".join(run)
+            run = []
+    if run:
+        yield "".join(run)
+
+
+def tokenize(text: str, n: int = 2) -> List[str]:
+    """Character n-grams of each run; runs shorter than n are kept whole"""
+    tokens: List[str] = []
+    for run in _runs(normalize(text)):
+        if len(run) <= n:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + n] for i in range(len(run) - n + 1))
+    return tokens
+
+
+# =============================================================================
+# Posting List Encoding
+# =============================================================================
+
+
+def _put_varint(buf: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _decode_postings(buf: bytearray) -> Tuple[array, array]:
+    """Decode [delta ordinal, tf]* varints into (ordinals, tfs)"""
+    ordinals = array("l")
+    tfs = array("l")
+    value = shift = last = 0
+    is_tf = False
+    for byte in buf:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if is_tf:
+            tfs.append(value)
+        else:
+            last += value
+            ordinals.append(last)
+        is_tf = not is_tf
+        value = shift = 0
+    return ordinals, tfs
+
+
+# =============================================================================
+# In-process Engine
+# =============================================================================
+
+
+class PackSearchIndex:
+    """
+    Inverted index over pack ordinals (see app.services.catalog_index)
+
+    Append-only: ordinals only grow, so add() appends to the end of each
+    posting list. Unpublished packs are filtered by the caller's live flags
+    and dropped when the catalog index compacts and rebuilds.
+
+    Catalog index versions are immutable, so a new version adds to a
+    copy(): the copy shares every posting list and copies one only when
+    add() first appends to it (copy-on-write per term).
+    """
+
+    def __init__(self, n: int = 2) -> None:
+        self.n = n
+        self._postings: Dict[str, bytearray] = {}
+        self._last: Dict[str, int] = {}
+        self._df: Dict[str, int] = {}
+        self._char_terms: Dict[str, List[str]] = {}
+        self._decoded: "OrderedDict[str, Tuple[array, array]]" = OrderedDict()
+        self.doc_lengths = array("l")
+        self._total_length = 0
+        # Terms / characters whose posting list / term list is not shared with a copy
+        self._owned: Set[str] = set()
+        self._owned_chars: Set[str] = set()
+
+    @classmethod
+    def build(cls, packs: Sequence[Pack], n: int = 2) -> "PackSearchIndex":
+        index = cls(n)
+        for ordinal, pack in enumerate(packs):
+            index.add(ordinal, pack)
+        return index
+
+    @staticmethod
+    def _fields(pack: Pack) -> Dict[str, str]:
+        return {
+            "name": pack.name,
+            "tags": " ".join(tag.name for tag in pack.tags),
+            "creator": pack.creator.display_name,
+            "description": pack.description,
+        }
+
+    def copy(self) -> "PackSearchIndex":
+        """Index sharing this one's posting lists until either side adds to them"""
+        index = PackSearchIndex(self.n)
+        index._postings = dict(self._postings)
+        index._last = dict(self._last)
+        index._df = dict(self._df)
+        index._char_terms = dict(self._char_terms)
+        index._decoded = OrderedDict(self._decoded)
+        index.doc_lengths = self.doc_lengths[:]
+        index._total_length = self._total_length
+        # Both sides now share everything
+        self._owned = set()
+        self._owned_chars = set()
+        return index
+
+    def add(self, ordinal: int, pack: Pack) -> None:
+        """Index pack under ordinal (must be greater than every indexed ordinal)"""
+        fields = self._fields(pack)
+        tf: Dict[str, int] = {}
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields[field], self.n):
+                tf[token] = tf.get(token, 0) + weight
+
+        while len(self.doc_lengths) < ordinal:
+            self.doc_lengths.append(0)
+        length = sum(tf.values())
+        self.doc_lengths.append(length)
+        self._total_length += length
+
+        for term, count in tf.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = bytearray()
+                self._last[term] = 0
+                self._df[term] = 0
+                for char in set(term):
+                    if char not in self._owned_chars:
+                        self._char_terms[char] = list(self._char_terms.get(char, ()))
+                        self._owned_chars.add(char)
+                    self._char_terms[char].append(term)
+            elif term not in self._owned:
+                postings = self._postings[term] = bytearray(postings)
+            self._owned.add(term)
+            _put_varint(postings, ordinal - self._last[term])
+            _put_varint(postings, count)
+            self._last[term] = ordinal
+            self._df[term] += 1
+            self._decoded.pop(term, None)
+
+    def _postings_for(self, term: str) -> Tuple[array, array]:
+        decoded = self._decoded.get(term)
+        if decoded is None:
+            decoded = _decode_postings(self._postings[term])
+            self._decoded[term] = decoded
+            if len(self._decoded) > DECODED_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        else:
+            self._decoded.move_to_end(term)
+        return decoded
+
+    def _idf(self, term: str) -> float:
+        docs = len(self.doc_lengths)
+        df = self._df[term]
+        return math.log(1 + (docs - df + 0.5) / (df + 0.5))
+
+    def _term_postings(self, term: str) -> List[Tuple[float, array, array]]:
+        """(idf, ordinals, tfs) of every indexed n-gram that matches a query n-gram"""
+        if len(term) < self.n:
+            # Shorter than an n-gram: every n-gram containing it matches
+            candidates = [t for t in self._char_terms.get(term[0], []) if term in t]
+        else:
+            candidates = [term] if term in self._postings else []
+        return [(self._idf(t), *self._postings_for(t)) for t in candidates]
+
+    def _groups(self, query: str) -> List[List[Tuple[float, array, array]]]:
+        terms = dict.fromkeys(tokenize(query, self.n))
+        return [self._term_postings(term) for term in terms]
+
+    def match(self, query: str) -> Set[int]:
+        """Ordinals containing every n-gram of query (set operations only, no scoring)"""
+        return self._match(self._groups(query))
+
+    @staticmethod
+    def _match(groups: List[List[Tuple[float, array, array]]]) -> Set[int]:
+        if not groups:
+            return set()
+        sets = [set().union(*(ordinals for _, ordinals, _ in group)) for group in groups]
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self, query: str) -> Dict[int, float]:
+        """Ordinals containing every n-gram of query, with BM25 scores"""
+        groups = self._groups(query)
+        matched = self._match(groups)
+        if not matched:
+            return {}
+
+        lengths = self.doc_lengths
+        average = self._total_length / max(len(lengths), 1)
+        k1_plus_1 = BM25_K1 + 1
+        scores = dict.fromkeys(matched, 0.0)
+        for group in groups:
+            best: Dict[int, float] = {}
+            for idf, ordinals, tfs in group:
+                if len(matched) * 16 < len(ordinals):
+                    # Few matches: probe this posting list
+                    hits = []
+                    for ordinal in matched:
+                        i = bisect_left(ordinals, ordinal)
+                        if i < len(ordinals) and ordinals[i] == ordinal:
+                            hits.append((ordinal, tfs[i]))
+                else:
+                    hits = [(o, tf) for o, tf in zip(ordinals, tfs) if o in scores]
+                for ordinal, tf in hits:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ordinal] / average)
+                    score = idf * tf * k1_plus_1 / (tf + norm)
+                    if score > best.get(ordinal, 0.0):
+                        best[ordinal] = score
+            for ordinal, score in best.items():
+                scores[ordinal] += score
+        return scores
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "terms": len(self._postings),
+            "postings_bytes": sum(len(p) for p in self._postings.values()),
+            "documents": len(self.doc_lengths),
+        }
@@ -0,0 +1,436 @@
+"""
+Incrementally maintained pack statistics (PackStats on every pack)
+
+Counting user_favorites / conversation_sessions / reviews per request does
+not scale, so:
+
+- Write paths record favorite and review deltas in memory (favorite,
+  unfavorite, review); recording is an addition with no I/O or lock
+- A background task flushes the deltas write-behind to pack_stats as one
+  additive UPSERT per shard, then reloads rows other workers changed.
+  Each batch has an id that commits with it (pack_stats_batches), so a
+  batch retried after an ambiguous failure is added exactly once
+- conversation_count is recounted: a periodic job groups
+  conversation_sessions by character, maps characters to packs through
+  the catalog index's pack items and writes the packs whose count changed
+- Reads are base row + this worker's unflushed deltas, including the ones
+  a flush is writing at that moment; they never touch the source tables
+  (or the database at all)
+
+favorites and reviews have no recount (user_favorites and reviews are not
+modeled yet), and their write paths do not exist yet either.
+"""
+import asyncio
+import logging
+import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationSession
+from app.models.pack_stats import PackStat, PackStatsBatch
+from app.schemas.catalog import Pack, PackStats
+from app.services.catalog_index import CatalogIndexManager, catalog_index
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Totals:
+    """Counter values of one pack (absolute or delta)"""
+
+    favorites: int = 0
+    conversations: int = 0
+    reviews: int = 0
+    rating_sum: int = 0
+
+    def add(self, other: "Totals") -> None:
+        self.favorites += other.favorites
+        self.conversations += other.conversations
+        self.reviews += other.reviews
+        self.rating_sum += other.rating_sum
+
+    def is_zero(self) -> bool:
+        return not (self.favorites or self.conversations or self.reviews or self.rating_sum)
+
+    def to_schema(self) -> PackStats:
+        return PackStats(
+            favorite_count=max(self.favorites, 0),
+            conversation_count=max(self.conversations, 0),
+            review_count=max(self.reviews, 0),
+            average_rating=round(self.rating_sum / self.reviews, 2) if self.reviews > 0 else None,
+        )
+
+
+def _to_totals(row: PackStat) -> Totals:
+    return Totals(
+        favorites=row.favorite_count,
+        conversations=row.conversation_count,
+        reviews=row.review_count,
+        rating_sum=row.rating_sum,
+    )
+
+
+# =============================================================================
+# Counters
+# =============================================================================
+
+
+class PackStatsCounters:
+    """
+    Per-process pack counters with write-behind persistence
+
+    Deltas live in shards keyed by pack id; a flush swaps one shard out
+    at a time, so each UPSERT batch stays bounded and writers keep
+    adding to fresh dicts while it runs. The swapped-out shard stays
+    readable until its deltas are part of the base totals; when its
+    write fails it stays as it is, batch id included, and the next flush
+    writes it again before the newer deltas.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        flush_seconds: float,
+        recount_seconds: float = 300,
+        batch_retention_seconds: float = 86400,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        index: CatalogIndexManager = catalog_index,
+    ) -> None:
+        self.flush_seconds = flush_seconds
+        self.recount_seconds = recount_seconds
+        self.batch_retention_seconds = batch_retention_seconds
+        self.session_factory = session_factory
+        self.index = index
+        self._shards: List[Dict[str, Totals]] = [{} for _ in range(max(shards, 1))]
+        # Per shard: the deltas a flush is writing (read by get() until they are in _base) and their batch id
+        self._flushing: List[Dict[str, Totals]] = [{} for _ in self._shards]
+        self._batch_ids: List[str] = ["" for _ in self._shards]
+        self._base: Dict[str, Totals] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_failures = 0
+        self.duplicate_batches = 0
+        self.recounts = 0
+        self.recounted_packs = 0
+
+    # -------------------------------------------------------------------------
+    # Write paths (call after the source transaction commits)
+    # -------------------------------------------------------------------------
+
+    def _shard_index(self, pack_id: str) -> int:
+        return zlib.crc32(pack_id.encode()) % len(self._shards)
+
+    def record(
+        self,
+        pack_id: str,
+        favorites: int = 0,
+        conversations: int = 0,
+        reviews: int = 0,
+        rating_sum: int = 0,
+    ) -> None:
+        shard = self._shards[self._shard_index(pack_id)]
+        pending = shard.get(pack_id)
+        if pending is None:
+            pending = shard[pack_id] = Totals()
+        pending.favorites += favorites
+        pending.conversations += conversations
+        pending.reviews += reviews
+        pending.rating_sum += rating_sum
+        self.recorded += 1
+
+    def record_favorite(self, pack_id: str, favorited: bool) -> None:
+        """Favorite (True) or unfavorite (False)"""
+        self.record(pack_id, favorites=1 if favorited else -1)
+
+    def record_review(self, pack_id: str, rating: Optional[int], previous_rating: Optional[int] = None) -> None:
+        """
+        A review was posted, edited or deleted
+
+        Args:
+            rating: New rating (None when the review was deleted)
+            previous_rating: Rating before an edit / delete (None for a new review)
+        """
+        reviews = (rating is not None) - (previous_rating is not None)
+        self.record(pack_id, reviews=reviews, rating_sum=(rating or 0) - (previous_rating or 0))
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def get(self, pack_id: str) -> Optional[Totals]:
+        """Current totals, or None when neither pack_stats nor this worker knows the pack"""
+        base = self._base.get(pack_id)
+        i = self._shard_index(pack_id)
+        deltas = [d for d in (self._flushing[i].get(pack_id), self._shards[i].get(pack_id)) if d is not None]
+        if not deltas:
+            return base
+        current = Totals() if base is None else Totals(**base.__dict__)
+        for delta in deltas:
+            current.add(delta)
+        return current
+
+    def apply(self, packs: Sequence[Pack]) -> List[Pack]:
+        """packs with stats replaced by the live counters (others returned as is)"""
+        result = []
+        for pack in packs:
+            totals = self.get(pack.id)
+            result.append(pack if totals is None else pack.model_copy(update={"stats": totals.to_schema()}))
+        return result
+
+    # -------------------------------------------------------------------------
+    # Flush / reload
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _insert(db: AsyncSession) -> Callable:
+        return postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+
+    async def flush(self) -> int:
+        """Write every shard's deltas to pack_stats; returns rows written"""
+        written = 0
+        async with self._lock:
+            for i in range(len(self._shards)):
+                if self._flushing[i]:
+                    # A failed batch first, under its own id: its commit may have succeeded
+                    written += await self._write_batch(i)
+                pending, self._shards[i] = self._shards[i], {}
+                if not pending:
+                    continue
+                self._flushing[i] = pending
+                self._batch_ids[i] = str(uuid.uuid4())
+                written += await self._write_batch(i)
+            self.flushes += 1
+            self.flushed_rows += written
+        return written
+
+    async def _write_batch(self, i: int) -> int:
+        try:
+            written = await self._flush_shard(self._batch_ids[i], self._flushing[i])
+        except Exception:
+            self.flush_failures += 1
+            raise
+        self._flushing[i] = {}
+        return written
+
+    async def _flush_shard(self, batch_id: str, pending: Dict[str, Totals]) -> int:
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "pack_id": pack_id,
+                "favorite_count": delta.favorites,
+                "conversation_count": delta.conversations,
+                "review_count": delta.reviews,
+                "rating_sum": delta.rating_sum,
+                "updated_at": now,
+            }
+            for pack_id, delta in pending.items()
+            if not delta.is_zero()
+        ]
+        if rows:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    self._insert(db)(PackStatsBatch)
+                    .values(batch_id=batch_id, applied_at=now)
+                    .on_conflict_do_nothing(index_elements=[PackStatsBatch.batch_id])
+                )
+                if result.rowcount == 0:
+                    # An earlier attempt committed and then failed: take the rows as they are now
+                    stored = await db.execute(select(PackStat).where(PackStat.pack_id.in_(list(pending))))
+                    for row in stored.scalars():
+                        self._base[row.pack_id] = _to_totals(row)
+                    self.duplicate_batches += 1
+                    return 0
+                stmt = self._insert(db)(PackStat).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[PackStat.pack_id],
+                    set_={
+                        "favorite_count": PackStat.favorite_count + stmt.excluded.favorite_count,
+                        "conversation_count": PackStat.conversation_count + stmt.excluded.conversation_count,
+                        "review_count": PackStat.review_count + stmt.excluded.review_count,
+                        "rating_sum": PackStat.rating_sum + stmt.excluded.rating_sum,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                )
+                await db.execute(stmt)
+                await db.commit()
+
+        # Our own writes are visible immediately (the caller then stops reading
+        # pending separately, with no await in between); reload() brings other workers'
+        for pack_id, delta in pending.items():
+            base = self._base.get(pack_id)
+            if base is None:
+                self._base[pack_id] = Totals(**delta.__dict__)
+            else:
+                base.add(delta)
+        return len(rows)
+
+    # -------------------------------------------------------------------------
+    # Recount / pruning
+    # -------------------------------------------------------------------------
+
+    async def recount(self) -> int:
+        """
+        Set conversation_count of every indexed pack from conversation_sessions
+
+        Packs outside the catalog index are left alone, so a stale or empty
+        index never resets counts.
+
+        Returns:
+            Number of packs whose count changed
+        """
+        packs_of: Dict[str, List[str]] = {}
+        counts: Dict[str, int] = {}
+        index = self.index.current
+        for pack_id in index.ordinals:
+            counts[pack_id] = 0
+            for item in index.items.get(pack_id, ()):
+                if item.item_type == "character":
+                    packs_of.setdefault(item.item_id, []).append(pack_id)
+
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            sessions = await db.execute(
+                select(ConversationSession.character_id, func.count()).group_by(ConversationSession.character_id)
+            )
+            for character_id, count in sessions.all():
+                for pack_id in packs_of.get(character_id, ()):
+                    counts[pack_id] += count
+            stored = await db.execute(
+                select(PackStat.pack_id, PackStat.conversation_count).where(PackStat.conversation_count != 0)
+            )
+            current = dict(stored.all())
+            rows = [
+                {
+                    "pack_id": pack_id,
+                    "favorite_count": 0,
+                    "conversation_count": count,
+                    "review_count": 0,
+                    "rating_sum": 0,
+                    "updated_at": now,
+                }
+                for pack_id, count in counts.items()
+                if current.get(pack_id, 0) != count
+            ]
+            if rows:
+                stmt = self._insert(db)(PackStat.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[PackStat.pack_id],
+                    set_={"conversation_count": stmt.excluded.conversation_count, "updated_at": stmt.excluded.updated_at},
+                )
+                await db.execute(stmt, rows)
+                await db.commit()
+        self.recounts += 1
+        self.recounted_packs += len(rows)
+        return len(rows)
+
+    async def prune_batches(self) -> int:
+        """Forget applied batch ids older than the retention; returns rows deleted"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.batch_retention_seconds)
+        async with self.session_factory() as db:
+            result = await db.execute(delete(PackStatsBatch).where(PackStatsBatch.applied_at < cutoff))
+            await db.commit()
+            return result.rowcount
+
+    async def reload(self) -> int:
+        """Pull pack_stats rows changed since the last reload; returns rows read"""
+        async with self._lock:
+            async with self.session_factory() as db:
+                query = select(PackStat)
+                if self._loaded_until is not None:
+                    # Overlap so rows committed late with an earlier updated_at are not missed
+                    since = self._loaded_until.timestamp() - 2 * self.flush_seconds
+                    query = query.where(PackStat.updated_at >= datetime.fromtimestamp(since, timezone.utc))
+                rows = (await db.execute(query)).scalars().all()
+            for row in rows:
+                self._base[row.pack_id] = _to_totals(row)
+                updated_at = row.updated_at if row.updated_at.tzinfo else row.updated_at.replace(tzinfo=timezone.utc)
+                if self._loaded_until is None or updated_at > self._loaded_until:
+                    self._loaded_until = updated_at
+            return len(rows)
+
+    # -------------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------------
+
+    async def start(self) -> None:
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception("Initial pack stats load failed")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            unwritten = self.pending_packs + sum(len(batch) for batch in self._flushing)
+            logger.exception("Final pack stats flush failed; %d packs lost", unwritten)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_recount = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Pack stats flush failed")
+            if loop.time() >= next_recount:
+                next_recount = loop.time() + self.recount_seconds
+                try:
+                    await self.recount()
+                    await self.prune_batches()
+                except Exception:
+                    logger.exception("Pack stats recount failed")
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("Pack stats reload failed")
+
+    @property
+    def pending_packs(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "packs": len(self._base),
+            "pending_packs": self.pending_packs,
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_failures": self.flush_failures,
+            "duplicate_batches": self.duplicate_batches,
+            "recounts": self.recounts,
+            "recounted_packs": self.recounted_packs,
+        }
+
+
+pack_stats = PackStatsCounters(
+    shards=settings.PACK_STATS_SHARDS,
+    flush_seconds=settings.PACK_STATS_FLUSH_SECONDS,
+    recount_seconds=settings.PACK_STATS_RECOUNT_SECONDS,
+    batch_retention_seconds=settings.PACK_STATS_BATCH_RETENTION_SECONDS,
+)
+register_metrics("pack_stats", pack_stats.stats)
@@ -0,0 +1,588 @@
+"""
+Streamed assistant replies (POST /threads/{thread_id}/messages:stream)
+
+Pipeline of one reply:
+
+1. The thread is checked and the prompt built before the response starts
+   (app.services.turn_pipeline); the user message is written in the
+   background and the input moderation check runs next to the LLM
+   request: no token is sent before it passes, a flagged message cancels
+   the request and ends the stream with an `error` (content_filtered)
+2. message_start announces the user and assistant message ids; if no
+   token arrived after LLM_WAITING_NOTICE_SECONDS a `waiting` event
+   tells the client the reply is delayed (NFR-P10). The LLM call itself
+   is bounded by the dispatcher's first-token deadline, hedging and
+   fallback (app.services.llm.dispatch)
+3. A producer task reads LLM chunks into a bounded queue; the stream
+   coalesces them into content_delta frames. The first delta is sent at
+   once (time to first token); after that a frame is flushed when it
+   reaches SSE_COALESCE_MAX_CHARS or SSE_COALESCE_MAX_DELAY_MS after its
+   first delta, so ~1-token LLM chunks do not each cost an SSE event
+4. message_done carries finish_reason and usage
+5. The assistant message is queued for a batched write once the user
+   message is (app.services.message_writes); a reply cut off by client disconnect, LLM failure or
+   shutdown is saved with what was streamed and finish_reason
+   "interrupted"
+
+Backpressure: StreamingResponse asks for the next frame only after the
+previous one was accepted by the server's transport. While a client is
+slow the queue fills, the producer stops reading the upstream response
+and the provider's TCP window closes; at most SSE_STREAM_BUFFER_CHUNKS
+chunks are held here per stream. Whatever queued up meanwhile goes out
+as fewer, larger frames.
+
+Disconnect: the router detaches the client as soon as the connection
+closes (also while waiting for the LLM) and the generation is cancelled,
+which closes the upstream request so no further tokens are paid for.
+With SSE_RESUME_GRACE_SECONDS > 0 the cancel waits that long for a
+reconnect (GET /threads/{thread_id}/messages/{message_id}:stream with
+Last-Event-ID) first. No DB session is held while streaming.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict, List, Optional, Sequence, Set
+
+from app.core.config import settings
+from app.core.drain import StreamTicket, drain_coordinator
+from app.core.errors import ErrorCode
+from app.core.metrics import register_metrics
+from app.core.sse import format_sse_event
+from app.schemas.conversation import (
+    SSEContentDelta,
+    SSEError,
+    SSEMessageDone,
+    SSEMessageStart,
+    SSEUsage,
+    SSEWaiting,
+)
+from app.services.generation_guard import GenerationLease
+from app.services.llm import ChatMessage, LLMChunk, LLMError, LLMProvider, LLMTimeoutError, llm_provider
+from app.services.message_writes import message_writes
+from app.services.moderation import ModerationResult
+from app.services.stream_replay import ReplayReader, stream_replay
+
+logger = logging.getLogger(__name__)
+
+# finish_reason values of SSEMessageDone
+FINISH_REASONS = ("stop", "length", "content_filter")
+# Stored finish_reason of a reply that was cut off (partial content)
+INTERRUPTED = "interrupted"
+
+_END = object()
+# Marker of notify_waiting: no item within after_seconds
+WAITING = LLMChunk()
+
+
+class InputFlagged(Exception):
+    """The user message of a reply was flagged by moderation"""
+
+    def __init__(self, result: ModerationResult) -> None:
+        super().__init__(", ".join(result.categories) or "flagged")
+        self.result = result
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: Exception) -> None:
+        self.exc = exc
+
+
+# =============================================================================
+# Delta Coalescing
+# =============================================================================
+
+
+async def coalesce_deltas(
+    chunks: AsyncIterator[LLMChunk],
+    max_chars: int = settings.SSE_COALESCE_MAX_CHARS,
+    max_delay_seconds: float = settings.SSE_COALESCE_MAX_DELAY_MS / 1000,
+    buffer_chunks: int = settings.SSE_STREAM_BUFFER_CHUNKS,
+) -> AsyncIterator[LLMChunk]:
+    """
+    Merge consecutive deltas of chunks into size- and time-bounded frames
+
+    The final chunk (finish_reason / usage) is passed through after the
+    last frame. max_delay_seconds <= 0 disables coalescing. Errors of the
+    source are raised here; leaving the iteration early cancels the
+    producer, which closes the source.
+    """
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, buffer_chunks))
+
+    async def produce() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put(_Failure(exc))
+        finally:
+            await chunks.aclose()
+
+    producer = asyncio.create_task(produce())
+    loop = asyncio.get_running_loop()
+    try:
+        parts: List[str] = []
+        size = 0
+        deadline = 0.0
+        first = True
+        while True:
+            if parts:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        item = None
+                    else:
+                        try:
+                            item = await asyncio.wait_for(queue.get(), remaining)
+                        except asyncio.TimeoutError:
+                            item = None
+                if item is None:
+                    yield LLMChunk(delta="".join(parts))
+                    parts, size = [], 0
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                if parts:
+                    yield LLMChunk(delta="".join(parts))
+                raise item.exc
+            if not item.delta:
+                # Final chunk: flush, then pass it through
+                if parts:
+                    yield LLMChunk(delta="".join(parts))
+                    parts, size = [], 0
+                yield item
+                continue
+            if first or max_delay_seconds <= 0:
+                first = False
+                yield item
+                continue
+            if not parts:
+                deadline = loop.time() + max_delay_seconds
+            parts.append(item.delta)
+            size += len(item.delta)
+            if size >= max_chars:
+                yield LLMChunk(delta="".join(parts))
+                parts, size = [], 0
+        if parts:
+            yield LLMChunk(delta="".join(parts))
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+async def notify_waiting(source: AsyncIterator[LLMChunk], after_seconds: float) -> AsyncIterator[LLMChunk]:
+    """
+    Pass source through, yielding WAITING once if its first item takes
+    longer than after_seconds (<= 0: never)
+    """
+    iterator = source.__aiter__()
+    if after_seconds > 0:
+        first = asyncio.ensure_future(iterator.__anext__())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=after_seconds)
+            if not done:
+                yield WAITING
+            try:
+                item = await first
+            except StopAsyncIteration:
+                return
+        finally:
+            if not first.done():
+                first.cancel()
+                await asyncio.wait({first})
+        yield item
+    async for item in iterator:
+        yield item
+
+
+async def hold_until_passed(
+    source: AsyncIterator[LLMChunk], gate: "Awaitable[ModerationResult]"
+) -> AsyncIterator[LLMChunk]:
+    """
+    Start source at once, but pass nothing on before gate passes
+
+    The first item is requested right away (the speculative LLM request);
+    a flagged verdict cancels it and raises InputFlagged. gate is shielded:
+    leaving early does not cancel the check others wait on.
+    """
+    iterator = source.__aiter__()
+    first = asyncio.ensure_future(iterator.__anext__())
+    try:
+        result = await asyncio.shield(gate)
+        if result.flagged:
+            raise InputFlagged(result)
+        try:
+            item = await first
+        except StopAsyncIteration:
+            return
+    finally:
+        if not first.done():
+            first.cancel()
+            await asyncio.wait({first})
+    yield item
+    async for item in iterator:
+        yield item
+
+
+# =============================================================================
+# Reply Stream
+# =============================================================================
+
+
+class ReplyStream:
+    """
+    One assistant reply: generation task plus the SSE events it produces
+
+    The generation (LLM stream, coalescing, persistence) runs in its own
+    task and appends events to a replay buffer (app.services.stream_replay);
+    responses are readers of that buffer - the original POST and any
+    resume with Last-Event-ID. Backpressure of attached readers reaches
+    the LLM read through the buffer.
+
+    When the last reader leaves (client disconnect) cancel() stops the
+    generation, at once by default or after SSE_RESUME_GRACE_SECONDS
+    without a reconnect: the upstream request is closed and the
+    partial answer is saved with finish_reason "interrupted". All cleanup
+    runs in the generation task, never in the cancelled response task
+    (which the server keeps cancelling at every await).
+
+    The generation's lease (app.services.generation_guard) is released
+    when the generation task ends, after the user message write; a
+    superseding send cancels it. gate is the moderation check the first
+    token waits for, user_write the user message insert the reply's insert
+    follows, on_done gets the usage of a completed reply.
+
+    content / finish_reason / usage hold what has been streamed so far.
+    """
+
+    def __init__(
+        self,
+        thread_id: str,
+        user_id: str,
+        user_message_id: str,
+        assistant_message_id: str,
+        messages: Sequence[ChatMessage],
+        provider: LLMProvider = llm_provider,
+        lease: Optional[GenerationLease] = None,
+        gate: "Optional[Awaitable[ModerationResult]]" = None,
+        user_write: Optional[asyncio.Task] = None,
+        on_done: Optional[Callable[[Optional[SSEUsage]], None]] = None,
+    ) -> None:
+        self.thread_id = thread_id
+        self.user_message_id = user_message_id
+        self.assistant_message_id = assistant_message_id
+        self.messages = messages
+        self.provider = provider
+        self.lease = lease
+        self.gate = gate
+        self.user_write = user_write
+        self.on_done = on_done
+        self.content: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[SSEUsage] = None
+        self.buffer = stream_replay.open(assistant_message_id, user_id, thread_id)
+        self.buffer.on_idle = self._on_idle
+        self._generation: Optional[asyncio.Task] = None
+        self._grace: Optional[asyncio.Task] = None
+        self._saved = False
+
+    def start(self) -> ReplayReader:
+        """Start generating; returns the reader of the requesting client"""
+        reader = self.buffer.reader(0)
+        self._generation = asyncio.create_task(self._run())
+        return reader
+
+    def cancel(self) -> None:
+        """Stop generating; safe to call from any task, any number of times"""
+        if self._generation is not None and not self._generation.done():
+            self._generation.cancel()
+
+    def _on_idle(self) -> None:
+        if settings.SSE_RESUME_GRACE_SECONDS <= 0:
+            self.cancel()
+        elif self._grace is None or self._grace.done():
+            self._grace = asyncio.create_task(self._cancel_when_abandoned())
+
+    async def _cancel_when_abandoned(self) -> None:
+        """Cancel once no client has followed the reply for the grace period"""
+        grace = settings.SSE_RESUME_GRACE_SECONDS
+        while True:
+            await asyncio.sleep(max(0.0, grace - self.buffer.idle_seconds()))
+            if self.buffer.readers:
+                return
+            if self.buffer.idle_seconds() < grace:
+                continue  # reattached and left again meanwhile
+            if await stream_replay.attached_elsewhere(self.assistant_message_id):
+                await asyncio.sleep(grace)
+                continue
+            break
+        self.cancel()
+
+    async def _run(self) -> None:
+        try:
+            async with drain_coordinator.track_stream() as ticket:
+                await stream_replay.mirror_open(self.buffer)
+                events = self._generate(ticket)
+                try:
+                    if self.lease is not None:
+                        # Bound here so a supersede always lands inside this try
+                        self.lease.bind(self.cancel)
+                    async for event in events:
+                        await self.buffer.append(event)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Reply stream failed for thread %s", self.thread_id)
+                finally:
+                    await events.aclose()
+                    await self.buffer.close()
+                    stream_replay.release(self.buffer)
+                    if self._grace is not None:
+                        self._grace.cancel()
+        finally:
+            if self.user_write is not None:
+                # The next send's history must contain this turn's user message
+                await asyncio.wait({self.user_write})
+            if self.lease is not None:
+                await self.lease.release()
+
+    async def _generate(self, ticket: StreamTicket) -> AsyncIterator[str]:
+        yield format_sse_event(
+            "message_start",
+            SSEMessageStart(
+                user_message_id=self.user_message_id,
+                assistant_message_id=self.assistant_message_id,
+            ),
+        )
+
+        coalesced = coalesce_deltas(self.provider.stream(self.messages))
+        frames = notify_waiting(coalesced, settings.LLM_WAITING_NOTICE_SECONDS)
+        held = hold_until_passed(frames, self.gate) if self.gate is not None else frames
+        guarded = ticket.guard(held)
+        try:
+            async for chunk in guarded:
+                if chunk is WAITING:
+                    yield format_sse_event("waiting", SSEWaiting(message="応答の生成に時間がかかっています"))
+                elif chunk.delta:
+                    self.content.append(chunk.delta)
+                    yield format_sse_event("content_delta", SSEContentDelta(delta=chunk.delta))
+                else:
+                    self.finish_reason = chunk.finish_reason
+                    if chunk.usage is not None:
+                        self.usage = SSEUsage(
+                            prompt_tokens=chunk.usage.prompt_tokens,
+                            completion_tokens=chunk.usage.completion_tokens,
+                        )
+        except InputFlagged as exc:
+            logger.info("Reply for thread %s withheld by moderation: %s", self.thread_id, exc)
+            yield format_sse_event(
+                "error",
+                SSEError(code=ErrorCode.CONTENT_FILTERED, message="不適切な内容が含まれているため送信できません"),
+            )
+            return
+        except LLMError as exc:
+            logger.warning("LLM stream failed for thread %s: %s", self.thread_id, exc)
+            self._save(INTERRUPTED)
+            timeout = isinstance(exc, LLMTimeoutError)
+            yield format_sse_event(
+                "error",
+                SSEError(
+                    code=ErrorCode.REQUEST_TIMEOUT if timeout else ErrorCode.SERVICE_UNAVAILABLE,
+                    message="応答の生成がタイムアウトしました" if timeout else "応答の生成に失敗しました",
+                ),
+            )
+            return
+        except BaseException:
+            # Cancelled (client gone) or failed mid-reply
+            self._save(INTERRUPTED)
+            raise
+        finally:
+            await guarded.aclose()
+            await held.aclose()
+            await frames.aclose()
+            await coalesced.aclose()
+
+        if ticket.interrupted:
+            # Server is shutting down: keep the partial answer so the
+            # client can resume instead of re-sending the message
+            self._save(INTERRUPTED)
+            yield format_sse_event(
+                "error",
+                SSEError(
+                    code=ErrorCode.SERVICE_UNAVAILABLE,
+                    message="サーバーが再起動中です。再接続してください。",
+                    resumable=True,
+                    assistant_message_id=self.assistant_message_id,
+                ),
+                retry_ms=settings.SSE_RETRY_MILLISECONDS,
+            )
+            return
+
+        finish_reason = self.finish_reason if self.finish_reason in FINISH_REASONS else "stop"
+        # Scheduled before the yield: the write runs in the background either
+        # way, and a client leaving right at message_done does not lose it
+        self._save(finish_reason)
+        if self.on_done is not None:
+            self.on_done(self.usage)
+        yield format_sse_event(
+            "message_done",
+            SSEMessageDone(
+                assistant_message_id=self.assistant_message_id,
+                finish_reason=finish_reason,
+                usage=self.usage,
+            ),
+        )
+
+    def _save(self, finish_reason: str) -> None:
+        if self._saved:
+            return
+        self._saved = True
+        reply_writes.save_reply(
+            self.thread_id, self.assistant_message_id, "".join(self.content), finish_reason, after=self.user_write
+        )
+
+
+# =============================================================================
+# Persistence
+# =============================================================================
+
+
+class HistoryReads:
+    """Conversation rows read per turn (stays flat as threads grow)"""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.rows = 0
+
+    def record(self, rows: int) -> None:
+        self.turns += 1
+        self.rows += rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "rows": self.rows}
+
+
+class ReplyWrites:
+    """
+    Message writes kept off the stream's critical path
+
+    Each write runs as its own task and hands the message to the
+    write-behind queue (app.services.message_writes); shutdown awaits the
+    pending ones (after the SSE drain, before the queue's final flush).
+    The user message waits for its moderation verdict (a flagged one is
+    not stored), the reply for the user message (after=), so created_at
+    keeps the turn order.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.interrupted = 0
+        self.filtered = 0
+        self.failed = 0
+
+    def save_user_message(
+        self,
+        thread_id: str,
+        message_id: str,
+        content: str,
+        gate: "Optional[Awaitable[ModerationResult]]" = None,
+    ) -> asyncio.Task:
+        return self._schedule(self._save_user_message(thread_id, message_id, content, gate))
+
+    def save_reply(
+        self,
+        thread_id: str,
+        message_id: str,
+        content: str,
+        finish_reason: str,
+        after: Optional[asyncio.Task] = None,
+    ) -> None:
+        if not content:
+            return
+        if finish_reason == INTERRUPTED:
+            self.interrupted += 1
+        self._schedule(self._save_reply(thread_id, message_id, content, finish_reason, after))
+
+    def _schedule(self, write: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(write)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        self.scheduled += 1
+        return task
+
+    async def _save_user_message(
+        self,
+        thread_id: str,
+        message_id: str,
+        content: str,
+        gate: "Optional[Awaitable[ModerationResult]]",
+    ) -> None:
+        if gate is not None:
+            try:
+                result = await asyncio.shield(gate)
+            except asyncio.CancelledError:
+                return  # the turn failed before its reply
+            if result.flagged:
+                self.filtered += 1
+                return
+        await self._save(thread_id, "user", message_id, content)
+
+    async def _save_reply(
+        self,
+        thread_id: str,
+        message_id: str,
+        content: str,
+        finish_reason: str,
+        after: Optional[asyncio.Task],
+    ) -> None:
+        if after is not None:
+            await asyncio.wait({after})
+        await self._save(thread_id, "character", message_id, content, finish_reason)
+
+    async def _save(
+        self,
+        thread_id: str,
+        role: str,
+        message_id: str,
+        content: str,
+        finish_reason: Optional[str] = None,
+    ) -> None:
+        try:
+            await message_writes.put(thread_id, role, content, message_id, finish_reason)
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to persist %s message for thread %s", role, thread_id)
+
+    async def flush(self) -> None:
+        """Wait for every pending write"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "scheduled": self.scheduled,
+            "interrupted": self.interrupted,
+            "filtered": self.filtered,
+            "failed": self.failed,
+        }
+
+
+history_rows = HistoryReads()
+register_metrics("history_reads", history_rows.stats)
+reply_writes = ReplyWrites()
+register_metrics("reply_writes", reply_writes.stats)
@@ -0,0 +1,435 @@
+"""
+Replay buffers for resumable reply streams (Last-Event-ID)
+
+Every event of a reply generation carries an id - its sequence number,
+1 = message_start - and stays in a bounded per-generation buffer
+(SSE_REPLAY_BUFFER_EVENTS). A client whose connection dropped reconnects
+with Last-Event-ID and gets the events after that id, then the live ones
+of the same, still running generation (no second LLM call).
+
+Backends (SSE_REPLAY_BACKEND):
+    memory - buffers live in this worker only; a resume has to reach the
+             worker running the generation, otherwise it gets 404
+    redis  - events are also mirrored to one Redis stream per generation
+             (XADD with ids 0-<seq>, trimmed to the buffer size), so any
+             node can serve the resume. Needs the redis package; without
+             it the memory backend is used.
+
+Buffers expire SSE_REPLAY_TTL_SECONDS after the generation completes
+(Redis keys: after their last write, so a crashed node leaves nothing
+behind).
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.errors import ConflictException, ErrorCode, NotFoundException, ServiceUnavailableException
+from app.core.metrics import register_metrics
+from app.core.sse import format_sse_event
+from app.schemas.conversation import SSEError
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - optional dependency
+    aioredis = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Events an attached reader may lag behind the generation before append() waits
+READ_AHEAD = 2
+
+# Redis: XREAD block per round trip, and lifetime of a remote reader's presence key
+REDIS_BLOCK_MS = 1000
+REDIS_ATTACHED_MS = 3000
+
+
+def _replay_gone() -> ConflictException:
+    return ConflictException("ストリームを再開できません。メッセージ履歴から取得してください。")
+
+
+# =============================================================================
+# In-process Buffer
+# =============================================================================
+
+
+class ReplayBuffer:
+    """
+    Events of one generation, in memory
+
+    The generation appends; readers iterate from their own cursor. While
+    readers are attached, append() waits until each is at most READ_AHEAD
+    events behind, so a slow client still slows the generation down (its
+    coalescer then merges deltas) instead of growing the buffer.
+    """
+
+    def __init__(
+        self,
+        message_id: str,
+        user_id: str,
+        thread_id: str,
+        capacity: int,
+        mirror: Optional["RedisReplayMirror"] = None,
+    ) -> None:
+        self.message_id = message_id
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.last_seq = 0
+        self.done = False
+        self.on_idle: Optional[Callable[[], None]] = None
+        self._events: Deque[Tuple[int, str]] = deque(maxlen=max(READ_AHEAD, capacity))
+        self._readers: Set["ReplayReader"] = set()
+        self._changed = asyncio.Event()
+        self._idle_since: Optional[float] = None
+        self._mirror = mirror
+
+    @property
+    def first_seq(self) -> int:
+        """Oldest id still replayable"""
+        return self._events[0][0] if self._events else self.last_seq + 1
+
+    @property
+    def readers(self) -> int:
+        return len(self._readers)
+
+    def idle_seconds(self) -> float:
+        """Time since the last reader left (0 while one is attached)"""
+        if self._readers or self._idle_since is None:
+            return 0.0
+        return asyncio.get_running_loop().time() - self._idle_since
+
+    async def append(self, frame: str) -> None:
+        """Add an SSE frame (an id line is prepended)"""
+        while self._readers and self.last_seq - min(r.cursor for r in self._readers) >= READ_AHEAD:
+            await self._wait()
+        self.last_seq += 1
+        event = f"id: {self.last_seq}\n{frame}"
+        self._events.append((self.last_seq, event))
+        self._notify()
+        if self._mirror is not None:
+            await self._mirror.append(self.message_id, self.last_seq, event)
+
+    async def close(self) -> None:
+        """Mark the generation complete; readers end after the last event"""
+        if self.done:
+            return
+        self.done = True
+        self._notify()
+        if self._mirror is not None:
+            await self._mirror.finish(self.message_id, self.last_seq)
+
+    def reader(self, after: int) -> "ReplayReader":
+        """
+        Attach a reader positioned after event id `after` (0 = from the start)
+
+        Raises:
+            ConflictException: If events after `after` were already dropped
+        """
+        if after < self.first_seq - 1:
+            raise _replay_gone()
+        reader = ReplayReader(self, after)
+        self._readers.add(reader)
+        self._idle_since = None
+        return reader
+
+    def _detach(self, reader: "ReplayReader") -> None:
+        if reader not in self._readers:
+            return
+        self._readers.discard(reader)
+        self._notify()
+        if not self._readers and not self.done:
+            self._idle_since = asyncio.get_running_loop().time()
+            if self.on_idle is not None:
+                self.on_idle()
+
+    async def _wait(self) -> None:
+        await self._changed.wait()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class ReplayReader:
+    """One client's position in a ReplayBuffer; close() ends its iteration (client gone)"""
+
+    def __init__(self, buffer: ReplayBuffer, after: int) -> None:
+        self._buffer = buffer
+        self.cursor = after
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        self._buffer._detach(self)
+
+    async def events(self) -> AsyncIterator[str]:
+        buffer = self._buffer
+        try:
+            while not self.closed:
+                pending = [entry for entry in buffer._events if entry[0] > self.cursor]
+                if not pending:
+                    if buffer.done:
+                        return
+                    await buffer._wait()
+                    continue
+                for seq, event in pending:
+                    yield event
+                    if self.closed:
+                        return
+                    self.cursor = seq
+                    buffer._notify()
+        finally:
+            self.close()
+
+
+# =============================================================================
+# Redis Mirror
+# =============================================================================
+
+
+class RedisReplayMirror:
+    """
+    Copy of the replay buffers in Redis streams, for resumes on other nodes
+
+    Keys (all expiring SSE_REPLAY_TTL_SECONDS after their last write):
+        sse:replay:{message_id}           stream of events, entry id 0-<seq>;
+                                          an entry with field "end" closes it
+        sse:replay:{message_id}:owner     hash user_id / thread_id
+        sse:replay:{message_id}:attached  set while a remote reader is attached
+
+    Write failures are counted and logged; the local stream goes on.
+    """
+
+    def __init__(self, url: str, capacity: int, ttl_seconds: int) -> None:
+        self._client = aioredis.from_url(url, decode_responses=True)
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.failed = 0
+
+    @staticmethod
+    def _key(message_id: str) -> str:
+        return f"sse:replay:{message_id}"
+
+    async def open(self, message_id: str, user_id: str, thread_id: str) -> None:
+        owner = f"{self._key(message_id)}:owner"
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.hset(owner, mapping={"user_id": user_id, "thread_id": thread_id})
+                pipe.expire(owner, self.ttl_seconds)
+                await pipe.execute()
+        except RedisError:
+            self._failed(message_id)
+
+    async def append(self, message_id: str, seq: int, event: str) -> None:
+        key = self._key(message_id)
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.xadd(key, {"event": event}, id=f"0-{seq}", maxlen=self.capacity, approximate=True)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(f"{key}:owner", self.ttl_seconds)
+                await pipe.execute()
+        except RedisError:
+            self._failed(message_id)
+
+    async def finish(self, message_id: str, last_seq: int) -> None:
+        key = self._key(message_id)
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.xadd(key, {"end": "1"}, id=f"0-{last_seq + 1}", maxlen=self.capacity, approximate=True)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(f"{key}:owner", self.ttl_seconds)
+                await pipe.execute()
+        except RedisError:
+            self._failed(message_id)
+
+    async def owner(self, message_id: str) -> Optional[Dict[str, str]]:
+        owner = await self._client.hgetall(f"{self._key(message_id)}:owner")
+        return owner or None
+
+    async def first_seq(self, message_id: str) -> Optional[int]:
+        entries = await self._client.xrange(self._key(message_id), count=1)
+        return int(entries[0][0].split("-")[1]) if entries else None
+
+    async def attached(self, message_id: str) -> bool:
+        try:
+            return bool(await self._client.exists(f"{self._key(message_id)}:attached"))
+        except RedisError:
+            return False
+
+    def reader(self, message_id: str, after: int) -> "RedisReplayReader":
+        return RedisReplayReader(self._client, message_id, self._key(message_id), after)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _failed(self, message_id: str) -> None:
+        self.failed += 1
+        logger.warning("Failed to mirror replay buffer %s to Redis", message_id, exc_info=True)
+
+
+class RedisReplayReader:
+    """
+    Reader of a generation running on another node (XREAD BLOCK on its stream)
+
+    If Redis fails mid-stream the reader ends with a resumable `error`
+    event; the client reconnects with the id of the last event it got.
+    """
+
+    def __init__(self, client: Any, message_id: str, key: str, after: int) -> None:
+        self._client = client
+        self.message_id = message_id
+        self._key = key
+        self.cursor = after
+        self.closed = False
+        self.failed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+    async def events(self) -> AsyncIterator[str]:
+        try:
+            async for event in self._events():
+                yield event
+        except RedisError:
+            self.failed = True
+            logger.warning("Lost the Redis replay stream of %s after event %d", self.message_id, self.cursor, exc_info=True)
+            yield format_sse_event(
+                "error",
+                SSEError(
+                    code=ErrorCode.SERVICE_UNAVAILABLE,
+                    message="ストリームの中継に失敗しました。再接続してください。",
+                    resumable=True,
+                    assistant_message_id=self.message_id,
+                ),
+                retry_ms=settings.SSE_RETRY_MILLISECONDS,
+            )
+
+    async def _events(self) -> AsyncIterator[str]:
+        last = f"0-{self.cursor}"
+        while not self.closed:
+            # Keeps the owning node from cancelling the generation as abandoned
+            await self._client.set(f"{self._key}:attached", "1", px=REDIS_ATTACHED_MS)
+            response = await self._client.xread({self._key: last}, count=100, block=REDIS_BLOCK_MS)
+            if not response:
+                if not await self._client.exists(self._key):
+                    return
+                continue
+            for entry_id, fields in response[0][1]:
+                last = entry_id
+                if "end" in fields:
+                    return
+                yield fields["event"]
+                if self.closed:
+                    return
+                self.cursor = int(entry_id.split("-")[1])
+
+
+# =============================================================================
+# Registry
+# =============================================================================
+
+
+class StreamReplay:
+    """Replay buffers of this worker's generations, plus the optional Redis mirror"""
+
+    def __init__(self, capacity: int, ttl_seconds: int, mirror: Optional[RedisReplayMirror] = None) -> None:
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.mirror = mirror
+        self._buffers: Dict[str, ReplayBuffer] = {}
+        self.opened = 0
+        self.resumed = 0
+
+    def open(self, message_id: str, user_id: str, thread_id: str) -> ReplayBuffer:
+        """Buffer of a new generation (call mirror_open() from the generation task)"""
+        buffer = ReplayBuffer(message_id, user_id, thread_id, self.capacity, self.mirror)
+        self._buffers[message_id] = buffer
+        self.opened += 1
+        return buffer
+
+    async def mirror_open(self, buffer: ReplayBuffer) -> None:
+        if self.mirror is not None:
+            await self.mirror.open(buffer.message_id, buffer.user_id, buffer.thread_id)
+
+    def release(self, buffer: ReplayBuffer) -> None:
+        """Generation finished: drop the buffer after the TTL"""
+        asyncio.get_running_loop().call_later(self.ttl_seconds, self._expire, buffer)
+
+    def _expire(self, buffer: ReplayBuffer) -> None:
+        if self._buffers.get(buffer.message_id) is buffer:
+            del self._buffers[buffer.message_id]
+
+    async def resume(self, message_id: str, user_id: str, thread_id: str, after: int) -> Any:
+        """
+        Reader for a reconnecting client (ReplayReader or RedisReplayReader)
+
+        Raises:
+            NotFoundException: Unknown, expired or someone else's generation
+            ConflictException: Events after `after` were already dropped
+            ServiceUnavailableException: Redis could not be read
+        """
+        buffer = self._buffers.get(message_id)
+        if buffer is not None:
+            if buffer.user_id != user_id or buffer.thread_id != thread_id:
+                raise NotFoundException("ストリームが見つかりません")
+            reader = buffer.reader(after)
+        elif self.mirror is not None:
+            try:
+                owner = await self.mirror.owner(message_id)
+                first_seq = await self.mirror.first_seq(message_id)
+            except RedisError:
+                logger.warning("Failed to look up replay buffer %s in Redis", message_id, exc_info=True)
+                raise ServiceUnavailableException("ストリームを再開できません。しばらくしてから再接続してください。", retry_after=1)
+            if owner is None or owner.get("user_id") != user_id or owner.get("thread_id") != thread_id:
+                raise NotFoundException("ストリームが見つかりません")
+            if first_seq is None:
+                raise NotFoundException("ストリームが見つかりません")
+            if after < first_seq - 1:
+                raise _replay_gone()
+            reader = self.mirror.reader(message_id, after)
+        else:
+            raise NotFoundException("ストリームが見つかりません")
+        self.resumed += 1
+        return reader
+
+    async def attached_elsewhere(self, message_id: str) -> bool:
+        """True while a reader on another node follows this generation"""
+        return self.mirror is not None and await self.mirror.attached(message_id)
+
+    async def aclose(self) -> None:
+        if self.mirror is not None:
+            await self.mirror.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        buffers = list(self._buffers.values())
+        return {
+            "backend": "redis" if self.mirror is not None else "memory",
+            "buffers": len(buffers),
+            "running": sum(not b.done for b in buffers),
+            "events": sum(len(b._events) for b in buffers),
+            "opened": self.opened,
+            "resumed": self.resumed,
+            "mirror_failed": self.mirror.failed if self.mirror is not None else 0,
+        }
+
+
+def create_stream_replay() -> StreamReplay:
+    """Registry for SSE_REPLAY_BACKEND (memory | redis)"""
+    mirror = None
+    if settings.SSE_REPLAY_BACKEND == "redis":
+        if aioredis is None:
+            logger.warning("SSE_REPLAY_BACKEND=redis but redis is not installed; replay buffers stay in memory")
+        else:
+            mirror = RedisReplayMirror(
+                settings.REDIS_URL, settings.SSE_REPLAY_BUFFER_EVENTS, settings.SSE_REPLAY_TTL_SECONDS
+            )
+    elif settings.SSE_REPLAY_BACKEND != "memory":
+        raise ValueError(f"Unknown SSE_REPLAY_BACKEND: {settings.SSE_REPLAY_BACKEND}")
+    return StreamReplay(settings.SSE_REPLAY_BUFFER_EVENTS, settings.SSE_REPLAY_TTL_SECONDS, mirror)
+
+
+stream_replay = create_stream_replay()
+register_metrics("stream_replay", stream_replay.stats)
@@ -0,0 +1,390 @@
+"""
+Steps of a conversation turn before and after the reply
+
+Every await between the request and the LLM request adds to the time to
+first token. Steps that do not depend on each other run concurrently:
+
+    moderation  input check (app.services.moderation), started first; runs
+                next to everything below and to the LLM request, which
+                starts speculatively - no token reaches the client before
+                the check passes, a flagged message cancels the request
+    context     thread (ownership) ‖ newest history rows
+    prompt      user memory ‖ persona prefix (both need the thread's
+                character), then the prompt is built from the caches
+
+Off the critical path, as background tasks:
+
+    - the user message insert, once moderation passed (skipped when flagged)
+    - the assistant message, after the user message so created_at keeps
+      the turn order (ReplyWrites, after=)
+    - usage accounting and affection (TurnEffects) after the reply
+
+A failing step cancels its siblings (concurrently()); a turn that fails
+before the reply cancels its moderation check.
+
+TURN_PIPELINE_CONCURRENT=false runs every step in turn and commits the
+user message before the LLM request (the previous behavior; the baseline
+of scripts/bench_turn_pipeline.py). Stage durations are in /metrics
+(turn_pipeline).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Set, Tuple, TypeVar, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.errors import ContentFilteredException, ForbiddenException, NotFoundException
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+from app.schemas.conversation import SSEUsage
+from app.services.context_summaries import ContextSummarizer, context_summaries
+from app.services.conversation import ConversationService
+from app.services.llm import LLMUsage
+from app.services.message_writes import MessageWriteQueue, message_writes
+from app.services.moderation import InputModeration, ModerationResult, input_moderation
+from app.services.prompt_builder import Prompt, PromptBuilder, prompt_builder
+from app.services.reply_stream import ReplyWrites, history_rows, reply_writes
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def concurrently(*aws: Awaitable[Any]) -> Tuple[Any, ...]:
+    """
+    Await aws concurrently; results in argument order
+
+    Unlike asyncio.gather, the first failure cancels the others (and waits
+    for them) before it is raised as is, and cancelling the caller cancels
+    them all.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task.done() and task.exception() is not None:
+                raise task.exception()
+        return tuple(task.result() for task in tasks)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+# =============================================================================
+# Stage Timings
+# =============================================================================
+
+
+class StageTimings:
+    """Recent durations per pipeline stage (avg / p95 in /metrics)"""
+
+    def __init__(self, window: int = settings.TURN_STAGE_WINDOW) -> None:
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    async def timed(self, stage: str, aw: Awaitable[T]) -> T:
+        started = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            stats[stage] = {
+                "count": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            }
+        return stats
+
+
+# =============================================================================
+# Turn
+# =============================================================================
+
+
+@dataclass(frozen=True)
+class Turn:
+    """Thread of a new user message and the history before it"""
+
+    thread: ConversationSession
+    # Unsummarized messages, oldest first (at most PROMPT_HISTORY_MESSAGES)
+    history: List[ConversationMessage]
+    # created_at of the newest unsummarized message outside history, if any
+    overflow_through: Optional[datetime] = None
+
+    @classmethod
+    def from_rows(cls, thread: ConversationSession, rows: List[ConversationMessage], window: int) -> "Turn":
+        """
+        Turn from the newest window + 1 rows of the thread, oldest first
+
+        Rows the thread's rolling summary covers are left out; the extra
+        row only tells whether older ones overflow the window.
+        """
+        if thread.summarized_until is not None:
+            rows = [row for row in rows if row.created_at > thread.summarized_until]
+        if len(rows) > window:
+            return cls(thread=thread, history=rows[1:], overflow_through=rows[0].created_at)
+        return cls(thread=thread, history=rows)
+
+    def compaction_through(self, dropped: int) -> Optional[datetime]:
+        """
+        Newest message to fold into the summary, None while nothing overflows
+
+        Once the window overflows (or the token budget dropped messages),
+        everything but the newest CONTEXT_SUMMARY_KEEP_MESSAGES is folded,
+        so a compaction covers several turns instead of running on each.
+
+        Args:
+            dropped: Oldest history messages the prompt dropped for its token budget
+        """
+        if not dropped and self.overflow_through is None:
+            return None
+        cut = max(dropped, len(self.history) - settings.CONTEXT_SUMMARY_KEEP_MESSAGES)
+        if cut > 0:
+            return self.history[cut - 1].created_at
+        return self.overflow_through
+
+
+@dataclass(frozen=True)
+class PreparedTurn:
+    """A turn ready for the LLM request"""
+
+    thread: ConversationSession
+    user_id: str
+    user_message_id: str
+    content: str
+    prompt: Prompt
+    # Verdict on the user message; the reply is held until it passes
+    moderation: "asyncio.Task[ModerationResult]"
+    # Background insert of the user message (skipped when flagged)
+    user_write: "asyncio.Task[None]"
+
+
+# =============================================================================
+# Turn Effects
+# =============================================================================
+
+
+class TurnEffects:
+    """
+    Usage accounting and affection after a reply, in the background
+
+    Usage is counted here (GET /metrics, turn_effects) until billing has a
+    table of its own. Affection is not implemented yet: it needs
+    user_character_relationships and the stage master
+    (m_relationship_stages), neither of which is modeled. _add_affection
+    documents the statement it will run; until then
+    AFFECTION_POINTS_PER_TURN defaults to 0, so no turn opens a session
+    for it.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        points: int = settings.AFFECTION_POINTS_PER_TURN,
+    ) -> None:
+        self.session_factory = session_factory
+        self.points = points
+        self._pending: Set[asyncio.Task] = set()
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.failed = 0
+
+    def record(self, user_id: str, character_id: str, usage: Union[LLMUsage, SSEUsage, None]) -> None:
+        self.turns += 1
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+        if self.points:
+            task = asyncio.create_task(self._affection(user_id, character_id))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _affection(self, user_id: str, character_id: str) -> None:
+        try:
+            async with self.session_factory() as db:
+                await _add_affection(db, user_id, character_id, self.points)
+                await db.commit()
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to update affection of user %s", user_id)
+
+    async def flush(self) -> None:
+        """Wait for every pending update"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "pending": len(self._pending),
+            "failed": self.failed,
+        }
+
+
+async def _add_affection(db: AsyncSession, user_id: str, character_id: str, points: int) -> None:
+    """
+    Add affection points of a turn (not implemented: a no-op)
+
+    To implement once user_character_relationships and m_relationship_stages are modeled:
+    - INSERT INTO user_character_relationships (user_id, character_id, affection)
+      VALUES (:user_id, :character_id, :points)
+      ON CONFLICT (user_id, character_id)
+      DO UPDATE SET affection = user_character_relationships.affection + :points
+    - Advance relationship_stage_id when affection crosses a stage threshold
+    """
+    return None
+
+
+# =============================================================================
+# Turn Pipeline
+# =============================================================================
+
+
+class TurnPipeline:
+    """Runs the steps of a turn (see the module docstring)"""
+
+    def __init__(
+        self,
+        builder: PromptBuilder = prompt_builder,
+        moderation: InputModeration = input_moderation,
+        writes: ReplyWrites = reply_writes,
+        queue: MessageWriteQueue = message_writes,
+        summaries: ContextSummarizer = context_summaries,
+        effects: Optional[TurnEffects] = None,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        concurrent: bool = settings.TURN_PIPELINE_CONCURRENT,
+        window: int = settings.PROMPT_HISTORY_MESSAGES,
+    ) -> None:
+        self.builder = builder
+        self.moderation = moderation
+        self.writes = writes
+        self.queue = queue
+        self.summaries = summaries
+        self.effects = effects or TurnEffects(session_factory)
+        self.session_factory = session_factory
+        self.concurrent = concurrent
+        self.window = window
+        self.timings = StageTimings()
+        self.turns = 0
+
+    async def prepare(self, thread_id: str, user_id: str, user_message_id: str, content: str) -> PreparedTurn:
+        """
+        Check the thread and build the prompt of a new user message
+
+        The moderation check and the user message insert keep running
+        after this returns (PreparedTurn.moderation / user_write); when
+        not concurrent both are done first.
+
+        Raises:
+            NotFoundException: Unknown thread
+            ForbiddenException: Thread of another user
+            ContentFilteredException: Flagged by moderation (not concurrent only;
+                otherwise the reply reports it)
+        """
+        started = time.perf_counter()
+        self.turns += 1
+        moderation = asyncio.ensure_future(self.timings.timed("moderation", self.moderation.check(content)))
+        try:
+            if self.concurrent:
+                thread, rows = await self.timings.timed(
+                    "context", concurrently(self._thread(thread_id), self._history(thread_id))
+                )
+            else:
+                if (await moderation).flagged:
+                    raise ContentFilteredException()
+                thread = await self.timings.timed("context", self._thread(thread_id))
+            if thread is None:
+                raise NotFoundException("スレッドが見つかりません")
+            if thread.user_id != user_id:
+                raise ForbiddenException("他のユーザーのスレッドにはアクセスできません")
+
+            prompt_started = time.perf_counter()
+            if self.concurrent:
+                # Warm both caches at once; build() then finds them
+                await concurrently(
+                    self.builder.memories.get(user_id, thread.character_id),
+                    self.builder.personas.get(thread.character_id),
+                )
+            else:
+                rows = await self._history(thread_id)
+            turn = Turn.from_rows(thread, rows, self.window)
+            prompt = await self.builder.build(
+                thread.character_id, user_id, turn.history, content, summary=thread.summary
+            )
+            self.timings.record("prompt", time.perf_counter() - prompt_started)
+        except BaseException:
+            moderation.cancel()
+            raise
+
+        through = turn.compaction_through(prompt.dropped)
+        if through is not None:
+            self.summaries.schedule(thread_id, through)
+        user_write = self.writes.save_user_message(thread_id, user_message_id, content, gate=moderation)
+        if not self.concurrent:
+            await self.timings.timed("user_write", asyncio.shield(user_write))
+        self.timings.record("prepare", time.perf_counter() - started)
+        return PreparedTurn(
+            thread=thread,
+            user_id=user_id,
+            user_message_id=user_message_id,
+            content=content,
+            prompt=prompt,
+            moderation=moderation,
+            user_write=user_write,
+        )
+
+    def finish(self, turn: PreparedTurn, usage: Union[LLMUsage, SSEUsage, None]) -> None:
+        """Schedule the effects of a completed reply"""
+        self.effects.record(turn.user_id, turn.thread.character_id, usage)
+
+    async def _thread(self, thread_id: str) -> Optional[ConversationSession]:
+        async with self.session_factory() as db:
+            return await ConversationService(db).get_session(thread_id)
+
+    async def _history(self, thread_id: str) -> List[ConversationMessage]:
+        """
+        Newest window + 1 rows, summarized or not
+
+        Read next to the thread, before its summary watermark is known
+        (Turn.from_rows filters); the new user message is not in it yet.
+        Messages still in the write-behind queue are merged in.
+        """
+        async with self.session_factory() as db:
+            rows = await ConversationService(db).recent_messages(thread_id, self.window + 1)
+        history_rows.record(len(rows))
+        return self.queue.merge(thread_id, rows, self.window + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrent": self.concurrent,
+            "turns": self.turns,
+            "stages": self.timings.stats(),
+        }
+
+
+turn_pipeline = TurnPipeline()
+register_metrics("turn_pipeline", turn_pipeline.stats)
+register_metrics("turn_effects", turn_pipeline.effects.stats)
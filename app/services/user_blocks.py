@@ -0,0 +1,165 @@
+"""
+Per-user block sets for catalog and search results (F-SAFE-009)
+
+Blocked creators, characters and tags must disappear from GET /packs and
+its keyword search. A NOT EXISTS against user_blocks in every catalog
+query would slow the shared query down for everyone, so instead:
+
+- A user's active blocks are loaded once (one query, shared by concurrent
+  misses) and cached with a TTL
+- They are compiled into one exclusion bitmap over the catalog index's
+  ordinals (union of the "creator:", "character:" and "tag:" bitmaps),
+  recompiled only when the index version changes
+- The index skips excluded ordinals while walking the sort order, so
+  pages are still filled to limit
+- Users with no catalog blocks (almost everyone) keep the shared, cached
+  response path
+- create_block / delete_block update the cached set write-through; other
+  workers pick the change up within the TTL
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.bitmap import RoaringBitmap
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.core.singleflight import SingleFlight
+from app.db.database import AsyncSessionLocal
+from app.services.catalog_index import BLOCK_TARGETS, CatalogIndex
+
+# (target_type, target_id)
+BlockTarget = Tuple[str, str]
+BlockLoader = Callable[[AsyncSession, str], Awaitable[Iterable[BlockTarget]]]
+
+
+class UserBlocks:
+    """Active blocks of one user, with the exclusion bitmap compiled for an index version"""
+
+    __slots__ = ("targets", "expires_at", "_compiled")
+
+    def __init__(self, targets: FrozenSet[BlockTarget], expires_at: float) -> None:
+        self.targets = targets
+        self.expires_at = expires_at
+        # (index version, ordinals to exclude or None)
+        self._compiled: Optional[Tuple[int, Optional[RoaringBitmap]]] = None
+
+    @property
+    def hides_catalog(self) -> bool:
+        return any(target_type in BLOCK_TARGETS for target_type, _ in self.targets)
+
+    def exclusion(self, index: CatalogIndex) -> Optional[RoaringBitmap]:
+        """Ordinals of index to hide (None = nothing to hide)"""
+        compiled = self._compiled
+        if compiled is None or compiled[0] != index.version:
+            if not self.hides_catalog:
+                return None
+            compiled = self._compiled = (index.version, index.blocked(self.targets) or None)
+        return compiled[1]
+
+
+class UserBlockCache:
+    """LRU + TTL cache of per-user block sets"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_users: int,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        load_blocks: Optional[BlockLoader] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.session_factory = session_factory
+        self.load_blocks = load_blocks or _load_block_targets
+        self._users: "OrderedDict[str, UserBlocks]" = OrderedDict()
+        # user_id -> writes seen while that user's blocks were loading
+        self._loading: Dict[str, int] = {}
+        self._flight = SingleFlight("user_blocks", wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS)
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def load(self, user_id: str) -> UserBlocks:
+        blocks = self._users.get(user_id)
+        if blocks is not None and blocks.expires_at >= time.monotonic():
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return blocks
+        self.misses += 1
+        return await self._flight.do(("user_blocks", user_id), lambda: self._fill(user_id))
+
+    async def _fill(self, user_id: str) -> UserBlocks:
+        self._loading[user_id] = 0
+        try:
+            async with self.session_factory() as db:
+                targets = frozenset(await self.load_blocks(db, user_id))
+            self.loads += 1
+            blocks = UserBlocks(targets, time.monotonic() + self.ttl_seconds)
+        finally:
+            writes = self._loading.pop(user_id, 0)
+        if writes == 0:
+            # A block / unblock during the load may be missing from the
+            # result; serve it once but do not cache it
+            self._users[user_id] = blocks
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return blocks
+
+    # -------------------------------------------------------------------------
+    # Write-through (call after the user_blocks transaction commits)
+    # -------------------------------------------------------------------------
+
+    def _update(self, user_id: str, target: BlockTarget, blocked: bool) -> None:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+        blocks = self._users.get(user_id)
+        if blocks is None:
+            return
+        targets = blocks.targets | {target} if blocked else blocks.targets - {target}
+        # A new object: requests holding the old one keep a consistent view
+        self._users[user_id] = UserBlocks(targets, blocks.expires_at)
+
+    def on_block(self, user_id: str, target_type: str, target_id: str) -> None:
+        """create_block"""
+        self._update(user_id, (target_type, target_id), blocked=True)
+
+    def on_unblock(self, user_id: str, target_type: str, target_id: str) -> None:
+        """delete_block"""
+        self._update(user_id, (target_type, target_id), blocked=False)
+
+    def invalidate(self, user_id: str) -> None:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+        self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._users),
+            "targets": sum(len(blocks.targets) for blocks in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+        }
+
+
+# =============================================================================
+# Loader (TODO: user_blocks is not modeled yet)
+# =============================================================================
+
+
+async def _load_block_targets(db: AsyncSession, user_id: str) -> Iterable[BlockTarget]:
+    """
+    TODO: SELECT target_type, target_id FROM user_blocks
+          WHERE user_id = :user_id AND deleted_at IS NULL
+    """
+    return []
+
+
+user_blocks = UserBlockCache(
+    ttl_seconds=settings.USER_BLOCKS_TTL_SECONDS,
+    max_users=settings.USER_BLOCKS_MAX_USERS,
+)
+register_metrics("user_blocks", user_blocks.stats)
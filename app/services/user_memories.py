@@ -0,0 +1,118 @@
+"""
+Long-term memory of a user with a character (user_character_memories)
+
+Every conversation turn puts the memory (nickname, preferences) into the
+prompt, right after the character's persona. It changes far less often
+than once per turn, so:
+
+- Memories are cached per (user, character) with a TTL; a missing row is
+  cached as absent too
+- Concurrent misses for the same pair share one load
+- Writers call invalidate(); other workers pick the change up within the
+  TTL
+
+The rolling conversation summary is per thread and read with the thread
+(conversation_sessions.summary), not cached here.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.core.singleflight import SingleFlight
+from app.db.database import AsyncSessionLocal
+from app.models.user_character_memory import UserCharacterMemory
+
+
+@dataclass(frozen=True)
+class UserMemory:
+    """What the character remembers about the user"""
+
+    nickname: Optional[str] = None
+    preferences: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.nickname or self.preferences)
+
+
+MemoryLoader = Callable[[AsyncSession, str, str], Awaitable[Optional[UserMemory]]]
+
+
+class UserMemoryCache:
+    """LRU + TTL cache of user_character_memories rows"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        load_memory: Optional[MemoryLoader] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self.load_memory = load_memory or _load_memory
+        # (user_id, character_id) -> (memory or None, expires_at)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Optional[UserMemory], float]]" = OrderedDict()
+        self._flight = SingleFlight("user_memories", wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: str, character_id: str) -> Optional[UserMemory]:
+        key = (user_id, character_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] >= time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return await self._flight.do(("user_memories", key), lambda: self._fill(key))
+
+    async def _fill(self, key: Tuple[str, str]) -> Optional[UserMemory]:
+        async with self.session_factory() as db:
+            memory = await self.load_memory(db, *key)
+        self._entries[key] = (memory, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return memory
+
+    def invalidate(self, user_id: str, character_id: str) -> None:
+        """Memory row written or deleted"""
+        self._entries.pop((user_id, character_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# =============================================================================
+# Loader
+# =============================================================================
+
+
+async def _load_memory(db: AsyncSession, user_id: str, character_id: str) -> Optional[UserMemory]:
+    row = await db.scalar(
+        select(UserCharacterMemory).where(
+            UserCharacterMemory.user_id == user_id,
+            UserCharacterMemory.character_id == character_id,
+        )
+    )
+    if row is None:
+        return None
+    return UserMemory(
+        nickname=row.nickname,
+        preferences=row.preferences or {},
+    )
+
+
+user_memories = UserMemoryCache(
+    ttl_seconds=settings.USER_MEMORY_TTL_SECONDS,
+    max_entries=settings.USER_MEMORY_MAX_ENTRIES,
+)
+register_metrics("user_memories", user_memories.stats)
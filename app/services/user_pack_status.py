@@ -0,0 +1,277 @@
+"""
+Per-user pack status (owned / favorited) for catalog pages
+
+A page of packs needs owned (user_entitlements) and favorited
+(user_favorites) for every pack; looking them up per pack is an N+1. The
+loader instead keeps, per user, two compressed bitmaps of pack numbers:
+
+- A cache miss loads the user's whole owned and favorited sets with one
+  query each; concurrent misses for the same user share that load
+- A page is then answered from memory, whatever its size
+- Purchases, revocations and favorite toggles update the cached bitmaps
+  write-through; other workers pick the change up within the TTL
+- The entitlement row itself (pack detail bundles) is only queried when
+  the user may own the pack
+- Pack numbers are never reused, so once max_pack_numbers are assigned
+  the numbering starts over and every cached user is dropped
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.bitmap import RoaringBitmap
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.core.singleflight import SingleFlight
+from app.db.database import AsyncSessionLocal
+from app.schemas.catalog import UserStatus
+from app.schemas.purchase import Entitlement
+
+PackIdLoader = Callable[[AsyncSession, str], Awaitable[Iterable[str]]]
+EntitlementLoader = Callable[[AsyncSession, str, str], Awaitable[Optional[Entitlement]]]
+
+
+class PackNumbers:
+    """
+    Stable small integers for pack ids (append-only)
+
+    Catalog index ordinals change on every rebuild, so cached per-user
+    bitmaps are keyed by these instead. Each user's sets keep the
+    numbering they were built with.
+    """
+
+    def __init__(self) -> None:
+        self._numbers: Dict[str, int] = {}
+
+    def number(self, pack_id: str) -> int:
+        number = self._numbers.get(pack_id)
+        if number is None:
+            number = self._numbers[pack_id] = len(self._numbers)
+        return number
+
+    def get(self, pack_id: str) -> Optional[int]:
+        """Number of pack_id without assigning one (request input is not interned)"""
+        return self._numbers.get(pack_id)
+
+    def numbers(self, pack_ids: Iterable[str]) -> RoaringBitmap:
+        return RoaringBitmap.from_iterable(self.number(pack_id) for pack_id in pack_ids)
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+
+class _UserSets:
+    __slots__ = ("packs", "owned", "favorited", "expires_at")
+
+    def __init__(self, packs: PackNumbers, owned: RoaringBitmap, favorited: RoaringBitmap, expires_at: float) -> None:
+        self.packs = packs
+        self.owned = owned
+        self.favorited = favorited
+        self.expires_at = expires_at
+
+
+class UserPackStatusLoader:
+    """LRU + TTL cache of per-user owned / favorited bitmaps"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_users: int,
+        max_pack_numbers: int = 200000,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        load_owned: Optional[PackIdLoader] = None,
+        load_favorited: Optional[PackIdLoader] = None,
+        load_entitlement: Optional[EntitlementLoader] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.max_pack_numbers = max_pack_numbers
+        self.session_factory = session_factory
+        self.load_owned = load_owned or _load_owned_pack_ids
+        self.load_favorited = load_favorited or _load_favorited_pack_ids
+        self.load_entitlement = load_entitlement or _load_pack_entitlement
+        self.packs = PackNumbers()
+        self._users: "OrderedDict[str, _UserSets]" = OrderedDict()
+        # user_id -> writes seen while that user's sets were loading
+        self._loading: Dict[str, int] = {}
+        self._flight = SingleFlight("user_pack_status", wait_timeout=settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS)
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.renumberings = 0
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    async def load(self, user_id: str, pack_ids: Sequence[str]) -> Dict[str, UserStatus]:
+        """
+        owned / favorited of every pack in pack_ids for user_id
+
+        Returns:
+            Mapping of pack id to UserStatus (every requested id present)
+        """
+        sets = self._cached(user_id)
+        if sets is None:
+            self.misses += 1
+            sets = await self._flight.do(("user_pack_status", user_id), lambda: self._fill(user_id))
+        else:
+            self.hits += 1
+        statuses = {}
+        for pack_id in pack_ids:
+            number = sets.packs.get(pack_id)
+            if number is None:
+                statuses[pack_id] = UserStatus(owned=False, favorited=False)
+            else:
+                statuses[pack_id] = UserStatus(owned=number in sets.owned, favorited=number in sets.favorited)
+        return statuses
+
+    async def load_one(self, user_id: str, pack_id: str) -> UserStatus:
+        return (await self.load(user_id, [pack_id]))[pack_id]
+
+    async def entitlement(self, user_id: str, pack_id: str) -> Optional[Entitlement]:
+        """
+        Active entitlement of user_id for pack_id, on its own session
+
+        Skips the query when the user's cached sets say the pack is not
+        owned; safe to run concurrently with load() for the same user.
+        """
+        sets = self._cached(user_id)
+        if sets is not None:
+            number = sets.packs.get(pack_id)
+            if number is None or number not in sets.owned:
+                return None
+        async with self.session_factory() as db:
+            return await self.load_entitlement(db, user_id, pack_id)
+
+    def _cached(self, user_id: str) -> Optional[_UserSets]:
+        sets = self._users.get(user_id)
+        if sets is None:
+            return None
+        if sets.expires_at < time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return sets
+
+    async def _fill(self, user_id: str) -> _UserSets:
+        self._loading[user_id] = 0
+        try:
+            async with self.session_factory() as db:
+                owned = await self.load_owned(db, user_id)
+                favorited = await self.load_favorited(db, user_id)
+            self.loads += 1
+            owned, favorited = set(owned), set(favorited)
+            unnumbered = sum(1 for pack_id in owned | favorited if self.packs.get(pack_id) is None)
+            if len(self.packs) + unnumbered > self.max_pack_numbers:
+                # Numbers of deleted / unpublished packs are never freed otherwise
+                self.packs = PackNumbers()
+                self._users.clear()
+                self.renumberings += 1
+            sets = _UserSets(
+                self.packs,
+                self.packs.numbers(owned),
+                self.packs.numbers(favorited),
+                time.monotonic() + self.ttl_seconds,
+            )
+        finally:
+            writes = self._loading.pop(user_id, 0)
+        if writes == 0:
+            # A purchase / favorite during the load may be missing from the
+            # result; serve it once but do not cache it
+            self._users[user_id] = sets
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return sets
+
+    # -------------------------------------------------------------------------
+    # Write-through (call after the source transaction commits)
+    # -------------------------------------------------------------------------
+
+    def _update(
+        self,
+        user_id: str,
+        pack_id: str,
+        owned: Optional[bool] = None,
+        favorited: Optional[bool] = None,
+    ) -> None:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+        sets = self._users.get(user_id)
+        if sets is None:
+            return
+        number = sets.packs.number(pack_id)
+        if owned is not None:
+            sets.owned = sets.owned.with_added(number) if owned else sets.owned.with_removed(number)
+        if favorited is not None:
+            sets.favorited = sets.favorited.with_added(number) if favorited else sets.favorited.with_removed(number)
+
+    def on_purchase(self, user_id: str, pack_id: str) -> None:
+        """Entitlement granted (purchase or free grant)"""
+        self._update(user_id, pack_id, owned=True)
+
+    def on_entitlement_revoked(self, user_id: str, pack_id: str) -> None:
+        """Entitlement revoked (refund, moderation)"""
+        self._update(user_id, pack_id, owned=False)
+
+    def on_favorite(self, user_id: str, pack_id: str, favorited: bool) -> None:
+        """Favorite (True) or unfavorite (False)"""
+        self._update(user_id, pack_id, favorited=favorited)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop the cached sets (e.g. after restore_purchases or account deletion)"""
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+        self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._users),
+            "pack_numbers": len(self.packs),
+            "bytes": sum(s.owned.size_in_bytes() + s.favorited.size_in_bytes() for s in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "renumberings": self.renumberings,
+        }
+
+
+# =============================================================================
+# Loaders (TODO: user_entitlements / user_favorites are not modeled yet)
+# =============================================================================
+
+
+async def _load_owned_pack_ids(db: AsyncSession, user_id: str) -> Iterable[str]:
+    """
+    TODO: SELECT entitlement_id FROM user_entitlements
+          WHERE user_id = :user_id AND entitlement_type = 'pack' AND revoked_at IS NULL
+    """
+    return []
+
+
+async def _load_favorited_pack_ids(db: AsyncSession, user_id: str) -> Iterable[str]:
+    """
+    TODO: SELECT DISTINCT pi.pack_id FROM user_favorites uf
+          JOIN pack_items pi ON pi.item_type = 'character' AND pi.item_id = uf.character_id
+          WHERE uf.user_id = :user_id AND uf.deleted_at IS NULL AND pi.deleted_at IS NULL
+    """
+    return []
+
+
+async def _load_pack_entitlement(db: AsyncSession, user_id: str, pack_id: str) -> Optional[Entitlement]:
+    """
+    TODO: SELECT id, entitlement_type, entitlement_id, granted_at, revoked_at FROM user_entitlements
+          WHERE user_id = :user_id AND entitlement_type = 'pack' AND entitlement_id = :pack_id
+            AND revoked_at IS NULL
+    """
+    return None
+
+
+user_pack_status = UserPackStatusLoader(
+    ttl_seconds=settings.USER_PACK_STATUS_TTL_SECONDS,
+    max_users=settings.USER_PACK_STATUS_MAX_USERS,
+    max_pack_numbers=settings.USER_PACK_STATUS_MAX_PACK_NUMBERS,
+)
+register_metrics("user_pack_status", user_pack_status.stats)
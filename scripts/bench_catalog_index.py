@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Catalog index vs SQL benchmark for GET /packs
+
+Usage:
+    python scripts/bench_catalog_index.py [--packs 100000] [--queries 2000]
+
+Generates a synthetic published catalog, loads it into an in-memory SQLite
+database shaped like database_design.md (packs, creators, m_tags,
+pack_tags; age_rating and favorite/conversation counts are denormalized
+onto packs so the SQL side is not penalized for the missing stats table)
+and into app.services.catalog_index.CatalogIndex. Then replays the same
+random mix of list_packs filters / sorts / cursors against both and
+prints p50 / p99 / max latency.
+
+Both paths stop at "page of packs"; JSON rendering is excluded.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schemas.catalog import Pack, PackStats  # noqa: E402
+from app.schemas.common import Creator, Tag  # noqa: E402
+from app.services.catalog_index import AGE_GROUP_RATINGS, CatalogIndex, PackQuery  # noqa: E402
+
+WORDS = ["放課後", "幼なじみ", "ファンタジー", "癒やし", "先輩", "学園", "冒険", "甘々", "ツンデレ", "日常", "星空", "カフェ"]
+SORT_COLUMNS = {
+    "created_at": "p.created_at",
+    "price": "p.price",
+    "favorite_count": "p.favorite_count",
+    "name": "p.name",
+}
+
+SCHEMA = """
+CREATE TABLE creators (id TEXT PRIMARY KEY, display_name TEXT NOT NULL);
+CREATE TABLE m_tags (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE packs (
+    id TEXT PRIMARY KEY, creator_id TEXT NOT NULL, pack_type TEXT NOT NULL,
+    name TEXT NOT NULL, description TEXT, price INTEGER, status INTEGER NOT NULL,
+    age_rating TEXT NOT NULL, favorite_count INTEGER NOT NULL, conversation_count INTEGER NOT NULL,
+    created_at INTEGER NOT NULL, deleted_at INTEGER
+);
+CREATE TABLE pack_tags (pack_id TEXT NOT NULL, tag_id TEXT NOT NULL, deleted_at INTEGER);
+CREATE INDEX idx_packs_status_created ON packs (status, created_at);
+CREATE INDEX idx_packs_status_price ON packs (status, price);
+CREATE INDEX idx_packs_status_fav ON packs (status, favorite_count);
+CREATE INDEX idx_packs_status_name ON packs (status, name);
+CREATE INDEX idx_pack_tags_tag ON pack_tags (tag_id, pack_id);
+CREATE INDEX idx_pack_tags_pack ON pack_tags (pack_id);
+"""
+
+
+def generate(count: int, rng: random.Random) -> list:
+    tags = [Tag(id=f"tag_{i:03d}", name=f"{WORDS[i % len(WORDS)]}{i}") for i in range(60)]
+    creators = [Creator(id=f"creator_{i:05d}", display_name=f"作者{i}") for i in range(2000)]
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        Pack(
+            id=f"pack_{i:08d}",
+            pack_type=rng.choice(["persona", "scenario"]),
+            name="".join(rng.sample(WORDS, 2)) + str(i),
+            description="、".join(rng.choice(WORDS) for _ in range(20)),
+            thumbnail_url=f"https://cdn.example.com/packs/{i}/thumb.webp",
+            price=rng.choice([0, 300, 500, 980]),
+            is_free=False,
+            age_rating=rng.choices(["all", "r15", "r18"], weights=[70, 20, 10])[0],
+            tags=rng.sample(tags, rng.randint(1, 5)),
+            creator=rng.choice(creators),
+            stats=PackStats(favorite_count=rng.randint(0, 9999), conversation_count=rng.randint(0, 99999)),
+            created_at=base + timedelta(seconds=rng.randint(0, 365 * 86400)),
+        )
+        for i in range(count)
+    ]
+
+
+def load_sql(packs: list) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    creators = {p.creator.id: p.creator for p in packs}
+    tags = {t.id: t for p in packs for t in p.tags}
+    conn.executemany("INSERT INTO creators VALUES (?, ?)", [(c.id, c.display_name) for c in creators.values()])
+    conn.executemany("INSERT INTO m_tags VALUES (?, ?)", [(t.id, t.name) for t in tags.values()])
+    conn.executemany(
+        "INSERT INTO packs VALUES (?, ?, ?, ?, ?, ?, 2, ?, ?, ?, ?, NULL)",
+        [
+            (p.id, p.creator.id, p.pack_type, p.name, p.description, p.price, p.age_rating,
+             p.stats.favorite_count, p.stats.conversation_count, int(p.created_at.timestamp()))
+            for p in packs
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO pack_tags VALUES (?, ?, NULL)",
+        [(p.id, t.id) for p in packs for t in p.tags],
+    )
+    conn.execute("ANALYZE")
+    return conn
+
+
+def sql_page(conn: sqlite3.Connection, q: PackQuery, offset: int) -> list:
+    """The query list_packs would run without the index (offset paging)"""
+    column = SORT_COLUMNS[q.sort]
+    direction = "DESC" if q.descending else "ASC"
+    where = ["p.status = 2", "p.deleted_at IS NULL"]
+    params: list = []
+    where.append(f"p.age_rating IN ({','.join('?' * len(q.ratings))})")
+    params.extend(q.ratings)
+    if q.pack_type:
+        where.append("p.pack_type = ?")
+        params.append(q.pack_type)
+    if q.text:
+        where.append("(p.name LIKE ? OR p.description LIKE ?)")
+        params.extend([f"%{q.text}%"] * 2)
+    for tag_id in q.tag_ids:
+        where.append("EXISTS (SELECT 1 FROM pack_tags pt WHERE pt.pack_id = p.id AND pt.tag_id = ? AND pt.deleted_at IS NULL)")
+        params.append(tag_id)
+    sql = f"""
+        SELECT p.id, p.name, c.display_name, group_concat(t.id || ':' || t.name)
+        FROM (
+            SELECT p.* FROM packs p WHERE {' AND '.join(where)}
+            ORDER BY {column} {direction}, p.id {direction} LIMIT ? OFFSET ?
+        ) p
+        JOIN creators c ON c.id = p.creator_id
+        LEFT JOIN pack_tags pt ON pt.pack_id = p.id AND pt.deleted_at IS NULL
+        LEFT JOIN m_tags t ON t.id = pt.tag_id
+        GROUP BY p.id
+        ORDER BY {column} {direction}, p.id {direction}
+    """
+    return conn.execute(sql, params + [q.limit + 1, offset]).fetchall()
+
+
+def random_query(rng: random.Random) -> PackQuery:
+    roll = rng.random()
+    return PackQuery(
+        ratings=AGE_GROUP_RATINGS[rng.choice(["u13", "u18", "adult", "adult"])],
+        pack_type=rng.choice([None, None, "persona", "scenario"]),
+        tag_ids=tuple(f"tag_{rng.randrange(60):03d}" for _ in range(rng.choice([0, 0, 1, 1, 2]))),
+        text=rng.choice(WORDS) if roll < 0.2 else None,
+        sort=rng.choice(list(SORT_COLUMNS)),
+        descending=rng.random() < 0.7,
+        limit=20,
+    )
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, samples: list) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"  {name:6} p50={statistics.median(ms):8.3f} ms  p99={percentile(ms, 0.99):8.3f} ms  max={max(ms):8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catalog index vs SQL benchmark")
+    parser.add_argument("--packs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    packs = generate(args.packs, rng)
+
+    started = time.perf_counter()
+    index = CatalogIndex.build(1, packs, {})
+    print(f"index build: {time.perf_counter() - started:.2f} s for {len(index):,} packs")
+    started = time.perf_counter()
+    conn = load_sql(packs)
+    print(f"sqlite load: {time.perf_counter() - started:.2f} s")
+
+    queries = []
+    for _ in range(args.queries):
+        q = random_query(rng)
+        # One in four requests is a second page
+        queries.append((q, 1 if rng.random() < 0.25 else 0))
+
+    index_samples, sql_samples = [], []
+    for q, page in queries:
+        started = time.perf_counter()
+        result, cursor = index.query(q)
+        if page and cursor:
+            index.query(PackQuery(**{**q.__dict__, "cursor": cursor}))
+        index_samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        sql_page(conn, q, 0)
+        if page:
+            sql_page(conn, q, q.limit)
+        sql_samples.append(time.perf_counter() - started)
+
+    print(f"\n{len(queries)} list_packs queries over {args.packs:,} packs")
+    report("index", index_samples)
+    report("sql", sql_samples)
+
+    started = time.perf_counter()
+    index.with_published(2, packs[0].model_copy(update={"id": "pack_new"}), [])
+    print(f"\nincremental publish: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Response compression benchmark
+
+Usage:
+    python scripts/bench_compression.py [--repeat 200]
+
+Renders synthetic PackListResponse / MessageListResponse / ClipListResponse
+pages with Japanese text and reports, per encoder available in
+app.core.compression, the compressed size, the ratio and the CPU time per
+compression. Also shows the saving from serving a cached
+CompressedVariants entry instead of recompressing on each request.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.compression import ENCODERS, CompressedVariants  # noqa: E402
+from app.schemas.catalog import Pack, PackListResponse, PackStats  # noqa: E402
+from app.schemas.common import Character, Creator, Pagination, Tag  # noqa: E402
+from app.schemas.conversation import Message, MessageListResponse  # noqa: E402
+from app.schemas.memory import Clip, ClipListResponse  # noqa: E402
+
+WORDS = ["放課後", "幼なじみ", "ファンタジー", "癒やし", "先輩", "学園", "冒険", "甘々", "ツンデレ", "日常", "星空", "カフェ"]
+NOW = datetime.now(timezone.utc)
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return "、".join(rng.choice(WORDS) for _ in range(n)) + "。"
+
+
+def pack_page(rng: random.Random, size: int) -> bytes:
+    packs = [
+        Pack(
+            id=f"pack_{i:08d}",
+            pack_type=rng.choice(["persona", "scenario"]),
+            name=sentence(rng, 3),
+            description=sentence(rng, 40),
+            thumbnail_url=f"https://cdn.example.com/packs/{i}/thumb.webp",
+            price=rng.choice([0, 300, 500, 980]),
+            is_free=False,
+            age_rating=rng.choice(["all", "r15"]),
+            tags=[Tag(id=f"tag_{t}", name=WORDS[t]) for t in rng.sample(range(len(WORDS)), 4)],
+            creator=Creator(id=f"creator_{i % 50}", display_name=sentence(rng, 2)),
+            stats=PackStats(favorite_count=rng.randint(0, 9999), conversation_count=rng.randint(0, 99999)),
+            created_at=NOW,
+        )
+        for i in range(size)
+    ]
+    return PackListResponse(data=packs, pagination=Pagination(next_cursor="c", has_more=True)).model_dump_json().encode()
+
+
+def message_page(rng: random.Random, size: int) -> bytes:
+    messages = [
+        Message(id=f"msg_{i}", role=rng.choice(["user", "character"]), content=sentence(rng, 15), created_at=NOW)
+        for i in range(size)
+    ]
+    return MessageListResponse(data=messages, pagination=Pagination(has_more=False)).model_dump_json().encode()
+
+
+def clip_page(rng: random.Random, size: int) -> bytes:
+    clips = [
+        Clip(
+            id=f"clip_{i}",
+            title=sentence(rng, 2),
+            content=sentence(rng, 20),
+            character=Character(id="char_1", name="ミナ"),
+            tags=rng.sample(WORDS, 3),
+            created_at=NOW,
+        )
+        for i in range(size)
+    ]
+    return ClipListResponse(data=clips, pagination=Pagination(has_more=False)).model_dump_json().encode()
+
+
+def bench(name: str, body: bytes, repeat: int) -> None:
+    print(f"\n{name}: {len(body):,} bytes")
+    print(f"  {'encoding':8} {'bytes':>9} {'ratio':>7} {'us/op':>9} {'MB/s':>8}")
+    for encoding, encode in ENCODERS.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compressed = encode(body)
+        elapsed = (time.perf_counter() - started) / repeat
+        print(f"  {encoding:8} {len(compressed):>9,} {len(compressed) / len(body):>7.3f} "
+              f"{elapsed * 1e6:>9.1f} {len(body) / elapsed / 1e6:>8.1f}")
+
+    variants = CompressedVariants(body)
+    encoding = next(iter(ENCODERS))
+    variants.encode(encoding)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        variants.encode(encoding)
+    cached = (time.perf_counter() - started) / repeat
+    print(f"  cached {encoding} variant: {cached * 1e6:.2f} us/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    bench("PackListResponse (limit=20)", pack_page(rng, 20), args.repeat)
+    bench("PackListResponse (limit=100)", pack_page(rng, 100), args.repeat)
+    bench("MessageListResponse (limit=50)", message_page(rng, 50), args.repeat)
+    bench("ClipListResponse (limit=50)", clip_page(rng, 50), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Context window benchmark: prompt size and DB rows read per turn as a thread grows
+
+Usage:
+    python scripts/bench_context_window.py [--messages 10000] [--report-every 1000]
+
+Starts the stub LLM server and one API worker (uvicorn, LLM_PROVIDER=stub,
+temporary SQLite database) and plays one thread turn by turn (POST
+/v1/threads/{id}/messages:stream, two messages per turn) up to
+--messages messages. Per --report-every messages:
+
+    windowed  - what the worker did: prompt tokens (usage of message_done),
+                conversation rows read on the hot path (history_reads in
+                /metrics) and rows folded by the background summary job
+                (context_summaries; one row read per folded message plus
+                the thread row per run) and summary LLM calls, per turn
+    full      - the same turn with the whole thread as history: every
+                message read and sent (computed from the database with the
+                stub's token estimate)
+
+The stub's "summaries" are random text of up to CONTEXT_SUMMARY_MAX_TOKENS
+tokens, so the summary part of the prompt is at its size limit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User, UserCharacterMemory  # noqa: E402,F401
+from app.services.llm.stub import prompt_tokens  # noqa: E402
+
+STUB_PORT = 8772
+API_PORT = 8773
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+METRICS_TOKEN = "bench"
+
+
+def create_thread(database: Path) -> str:
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        thread = ConversationSession(user_id=USER, character_id=CHARACTER)
+        db.add(thread)
+        db.commit()
+    engine.dispose()
+    return thread.id
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def turn(client: httpx.AsyncClient, thread_id: str, index: int) -> int:
+    """One turn; returns the prompt tokens the LLM was billed for"""
+    event = None
+    async with client.stream(
+        "POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": f"今日の出来事 {index} を聞いて"}
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: ") and event == "message_done":
+                return json.loads(line[6:])["usage"]["prompt_tokens"]
+    raise RuntimeError("stream ended without message_done")
+
+
+def full_history(database: Path, thread_id: str) -> tuple:
+    """(rows, prompt tokens) of a turn that sends the whole thread"""
+    with sqlite3.connect(database) as db:
+        contents = [row[0] for row in db.execute(
+            "SELECT content FROM conversation_messages WHERE session_id = ?", (thread_id,)
+        )]
+    return len(contents), prompt_tokens([{"content": c} for c in contents] + [{"content": "今日の出来事"}])
+
+
+async def play(args: argparse.Namespace, database: Path, thread_id: str) -> None:
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}", "X-Metrics-Token": METRICS_TOKEN}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, timeout=60) as client:
+        print(f"{'messages':>9} | {'windowed: prompt tok':>20} {'hot rows':>9} {'summary rows':>13} "
+              f"{'summary calls':>14} | {'full: prompt tok':>16} {'rows':>6}")
+        metrics = (await client.get("/metrics")).json()
+        tokens = []
+        for index in range(args.messages // 2):
+            tokens.append(await turn(client, thread_id, index))
+            messages = 2 * (index + 1)
+            if messages % args.report_every:
+                continue
+            await asyncio.sleep(0.2)  # let the summary job catch up before sampling
+            before, metrics = metrics, (await client.get("/metrics")).json()
+            turns = metrics["history_reads"]["turns"] - before["history_reads"]["turns"]
+            hot = metrics["history_reads"]["rows"] - before["history_reads"]["rows"]
+            folded = (metrics["context_summaries"]["folded_messages"]
+                      - before["context_summaries"]["folded_messages"])
+            runs = metrics["context_summaries"]["runs"] - before["context_summaries"]["runs"]
+            rows, full_tokens = full_history(database, thread_id)
+            print(f"{messages:>9} | {statistics.mean(tokens):>20.0f} {hot / turns:>9.1f} "
+                  f"{(folded + runs) / turns:>13.1f} {runs / turns:>14.2f} | {full_tokens:>16} {rows:>6}")
+            tokens = []
+        print(f"\ncontext_summaries: {metrics['context_summaries']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Context window benchmark")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--report-every", type=int, default=1000)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT),
+         "--first-token-ms", "0", "--tokens-per-second", "0", "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            thread_id = create_thread(database)
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "warning"],
+                cwd=ROOT,
+                env=dict(
+                    os.environ,
+                    DEBUG="false",
+                    METRICS_TOKEN=METRICS_TOKEN,
+                    DATABASE_URL=f"sqlite:///{database}",
+                    LLM_PROVIDER="stub",
+                    LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+                ),
+            )
+            try:
+                asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+                asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+                asyncio.run(play(args, database, thread_id))
+            finally:
+                worker.terminate()
+                worker.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
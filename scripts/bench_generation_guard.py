@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Generation guard benchmark: lease overhead and parallel sends on one thread
+
+Usage:
+    python scripts/bench_generation_guard.py [--leases 100000] [--burst 10] [--redis-url redis://localhost:6379/0]
+
+1. Lease overhead (in process): --leases acquire + release pairs on
+   distinct threads (the uncontended cost every send pays), and a queue
+   of --burst waiters on one thread (hand-over latency from release to
+   the next holder). Memory backend always; the Redis backend when the
+   redis package is installed and --redis-url answers.
+
+2. Parallel sends (stub LLM server and one API worker, LLM_PROVIDER=stub,
+   temporary SQLite database): --burst concurrent
+   POST /v1/threads/{id}/messages:stream on the same thread, once per
+   GENERATION_GUARD_POLICY. Reports the responses (streamed / 409), the
+   streams that completed with message_done, the LLM requests made, and
+   whether the thread's history interleaved (two user messages in a row
+   without the reply between them). Under supersede a send cancelled
+   before its first token keeps its user message without a reply, which
+   counts here too.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.errors import ConflictException  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User, UserCharacterMemory  # noqa: E402,F401
+from app.services.generation_guard import (  # noqa: E402
+    GenerationGuard,
+    MemoryGenerationLocks,
+    RedisGenerationLocks,
+    aioredis,
+)
+
+STUB_PORT = 8778
+API_PORT = 8779
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+# =============================================================================
+# Lease overhead
+# =============================================================================
+
+
+async def uncontended(guard: GenerationGuard, leases: int) -> float:
+    """Mean µs per acquire + release"""
+    threads = [str(uuid.uuid4()) for _ in range(1000)]
+    started = time.perf_counter()
+    for i in range(leases):
+        lease = await guard.acquire(f"user-{i % 1000}", threads[i % 1000])
+        await lease.release()
+    return (time.perf_counter() - started) / leases * 1e6
+
+
+async def handover(guard: GenerationGuard, burst: int) -> list:
+    """µs from each release to the next waiter holding the lease"""
+    thread_id = str(uuid.uuid4())
+    released = []
+    samples = []
+
+    async def send() -> None:
+        lease = await guard.acquire(USER, thread_id)
+        if released:
+            samples.append((time.perf_counter() - released[-1]) * 1e6)
+        await asyncio.sleep(0.001)
+        released.append(time.perf_counter())
+        await lease.release()
+
+    await asyncio.gather(*(send() for _ in range(burst)))
+    return samples
+
+
+async def overhead(args: argparse.Namespace) -> None:
+    backends = [("memory", lambda: MemoryGenerationLocks(max_per_user=args.burst))]
+    if aioredis is not None:
+        backends.append(("redis", lambda: RedisGenerationLocks(args.redis_url, args.burst, 30, 0.01)))
+    print(f"{'backend':>8} | {'acquire+release µs':>18} | {'hand-over µs p50':>16} {'max':>8}")
+    for name, backend in backends:
+        try:
+            locks = backend()
+            per_lease = await uncontended(GenerationGuard(locks, policy="reject"), args.leases if name == "memory"
+                                          else min(args.leases, 5000))
+            samples = await handover(GenerationGuard(locks, policy="queue", queue_timeout_seconds=30), args.burst)
+            await locks.aclose()
+        except (OSError, ConflictException) as exc:
+            print(f"{name:>8} | skipped ({type(exc).__name__}: {exc})")
+            continue
+        except Exception as exc:  # redis connection errors
+            print(f"{name:>8} | skipped ({type(exc).__name__})")
+            continue
+        print(f"{name:>8} | {per_lease:>18.2f} | {statistics.median(samples):>16.0f} {max(samples):>8.0f}")
+    if aioredis is None:
+        print("   redis | skipped (redis package not installed)")
+
+
+# =============================================================================
+# Parallel sends
+# =============================================================================
+
+
+async def one_send(client: httpx.AsyncClient, thread_id: str, index: int) -> str:
+    async with client.stream(
+        "POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": f"同時送信 {index}"}
+    ) as response:
+        if response.status_code == 409:
+            return "409"
+        if response.status_code != 200:
+            return str(response.status_code)
+        async for line in response.aiter_lines():
+            if line == "event: message_done":
+                return "done"
+    return "cut"
+
+
+def interleaved(database: Path, thread_id: str) -> int:
+    """User messages directly following another user message"""
+    with sqlite3.connect(database) as db:
+        roles = [row[0] for row in db.execute(
+            "SELECT role FROM conversation_messages WHERE session_id = ? ORDER BY created_at", (thread_id,)
+        )]
+    return sum(a == b == "user" for a, b in zip(roles, roles[1:]))
+
+
+async def stub_requests() -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"http://127.0.0.1:{STUB_PORT}/stats")).json()["requests"]
+
+
+def sends(policy: str, args: argparse.Namespace, database: Path, thread_id: str) -> None:
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "error"],
+        cwd=ROOT,
+        env=dict(
+            os.environ,
+            DEBUG="false",
+            DATABASE_URL=f"sqlite:///{database}",
+            LLM_PROVIDER="stub",
+            LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+            LLM_PREWARM_CONNECTIONS="0",
+            GENERATION_GUARD_POLICY=policy,
+            GENERATION_QUEUE_TIMEOUT_SECONDS="30",
+        ),
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+
+        async def burst() -> list:
+            headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", headers=headers,
+                                         timeout=60) as client:
+                return await asyncio.gather(*(one_send(client, thread_id, i) for i in range(args.burst)))
+
+        before = asyncio.run(stub_requests())
+        started = time.perf_counter()
+        results = asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+        llm = asyncio.run(stub_requests()) - before
+    finally:
+        worker.terminate()
+        worker.wait()
+    print(f"{policy:>9} | {sum(r != '409' for r in results):>8} {results.count('409'):>5} "
+          f"{results.count('done'):>6} | {llm:>12} | {interleaved(database, thread_id):>11} | {elapsed:>6.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generation guard benchmark")
+    parser.add_argument("--leases", type=int, default=100000)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--reply-tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(overhead(args))
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT), "--first-token-ms", "200",
+         "--tokens-per-second", "100", "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            threads = create_threads(database, 3)
+            print(f"\n{args.burst} parallel sends on one thread\n")
+            print(f"{'policy':>9} | {'streamed':>8} {'409':>5} {'done':>6} | {'LLM requests':>12} | "
+                  f"{'interleaved':>11} | {'time s':>6}")
+            for policy, thread_id in zip(("reject", "queue", "supersede"), threads):
+                sends(policy, args, database, thread_id)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
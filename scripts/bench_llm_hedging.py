@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+LLM hedging benchmark: time to first token against a slow-tailed / failing provider
+
+Usage:
+    python scripts/bench_llm_hedging.py [--requests 400] [--concurrency 10] [--first-token-ms 400]
+        [--first-token-sigma 0.25] [--slow-ratio 0.1] [--slow-first-token-ms 4000]
+
+Starts three stub LLM servers (app.services.llm.stub) with injected
+latency and failures:
+
+    primary    - log-normal first token around --first-token-ms, and
+                 --slow-ratio of requests waiting --slow-first-token-ms
+    alternate  - the same distribution, another seed (a second region /
+                 deployment of the model)
+    broken     - every request answered with HTTP 503
+
+and runs one API worker (uvicorn, LLM_PROVIDER=stub, temporary SQLite
+database) per scenario:
+
+    single     - primary only: deadlines and breaker, nothing to hedge to
+    hedged     - primary, LLM_FALLBACK_PROVIDER=alternate
+    outage     - broken, LLM_FALLBACK_PROVIDER=alternate
+
+--requests POST /v1/threads/{id}/messages:stream, --concurrency at a time.
+Per scenario: time from message_start to the first content_delta (the
+LLM stage; p50 / p95 / p99 and the share over 3 s), streams that sent
+`waiting` or ended in `error`, and from the worker's /metrics and the
+stubs' /stats the hedges, the extra upstream requests they cost and the
+breaker state of each provider. Requests refused before message_start
+(the temporary SQLite database is locked by concurrent commits) are
+counted as rejected and left out.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User, UserCharacterMemory  # noqa: E402,F401
+
+PRIMARY_PORT = 8774
+ALTERNATE_PORT = 8775
+BROKEN_PORT = 8776
+API_PORT = 8777
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+METRICS_TOKEN = "bench"
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def one_stream(client: httpx.AsyncClient, index: int, thread_id: str) -> dict:
+    started = None
+    result = {"ttft": None, "waiting": False, "error": False, "rejected": False}
+    event = None
+    async with client.stream(
+        "POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": f"こんにちは {index}"}
+    ) as response:
+        if response.status_code != 200:
+            result["rejected"] = True
+            return result
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "message_start":
+                    started = time.perf_counter()
+                elif event == "waiting":
+                    result["waiting"] = True
+                elif event == "error":
+                    result["error"] = True
+                elif event == "content_delta" and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - started
+    return result
+
+
+async def load(args: argparse.Namespace, threads: list) -> tuple:
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}", "X-Metrics-Token": METRICS_TOKEN}
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def limited(client: httpx.AsyncClient, index: int) -> dict:
+        async with slots:
+            return await one_stream(client, index, threads[index % len(threads)])
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, timeout=60) as client:
+        results = await asyncio.gather(*(limited(client, i) for i in range(args.requests)))
+        metrics = (await client.get("/metrics")).json()
+    return results, metrics
+
+
+async def stub_requests() -> dict:
+    async with httpx.AsyncClient() as client:
+        return {
+            port: (await client.get(f"http://127.0.0.1:{port}/stats")).json()
+            for port in (PRIMARY_PORT, ALTERNATE_PORT, BROKEN_PORT)
+        }
+
+
+def run(name: str, args: argparse.Namespace, database: Path, threads: list, primary: int, fallback: int) -> None:
+    env = dict(
+        os.environ,
+        DEBUG="false",
+        METRICS_TOKEN=METRICS_TOKEN,
+        DATABASE_URL=f"sqlite:///{database}",
+        LLM_PROVIDER="stub",
+        LLM_BASE_URL=f"http://127.0.0.1:{primary}/v1",
+        LLM_PREWARM_CONNECTIONS="0",
+        GENERATION_MAX_PER_USER=str(args.concurrency),  # one bench user on many threads
+    )
+    if fallback:
+        env.update(LLM_FALLBACK_PROVIDER="stub", LLM_FALLBACK_BASE_URL=f"http://127.0.0.1:{fallback}/v1")
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "error"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+        before = asyncio.run(stub_requests())
+        results, metrics = asyncio.run(load(args, threads))
+        after = asyncio.run(stub_requests())
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    served = [r for r in results if not r["rejected"]]
+    ttft = [r["ttft"] * 1000 for r in served if r["ttft"] is not None]
+    upstream = sum(after[port]["requests"] - before[port]["requests"] for port in after)
+    llm = metrics["llm"]
+    print(f"{name:>8} | {len(results) - len(served):>8} | {percentile(ttft, 0.5):>7.0f} {percentile(ttft, 0.95):>7.0f} "
+          f"{percentile(ttft, 0.99):>7.0f} {sum(t > 3000 for t in ttft) / len(served):>7.1%} | "
+          f"{sum(r['waiting'] for r in served):>7} {sum(r['error'] for r in served):>6} | "
+          f"{llm['hedges']:>6} {llm['hedge_wins']:>5} {llm['fallbacks']:>9} {upstream - len(served):>+6} | "
+          + ", ".join(f"{p['provider']}:{p['breaker']['state']}({p['breaker']['opens']})" for p in llm["providers"]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LLM hedging benchmark")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--first-token-sigma", type=float, default=0.25)
+    parser.add_argument("--slow-ratio", type=float, default=0.1)
+    parser.add_argument("--slow-first-token-ms", type=float, default=4000)
+    parser.add_argument("--reply-tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    latency = ["--first-token-ms", str(args.first_token_ms), "--first-token-sigma", str(args.first_token_sigma),
+               "--slow-ratio", str(args.slow_ratio), "--slow-first-token-ms", str(args.slow_first_token_ms),
+               "--reply-tokens", str(args.reply_tokens), "--tokens-per-second", "100"]
+    stubs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "app.services.llm.stub", "--port", str(port), *extra],
+            cwd=ROOT,
+            env=dict(os.environ, DEBUG="false"),
+        )
+        for port, extra in (
+            (PRIMARY_PORT, latency + ["--seed", "1"]),
+            (ALTERNATE_PORT, latency + ["--seed", "2"]),
+            (BROKEN_PORT, ["--error-ratio", "1"]),
+        )
+    ]
+    try:
+        for port in (PRIMARY_PORT, ALTERNATE_PORT, BROKEN_PORT):
+            asyncio.run(wait_until_up(f"http://127.0.0.1:{port}/v1/models"))
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            threads = create_threads(database, args.concurrency)
+            print(f"{args.requests} streams, {args.concurrency} concurrent; first token ~{args.first_token_ms:.0f} ms, "
+                  f"{args.slow_ratio:.0%} at {args.slow_first_token_ms:.0f} ms\n")
+            print(f"{'scenario':>8} | {'rejected':>8} | {'ttft p50':>7} {'p95':>7} {'p99':>7} {'>3 s':>7} | {'waiting':>7} "
+                  f"{'errors':>6} | {'hedges':>6} {'wins':>5} {'fallbacks':>9} {'extra':>6} | breakers (opens)")
+            run("single", args, database, threads, PRIMARY_PORT, 0)
+            run("hedged", args, database, threads, PRIMARY_PORT, ALTERNATE_PORT)
+            run("outage", args, database, threads, BROKEN_PORT, ALTERNATE_PORT)
+    finally:
+        for stub in stubs:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Message write benchmark: per-message commits vs the write-behind queue
+
+Usage:
+    python scripts/bench_message_writes.py [--messages 20000] [--writers 64] [--threads 500]
+        [--database-url postgresql+asyncpg://...]
+
+1. Throughput (in process, temporary SQLite database unless
+   --database-url): --writers concurrent writers store --messages
+   messages spread over --threads threads through
+   app.services.message_writes, once per mode:
+
+       direct        - MESSAGE_WRITE_BEHIND=false: one transaction per
+                       message (INSERT + thread counter UPDATE)
+       write-behind  - queued, one multi-row INSERT + one counter
+                       executemany per flush (MESSAGE_WRITE_FLUSH_MS),
+                       spill log in a temporary directory (fsync on)
+
+   Reports messages/s until every message is committed, put() latency
+   p50 / p99 (what a reply write waits for), the batches and their
+   average size, and whether the stored rows and thread counters match.
+
+2. Crash recovery: messages are queued but never flushed, the spill log
+   is abandoned the way a killed worker leaves it, and a new queue
+   replays it at startup. Also checks that the queued messages were
+   visible to history reads (merge()) before they were stored.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User, UserCharacterMemory  # noqa: E402,F401
+from app.services.message_writes import MessageWriteQueue, SpillLog  # noqa: E402
+
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+
+
+async def create_database(url: str, threads: int) -> tuple:
+    """Engine, session factory and `threads` fresh threads of the bench user"""
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        if await db.get(User, USER) is None:
+            db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        sessions = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(threads)]
+        db.add_all(sessions)
+        await db.commit()
+    return engine, factory, [session.id for session in sessions]
+
+
+async def stored(factory: async_sessionmaker, thread_ids: list) -> tuple:
+    """(messages stored in thread_ids, sum of their message_count)"""
+    async with factory() as db:
+        rows = await db.scalar(
+            select(func.count()).select_from(ConversationMessage).where(ConversationMessage.session_id.in_(thread_ids))
+        )
+        counted = await db.scalar(
+            select(func.sum(ConversationSession.message_count)).where(ConversationSession.id.in_(thread_ids))
+        )
+    return rows, counted or 0
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+# =============================================================================
+# Throughput
+# =============================================================================
+
+
+async def throughput(mode: str, args: argparse.Namespace, url: str, spill_dir: Path) -> None:
+    engine, factory, thread_ids = await create_database(url, args.threads)
+    queue = MessageWriteQueue(
+        factory,
+        enabled=mode == "write-behind",
+        spill=SpillLog(spill_dir / mode) if mode == "write-behind" else None,
+        queue_max=args.queue_max,
+    )
+    await queue.start()
+    latencies = []
+    failed = 0
+    per_writer = args.messages // args.writers
+
+    async def writer(index: int) -> None:
+        nonlocal failed
+        for i in range(per_writer):
+            thread_id = thread_ids[(index * per_writer + i) % len(thread_ids)]
+            started = time.perf_counter()
+            try:
+                await queue.put(thread_id, "user" if i % 2 == 0 else "character", f"メッセージ {index}-{i} " * 4)
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(args.writers)))
+    await queue.stop()  # final flush: everything committed
+    elapsed = time.perf_counter() - started
+    rows, counted = await stored(factory, thread_ids)
+    await engine.dispose()
+
+    total = per_writer * args.writers
+    ms = [latency * 1000 for latency in latencies]
+    stats = queue.stats()
+    print(f"{mode:>12} | {total / elapsed:>10.0f} | {statistics.median(ms):>7.2f} {percentile(ms, 0.99):>7.2f} | "
+          f"{stats['batches'] or total:>7} {stats['avg_batch'] or 1:>6} | {failed:>6} | "
+          f"{'ok' if rows == counted == total - failed else f'{rows} rows / {counted} counted':>8}")
+
+
+# =============================================================================
+# Crash recovery
+# =============================================================================
+
+
+async def recovery(args: argparse.Namespace, url: str, spill_dir: Path) -> None:
+    engine, factory, thread_ids = await create_database(url, 10)
+    directory = spill_dir / "recovery"
+
+    # A worker that dies before its first flush
+    doomed = MessageWriteQueue(factory, enabled=True, spill=SpillLog(directory))
+    queued = []
+    for i in range(args.recovery_messages):
+        queued.append(await doomed.put(thread_ids[i % 10], "user", f"未保存 {i}", str(uuid.uuid4())))
+    visible = doomed.merge(thread_ids[0], [], 1000)
+    doomed.spill.close()  # what the process exit leaves: segments kept, locks released
+    before, _ = await stored(factory, thread_ids)
+
+    successor = MessageWriteQueue(factory, enabled=True, spill=SpillLog(directory))
+    recovered = await successor.recover()
+    await successor.flush()
+    again = await MessageWriteQueue(factory, enabled=True, spill=SpillLog(directory)).recover()
+    successor.spill.close()
+    rows, counted = await stored(factory, thread_ids)
+    await engine.dispose()
+
+    expected = [message.id for message in queued if message.session_id == thread_ids[0]]
+    print(f"queued {len(queued)}, visible to history reads before storing: "
+          f"{'yes' if [m.id for m in visible] == expected else 'NO'}")
+    print(f"stored before recovery {before}, recovered {recovered}, stored after {rows} "
+          f"(message_count {counted}), replayed again {again}, segments left {len(list(directory.glob('*.jsonl')))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Message write benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=500)
+    parser.add_argument("--queue-max", type=int, default=10000)
+    parser.add_argument("--recovery-messages", type=int, default=1000)
+    parser.add_argument("--database-url", default="")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        spill_dir = Path(tmp) / "spill"
+        print(f"{args.messages} messages, {args.writers} writers, {args.threads} threads\n")
+        print(f"{'mode':>12} | {'msgs/s':>10} | {'put p50':>7} {'p99 ms':>7} | {'batches':>7} {'avg':>6} | "
+              f"{'failed':>6} | {'counters':>8}")
+        for mode in ("direct", "write-behind"):
+            asyncio.run(throughput(mode, args, url, spill_dir))
+        print("\nCrash recovery\n")
+        asyncio.run(recovery(args, url, spill_dir))
+
+
+if __name__ == "__main__":
+    main()
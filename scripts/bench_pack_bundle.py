@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Pack detail screen benchmark: separate requests vs one include= bundle
+
+Usage:
+    python scripts/bench_pack_bundle.py [--rtt-ms 150] [--db-ms 5] [--requests 30]
+
+The pack detail screen needs the pack, its items, the caller's
+entitlement and summaries of its characters. Requests go through the
+ASGI app in process, with every request delayed by --rtt-ms (simulated
+mobile round trip) and every DB query by --db-ms. Compared:
+
+    sequential - GET /packs/{id}, /packs/{id}/items, then entitlement and
+                 characters (bench-only routes over the same services),
+                 one after another
+    parallel   - the same four requests issued at once
+    bundle     - GET /packs/{id}?include=items,entitlement,characters
+
+Each flow runs cold (user_pack_status / character_summaries caches
+cleared before every screen) and warm.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.schemas.catalog import Pack, PackItem, PackStats  # noqa: E402
+from app.schemas.common import Character, Creator  # noqa: E402
+from app.schemas.purchase import Entitlement  # noqa: E402
+from app.services.catalog_index import CatalogIndex, catalog_index  # noqa: E402
+from app.services.character_summaries import character_summaries  # noqa: E402
+from app.services.user_pack_status import user_pack_status  # noqa: E402
+
+PACKS = 1000
+USER = "00000000-0000-0000-0000-000000000001"
+INCLUDE = "items,entitlement,characters"
+
+
+class DelayedTransport(httpx.ASGITransport):
+    """ASGI transport adding a fixed round trip to every request"""
+
+    def __init__(self, app, rtt: float) -> None:
+        super().__init__(app=app)
+        self.rtt = rtt
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.rtt)
+        return await super().handle_async_request(request)
+
+
+def generate() -> tuple:
+    creator = Creator(id="creator_00000", display_name="作者")
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    packs, items = [], {}
+    for i in range(PACKS):
+        pack_id = f"pack_{i:08d}"
+        packs.append(Pack(
+            id=pack_id,
+            pack_type="persona",
+            name=f"Pack {i}",
+            description="",
+            thumbnail_url=f"https://cdn.example.com/packs/{i}/thumb.webp",
+            price=500,
+            is_free=False,
+            age_rating="all",
+            creator=creator,
+            stats=PackStats(favorite_count=0, conversation_count=0),
+            created_at=base + timedelta(seconds=i),
+        ))
+        items[pack_id] = [
+            PackItem(id=f"item_{i}_{j}", item_type="character", item_id=f"char_{i:08d}_{j}", name=f"キャラ{j}")
+            for j in range(3)
+        ]
+    return packs, items
+
+
+def install_loaders(db: float) -> None:
+    """Replace the TODO loaders with ones that cost db seconds per query"""
+
+    async def owned(session, user_id):
+        await asyncio.sleep(db)
+        return [f"pack_{i:08d}" for i in range(0, PACKS, 2)]
+
+    async def favorited(session, user_id):
+        await asyncio.sleep(db)
+        return []
+
+    async def entitlement(session, user_id, pack_id):
+        await asyncio.sleep(db)
+        return Entitlement(
+            id=f"ent_{pack_id}",
+            entitlement_type="pack",
+            entitlement_id=pack_id,
+            granted_at=datetime(2025, 6, 1, tzinfo=timezone.utc),
+        )
+
+    async def characters(session, character_ids):
+        await asyncio.sleep(db)
+        return [
+            Character(id=c, name=c, avatar_url=f"https://cdn.example.com/characters/{c}.webp")
+            for c in character_ids
+        ]
+
+    user_pack_status.load_owned = owned
+    user_pack_status.load_favorited = favorited
+    user_pack_status.load_entitlement = entitlement
+    character_summaries.load_characters = characters
+
+
+def build_app():
+    """App with bench-only entitlement / character routes over the same services"""
+    from fastapi import APIRouter
+
+    from app.main import create_app
+
+    app = create_app()
+    router = APIRouter(prefix="/bench")
+
+    @router.get("/entitlements/{pack_id}")
+    async def entitlement(pack_id: str):
+        return await user_pack_status.entitlement(USER, pack_id)
+
+    @router.get("/packs/{pack_id}/characters")
+    async def characters(pack_id: str):
+        ids = [i.item_id for i in catalog_index.current.get_items(pack_id) if i.item_type == "character"]
+        return await character_summaries.load(ids)
+
+    app.include_router(router)
+    return app
+
+
+async def sequential(client: httpx.AsyncClient, pack_id: str) -> None:
+    for path in (f"/v1/packs/{pack_id}", f"/v1/packs/{pack_id}/items",
+                 f"/bench/entitlements/{pack_id}", f"/bench/packs/{pack_id}/characters"):
+        (await client.get(path)).raise_for_status()
+
+
+async def parallel(client: httpx.AsyncClient, pack_id: str) -> None:
+    responses = await asyncio.gather(
+        client.get(f"/v1/packs/{pack_id}"),
+        client.get(f"/v1/packs/{pack_id}/items"),
+        client.get(f"/bench/entitlements/{pack_id}"),
+        client.get(f"/bench/packs/{pack_id}/characters"),
+    )
+    for response in responses:
+        response.raise_for_status()
+
+
+async def bundle(client: httpx.AsyncClient, pack_id: str) -> None:
+    response = await client.get(f"/v1/packs/{pack_id}", params={"include": INCLUDE})
+    response.raise_for_status()
+    body = response.json()
+    assert body["entitlement"] is not None and len(body["characters"]) == 3, body
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, samples: list) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"    {name:10} p50={statistics.median(ms):8.1f} ms  p99={percentile(ms, 0.99):8.1f} ms")
+
+
+async def run(args: argparse.Namespace) -> None:
+    packs, items = generate()
+    catalog_index._index = CatalogIndex.build(1, packs, items)
+    catalog_index._version = 1
+    install_loaders(args.db_ms / 1000)
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+    transport = DelayedTransport(build_app(), rtt=args.rtt_ms / 1000)
+    print(f"simulated RTT {args.rtt_ms} ms, DB query {args.db_ms} ms, {args.requests} screens per flow")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for cold in (True, False):
+            print(f"\n  {'cold' if cold else 'warm'} caches")
+            for name, flow in (("sequential", sequential), ("parallel", parallel), ("bundle", bundle)):
+                samples = []
+                for i in range(args.requests):
+                    # Even packs are owned, so the entitlement is always queried
+                    pack_id = f"pack_{(i * 2) % PACKS:08d}"
+                    if cold:
+                        user_pack_status.invalidate(USER)
+                        character_summaries._entries.clear()
+                    started = time.perf_counter()
+                    await flow(client, pack_id)
+                    samples.append(time.perf_counter() - started)
+                report(name, samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack detail bundle benchmark")
+    parser.add_argument("--rtt-ms", type=float, default=150)
+    parser.add_argument("--db-ms", type=float, default=5)
+    parser.add_argument("--requests", type=int, default=30)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
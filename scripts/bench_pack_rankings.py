@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Pack ranking benchmark: query-time decayed aggregation vs precomputed rankings
+
+Usage:
+    python scripts/bench_pack_rankings.py [--sessions 50000000] [--packs 20000] [--days 90] [--sql-sessions 1000000]
+
+Synthetic conversation_sessions (Zipf-distributed over packs, plus a few
+packs with a burst in the last two days) spread evenly over --days.
+Measured:
+
+    query-time  - SELECT ... SUM(POWER(2, (started_at - now) / half_life))
+                  GROUP BY pack ORDER BY score LIMIT 20 over a SQLite
+                  table of --sql-sessions rows (what every request would
+                  pay; scales linearly, so the time for --sessions is
+                  extrapolated)
+    backfill    - app.services.pack_rankings.PackRankingJob folding all
+                  --sessions events (one-time)
+    incremental - the next run, folding only the last interval's events
+    page        - list_packs sort=trending / popularity pages (limit 20,
+                  walking 5 cursors) from the catalog index
+
+Sessions are generated on demand from their position, so the event
+source honours the job's keyset watermark without storing 50M rows.
+Uses a temporary SQLite file for pack_rankings.
+"""
+import argparse
+import asyncio
+import math
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.models.pack_ranking import PackRanking, PackRankingWatermark  # noqa: E402
+from app.schemas.catalog import Pack, PackStats  # noqa: E402
+from app.schemas.common import Creator  # noqa: E402
+from app.services.catalog_index import AGE_GROUP_RATINGS, CatalogIndex, CatalogIndexManager, PackQuery  # noqa: E402
+from app.services.pack_rankings import PackRankingJob, decayed_score  # noqa: E402
+
+HALF_LIVES = {"popularity": 720 * 3600.0, "trending": 24 * 3600.0}
+INTERVAL = 300
+TRENDING_PACKS = 10
+
+
+class SyntheticSessions:
+    """Session i happens at start + i * step; its pack is a pure function of i"""
+
+    def __init__(self, sessions: int, packs: int, days: int, now: datetime) -> None:
+        self.count = sessions
+        self.packs = packs
+        self.start = now.timestamp() - days * 86400
+        self.step = days * 86400 / sessions
+        self.burst_from = now.timestamp() - 2 * 86400
+        rng = random.Random(7)
+        # Zipf(1.1) over packs, as a 64k lookup table
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(packs)]
+        self.table = rng.choices(range(packs), weights=weights, k=65536)
+        # Trending packs come from the long tail
+        self.trending = rng.sample(range(packs // 2, packs), TRENDING_PACKS)
+
+    def at(self, i: int) -> float:
+        return self.start + i * self.step
+
+    def pack(self, i: int, at: float) -> int:
+        if at >= self.burst_from and i % 5 == 0:
+            return self.trending[(i // 5) % TRENDING_PACKS]
+        return self.table[(i * 2654435761) % 65536]
+
+    def before(self, until: datetime) -> int:
+        """Number of sessions started before until"""
+        return max(0, min(self.count, math.ceil((until.timestamp() - self.start) / self.step)))
+
+    async def source(self, db, watermark, until: datetime, limit: int):
+        start = int(watermark[1]) + 1 if watermark[1] else 0
+        end = min(start + limit, self.before(until))
+        if start >= end:
+            return [], None
+        events = []
+        for i in range(start, end):
+            at = self.at(i)
+            events.append((pack_id(self.pack(i, at)), datetime.fromtimestamp(at, timezone.utc), 1.0))
+        return events, (events[-1][1], f"{end - 1:012d}")
+
+
+def pack_id(number: int) -> str:
+    return f"pack_{number:08d}"
+
+
+def generate_packs(count: int) -> list:
+    creator = Creator(id="creator_00000", display_name="作者")
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        Pack(
+            id=pack_id(i),
+            pack_type="persona",
+            name=f"Pack {i}",
+            description="",
+            thumbnail_url=f"https://cdn.example.com/packs/{i}/thumb.webp",
+            price=0,
+            is_free=True,
+            age_rating="all",
+            tags=[],
+            creator=creator,
+            stats=PackStats(favorite_count=0, conversation_count=0),
+            created_at=base + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def query_time(sessions: SyntheticSessions, rows: int, now: datetime) -> float:
+    """Seconds per request for SQL decayed aggregation over rows sessions"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE conversation_sessions (id INTEGER PRIMARY KEY, pack_id TEXT, started_at REAL)")
+    step = sessions.count / rows
+    conn.executemany(
+        "INSERT INTO conversation_sessions VALUES (?, ?, ?)",
+        ((i, pack_id(sessions.pack(j, sessions.at(j))), sessions.at(j))
+         for i, j in ((i, int(i * step)) for i in range(rows))),
+    )
+    conn.execute("CREATE INDEX idx_cs_started ON conversation_sessions (started_at)")
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        conn.execute(
+            "SELECT pack_id, SUM(POWER(2.0, (started_at - ?) / ?)) AS score FROM conversation_sessions "
+            "GROUP BY pack_id ORDER BY score DESC LIMIT 20",
+            (now.timestamp(), HALF_LIVES["trending"]),
+        ).fetchall()
+        samples.append(time.perf_counter() - started)
+    conn.close()
+    return statistics.median(samples)
+
+
+async def run(args: argparse.Namespace) -> None:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    sessions = SyntheticSessions(args.sessions, args.packs, args.days, now)
+
+    print(f"{args.sessions:,} sessions over {args.days} days, {args.packs:,} packs")
+    per_request = query_time(sessions, args.sql_sessions, now)
+    print(f"  query-time   {per_request * 1000:10.1f} ms per request over {args.sql_sessions:,} rows "
+          f"(~{per_request * args.sessions / args.sql_sessions:.1f} s at {args.sessions:,})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/rankings.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[PackRanking.__table__, PackRankingWatermark.__table__])
+        index = CatalogIndexManager(interval_seconds=3600)
+        index._index = CatalogIndex.build(1, generate_packs(args.packs), {})
+        job = PackRankingJob(
+            interval_seconds=INTERVAL,
+            half_lives=HALF_LIVES,
+            batch_size=args.batch,
+            settle_seconds=0,
+            session_factory=async_sessionmaker(engine, expire_on_commit=False),
+            sources={"conversation_sessions": sessions.source},
+            index=index,
+        )
+
+        started = time.perf_counter()
+        folded = await job.run(until=now - timedelta(seconds=INTERVAL))
+        elapsed = time.perf_counter() - started
+        print(f"  backfill     {elapsed:10.1f} s  ({folded:,} events, {folded / elapsed:,.0f} events/s, one-time)")
+
+        started = time.perf_counter()
+        folded = await job.run(until=now)
+        elapsed = time.perf_counter() - started
+        print(f"  incremental  {elapsed * 1000:10.1f} ms ({folded:,} events of the last {INTERVAL} s)")
+
+        for ranking in HALF_LIVES:
+            samples = []
+            for _ in range(200):
+                cursor = None
+                for _ in range(5):
+                    started = time.perf_counter()
+                    page, cursor = index.current.query(
+                        PackQuery(ratings=AGE_GROUP_RATINGS["adult"], sort=ranking, cursor=cursor, limit=20)
+                    )
+                    samples.append(time.perf_counter() - started)
+            ms = [s * 1000 for s in samples]
+            print(f"  page {ranking:11} p50={statistics.median(ms):7.3f} ms  p99={percentile(ms, 0.99):7.3f} ms")
+
+        top, _ = index.current.query(PackQuery(ratings=AGE_GROUP_RATINGS["adult"], sort="trending", limit=20))
+        trending = {pack_id(number) for number in sessions.trending}
+        print(f"\nburst packs in the trending top 20: {len(trending & {p.id for p in top})}/{TRENDING_PACKS}")
+        if args.verify:
+            verify(sessions, job, now)
+        await engine.dispose()
+
+
+def verify(sessions: SyntheticSessions, job: PackRankingJob, now: datetime) -> None:
+    """Stored log scores must equal a direct decayed sum over every session"""
+    half_life = HALF_LIVES["trending"]
+    direct = {}
+    for i in range(sessions.before(now)):
+        at = sessions.at(i)
+        key = pack_id(sessions.pack(i, at))
+        direct[key] = direct.get(key, 0.0) + 2.0 ** ((at - now.timestamp()) / half_life)
+    worst = 0.0
+    for key, value in direct.items():
+        stored = decayed_score(job.scores["trending"][key], half_life, now.timestamp())
+        worst = max(worst, abs(stored - value) / value)
+    print(f"max relative error vs direct sum: {worst:.2e} -> {'OK' if worst < 1e-6 else 'MISMATCH'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack ranking benchmark")
+    parser.add_argument("--sessions", type=int, default=50_000_000)
+    parser.add_argument("--packs", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--sql-sessions", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--verify", action="store_true", help="recompute every score directly (slow)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
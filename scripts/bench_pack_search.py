@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Pack keyword search benchmark (relevance and latency)
+
+Usage:
+    python scripts/bench_pack_search.py [--packs 100000] [--queries 300]
+
+Generates a Japanese pack corpus (names, descriptions, tags, creator
+names; keywords mixed into a background vocabulary of kanji compounds)
+and runs keyword queries, half of them typed as a variant of the indexed
+form (hiragana for katakana, half-width katakana, full-width latin). For each engine it reports:
+
+    recall     - share of packs that really contain the keyword (after
+                 normalization) that were returned
+    precision  - share of returned packs that really contain it
+    name@10    - share of the top 10 whose name contains it (ranking)
+    p50 / p99  - latency per query
+
+Engines: the in-process n-gram index (app.services.pack_search) ranked
+with BM25 ("index", sort=relevance) and as a plain filter ("match",
+other sorts), and the LIKE '%...%' scan the SQL path would otherwise use
+(SQLite, no normalization).
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schemas.catalog import Pack, PackStats  # noqa: E402
+from app.schemas.common import Creator, Tag  # noqa: E402
+from app.services.pack_search import PackSearchIndex, normalize  # noqa: E402
+
+KATAKANA = ["カフェ", "ファンタジー", "ツンデレ", "メイド", "アイドル", "ミステリー", "ホラー", "ロマンス",
+            "バンド", "サッカー", "ゲーム", "ヒーロー", "ドラゴン", "プリンセス", "スパイ", "ロボット"]
+KANJI = ["放課後", "幼なじみ", "学園", "冒険", "先輩", "後輩", "日常", "星空", "魔法", "探偵", "生徒会",
+         "図書館", "夏祭り", "温泉", "雪国", "剣士", "王国", "料理", "音楽", "恋愛", "友情", "秘密"]
+HIRAGANA = ["ゆるふわ", "あまあま", "のんびり", "ひみつ", "おでかけ", "いやし"]
+LATIN = ["VTuber", "ASMR", "RPG", "SF"]
+WORDS = KATAKANA + KANJI + HIRAGANA + LATIN
+FILLER = ["の", "と", "な", "で", "、", "。", "する", "物語", "世界", "あなた", "一緒に"]
+# Background vocabulary so keywords have realistic document frequencies
+KANJI_POOL = "春夏秋冬朝昼夜空海山川森花風雨雪月星光影夢心愛恋友家町村道駅店本歌声色音時間旅路街橋港島城塔庭窓扉"
+
+
+def variant(word: str, rng: random.Random) -> str:
+    """A differently typed form of word that normalizes to the same text"""
+    if word in KATAKANA:
+        if rng.random() < 0.5:
+            return "".join(chr(ord(c) - 0x60) if 0x30A1 <= ord(c) <= 0x30F6 else c for c in word)
+        return unicodedata.normalize("NFKC", word).translate(_HALF_WIDTH)
+    if word in LATIN:
+        return "".join(chr(ord(c) + 0xFEE0) for c in word)
+    return word
+
+
+# Full-width katakana -> half-width (subset sufficient for KATAKANA above)
+_HALF_WIDTH = str.maketrans({
+    "カ": "ｶ", "フ": "ﾌ", "ェ": "ｪ", "ァ": "ｧ", "ン": "ﾝ", "タ": "ﾀ", "ジ": "ｼﾞ", "ー": "ｰ", "ツ": "ﾂ", "デ": "ﾃﾞ",
+    "レ": "ﾚ", "メ": "ﾒ", "イ": "ｲ", "ド": "ﾄﾞ", "ア": "ｱ", "ル": "ﾙ", "ミ": "ﾐ", "ス": "ｽ", "テ": "ﾃ", "リ": "ﾘ",
+    "ホ": "ﾎ", "ラ": "ﾗ", "ロ": "ﾛ", "マ": "ﾏ", "バ": "ﾊﾞ", "サ": "ｻ", "ッ": "ｯ", "ゲ": "ｹﾞ", "ム": "ﾑ", "ヒ": "ﾋ",
+    "ゴ": "ｺﾞ", "プ": "ﾌﾟ", "セ": "ｾ", "パ": "ﾊﾟ", "イ": "ｲ", "ボ": "ﾎﾞ", "ト": "ﾄ", "ヤ": "ﾔ",
+})
+
+
+def generate(count: int, rng: random.Random) -> list:
+    background = list({"".join(rng.sample(KANJI_POOL, 2)) for _ in range(3000)})
+    tags = [Tag(id=f"tag_{i:03d}", name=word) for i, word in enumerate(WORDS)]
+    creators = [Creator(id=f"creator_{i:05d}", display_name=f"{rng.choice(WORDS)}工房{i}") for i in range(2000)]
+    packs = []
+    for i in range(count):
+        name = "".join(rng.sample(WORDS, 2)) + rng.choice(["", "物語", "の日々", "ライフ"])
+        description = "".join(
+            rng.choice(WORDS) if rng.random() < 0.05 else rng.choice(background + FILLER)
+            for _ in range(40)
+        )
+        packs.append(
+            Pack(
+                id=f"pack_{i:08d}",
+                pack_type="persona",
+                name=name,
+                description=description,
+                thumbnail_url="https://cdn.example.com/t.webp",
+                price=0,
+                is_free=True,
+                age_rating="all",
+                tags=rng.sample(tags, rng.randint(1, 4)),
+                creator=rng.choice(creators),
+                stats=PackStats(favorite_count=0, conversation_count=0),
+                created_at="2025-01-01T00:00:00Z",
+            )
+        )
+    return packs
+
+
+def haystack(pack: Pack) -> str:
+    return " ".join([pack.name, pack.description, " ".join(t.name for t in pack.tags), pack.creator.display_name])
+
+
+def load_sql(packs: list) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE packs (ordinal INTEGER PRIMARY KEY, name TEXT, search TEXT)")
+    conn.executemany("INSERT INTO packs VALUES (?, ?, ?)", [(i, p.name, haystack(p)) for i, p in enumerate(packs)])
+    return conn
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack keyword search benchmark")
+    parser.add_argument("--packs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    packs = generate(args.packs, rng)
+    normalized = [normalize(haystack(p)) for p in packs]
+
+    started = time.perf_counter()
+    index = PackSearchIndex.build(packs)
+    stats = index.stats()
+    print(f"index build: {time.perf_counter() - started:.1f} s, {stats['terms']:,} terms, "
+          f"{stats['postings_bytes'] / 1024 / 1024:.1f} MiB postings")
+    conn = load_sql(packs)
+
+    queries = []
+    for _ in range(args.queries):
+        words = rng.sample(WORDS, rng.choice([1, 1, 2]))
+        typed = [variant(w, rng) if rng.random() < 0.5 else w for w in words]
+        queries.append((words, " ".join(typed)))
+
+    results = {"index": [], "match": [], "like": []}
+    for words, typed in queries:
+        keys = [normalize(w) for w in words]
+        relevant = {i for i, text in enumerate(normalized) if all(k in text for k in keys)}
+
+        started = time.perf_counter()
+        scores = index.search(typed)
+        top = sorted(scores, key=scores.get, reverse=True)[:10]
+        elapsed = time.perf_counter() - started
+        results["index"].append((elapsed, set(scores), top, relevant, keys))
+
+        started = time.perf_counter()
+        matched = index.match(typed)
+        elapsed = time.perf_counter() - started
+        results["match"].append((elapsed, matched, sorted(matched)[:10], relevant, keys))
+
+        started = time.perf_counter()
+        where = " AND ".join("search LIKE ?" for _ in typed.split())
+        rows = conn.execute(
+            f"SELECT ordinal FROM packs WHERE {where}", [f"%{w}%" for w in typed.split()]
+        ).fetchall()
+        elapsed = time.perf_counter() - started
+        returned = {row[0] for row in rows}
+        results["like"].append((elapsed, returned, sorted(returned)[:10], relevant, keys))
+
+    print(f"\n{len(queries)} queries over {args.packs:,} packs (about half typed as variants)")
+    for engine, runs in results.items():
+        latencies = [r[0] * 1000 for r in runs]
+        recall = statistics.mean(len(r[1] & r[3]) / len(r[3]) if r[3] else 1.0 for r in runs)
+        precision = statistics.mean(len(r[1] & r[3]) / len(r[1]) if r[1] else 1.0 for r in runs)
+        name_at_10 = statistics.mean(
+            sum(all(k in normalize(packs[o].name) for k in r[4]) for o in r[2]) / len(r[2]) if r[2] else 0.0
+            for r in runs
+        )
+        print(f"  {engine:5} recall={recall:.3f} precision={precision:.3f} name@10={name_at_10:.3f} "
+              f"p50={statistics.median(latencies):7.2f} ms p99={percentile(latencies, 0.99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
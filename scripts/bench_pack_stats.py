@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Pack stats contention benchmark: hot-row UPDATE vs write-behind counters
+
+Usage:
+    python scripts/bench_pack_stats.py [--toggles 1000] [--rounds 5]
+
+1k users toggle the favorite on the same pack concurrently. Compared:
+
+    row      - one UPDATE pack_stats SET favorite_count = favorite_count +- 1
+               transaction per toggle (every toggle contends for the same row)
+    counters - app.services.pack_stats.PackStatsCounters.record_favorite per
+               toggle, flushed write-behind as one UPSERT
+
+Then a correctness run: toggles keep arriving while flushes run; every
+read taken meanwhile (including during a flush's DB round trip) and the
+final pack_stats row must equal the true number of favorites, i.e. no
+delta was hidden, applied twice or lost.
+
+Uses a temporary SQLite file database.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.models.pack_stats import PackStat, PackStatsBatch  # noqa: E402
+from app.services.pack_stats import PackStatsCounters  # noqa: E402
+
+PACK_ID = "pack_hot"
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, total: float, samples: list, extra: str = "") -> None:
+    us = [s * 1_000_000 for s in samples]
+    print(f"  {name:8} total={total * 1000:9.1f} ms  toggle p50={statistics.median(us):10.1f} us  "
+          f"p99={percentile(us, 0.99):10.1f} us  {extra}")
+
+
+async def stored_favorites(sessions: async_sessionmaker) -> int:
+    async with sessions() as db:
+        return (await db.execute(select(PackStat.favorite_count).where(PackStat.pack_id == PACK_ID))).scalar_one()
+
+
+async def reset(sessions: async_sessionmaker) -> None:
+    async with sessions() as db:
+        await db.execute(text("DELETE FROM pack_stats"))
+        await db.execute(text(f"INSERT INTO pack_stats VALUES ('{PACK_ID}', 0, 0, 0, 0, CURRENT_TIMESTAMP)"))
+        await db.commit()
+
+
+async def bench_row(sessions: async_sessionmaker, deltas: list) -> None:
+    samples = []
+    errors = 0
+
+    async def toggle(delta: int) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            async with sessions() as db:
+                await db.execute(
+                    text("UPDATE pack_stats SET favorite_count = favorite_count + :d WHERE pack_id = :p"),
+                    {"d": delta, "p": PACK_ID},
+                )
+                await db.commit()
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(toggle(d) for d in deltas))
+    total = time.perf_counter() - started
+    stored = await stored_favorites(sessions)
+    report("row", total, samples, f"errors={errors} stored={stored} expected={sum(deltas)}")
+
+
+async def bench_counters(sessions: async_sessionmaker, deltas: list) -> None:
+    counters = PackStatsCounters(shards=16, flush_seconds=5, session_factory=sessions)
+    samples = []
+
+    async def toggle(delta: int) -> None:
+        started = time.perf_counter()
+        counters.record_favorite(PACK_ID, delta > 0)
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(toggle(d) for d in deltas))
+    recorded = time.perf_counter() - started
+    read = counters.get(PACK_ID).favorites
+    flush_started = time.perf_counter()
+    await counters.flush()
+    flush = time.perf_counter() - flush_started
+    stored = await stored_favorites(sessions)
+    report("counters", recorded + flush, samples,
+           f"flush={flush * 1000:.1f} ms read={read} stored={stored} expected={sum(deltas)}")
+
+
+async def check_consistency(sessions: async_sessionmaker, toggles: int, rng: random.Random) -> None:
+    """Interleave toggles, reads and flushes; every read and the stored count must equal the truth"""
+    favorited: Dict[str, bool] = {}
+    counters = PackStatsCounters(shards=16, flush_seconds=5, session_factory=sessions)
+    recorded = 0
+    reads = 0
+    stale = 0
+    flushing = True
+
+    async def user(i: int) -> None:
+        nonlocal recorded
+        for _ in range(rng.randint(1, 4)):
+            await asyncio.sleep(rng.random() * 0.05)
+            # Source write commits, then the delta is recorded
+            state = not favorited.get(f"user_{i}", False)
+            favorited[f"user_{i}"] = state
+            counters.record_favorite(PACK_ID, state)
+            recorded += 1
+
+    async def reader() -> None:
+        nonlocal reads, stale
+        while flushing:
+            totals = counters.get(PACK_ID)
+            reads += 1
+            if (totals.favorites if totals else 0) != sum(favorited.values()):
+                stale += 1
+            await asyncio.sleep(0)
+
+    async def background() -> None:
+        nonlocal flushing
+        for _ in range(6):
+            await asyncio.sleep(0.01)
+            await counters.flush()
+        await asyncio.sleep(0.3)
+        flushing = False
+
+    await asyncio.gather(background(), reader(), *(user(i) for i in range(toggles)))
+    await counters.flush()
+    stored = await stored_favorites(sessions)
+    truth = sum(favorited.values())
+    status = "OK" if stored == truth == counters.get(PACK_ID).favorites and not stale else "MISMATCH"
+    print(f"  flushes interleaved with {recorded} toggles: stored={stored} truth={truth} "
+          f"reads={reads} stale_reads={stale} -> {status}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/stats.db", connect_args={"timeout": 60})
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[PackStat.__table__, PackStatsBatch.__table__])
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        rng = random.Random(5)
+
+        print(f"{args.toggles} concurrent favorite toggles on one pack, {args.rounds} rounds")
+        for _ in range(args.rounds):
+            deltas = [rng.choice([1, 1, -1]) for _ in range(args.toggles)]
+            await reset(sessions)
+            await bench_row(sessions, deltas)
+            await reset(sessions)
+            await bench_counters(sessions, deltas)
+
+        print("\nreads and flushes interleaved")
+        await reset(sessions)
+        await check_consistency(sessions, args.toggles, rng)
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack stats contention benchmark")
+    parser.add_argument("--toggles", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
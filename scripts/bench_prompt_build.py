@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Prompt assembly benchmark: build time and stable-prefix hit rate
+
+Usage:
+    python scripts/bench_prompt_build.py [--characters 50] [--users 500] [--turns 20000] [--edit-every 2000]
+
+Replays --turns conversation turns of random (user, character) threads
+with synthetic personas (~1.5k characters each), user memories, thread
+summaries and the last PROMPT_HISTORY_MESSAGES messages of each thread. Every --edit-every
+turns one character's persona is edited (invalidate()).
+
+    naive   - per turn: load, render persona + memory + summary into one
+              system message, count the tokens of every message
+    cached  - PromptBuilder: compiled persona prefix per content version,
+              memory and summary as system messages of their own, token
+              counts per segment
+
+Reports per turn:
+- characters run through the tokenizer (the cost that grows with a BPE
+  tokenizer such as tiktoken; without it count_tokens is a cheap
+  estimate and build times of both are close)
+- build time (DB loads excluded: both would pay them, the cached builder
+  only on a miss)
+- stable-prefix hit rate: turns whose first message was already sent
+  before, i.e. a provider prompt prefix cache can serve it, and the share
+  of prompt tokens inside that prefix
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.config import settings  # noqa: E402
+from app.models.conversation import ConversationMessage  # noqa: E402
+from app.services.llm import MESSAGE_OVERHEAD_TOKENS, ChatMessage, TokenCounts, count_tokens  # noqa: E402
+from app.services.llm.stub import VOCABULARY  # noqa: E402
+from app.services.prompt_builder import (  # noqa: E402
+    CHAT_ROLES,
+    PersonaPromptCache,
+    PersonaSource,
+    PromptBuilder,
+    render_memory,
+    render_persona,
+    render_summary,
+)
+from app.services.user_memories import UserMemory, UserMemoryCache  # noqa: E402
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def words(rng: random.Random, count: int) -> str:
+    return "".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+# =============================================================================
+# Fixtures
+# =============================================================================
+
+
+def make_persona(rng: random.Random, character_id: str, version: int = 0) -> PersonaSource:
+    return PersonaSource(
+        character_id=character_id,
+        name=f"キャラクター{character_id[:4]}",
+        profile=words(rng, 300) + f"（第{version}版）",
+        first_person=rng.choice(("わたし", "ぼく", "あたし")),
+        speaking_style=words(rng, 80),
+        example_lines=tuple(words(rng, 20) for _ in range(5)),
+        scenario=words(rng, 200),
+    )
+
+
+def make_memory(rng: random.Random) -> UserMemory:
+    return UserMemory(
+        nickname=rng.choice(("ゆうくん", "みーちゃん", None)),
+        preferences={f"好み{i}": words(rng, 3) for i in range(rng.randint(0, 4))},
+    )
+
+
+class Fixtures:
+    def __init__(self, args: argparse.Namespace) -> None:
+        rng = random.Random(42)
+        self.characters = [str(uuid.uuid4()) for _ in range(args.characters)]
+        self.users = [str(uuid.uuid4()) for _ in range(args.users)]
+        self.personas = {c: make_persona(rng, c) for c in self.characters}
+        self.versions = {c: 0 for c in self.characters}
+        self.memories = {(u, c): make_memory(rng) for u in self.users for c in rng.sample(self.characters, 3)}
+        self.threads = list(self.memories)
+        self.summaries = {thread: words(rng, 120) for thread in self.threads if rng.random() < 0.7}
+        self.history: dict = {}
+        self.rng = rng
+
+    def edit(self, character_id: str) -> None:
+        self.versions[character_id] += 1
+        self.personas[character_id] = make_persona(self.rng, character_id, self.versions[character_id])
+
+    def append(self, thread: tuple, role: str, content: str) -> None:
+        messages = self.history.setdefault(thread, [])
+        messages.append(ConversationMessage(id=str(uuid.uuid4()), role=role, content=content))
+        del messages[:-settings.PROMPT_HISTORY_MESSAGES]
+
+    async def load_persona(self, db, character_id: str):
+        return self.personas[character_id]
+
+    async def load_memory(self, db, user_id: str, character_id: str):
+        return self.memories.get((user_id, character_id))
+
+
+# =============================================================================
+# Builders
+# =============================================================================
+
+
+class MeasuredCounts(TokenCounts):
+    """TokenCounts that adds up the characters it actually tokenizes"""
+
+    chars = 0
+
+    def count(self, key: str, text: str) -> int:
+        if self.get(key) is None:
+            self.chars += len(text)
+        return super().count(key, text)
+
+
+def naive_build(fixtures: Fixtures, user_id: str, character_id: str, history: list, content: str) -> tuple:
+    """(messages, tokens) rebuilt from scratch"""
+    system = render_persona(fixtures.personas[character_id])
+    memory = fixtures.memories.get((user_id, character_id))
+    if memory is not None and not memory.is_empty:
+        system += "\n\n" + render_memory(memory)
+    summary = fixtures.summaries.get((user_id, character_id))
+    if summary:
+        system += "\n\n" + render_summary(summary)
+    messages = [ChatMessage(role="system", content=system)]
+    messages += [ChatMessage(role=CHAT_ROLES[m.role], content=m.content) for m in history]
+    messages.append(ChatMessage(role="user", content=content))
+    return messages, sum(count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+async def replay(args: argparse.Namespace, cached: bool) -> dict:
+    fixtures = Fixtures(args)
+    counts = MeasuredCounts(max_entries=settings.PROMPT_TOKEN_CACHE_MAX_ENTRIES)
+    personas = PersonaPromptCache(
+        ttl_seconds=settings.PERSONA_PROMPT_TTL_SECONDS,
+        max_entries=settings.PERSONA_PROMPT_MAX_ENTRIES,
+        load_persona=fixtures.load_persona,
+        counts=counts,
+    )
+    memories = UserMemoryCache(
+        ttl_seconds=settings.USER_MEMORY_TTL_SECONDS,
+        max_entries=settings.USER_MEMORY_MAX_ENTRIES,
+        load_memory=fixtures.load_memory,
+    )
+    builder = PromptBuilder(personas, memories, counts)
+    rng = random.Random(7)
+    seen_prefixes: set = set()
+    timings, hits, prefix_share, tokenized = [], 0, [], 0
+    for turn in range(args.turns):
+        if args.edit_every and turn and turn % args.edit_every == 0:
+            character_id = rng.choice(fixtures.characters)
+            fixtures.edit(character_id)
+            personas.invalidate(character_id)
+        user_id, character_id = thread = rng.choice(fixtures.threads)
+        history = fixtures.history.get(thread, [])
+        content = words(rng, 15)
+
+        started = time.perf_counter()
+        if cached:
+            prompt = await builder.build(character_id, user_id, history, content, summary=fixtures.summaries.get(thread))
+            messages, tokens = prompt.messages, prompt.tokens
+        else:
+            messages, tokens = naive_build(fixtures, user_id, character_id, history, content)
+        timings.append((time.perf_counter() - started) * 1e6)
+        # The new message is counted directly by both builders
+        tokenized += len(content) + (0 if cached else sum(len(m.content) for m in messages[:-1]))
+
+        prefix = messages[0].content
+        if prefix in seen_prefixes:
+            hits += 1
+            prefix_share.append((count_tokens(prefix) + MESSAGE_OVERHEAD_TOKENS) / tokens)
+        else:
+            seen_prefixes.add(prefix)
+            prefix_share.append(0.0)
+        fixtures.append(thread, "user", content)
+        fixtures.append(thread, "character", words(rng, 40))
+    return {
+        "timings": timings,
+        "tokenized": (tokenized + counts.chars) / args.turns,
+        "hit_rate": hits / args.turns,
+        "prefix_share": statistics.mean(prefix_share),
+        "personas": personas.stats(),
+        "counts": counts.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prompt assembly benchmark")
+    parser.add_argument("--characters", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--edit-every", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.turns} turns, {args.users} users x 3 of {args.characters} characters, "
+          f"history {settings.PROMPT_HISTORY_MESSAGES} messages, persona edit every {args.edit_every} turns")
+    for label, cached in (("naive", False), ("cached", True)):
+        result = asyncio.run(replay(args, cached))
+        timings = result["timings"]
+        print(f"\n  {label}")
+        print(f"    tokenized      {result['tokenized']:8.0f} chars/turn")
+        print(f"    build          p50={statistics.median(timings):8.1f} us  p99={percentile(timings, 0.99):8.1f} us")
+        print(f"    stable prefix  hit rate {result['hit_rate'] * 100:5.1f} %, "
+              f"{result['prefix_share'] * 100:5.1f} % of prompt tokens")
+        if cached:
+            print(f"    personas {result['personas']}")
+            print(f"    token counts {result['counts']}")
+
+
+if __name__ == "__main__":
+    main()
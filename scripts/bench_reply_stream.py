@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Reply streaming benchmark: concurrent SSE streams per worker
+
+Usage:
+    python scripts/bench_reply_stream.py [--streams 500] [--first-token-ms 300] [--tokens-per-second 50] [--reply-tokens 60]
+
+Starts the stub LLM server (app.services.llm.stub) and one API worker
+(uvicorn, LLM_PROVIDER=stub, temporary SQLite database) as separate
+processes, then opens --streams concurrent
+POST /v1/threads/{id}/messages:stream requests from this process.
+The worker runs twice: with delta coalescing off
+(SSE_COALESCE_MAX_DELAY_MS=0, one event per LLM chunk) and on
+(the configured defaults). Per stream:
+
+    start    - request start to message_start (user message committed)
+    ttft     - request start to the first content_delta
+    total    - request start to message_done
+    events   - content_delta events received
+    bytes    - response body size
+
+plus the worker's CPU time for the whole run and whether every stream
+ended with message_done and the complete reply.
+
+The temporary SQLite database serializes the user-message commits that
+precede message_start, so at a few hundred streams start latency is
+mostly the commit queue and some requests fail with "database is
+locked" (counted as rejected); the streaming stages after it are what
+the two runs compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User  # noqa: E402,F401
+from app.services.llm.stub import reply_tokens  # noqa: E402
+
+STUB_PORT = 8766
+API_PORT = 8767
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+def cpu_seconds(pid: int) -> float:
+    """utime + stime of a process (Linux)"""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def one_stream(client: httpx.AsyncClient, index: int, thread_id: str, reply_length: int) -> dict:
+    content = f"こんにちは {index}"
+    started = time.perf_counter()
+    result = {"start": None, "ttft": None, "total": None, "events": 0, "bytes": 0, "ok": False, "failed": False}
+    text = []
+    event = None
+    async with client.stream("POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": content}) as response:
+        if response.status_code != 200:
+            result["failed"] = True
+            return result
+        async for line in response.aiter_lines():
+            result["bytes"] += len(line.encode()) + 1
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "message_start":
+                    result["start"] = time.perf_counter() - started
+            elif line.startswith("data: "):
+                if event == "content_delta":
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    result["events"] += 1
+                    text.append(json.loads(line[6:])["delta"])
+                elif event == "message_done":
+                    result["total"] = time.perf_counter() - started
+                    expected = "".join(reply_tokens([{"content": content}], reply_length))
+                    result["ok"] = "".join(text) == expected and "usage" in json.loads(line[6:])
+    return result
+
+
+async def load(threads: list, reply_length: int) -> list:
+    limits = httpx.Limits(max_connections=len(threads) + 10, max_keepalive_connections=len(threads) + 10)
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, limits=limits, timeout=120
+    ) as client:
+        return await asyncio.gather(*(one_stream(client, i, thread_id, reply_length) for i, thread_id in enumerate(threads)))
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run(coalesce: bool, args: argparse.Namespace, database: Path, threads: list) -> None:
+    env = dict(
+        os.environ,
+        DEBUG="false",
+        DATABASE_URL=f"sqlite:///{database}",
+        LLM_PROVIDER="stub",
+        LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+        LLM_MAX_CONNECTIONS=str(args.streams + 10),
+        LLM_MAX_KEEPALIVE_CONNECTIONS=str(args.streams + 10),
+        GENERATION_MAX_PER_USER=str(args.streams),  # one bench user on many threads
+    )
+    if not coalesce:
+        env["SSE_COALESCE_MAX_DELAY_MS"] = "0"
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+        cpu_before = cpu_seconds(worker.pid)
+        started = time.perf_counter()
+        results = asyncio.run(load(threads, args.reply_tokens))
+        elapsed = time.perf_counter() - started
+        cpu = cpu_seconds(worker.pid) - cpu_before
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    done = [r for r in results if r["total"] is not None]
+    start = [r["start"] * 1000 for r in done]
+    ttft = [r["ttft"] * 1000 for r in done]
+    total = [r["total"] * 1000 for r in done]
+    print(f"\n  coalescing {'on ' if coalesce else 'off'}  ({elapsed:.1f} s wall, worker CPU {cpu:.2f} s)")
+    print(f"    start   p50={statistics.median(start):8.1f} ms  p99={percentile(start, 0.99):8.1f} ms")
+    print(f"    ttft    p50={statistics.median(ttft):8.1f} ms  p99={percentile(ttft, 0.99):8.1f} ms")
+    print(f"    total   p50={statistics.median(total):8.1f} ms  p99={percentile(total, 0.99):8.1f} ms")
+    print(f"    events  {statistics.mean(r['events'] for r in done):8.1f} per stream, "
+          f"{statistics.mean(r['bytes'] for r in done):8.0f} bytes per stream")
+    print(f"    complete {sum(r['ok'] for r in results)}/{len(results)}, "
+          f"rejected before message_start {sum(r['failed'] for r in results)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reply streaming benchmark")
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT),
+         "--first-token-ms", str(args.first_token_ms), "--tokens-per-second", str(args.tokens_per_second),
+         "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            threads = create_threads(database, args.streams)
+            asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+            print(f"{args.streams} concurrent streams, stub LLM: first token {args.first_token_ms:.0f} ms, "
+                  f"{args.tokens_per_second:.0f} tokens/s, {args.reply_tokens} tokens")
+            run(False, args, database, threads)
+            run(True, args, database, threads)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Shared snapshot benchmark (per-worker heap copies vs one mmap'd snapshot)
+
+Usage:
+    python scripts/bench_shared_snapshot.py [--workers 4] [--entries 20000] [--value-size 2048]
+
+Builds a snapshot of pre-rendered JSON values, then starts N worker
+processes in two modes:
+
+    heap  - every worker loads its own dict of bytes (today's per-process cache)
+    mmap  - every worker maps the same file through SharedSnapshot
+
+Each worker reports its RSS split into private (RssAnon) and shared
+(RssFile + RssShmem) pages from /proc/self/status, plus hit latency of
+get() over random keys. Summed private RSS is the memory that scales with
+the worker count. Linux only.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.shared_snapshot import SharedSnapshot, write_snapshot  # noqa: E402
+
+
+def build_entries(count: int, value_size: int) -> dict:
+    rng = random.Random(42)
+    filler = "マスタデータ"
+    entries = {}
+    for i in range(count):
+        text = "".join(rng.choice(filler) for _ in range(value_size // 3))
+        entries[f"key:{i}"] = json.dumps({"id": i, "text": text}, ensure_ascii=False).encode()
+    return entries
+
+
+def rss_kb() -> dict:
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                fields[name] = int(value.split()[0])
+    return fields
+
+
+def worker(mode: str, directory: str, entries_path: str, count: int, lookups: int, queue) -> None:
+    keys = [f"key:{i}" for i in range(count)]
+    rng = random.Random()
+
+    if mode == "heap":
+        with open(entries_path) as f:
+            cache = {k: v.encode() for k, v in json.load(f).items()}
+        get = cache.get
+    else:
+        snapshot = SharedSnapshot("bench", directory=Path(directory), check_interval=1.0)
+        get = snapshot.get
+
+    # Touch every value once so resident pages reflect a warm cache
+    for key in keys:
+        value = get(key)
+        for i in range(0, len(value), 4096):
+            value[i]
+
+    sample = [rng.choice(keys) for _ in range(lookups)]
+    started = time.perf_counter()
+    for key in sample:
+        get(key)
+    elapsed = time.perf_counter() - started
+
+    result = rss_kb()
+    result["ns_per_get"] = elapsed / lookups * 1e9
+    queue.put(result)
+
+
+def run(mode: str, workers: int, directory: str, entries_path: str, count: int, lookups: int) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(mode, directory, entries_path, count, lookups, queue))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    private = sum(r["RssAnon"] for r in results)
+    shared = max(r["RssFile"] + r["RssShmem"] for r in results)
+    latency = statistics.median(r["ns_per_get"] for r in results)
+    print(f"{mode:5} workers={workers} private RSS total={private / 1024:8.1f} MiB "
+          f"shared per worker={shared / 1024:8.1f} MiB get()={latency:7.0f} ns")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared snapshot benchmark")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--value-size", type=int, default=2048)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    entries = build_entries(args.entries, args.value_size)
+    payload = sum(len(v) for v in entries.values())
+    print(f"snapshot: {len(entries):,} entries, {payload / 1024 / 1024:.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        entries_path = str(Path(directory) / "entries.json")
+        with open(entries_path, "w") as f:
+            json.dump({k: v.decode() for k, v in entries.items()}, f, ensure_ascii=False)
+        write_snapshot(Path(directory) / "bench.snap", entries, version=1)
+        del entries
+
+        run("heap", args.workers, directory, entries_path, args.entries, args.lookups)
+        run("mmap", args.workers, directory, entries_path, args.entries, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
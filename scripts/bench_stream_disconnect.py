@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Stream disconnect benchmark: how fast an abandoned reply stops upstream
+
+Usage:
+    python scripts/bench_stream_disconnect.py [--trials 50] [--streams 200] [--after-deltas 1] [--resume-grace-seconds 0]
+
+Starts the stub LLM server (app.services.llm.stub) and one API worker
+(uvicorn, LLM_PROVIDER=stub, temporary SQLite database) as separate
+processes. Clients open POST /v1/threads/{id}/messages:stream, read
+--after-deltas content_delta events and close the connection.
+
+    sequential  - one stream at a time; teardown = client close to the
+                  stub's upstream request being cancelled (polls /stats)
+    concurrent  - --streams streams closing together; time until the stub
+                  has no active request left
+
+After the worker has shut down, the temporary database is checked for one
+assistant message per abandoned stream with finish_reason "interrupted".
+Replies are long (--reply-tokens) so a stream that is not cancelled would
+still be running upstream when it is checked. The worker runs with
+SSE_RESUME_GRACE_SECONDS=--resume-grace-seconds (default 0: cancel at
+once; with a grace period teardown is that much later, by design).
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User  # noqa: E402,F401
+
+STUB_PORT = 8768
+API_PORT = 8769
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+POLL_SECONDS = 0.002
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def abandon_stream(client: httpx.AsyncClient, index: int, thread_id: str, after_deltas: int) -> float:
+    """Open a stream, read after_deltas content_delta events, close; returns the close time"""
+    received = 0
+    async with client.stream(
+        "POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": f"またね {index}"}
+    ) as response:
+        async for line in response.aiter_lines():
+            if line == "event: content_delta":
+                received += 1
+                if received >= after_deltas:
+                    break
+    return time.perf_counter()
+
+
+async def wait_for_stub(stub: httpx.AsyncClient, done, timeout: float = 30.0) -> float:
+    """Poll the stub's /stats until done(stats); returns the time it became true"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        stats = (await stub.get("/stats")).json()
+        if done(stats):
+            return time.perf_counter()
+        await asyncio.sleep(POLL_SECONDS)
+    raise RuntimeError(f"stub still busy after {timeout:.0f} s: {stats}")
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(label: str, samples_ms: list) -> None:
+    print(f"    {label:<10} p50={statistics.median(samples_ms):8.1f} ms  "
+          f"p99={percentile(samples_ms, 0.99):8.1f} ms  max={max(samples_ms):8.1f} ms")
+
+
+async def sequential(args: argparse.Namespace, threads: list, api: httpx.AsyncClient, stub: httpx.AsyncClient) -> None:
+    teardown = []
+    for i in range(args.trials):
+        cancelled = (await stub.get("/stats")).json()["cancelled"]
+        closed = await abandon_stream(api, i, threads[i], args.after_deltas)
+        torn_down = await wait_for_stub(stub, lambda s: s["cancelled"] > cancelled and s["active"] == 0)
+        teardown.append((torn_down - closed) * 1000)
+    print(f"\n  sequential ({args.trials} streams)")
+    report("teardown", teardown)
+
+
+async def concurrent(args: argparse.Namespace, threads: list, api: httpx.AsyncClient, stub: httpx.AsyncClient) -> None:
+    before = (await stub.get("/stats")).json()
+    closes = await asyncio.gather(
+        *(abandon_stream(api, args.trials + i, threads[args.trials + i], args.after_deltas) for i in range(args.streams))
+    )
+    idle = await wait_for_stub(stub, lambda s: s["active"] == 0)
+    after = (await stub.get("/stats")).json()
+    print(f"\n  concurrent ({args.streams} streams)")
+    print(f"    last close to upstream idle {(idle - max(closes)) * 1000:8.1f} ms")
+    print(f"    upstream cancelled {after['cancelled'] - before['cancelled']}/{after['requests'] - before['requests']}")
+
+
+async def load(args: argparse.Namespace, threads: list) -> None:
+    limits = httpx.Limits(max_connections=args.streams + 10)
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, limits=limits, timeout=60
+    ) as api, httpx.AsyncClient(base_url=f"http://127.0.0.1:{STUB_PORT}") as stub:
+        await sequential(args, threads, api, stub)
+        await concurrent(args, threads, api, stub)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream disconnect benchmark")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--after-deltas", type=int, default=1)
+    parser.add_argument("--resume-grace-seconds", type=float, default=0)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--reply-tokens", type=int, default=1000)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT),
+         "--first-token-ms", str(args.first_token_ms), "--tokens-per-second", str(args.tokens_per_second),
+         "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            threads = create_threads(database, args.trials + args.streams)
+            asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "warning"],
+                cwd=ROOT,
+                env=dict(
+                    os.environ,
+                    DEBUG="false",
+                    DATABASE_URL=f"sqlite:///{database}",
+                    LLM_PROVIDER="stub",
+                    LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+                    LLM_MAX_CONNECTIONS=str(args.streams + 10),
+                    SSE_RESUME_GRACE_SECONDS=str(args.resume_grace_seconds),
+                    GENERATION_MAX_PER_USER=str(args.streams),  # one bench user on many threads
+                ),
+            )
+            try:
+                asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+                print(f"stub LLM: first token {args.first_token_ms:.0f} ms, {args.tokens_per_second:.0f} tokens/s, "
+                      f"{args.reply_tokens} tokens; clients close after {args.after_deltas} content_delta")
+                asyncio.run(load(args, threads))
+            finally:
+                worker.terminate()
+                worker.wait()
+
+            with sqlite3.connect(database) as db:
+                saved = dict(db.execute(
+                    "SELECT COALESCE(finish_reason, 'none'), COUNT(*) FROM conversation_messages "
+                    "WHERE role = 'character' GROUP BY 1"
+                ).fetchall())
+            print(f"\n  assistant messages saved: {saved or 'none'} "
+                  f"(expected interrupted={args.trials + args.streams})")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
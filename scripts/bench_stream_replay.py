@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Stream replay benchmark: replay buffer memory and Last-Event-ID resume
+
+Usage:
+    python scripts/bench_stream_replay.py [--buffers 1000] [--reply-tokens 60] [--streams 100] [--drop-after 3]
+
+1. memory - --buffers in-process replay buffers (StreamReplay, memory
+   backend), each holding every event of a --reply-tokens reply, with
+   one content_delta per token and merged up to SSE_COALESCE_MAX_CHARS
+   (the size bound only; time-bounded flushes add a few frames in a real
+   stream). Reported as traced Python memory per 1k active streams.
+
+2. resume - starts the stub LLM server and one API worker (uvicorn,
+   LLM_PROVIDER=stub, temporary SQLite database). --streams clients open
+   POST /v1/threads/{id}/messages:stream, drop the connection after
+   --drop-after events and reconnect to
+   GET /v1/threads/{id}/messages/{message_id}:stream with Last-Event-ID.
+   Reports reconnect-to-first-event latency (a replayed event, or the
+   next live one if nothing was missed), whether the joined reply is
+   complete, and the number of upstream LLM requests (one per stream:
+   resuming does not generate again).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.core.sse import format_sse_event  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User  # noqa: E402,F401
+from app.schemas.conversation import SSEContentDelta, SSEMessageDone, SSEMessageStart, SSEUsage  # noqa: E402
+from app.services.llm.stub import reply_tokens  # noqa: E402
+from app.services.stream_replay import StreamReplay  # noqa: E402
+
+STUB_PORT = 8770
+API_PORT = 8771
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+# =============================================================================
+# Memory
+# =============================================================================
+
+
+def reply_frames(index: int, tokens: int, coalesce_chars: int) -> list:
+    """SSE frames of one reply; coalesce_chars 0 = one content_delta per token"""
+    deltas, part = [], ""
+    for token in reply_tokens([{"content": f"こんにちは {index}"}], tokens):
+        part += token
+        if len(part) >= coalesce_chars:
+            deltas.append(part)
+            part = ""
+    if part:
+        deltas.append(part)
+    message_id = str(uuid.uuid4())
+    frames = [format_sse_event("message_start", SSEMessageStart(user_message_id=str(uuid.uuid4()),
+                                                                 assistant_message_id=message_id))]
+    frames += [format_sse_event("content_delta", SSEContentDelta(delta=delta)) for delta in deltas]
+    frames.append(format_sse_event("message_done", SSEMessageDone(
+        assistant_message_id=message_id, finish_reason="stop",
+        usage=SSEUsage(prompt_tokens=20, completion_tokens=tokens))))
+    return frames
+
+
+async def fill(buffers: int, tokens: int, coalesce_chars: int) -> tuple:
+    replies = [reply_frames(i, tokens, coalesce_chars) for i in range(buffers)]
+    replay = StreamReplay(capacity=settings.SSE_REPLAY_BUFFER_EVENTS, ttl_seconds=settings.SSE_REPLAY_TTL_SECONDS)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for frames in replies:
+        buffer = replay.open(str(uuid.uuid4()), USER, str(uuid.uuid4()))
+        for frame in frames:
+            await buffer.append(frame)
+        buffer.reader(0)  # one attached client, as while streaming
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    events = sum(len(frames) for frames in replies) / buffers
+    return used, events
+
+
+def memory(args: argparse.Namespace) -> None:
+    print(f"memory: {args.buffers} replay buffers, {args.reply_tokens}-token replies")
+    coalesce_chars = settings.SSE_COALESCE_MAX_CHARS
+    for label, chars in (("per token", 0), (f"{coalesce_chars}-char frames", coalesce_chars)):
+        used, events = asyncio.run(fill(args.buffers, args.reply_tokens, chars))
+        print(f"  {label:<16} {events:6.1f} events/stream  {used / args.buffers:8.0f} B/stream  "
+              f"{used / args.buffers * 1000 / 2**20:6.2f} MiB per 1k streams")
+
+
+# =============================================================================
+# Resume
+# =============================================================================
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def read_events(response: httpx.Response, limit: int = 0):
+    """Parsed (id, event, data) of an SSE response; stops after `limit` events if set"""
+    event_id, event, count = None, None, 0
+    async for line in response.aiter_lines():
+        if line.startswith("id: "):
+            event_id = int(line[4:])
+        elif line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data: "):
+            yield event_id, event, json.loads(line[6:])
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+async def dropped_stream(client: httpx.AsyncClient, index: int, thread_id: str, args: argparse.Namespace) -> dict:
+    content = f"こんにちは {index}"
+    text, last_id, message_id = [], 0, None
+    async with client.stream("POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": content}) as response:
+        async for event_id, event, data in read_events(response, args.drop_after):
+            last_id = event_id
+            if event == "message_start":
+                message_id = data["assistant_message_id"]
+            elif event == "content_delta":
+                text.append(data["delta"])
+
+    reconnected = time.perf_counter()
+    result = {"first_event": None, "ok": False}
+    async with client.stream(
+        "GET", f"/v1/threads/{thread_id}/messages/{message_id}:stream", headers={"Last-Event-ID": str(last_id)}
+    ) as response:
+        if response.status_code != 200:
+            return result
+        async for event_id, event, data in read_events(response):
+            if result["first_event"] is None:
+                result["first_event"] = time.perf_counter() - reconnected
+            if event_id != last_id + 1:
+                return result
+            last_id = event_id
+            if event == "content_delta":
+                text.append(data["delta"])
+            elif event == "message_done":
+                result["ok"] = "".join(text) == "".join(reply_tokens([{"content": content}], args.reply_tokens))
+    return result
+
+
+async def resume_load(args: argparse.Namespace, threads: list) -> None:
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}"}
+    limits = httpx.Limits(max_connections=2 * args.streams + 10)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, limits=limits, timeout=60
+    ) as client, httpx.AsyncClient(base_url=f"http://127.0.0.1:{STUB_PORT}") as stub:
+        before = (await stub.get("/stats")).json()["requests"]
+        results = await asyncio.gather(*(dropped_stream(client, i, thread_id, args) for i, thread_id in enumerate(threads)))
+        requests = (await stub.get("/stats")).json()["requests"] - before
+    first = [r["first_event"] * 1000 for r in results if r["first_event"] is not None]
+    print(f"\nresume: {args.streams} streams dropped after {args.drop_after} events")
+    if first:
+        print(f"  reconnect to first event  p50={statistics.median(first):7.1f} ms  "
+              f"p99={percentile(first, 0.99):7.1f} ms")
+    print(f"  complete after resume {sum(r['ok'] for r in results)}/{len(results)}, "
+          f"upstream LLM requests {requests}")
+
+
+def resume(args: argparse.Namespace) -> None:
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT),
+         "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / "bench.db"
+            threads = create_threads(database, args.streams)
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "warning"],
+                cwd=ROOT,
+                env=dict(
+                    os.environ,
+                    DEBUG="false",
+                    DATABASE_URL=f"sqlite:///{database}",
+                    LLM_PROVIDER="stub",
+                    LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+                    SSE_REPLAY_BACKEND="memory",
+                    GENERATION_MAX_PER_USER=str(args.streams),  # one bench user on many threads
+                ),
+            )
+            try:
+                asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+                asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+                asyncio.run(resume_load(args, threads))
+            finally:
+                worker.terminate()
+                worker.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream replay benchmark")
+    parser.add_argument("--buffers", type=int, default=1000)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--drop-after", type=int, default=3)
+    args = parser.parse_args()
+    memory(args)
+    resume(args)
+
+
+if __name__ == "__main__":
+    main()
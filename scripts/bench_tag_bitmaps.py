@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tag / rating / type filter benchmark: roaring bitmaps vs SQL joins
+
+Usage:
+    python scripts/bench_tag_bitmaps.py [--packs 100000] [--tags 300] [--queries 500]
+
+Generates packs whose tags follow a Zipf-like popularity (a few tags are
+on a large share of packs), then compares, for random filter combinations
+(2-3 tags with AND or OR, optional age ratings and pack type):
+
+    bitmap - RoaringBitmap operations from CatalogIndex bitmaps
+    sql    - pack_tags joins in SQLite (GROUP BY / HAVING for AND)
+
+Both compute the full matching set (what a count or the first page of a
+selective filter needs). Also times the list_tags counts: one popcount
+per tag vs a GROUP BY over pack_tags.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.bitmap import EMPTY_BITMAP, RoaringBitmap  # noqa: E402
+from app.services.catalog_index import AGE_RATINGS, LIVE  # noqa: E402
+
+
+def generate(packs: int, tags: int, rng: random.Random) -> list:
+    weights = [1 / (rank + 1) for rank in range(tags)]
+    rows = []
+    for ordinal in range(packs):
+        pack_tags = set(rng.choices(range(tags), weights=weights, k=rng.randint(1, 6)))
+        rows.append((
+            ordinal,
+            rng.choices(AGE_RATINGS, weights=[70, 20, 10])[0],
+            rng.choice(["persona", "scenario"]),
+            sorted(pack_tags),
+        ))
+    return rows
+
+
+def build_bitmaps(rows: list) -> dict:
+    members: dict = {}
+    for ordinal, rating, pack_type, tag_ids in rows:
+        members.setdefault(f"rating:{rating}", []).append(ordinal)
+        members.setdefault(f"type:{pack_type}", []).append(ordinal)
+        for tag in tag_ids:
+            members.setdefault(f"tag:{tag}", []).append(ordinal)
+    bitmaps = {key: RoaringBitmap.from_sorted(ordinals) for key, ordinals in members.items()}
+    bitmaps[LIVE] = RoaringBitmap.from_sorted(range(len(rows)))
+    return bitmaps
+
+
+def load_sql(rows: list) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE packs (id INTEGER PRIMARY KEY, age_rating TEXT, pack_type TEXT, status INTEGER);
+        CREATE TABLE pack_tags (pack_id INTEGER, tag_id INTEGER, deleted_at INTEGER);
+        CREATE INDEX idx_pack_tags_tag ON pack_tags (tag_id, pack_id);
+        CREATE INDEX idx_pack_tags_pack ON pack_tags (pack_id);
+    """)
+    conn.executemany("INSERT INTO packs VALUES (?, ?, ?, 2)", [(o, r, t) for o, r, t, _ in rows])
+    conn.executemany(
+        "INSERT INTO pack_tags VALUES (?, ?, NULL)",
+        [(o, tag) for o, _, _, tag_ids in rows for tag in tag_ids],
+    )
+    conn.execute("ANALYZE")
+    return conn
+
+
+def bitmap_query(bitmaps: dict, tags: list, mode: str, ratings: tuple, pack_type) -> int:
+    parts = []
+    if set(ratings) != set(AGE_RATINGS):
+        parts.append(RoaringBitmap.union(bitmaps.get(f"rating:{r}", EMPTY_BITMAP) for r in ratings))
+    if pack_type:
+        parts.append(bitmaps[f"type:{pack_type}"])
+    tag_bitmaps = [bitmaps.get(f"tag:{t}", EMPTY_BITMAP) for t in tags]
+    if mode == "any":
+        parts.append(RoaringBitmap.union(tag_bitmaps))
+    else:
+        parts.extend(tag_bitmaps)
+    return len(RoaringBitmap.intersection(parts + [bitmaps[LIVE]]))
+
+
+def sql_query(conn: sqlite3.Connection, tags: list, mode: str, ratings: tuple, pack_type) -> int:
+    marks = ",".join("?" * len(tags))
+    having = f"HAVING COUNT(DISTINCT pt.tag_id) = {len(tags)}" if mode == "all" else ""
+    where = [f"pt.tag_id IN ({marks})", "pt.deleted_at IS NULL", "p.status = 2",
+             f"p.age_rating IN ({','.join('?' * len(ratings))})"]
+    params = list(tags) + list(ratings)
+    if pack_type:
+        where.append("p.pack_type = ?")
+        params.append(pack_type)
+    sql = f"""
+        SELECT COUNT(*) FROM (
+            SELECT p.id FROM packs p JOIN pack_tags pt ON pt.pack_id = p.id
+            WHERE {' AND '.join(where)}
+            GROUP BY p.id {having}
+        )
+    """
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, samples: list) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"  {name:7} p50={statistics.median(ms):8.3f} ms  p99={percentile(ms, 0.99):8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tag bitmap benchmark")
+    parser.add_argument("--packs", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    rows = generate(args.packs, args.tags, rng)
+    bitmaps = build_bitmaps(rows)
+    size = sum(b.size_in_bytes() for b in bitmaps.values())
+    print(f"{len(bitmaps)} bitmaps, {size / 1024 / 1024:.2f} MiB")
+    conn = load_sql(rows)
+
+    bitmap_samples, sql_samples = [], []
+    for _ in range(args.queries):
+        # Skew towards popular tags, where joins hurt most
+        tags = rng.sample(range(min(args.tags, 30)), rng.choice([2, 3]))
+        mode = rng.choice(["all", "any"])
+        ratings = rng.choice([("all",), ("all", "r15"), AGE_RATINGS])
+        pack_type = rng.choice([None, "persona"])
+
+        started = time.perf_counter()
+        expected = bitmap_query(bitmaps, tags, mode, ratings, pack_type)
+        bitmap_samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        actual = sql_query(conn, tags, mode, ratings, pack_type)
+        sql_samples.append(time.perf_counter() - started)
+        assert expected == actual, (tags, mode, ratings, pack_type, expected, actual)
+
+    print(f"\n{args.queries} filter combinations over {args.packs:,} packs")
+    report("bitmap", bitmap_samples)
+    report("sql", sql_samples)
+
+    started = time.perf_counter()
+    live = bitmaps[LIVE]
+    counts = {t: len(bitmaps[f"tag:{t}"] & live) for t in range(args.tags) if f"tag:{t}" in bitmaps}
+    bitmap_counts = time.perf_counter() - started
+    started = time.perf_counter()
+    rows_sql = conn.execute(
+        "SELECT tag_id, COUNT(*) FROM pack_tags pt JOIN packs p ON p.id = pt.pack_id "
+        "WHERE pt.deleted_at IS NULL AND p.status = 2 GROUP BY tag_id"
+    ).fetchall()
+    sql_counts = time.perf_counter() - started
+    assert counts == dict(rows_sql)
+    print(f"\nlist_tags counts: bitmap {bitmap_counts * 1000:.1f} ms, sql {sql_counts * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Turn pipeline benchmark: time to first token with sequential vs concurrent pre-generation steps
+
+Usage:
+    python scripts/bench_turn_pipeline.py [--requests 200] [--concurrency 8] [--first-token-ms 300]
+        [--moderation-ms 150] [--flagged-ratio 0.1]
+
+Starts a stub LLM server (app.services.llm.stub, also serving
+/v1/moderations after --moderation-ms) and one API worker per mode
+(uvicorn, LLM_PROVIDER=stub, MODERATION_PROVIDER=stub, temporary SQLite
+database):
+
+    sequential  - TURN_PIPELINE_CONCURRENT=false: moderation, thread,
+                  memory, history, prompt, user message commit, then the
+                  LLM request
+    concurrent  - TURN_PIPELINE_CONCURRENT=true: moderation next to the
+                  speculative LLM request, thread ‖ history, memory ‖
+                  persona, user message written in the background
+
+--requests POST /v1/threads/{id}/messages:stream, --concurrency at a
+time; --flagged-ratio of the messages contain a word the stub flags.
+Per mode: time from sending the request to message_start and to the first
+content_delta (p50 / p95, passed messages only), the flagged messages
+(422 or `error` content_filtered) and the LLM requests the stub saw
+cancelled for them, and the worker's stage timings (/metrics,
+turn_pipeline; avg ms). Requests refused for SQLite lock contention are
+counted as rejected.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationMessage, ConversationSession, User, UserCharacterMemory  # noqa: E402,F401
+from app.services.llm.stub import STUB_FLAGGED_WORDS  # noqa: E402
+
+STUB_PORT = 8780
+API_PORT = 8781
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+METRICS_TOKEN = "bench"
+STAGES = ("moderation", "context", "prompt", "user_write", "prepare")
+
+
+def create_threads(database: Path, count: int) -> list:
+    """Bench user and `count` threads of it (the stream endpoints check ownership)"""
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.add(User(id=USER, email="bench@example.com", password_hash="-"))
+        threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+        db.add_all(threads)
+        db.commit()
+    engine.dispose()
+    return [thread.id for thread in threads]
+
+
+async def wait_until_up(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+def percentile(samples: list, p: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def one_stream(client: httpx.AsyncClient, thread_id: str, content: str) -> dict:
+    result = {"start": None, "ttft": None, "filtered": False, "rejected": False}
+    sent = time.perf_counter()
+    async with client.stream("POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": content}) as response:
+        if response.status_code == 422:
+            result["filtered"] = True
+            return result
+        if response.status_code != 200:
+            result["rejected"] = True
+            return result
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "message_start":
+                    result["start"] = time.perf_counter() - sent
+                elif event == "content_delta" and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - sent
+            elif event == "error" and "content_filtered" in line:
+                result["filtered"] = True
+    return result
+
+
+async def load(args: argparse.Namespace, threads: list) -> tuple:
+    headers = {"Authorization": f"Bearer {create_access_token(USER)}", "X-Metrics-Token": METRICS_TOKEN}
+    # One stream per thread at a time (the generation guard rejects a second)
+    locks = [asyncio.Lock() for _ in threads]
+    every = round(1 / args.flagged_ratio) if args.flagged_ratio > 0 else 0
+
+    async def send(client: httpx.AsyncClient, index: int) -> dict:
+        flagged = every and index % every == every - 1
+        content = f"{STUB_FLAGGED_WORDS[0]}ぞ {index}" if flagged else f"今日は何してた？ {index}"
+        async with locks[index % len(threads)]:
+            return await one_stream(client, threads[index % len(threads)], content)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", headers=headers, timeout=60) as client:
+        results = await asyncio.gather(*(send(client, i) for i in range(args.requests)))
+        metrics = (await client.get("/metrics")).json()
+    return results, metrics
+
+
+async def stub_stats() -> dict:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"http://127.0.0.1:{STUB_PORT}/stats")).json()
+
+
+def run(mode: str, args: argparse.Namespace, database: Path, threads: list) -> None:
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "error"],
+        cwd=ROOT,
+        env=dict(
+            os.environ,
+            DEBUG="false",
+            METRICS_TOKEN=METRICS_TOKEN,
+            DATABASE_URL=f"sqlite:///{database}",
+            LLM_PROVIDER="stub",
+            LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+            MODERATION_PROVIDER="stub",
+            MODERATION_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+            LLM_PREWARM_CONNECTIONS="0",
+            TURN_PIPELINE_CONCURRENT=str(mode == "concurrent").lower(),
+            GENERATION_MAX_PER_USER=str(args.concurrency),  # one bench user on many threads
+        ),
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{API_PORT}/health"))
+        before = asyncio.run(stub_stats())
+        results, metrics = asyncio.run(load(args, threads))
+        # Cancelled upstream requests are counted when their handler unwinds
+        time.sleep(0.5)
+        after = asyncio.run(stub_stats())
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    passed = [r for r in results if not r["filtered"] and not r["rejected"]]
+    start = [r["start"] * 1000 for r in passed if r["start"] is not None]
+    ttft = [r["ttft"] * 1000 for r in passed if r["ttft"] is not None]
+    stages = metrics["turn_pipeline"]["stages"]
+    print(f"{mode:>10} | {sum(r['rejected'] for r in results):>8} | {percentile(start, 0.5):>7.0f} "
+          f"{percentile(start, 0.95):>7.0f} | {percentile(ttft, 0.5):>7.0f} {percentile(ttft, 0.95):>7.0f} | "
+          f"{sum(r['filtered'] for r in results):>8} {after['requests'] - before['requests']:>5} "
+          f"{after['cancelled'] - before['cancelled']:>9} | "
+          + " ".join(f"{stages[s]['avg_ms'] if s in stages else '-':>10}" for s in STAGES))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Turn pipeline benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--moderation-ms", type=float, default=150)
+    parser.add_argument("--flagged-ratio", type=float, default=0.1)
+    parser.add_argument("--reply-tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm.stub", "--port", str(STUB_PORT),
+         "--first-token-ms", str(args.first_token_ms), "--moderation-ms", str(args.moderation_ms),
+         "--tokens-per-second", "100", "--reply-tokens", str(args.reply_tokens)],
+        cwd=ROOT,
+        env=dict(os.environ, DEBUG="false"),
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{STUB_PORT}/v1/models"))
+        print(f"{args.requests} streams, {args.concurrency} concurrent; first token {args.first_token_ms:.0f} ms, "
+              f"moderation {args.moderation_ms:.0f} ms, {args.flagged_ratio:.0%} flagged\n")
+        print(f"{'mode':>10} | {'rejected':>8} | {'start p50':>7} {'p95':>7} | {'ttft p50':>7} {'p95':>7} | "
+              f"{'filtered':>8} {'LLM':>5} {'cancelled':>9} | " + " ".join(f"{s:>10}" for s in STAGES))
+        for mode in ("sequential", "concurrent"):
+            with tempfile.TemporaryDirectory() as tmp:
+                database = Path(tmp) / "bench.db"
+                run(mode, args, database, create_threads(database, args.concurrency))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
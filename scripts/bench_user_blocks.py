@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Per-user block filter benchmark: NOT EXISTS subqueries vs exclusion bitmaps
+
+Usage:
+    python scripts/bench_user_blocks.py [--packs 100000] [--queries 300]
+
+A catalog of packs (creators, tags, 1-3 characters each) is loaded into
+SQLite shaped like database_design.md (packs, pack_tags, pack_items,
+user_blocks) and into CatalogIndex. For users with 0, 100 and 10k blocks
+(mostly characters, some creators, a few tags), GET /packs pages
+(created_at desc, limit 20, first page or a cursor page) are served by:
+
+    sql     - NOT EXISTS against user_blocks for creator / character / tag
+              on every candidate row
+    compile - UserBlocks.exclusion for an index version it has not seen
+    index   - CatalogIndex.query with the compiled exclusion (warm)
+
+Index pages are checked against the SQL pages.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schemas.catalog import Pack, PackItem, PackStats  # noqa: E402
+from app.schemas.common import Creator, Tag  # noqa: E402
+from app.services.catalog_index import AGE_GROUP_RATINGS, CatalogIndex, PackQuery  # noqa: E402
+from app.services.user_blocks import UserBlocks  # noqa: E402
+
+CREATORS = 10_000
+TAGS = 60
+
+SCHEMA = """
+CREATE TABLE packs (id TEXT PRIMARY KEY, creator_id TEXT NOT NULL, status INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL, deleted_at INTEGER);
+CREATE TABLE pack_tags (pack_id TEXT NOT NULL, tag_id TEXT NOT NULL, deleted_at INTEGER);
+CREATE TABLE pack_items (pack_id TEXT NOT NULL, item_type TEXT NOT NULL, item_id TEXT NOT NULL, deleted_at INTEGER);
+CREATE TABLE user_blocks (user_id TEXT NOT NULL, target_type TEXT NOT NULL, target_id TEXT NOT NULL, deleted_at INTEGER);
+CREATE INDEX idx_packs_status_created ON packs (status, created_at);
+CREATE INDEX idx_pack_tags_pack ON pack_tags (pack_id, tag_id);
+CREATE INDEX idx_pack_items_pack ON pack_items (pack_id, item_type, item_id);
+CREATE UNIQUE INDEX user_blocks_active_uk ON user_blocks (user_id, target_type, target_id);
+"""
+
+SQL_PAGE = """
+SELECT p.id, p.created_at FROM packs p
+WHERE p.status = 2 AND p.deleted_at IS NULL {cursor}
+  AND NOT EXISTS (SELECT 1 FROM user_blocks b WHERE b.user_id = :u AND b.target_type = 'creator'
+                  AND b.target_id = p.creator_id AND b.deleted_at IS NULL)
+  AND NOT EXISTS (SELECT 1 FROM pack_items pi JOIN user_blocks b
+                  ON b.user_id = :u AND b.target_type = 'character' AND b.target_id = pi.item_id
+                  AND b.deleted_at IS NULL
+                  WHERE pi.pack_id = p.id AND pi.item_type = 'character' AND pi.deleted_at IS NULL)
+  AND NOT EXISTS (SELECT 1 FROM pack_tags pt JOIN user_blocks b
+                  ON b.user_id = :u AND b.target_type = 'tag' AND b.target_id = pt.tag_id
+                  AND b.deleted_at IS NULL
+                  WHERE pt.pack_id = p.id AND pt.deleted_at IS NULL)
+ORDER BY p.created_at DESC, p.id DESC LIMIT :limit
+"""
+
+
+def generate(count: int, rng: random.Random) -> tuple:
+    tags = [Tag(id=f"tag_{i:03d}", name=f"tag{i}") for i in range(TAGS)]
+    creators = [Creator(id=f"creator_{i:05d}", display_name=f"作者{i}") for i in range(CREATORS)]
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    packs, items = [], {}
+    for i in range(count):
+        pack_id = f"pack_{i:08d}"
+        packs.append(Pack(
+            id=pack_id,
+            pack_type="persona",
+            name=f"Pack {i}",
+            description="",
+            thumbnail_url=f"https://cdn.example.com/packs/{i}/thumb.webp",
+            price=0,
+            is_free=True,
+            age_rating="all",
+            tags=rng.sample(tags, rng.randint(1, 3)),
+            creator=rng.choice(creators),
+            stats=PackStats(favorite_count=0, conversation_count=0),
+            created_at=base + timedelta(seconds=rng.randint(0, 365 * 86400)),
+        ))
+        items[pack_id] = [
+            PackItem(id=f"item_{i}_{j}", item_type="character", item_id=f"char_{i:08d}_{j}", name="c")
+            for j in range(rng.randint(1, 3))
+        ]
+    return packs, items
+
+
+def load_sql(packs: list, items: dict) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO packs VALUES (?, ?, 2, ?, NULL)",
+        [(p.id, p.creator.id, int(p.created_at.timestamp() * 1_000_000)) for p in packs],
+    )
+    conn.executemany("INSERT INTO pack_tags VALUES (?, ?, NULL)", [(p.id, t.id) for p in packs for t in p.tags])
+    conn.executemany(
+        "INSERT INTO pack_items VALUES (?, 'character', ?, NULL)",
+        [(pack_id, item.item_id) for pack_id, rows in items.items() for item in rows],
+    )
+    conn.execute("ANALYZE")
+    return conn
+
+
+def random_blocks(count: int, packs: list, items: dict, rng: random.Random) -> set:
+    tags = min(count // 20, 5)
+    creators = count * 15 // 100
+    blocks = {("tag", f"tag_{t:03d}") for t in rng.sample(range(TAGS), tags)}
+    blocks |= {("creator", f"creator_{c:05d}") for c in rng.sample(range(CREATORS), creators)}
+    while len(blocks) < count:
+        pack = rng.choice(packs)
+        blocks.add(("character", rng.choice(items[pack.id]).item_id))
+    return blocks
+
+
+def sql_page(conn: sqlite3.Connection, user_id: str, cursor, limit: int) -> list:
+    condition = "AND (p.created_at, p.id) < (:c_at, :c_id)" if cursor else ""
+    params = {"u": user_id, "limit": limit}
+    if cursor:
+        params.update(c_at=cursor[0], c_id=cursor[1])
+    return conn.execute(SQL_PAGE.format(cursor=condition), params).fetchall()
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, samples: list) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"    {name:8} p50={statistics.median(ms):9.3f} ms  p99={percentile(ms, 0.99):9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-user block filter benchmark")
+    parser.add_argument("--packs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    packs, items = generate(args.packs, rng)
+    index = CatalogIndex.build(1, packs, items)
+    conn = load_sql(packs, items)
+    ratings = AGE_GROUP_RATINGS["adult"]
+    print(f"{args.packs:,} packs, {CREATORS:,} creators, {TAGS} tags; {args.queries} pages per user")
+
+    for count in (0, 100, 10_000):
+        user_id = f"user_{count}"
+        targets = random_blocks(count, packs, items, rng)
+        conn.executemany(
+            "INSERT INTO user_blocks VALUES (?, ?, ?, NULL)", [(user_id, t, i) for t, i in sorted(targets)]
+        )
+
+        compile_samples = []
+        for _ in range(20):
+            # A fresh UserBlocks compiles like a cache miss or a new index version
+            blocks = UserBlocks(frozenset(targets), expires_at=float("inf"))
+            started = time.perf_counter()
+            exclude = blocks.exclusion(index)
+            compile_samples.append(time.perf_counter() - started)
+        hidden = len(exclude) if exclude is not None else 0
+
+        sql_samples, index_samples = [], []
+        for _ in range(args.queries):
+            # Second page half of the time
+            start_cursor = None
+            if rng.random() < 0.5:
+                first, start_cursor = index.query(PackQuery(ratings=ratings, limit=20, exclude=exclude))
+            started = time.perf_counter()
+            page, _ = index.query(PackQuery(ratings=ratings, limit=20, cursor=start_cursor, exclude=exclude))
+            index_samples.append(time.perf_counter() - started)
+
+            sql_cursor = None
+            if start_cursor:
+                last = first[-1]
+                sql_cursor = (int(last.created_at.timestamp() * 1_000_000), last.id)
+            started = time.perf_counter()
+            rows = sql_page(conn, user_id, sql_cursor, 20)
+            sql_samples.append(time.perf_counter() - started)
+            assert [p.id for p in page] == [r[0] for r in rows], (count, [p.id for p in page][:3], rows[:3])
+
+        print(f"\n  {count:,} blocks ({hidden:,} packs hidden)")
+        report("sql", sql_samples)
+        report("compile", compile_samples)
+        report("index", index_samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Per-user pack status benchmark (owned / favorited for a catalog page)
+
+Usage:
+    python scripts/bench_user_pack_status.py [--packs 50000] [--owned 5000] [--page 100] [--pages 200]
+
+A user who owns 5k packs (and favorited some of their characters) views
+100-pack pages. SQLite tables are shaped like database_design.md
+(user_entitlements, user_favorites -> pack_items) with other users' rows
+mixed in. Compared:
+
+    n+1     - two EXISTS queries per pack on the page
+    batch   - one IN (...) query each for entitlements and favorites
+    cold    - UserPackStatusLoader on a cache miss (loads the user's full
+              sets with one query each, then answers from the bitmaps)
+    warm    - UserPackStatusLoader on a hit (no query)
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.services.user_pack_status import UserPackStatusLoader  # noqa: E402
+
+USER = "user_me"
+
+SCHEMA = [
+    "CREATE TABLE pack_items (pack_id TEXT, item_type TEXT, item_id TEXT, deleted_at INTEGER)",
+    "CREATE TABLE user_entitlements (user_id TEXT, entitlement_type TEXT, entitlement_id TEXT, revoked_at INTEGER)",
+    "CREATE TABLE user_favorites (user_id TEXT, character_id TEXT, deleted_at INTEGER)",
+    "CREATE INDEX idx_pi_item ON pack_items (item_type, item_id)",
+    "CREATE INDEX idx_pi_pack ON pack_items (pack_id)",
+    "CREATE INDEX idx_ue_user ON user_entitlements (user_id, entitlement_type, entitlement_id)",
+    "CREATE INDEX idx_uf_user ON user_favorites (user_id, character_id)",
+]
+
+OWNED_SQL = (
+    "SELECT entitlement_id FROM user_entitlements "
+    "WHERE user_id = :u AND entitlement_type = 'pack' AND revoked_at IS NULL"
+)
+FAVORITED_SQL = (
+    "SELECT DISTINCT pi.pack_id FROM user_favorites uf "
+    "JOIN pack_items pi ON pi.item_type = 'character' AND pi.item_id = uf.character_id "
+    "WHERE uf.user_id = :u AND uf.deleted_at IS NULL AND pi.deleted_at IS NULL"
+)
+
+
+async def setup(sessions: async_sessionmaker, packs: int, owned: int, rng: random.Random) -> list:
+    pack_ids = [f"pack_{i:07d}" for i in range(packs)]
+    async with sessions() as db:
+        for statement in SCHEMA:
+            await db.execute(text(statement))
+        await db.execute(
+            text("INSERT INTO pack_items VALUES (:p, 'character', :c, NULL)"),
+            [{"p": p, "c": f"char_{p}"} for p in pack_ids],
+        )
+        rows = [{"u": USER, "p": p} for p in rng.sample(pack_ids, owned)]
+        rows += [{"u": f"user_{rng.randrange(2000)}", "p": rng.choice(pack_ids)} for _ in range(owned * 10)]
+        await db.execute(text("INSERT INTO user_entitlements VALUES (:u, 'pack', :p, NULL)"), rows)
+        rows = [{"u": USER, "c": f"char_{p}"} for p in rng.sample(pack_ids, owned // 5)]
+        rows += [{"u": f"user_{rng.randrange(2000)}", "c": f"char_{rng.choice(pack_ids)}"} for _ in range(owned * 5)]
+        await db.execute(text("INSERT INTO user_favorites VALUES (:u, :c, NULL)"), rows)
+        await db.execute(text("ANALYZE"))
+        await db.commit()
+    return pack_ids
+
+
+async def n_plus_one(db: AsyncSession, page: list) -> dict:
+    result = {}
+    for pack_id in page:
+        owned = await db.execute(
+            text(OWNED_SQL + " AND entitlement_id = :p LIMIT 1"), {"u": USER, "p": pack_id}
+        )
+        favorited = await db.execute(
+            text(FAVORITED_SQL.replace("DISTINCT ", "") + " AND pi.pack_id = :p LIMIT 1"), {"u": USER, "p": pack_id}
+        )
+        result[pack_id] = (owned.first() is not None, favorited.first() is not None)
+    return result
+
+
+async def batch(db: AsyncSession, page: list) -> dict:
+    params = {"u": USER, **{f"p{i}": p for i, p in enumerate(page)}}
+    marks = ", ".join(f":p{i}" for i in range(len(page)))
+    owned = {r[0] for r in await db.execute(text(f"{OWNED_SQL} AND entitlement_id IN ({marks})"), params)}
+    favorited = {r[0] for r in await db.execute(text(f"{FAVORITED_SQL} AND pi.pack_id IN ({marks})"), params)}
+    return {p: (p in owned, p in favorited) for p in page}
+
+
+async def load_owned(db: AsyncSession, user_id: str) -> list:
+    return [r[0] for r in await db.execute(text(OWNED_SQL), {"u": user_id})]
+
+
+async def load_favorited(db: AsyncSession, user_id: str) -> list:
+    return [r[0] for r in await db.execute(text(FAVORITED_SQL), {"u": user_id})]
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def report(name: str, samples: list) -> None:
+    ms = [s * 1000 for s in samples]
+    print(f"  {name:6} p50={statistics.median(ms):8.3f} ms  p99={percentile(ms, 0.99):8.3f} ms")
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/status.db")
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        pack_ids = await setup(sessions, args.packs, args.owned, rng)
+        pages = [rng.sample(pack_ids, args.page) for _ in range(args.pages)]
+
+        samples = {"n+1": [], "batch": [], "cold": [], "warm": []}
+        async with sessions() as db:
+            for page in pages:
+                started = time.perf_counter()
+                expected = await n_plus_one(db, page)
+                samples["n+1"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                assert await batch(db, page) == expected
+                samples["batch"].append(time.perf_counter() - started)
+
+                loader = UserPackStatusLoader(
+                    ttl_seconds=60, max_users=10, session_factory=sessions,
+                    load_owned=load_owned, load_favorited=load_favorited,
+                )
+                for name in ("cold", "warm"):
+                    started = time.perf_counter()
+                    statuses = await loader.load(USER, page)
+                    samples[name].append(time.perf_counter() - started)
+                    assert {p: (s.owned, s.favorited) for p, s in statuses.items()} == expected
+
+        print(f"{args.pages} pages of {args.page} packs, user owns {args.owned:,} of {args.packs:,} packs")
+        for name, values in samples.items():
+            report(name, values)
+        print(f"\ncached sets for the user: {loader.stats()['bytes']:,} bytes")
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-user pack status benchmark")
+    parser.add_argument("--packs", type=int, default=50_000)
+    parser.add_argument("--owned", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
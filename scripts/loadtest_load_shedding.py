@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load-shedding load test
+
+Usage:
+    python scripts/loadtest_load_shedding.py [--seconds 10] [--rate 400]
+
+Starts a uvicorn worker twice (LOAD_SHED_ENABLED=false / true) and offers
+open-loop overload to a low-priority catalog route (simulated 5ms CPU +
+50ms DB per request) while probing a priority route (POST /v1/auth/refresh).
+Prints p50/p99 of the priority route and the low-priority status mix.
+The load generator runs in this process, so use a machine with at least
+two cores or the client competes with the worker for CPU.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+
+PORT = 8765
+
+
+def build_app():
+    """App factory with an extra catalog-priority route that does realistic work"""
+    from fastapi import APIRouter
+
+    from app.core.load_shedding import router_dependencies
+    from app.main import create_app
+
+    app = create_app()
+    router = APIRouter(prefix="/loadtest")
+
+    @router.get("/catalog")
+    async def simulated_catalog():
+        time.sleep(0.005)  # serialization / filtering on the loop
+        await asyncio.sleep(0.05)  # DB round trips
+        return {"data": []}
+
+    app.include_router(router, dependencies=router_dependencies("catalog"))
+    return app
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+
+async def offer_low_priority(client, rate, stop, counts, pending):
+    async def one():
+        try:
+            response = await client.get("/loadtest/catalog")
+            key = response.status_code
+        except httpx.HTTPError:
+            key = "error"
+        counts[key] = counts.get(key, 0) + 1
+
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        pending.append(asyncio.create_task(one()))
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.post("/v1/auth/refresh", json={"refresh_token": "invalid"})
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.02)
+
+
+async def wait_until_up(client):
+    for _ in range(100):
+        try:
+            await client.get("/health")
+            return
+        except httpx.HTTPError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def load(seconds: float, rate: int):
+    limits = httpx.Limits(max_connections=2000, max_keepalive_connections=2000)
+    latencies: list = []
+    counts: dict = {}
+    pending: list = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30) as client:
+        await wait_until_up(client)
+        tasks = [asyncio.create_task(offer_low_priority(client, rate, stop, counts, pending))]
+        tasks += [asyncio.create_task(probe(client, stop, latencies)) for _ in range(4)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        await asyncio.gather(*pending)
+    return latencies, counts
+
+
+def run(enabled: bool, seconds: float, rate: int) -> None:
+    env = dict(os.environ, DEBUG="false", LOAD_SHED_ENABLED=str(enabled).lower())
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "scripts.loadtest_load_shedding:build_app",
+         "--factory", "--port", str(PORT), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        latencies, counts = asyncio.run(load(seconds, rate))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"load shedding {'enabled ' if enabled else 'disabled'}: "
+          f"priority p50={statistics.median(latencies):7.1f}ms "
+          f"p99={percentile(latencies, 99):7.1f}ms (n={len(latencies)}) "
+          f"low-priority status counts={dict(sorted(counts.items(), key=str))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-shedding load test")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=int, default=400, help="offered low-priority requests/sec")
+    args = parser.parse_args()
+
+    run(False, args.seconds, args.rate)
+    run(True, args.seconds, args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Shared test setup
+
+The settings are read once at import, so the environment is set here,
+before anything from app is imported: a temporary SQLite database, the
+in-process stub LLM (app.services.llm.stub) on a free port, and limits
+sized for many streams of one test user. Every test runs on one event
+loop (pytest.ini), like the singletons they share.
+"""
+import asyncio
+import contextlib
+import os
+import signal
+import socket
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Sequence
+
+import pytest
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+TMP = Path(tempfile.mkdtemp(prefix="aiwill-tests-"))
+DATABASE = TMP / "test.db"
+STUB_PORT = _free_port()
+
+os.environ.update(
+    DEBUG="false",
+    DATABASE_URL=f"sqlite:///{DATABASE}",
+    LLM_PROVIDER="stub",
+    LLM_BASE_URL=f"http://127.0.0.1:{STUB_PORT}/v1",
+    LLM_FALLBACK_PROVIDER="",
+    LLM_PREWARM_CONNECTIONS="0",
+    MODERATION_PROVIDER="",
+    MESSAGE_WRITE_SPILL_DIR=str(TMP / "message-spill"),
+    SHARED_SNAPSHOT_DIR=str(TMP / "snapshots"),
+    GENERATION_MAX_PER_USER="1000",
+)
+
+import uvicorn  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.models import ConversationSession, User  # noqa: E402
+from app.schemas.catalog import Pack, PackStats  # noqa: E402
+from app.schemas.common import Creator, Tag  # noqa: E402
+from app.services.catalog_index import CatalogIndex, catalog_index  # noqa: E402
+from app.services.llm.stub import create_stub_app  # noqa: E402
+
+USER = "00000000-0000-0000-0000-000000000001"
+CHARACTER = "00000000-0000-0000-0000-0000000000c1"
+
+# Long replies: a stream is still running upstream whenever a test looks at it
+STUB_FIRST_TOKEN_MS = 20
+STUB_TOKENS_PER_SECOND = 50
+STUB_REPLY_TOKENS = 5000
+
+
+def make_pack(
+    pack_id: str,
+    age_rating: str = "all",
+    name: Optional[str] = None,
+    tags: Sequence[Tag] = (),
+    pack_type: str = "persona",
+    updated_at: Optional[datetime] = None,
+) -> Pack:
+    """A published pack as the catalog loaders return it"""
+    return Pack(
+        id=pack_id,
+        pack_type=pack_type,
+        name=name or f"パック {pack_id}",
+        description="説明",
+        thumbnail_url=f"https://cdn.example.com/packs/{pack_id}/thumb.webp",
+        price=0,
+        is_free=True,
+        age_rating=age_rating,
+        tags=list(tags),
+        creator=Creator(id="creator_1", display_name="作者"),
+        stats=PackStats(favorite_count=0, conversation_count=0),
+        created_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        updated_at=updated_at,
+    )
+
+
+@pytest.fixture(scope="session")
+def database() -> Path:
+    """The test database with every table (what the DEBUG startup would create)"""
+    engine = create_engine(f"sqlite:///{DATABASE}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=USER, email="test@example.com", password_hash="-"))
+        db.commit()
+    engine.dispose()
+    return DATABASE
+
+
+@pytest.fixture
+def create_threads(database: Path):
+    """Factory: `count` new threads of the test user"""
+
+    def create(count: int) -> List[str]:
+        engine = create_engine(f"sqlite:///{database}")
+        with Session(engine, expire_on_commit=False) as db:
+            threads = [ConversationSession(user_id=USER, character_id=CHARACTER) for _ in range(count)]
+            db.add_all(threads)
+            db.commit()
+        engine.dispose()
+        return [thread.id for thread in threads]
+
+    return create
+
+
+@pytest.fixture(scope="session")
+def auth_headers() -> dict:
+    return {"Authorization": f"Bearer {create_access_token(USER)}"}
+
+
+@contextlib.asynccontextmanager
+async def serve(app, port: int = 0, capture_signals: bool = False) -> AsyncIterator[uvicorn.Server]:
+    """
+    Run app with uvicorn on this event loop until the context exits
+
+    Without capture_signals the server leaves SIGTERM / SIGINT alone; the
+    handlers (including the ones the app's lifespan chains) are restored
+    afterwards either way.
+    """
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    if not capture_signals:
+        server.capture_signals = contextlib.nullcontext
+    task = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            if task.done():
+                task.result()
+                raise RuntimeError("server did not start")
+            await asyncio.sleep(0.01)
+        yield server
+    finally:
+        server.should_exit = True
+        await task
+        for sig, handler in handlers.items():
+            signal.signal(sig, handler)
+
+
+def server_url(server: uvicorn.Server) -> str:
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    return f"http://{host}:{port}"
+
+
+@pytest.fixture
+async def stub_llm() -> AsyncIterator[dict]:
+    """The stub LLM server on LLM_BASE_URL; yields its counters (requests, active, cancelled, ...)"""
+    app = create_stub_app(STUB_FIRST_TOKEN_MS, STUB_TOKENS_PER_SECOND, STUB_REPLY_TOKENS, moderation_ms=0)
+    async with serve(app, port=STUB_PORT):
+        yield app.state.stub
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """Factory: serve these packs from the catalog index (a new version, so no cached page applies)"""
+
+    def install(packs: Sequence[Pack], items: Optional[dict] = None) -> CatalogIndex:
+        index = CatalogIndex.build(catalog_index._next_version(), packs, items or {})
+        monkeypatch.setattr(catalog_index, "_index", index)
+        return index
+
+    return install
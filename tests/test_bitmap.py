@@ -0,0 +1,128 @@
+"""RoaringBitmap against Python set: conversions, copy-on-write updates and set algebra"""
+import random
+from array import array
+from collections import Counter
+
+import pytest
+
+from app.core.bitmap import ARRAY_MAX, CHUNK_BITS, RoaringBitmap
+
+SEEDS = range(10)
+CHUNK = 1 << CHUNK_BITS
+
+
+def random_values(rng: random.Random) -> set:
+    """Values over a few chunks, each chunk sparse, dense or right at the array / bitset boundary"""
+    values = set()
+    for high in rng.sample(range(4), rng.randint(0, 4)):
+        size = rng.choice([1, rng.randint(2, 100), ARRAY_MAX - 1, ARRAY_MAX, ARRAY_MAX + 1, rng.randint(5000, 40000)])
+        values.update(high * CHUNK + low for low in rng.sample(range(CHUNK), size))
+    return values
+
+
+def assert_matches(bitmap: RoaringBitmap, expected: set) -> None:
+    assert list(bitmap) == sorted(expected)
+    assert len(bitmap) == len(expected)
+    assert bool(bitmap) == bool(expected)
+    # Every chunk is held in its smaller container and none is empty
+    members = Counter(value >> CHUNK_BITS for value in expected)
+    assert bitmap._containers.keys() == members.keys()
+    for high, container in bitmap._containers.items():
+        assert isinstance(container, array) == (members[high] <= ARRAY_MAX)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_build_and_membership(seed):
+    rng = random.Random(seed)
+    values = random_values(rng)
+    bitmap = RoaringBitmap.from_iterable(values)
+    assert_matches(bitmap, values)
+
+    probes = rng.sample(range(5 * CHUNK), 2000) + rng.sample(sorted(values), min(len(values), 2000))
+    assert all((probe in bitmap) == (probe in values) for probe in probes)
+    assert bitmap.select(probes) == values.intersection(probes)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_added_and_removed_convert_at_the_array_limit(seed):
+    rng = random.Random(seed)
+    values = set(rng.sample(range(CHUNK), ARRAY_MAX - 2)) | {CHUNK + 7}
+    bitmap = RoaringBitmap.from_iterable(values)
+    versions = [(bitmap, set(values))]
+
+    # Walk across the boundary in both directions, keeping every version
+    for _ in range(8):
+        value = rng.choice([v for v in range(CHUNK) if v not in values])
+        bitmap, values = bitmap.with_added(value), values | {value}
+        versions.append((bitmap, set(values)))
+    for _ in range(8):
+        value = rng.choice(sorted(values))
+        bitmap, values = bitmap.with_removed(value), values - {value}
+        versions.append((bitmap, set(values)))
+    # Emptying a chunk drops its container
+    bitmap, values = bitmap.with_removed(CHUNK + 7), values - {CHUNK + 7}
+    versions.append((bitmap, set(values)))
+
+    for version, expected in versions:
+        assert_matches(version, expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_random_updates_keep_older_versions(seed):
+    rng = random.Random(seed)
+    values = random_values(rng)
+    bitmap = RoaringBitmap.from_iterable(values)
+    members = sorted(values) or [0]
+    versions = [(bitmap, set(values))]
+    for step in range(1, 301):
+        value = rng.randrange(4 * CHUNK) if rng.random() < 0.5 else rng.choice(members)
+        if rng.random() < 0.5:
+            changed = value not in values
+            updated, values = bitmap.with_added(value), values | {value}
+        else:
+            changed = value in values
+            updated, values = bitmap.with_removed(value), values - {value}
+        # No-op updates return the same bitmap
+        assert (updated is not bitmap) == changed
+        bitmap = updated
+        if step % 30 == 0:
+            versions.append((bitmap, set(values)))
+
+    for version, expected in versions:
+        assert_matches(version, expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_set_algebra(seed):
+    rng = random.Random(seed)
+    a, b, c = (random_values(rng) for _ in range(3))
+    ra, rb, rc = (RoaringBitmap.from_iterable(values) for values in (a, b, c))
+
+    assert_matches(ra & rb, a & b)
+    assert_matches(ra | rb, a | b)
+    assert_matches(ra - rb, a - b)
+    assert_matches(rb - ra, b - a)
+    assert_matches(RoaringBitmap.union([ra, rb, rc]), a | b | c)
+    assert_matches(RoaringBitmap.intersection([ra, rb, rc]), a & b & c)
+    assert_matches(RoaringBitmap.union([]), set())
+    assert_matches(RoaringBitmap.intersection([]), set())
+
+    # Operands are not modified
+    assert_matches(ra, a)
+    assert_matches(rb, b)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_set_algebra_across_container_kinds(seed):
+    rng = random.Random(seed)
+    sizes = (50, ARRAY_MAX, ARRAY_MAX + 1, 30000)
+    # The same chunk as an array or a bitset on either side of each operator
+    for left in sizes:
+        for right in sizes:
+            a = set(rng.sample(range(CHUNK), left))
+            b = set(rng.sample(range(CHUNK), right)) | set(rng.sample(sorted(a), min(left, 40)))
+            ra, rb = RoaringBitmap.from_iterable(a), RoaringBitmap.from_iterable(b)
+            assert_matches(ra & rb, a & b)
+            assert_matches(ra | rb, a | b)
+            assert_matches(ra - rb, a - b)
+            assert_matches(RoaringBitmap.union([ra, rb, ra]), a | b)
@@ -0,0 +1,221 @@
+"""Catalog endpoints served from the catalog index"""
+import httpx
+import pytest
+
+from app.core.response_cache import catalog_response_cache
+from app.core.security import create_access_token
+from app.deps import CurrentUserId, UserState, get_current_user_state
+from app.main import app
+from app.schemas.catalog import PackItem
+from app.schemas.common import Creator, Tag
+from app.services.user_blocks import user_blocks
+from tests.conftest import USER, make_pack
+
+
+@pytest.fixture
+async def client(auth_headers):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=auth_headers) as client:
+        yield client
+
+
+async def test_character_tags_are_an_empty_list(client, catalog):
+    catalog([make_pack("pack_1", tags=[Tag(id="tag_1", name="日常")])])
+
+    response = await client.get("/v1/tags", params={"type": "character"})
+    assert response.status_code == 200
+    assert response.json() == {"data": []}
+
+    response = await client.get("/v1/tags", params={"type": "pack"})
+    assert response.status_code == 200
+    assert response.json() == {"data": [{"id": "tag_1", "name": "日常", "count": 1}]}
+
+
+# =============================================================================
+# Age groups: responses cached for adults must not reach minors
+# =============================================================================
+
+
+@pytest.fixture
+def age_group():
+    """Setter for the caller's age group (the placeholder user state is always adult)"""
+
+    def use(group: str) -> None:
+        async def state(user_id: CurrentUserId) -> UserState:
+            return UserState(user_id=user_id, consent_completed=True, age_verified=True, age_group=group)
+
+        app.dependency_overrides[get_current_user_state] = state
+
+    use("adult")
+    yield use
+    app.dependency_overrides.pop(get_current_user_state, None)
+
+
+@pytest.fixture
+def rated_catalog(catalog):
+    """One pack per rating, all carrying the same tag; the r18 pack has an item"""
+    tag = Tag(id="tag_rated", name="年齢別")
+    catalog(
+        [make_pack(f"pack_{rating}", age_rating=rating, tags=[tag]) for rating in ("all", "r15", "r18")],
+        {"pack_r18": [PackItem(id="item_1", item_type="event", item_id="event_1", name="イベント")]},
+    )
+
+
+def pack_ids(response: httpx.Response) -> list:
+    assert response.status_code == 200
+    return sorted(pack["id"] for pack in response.json()["data"])
+
+
+@pytest.mark.parametrize("age_rating", [None, "r18"])
+async def test_pack_list_cached_for_adults_hides_r18_from_minors(
+    client, database, rated_catalog, age_group, age_rating
+):
+    params = {"age_rating": age_rating} if age_rating else {}
+    adult = await client.get("/v1/packs", params=params)
+    assert "pack_r18" in pack_ids(adult)
+
+    age_group("u18")
+    assert "pack_r18" not in pack_ids(await client.get("/v1/packs", params=params))
+    age_group("u13")
+    assert pack_ids(await client.get("/v1/packs", params=params)) == (["pack_all"] if age_rating is None else [])
+
+
+async def test_pack_detail_is_age_restricted_after_adult_reads(client, database, rated_catalog, age_group):
+    include = {"include": "items,entitlement,characters"}
+    adult = await client.get("/v1/packs/pack_r18", params=include)
+    assert adult.status_code == 200
+    assert adult.json()["items"][0]["id"] == "item_1"
+
+    for group in ("u18", "u13"):
+        age_group(group)
+        for params in ({}, include):
+            response = await client.get(
+                "/v1/packs/pack_r18", params=params, headers={"If-None-Match": adult.headers["ETag"]}
+            )
+            assert response.status_code == 403
+            assert response.json()["error"]["code"] == "age_restricted"
+
+
+async def test_pack_items_revalidation_is_age_restricted(client, database, rated_catalog, age_group):
+    adult = await client.get("/v1/packs/pack_r18/items")
+    assert adult.status_code == 200
+    assert adult.headers["Cache-Control"].startswith("private")
+    revalidated = await client.get("/v1/packs/pack_r18/items", headers={"If-None-Match": adult.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+    for group in ("u18", "u13"):
+        age_group(group)
+        for headers in ({"If-None-Match": adult.headers["ETag"]}, {}):
+            response = await client.get("/v1/packs/pack_r18/items", headers=headers)
+            assert response.status_code == 403
+            assert "item_1" not in response.text
+
+
+async def test_thread_creation_is_age_restricted(client, database, rated_catalog, age_group):
+    await client.get("/v1/packs/pack_r18")
+    for group in ("u18", "u13"):
+        age_group(group)
+        response = await client.post("/v1/threads", json={"pack_id": "pack_r18", "character_id": "character_1"})
+        assert response.status_code == 403
+        assert response.json()["error"]["code"] == "age_restricted"
+
+
+async def test_tag_counts_cover_only_visible_packs(client, database, rated_catalog, age_group):
+    adult = await client.get("/v1/tags")
+    assert adult.json()["data"] == [{"id": "tag_rated", "name": "年齢別", "count": 3}]
+
+    expected = {"u18": 2, "u13": 1}
+    for group, count in expected.items():
+        age_group(group)
+        stale = await client.get("/v1/tags", headers={"If-None-Match": adult.headers["ETag"]})
+        assert stale.status_code == 200
+        assert stale.headers["Cache-Control"].startswith("private")
+        assert stale.json()["data"] == [{"id": "tag_rated", "name": "年齢別", "count": count}]
+
+
+# =============================================================================
+# Blocks: blocked creators / characters / tags are hidden per user
+# =============================================================================
+
+OTHER_USER = "00000000-0000-0000-0000-000000000002"
+BLOCKS = {("creator", "creator_blocked"), ("character", "character_blocked"), ("tag", "tag_blocked")}
+
+
+@pytest.fixture
+def blocks(monkeypatch):
+    """USER blocks BLOCKS; everyone else blocks nothing"""
+
+    async def load_blocks(db, user_id):
+        return BLOCKS if user_id == USER else ()
+
+    monkeypatch.setattr(user_blocks, "load_blocks", load_blocks)
+    for user_id in (USER, OTHER_USER):
+        user_blocks.invalidate(user_id)
+    yield
+    for user_id in (USER, OTHER_USER):
+        user_blocks.invalidate(user_id)
+
+
+@pytest.fixture
+def blockable_catalog(catalog) -> set:
+    """30 packs, every third one hidden by a block; returns the ids left visible"""
+    packs, items, hidden = [], {}, set()
+    for i in range(30):
+        pack_id = f"pack_block_{i:02d}"
+        pack = make_pack(pack_id, tags=[Tag(id="tag_blocked" if i % 9 == 6 else "tag_other", name="タグ")])
+        if i % 9 == 0:
+            pack = pack.model_copy(update={"creator": Creator(id="creator_blocked", display_name="ブロック")})
+        if i % 9 == 3:
+            items[pack_id] = [PackItem(id=f"item_{i}", item_type="character", item_id="character_blocked", name="キャラ")]
+        packs.append(pack)
+        if i % 3 == 0:
+            hidden.add(pack_id)
+    catalog(packs, items)
+    return {pack.id for pack in packs} - hidden
+
+
+async def all_pages(client: httpx.AsyncClient, limit: int, headers: dict = None) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/v1/packs", params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([pack["id"] for pack in body["data"]])
+        cursor = body["pagination"]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_blocked_packs_are_hidden_and_pages_still_fill(client, database, blocks, blockable_catalog):
+    pages = await all_pages(client, limit=6)
+    listed = [pack_id for page in pages for pack_id in page]
+
+    assert sorted(listed) == sorted(blockable_catalog)
+    assert len(listed) == len(set(listed))
+    # Every page but the last is full, although the hidden packs sit between them
+    assert [len(page) for page in pages[:-1]] == [6] * (len(pages) - 1)
+    assert 0 < len(pages[-1]) <= 6
+
+
+async def test_blocking_users_skip_the_shared_cache(client, database, blocks, blockable_catalog):
+    other = {"Authorization": f"Bearer {create_access_token(OTHER_USER)}"}
+    shared = await client.get("/v1/packs", params={"limit": 100}, headers=other)
+    assert len(shared.json()["data"]) == 30
+    before = catalog_response_cache.stats()
+
+    blocked = await client.get("/v1/packs", params={"limit": 100})
+    assert sorted(pack["id"] for pack in blocked.json()["data"]) == sorted(blockable_catalog)
+    # Neither read from nor written to the shared cache
+    assert catalog_response_cache.stats() == before
+
+    again = await client.get("/v1/packs", params={"limit": 100}, headers=other)
+    assert again.json() == shared.json()
+    assert catalog_response_cache.stats()["hits"] == before["hits"] + 1
+
+    # Unblocking everything puts the user back on the shared page
+    for target_type, target_id in BLOCKS:
+        user_blocks.on_unblock(USER, target_type, target_id)
+    unblocked = await client.get("/v1/packs", params={"limit": 100})
+    assert unblocked.json() == shared.json()
+    assert catalog_response_cache.stats()["hits"] == before["hits"] + 2
@@ -0,0 +1,29 @@
+"""Catalog index versions: copy-on-write search"""
+from app.services.catalog_index import CatalogIndex, PackQuery
+from tests.conftest import make_pack
+
+ALL_RATINGS = ("all", "r15", "r18")
+
+
+def search(index: CatalogIndex, text: str) -> list:
+    packs, _ = index.query(PackQuery(ratings=ALL_RATINGS, text=text, limit=100))
+    return sorted(pack.id for pack in packs)
+
+
+def test_published_versions_do_not_share_search_updates():
+    v1 = CatalogIndex.build(1, [make_pack("pack_1", name="はじまりの物語")], {})
+    v2 = v1.with_published(2, make_pack("pack_2", name="星空の物語"), [])
+    # Derived from v1 again (two writers racing on the same base)
+    v3 = v1.with_published(3, make_pack("pack_3", name="星空の約束"), [])
+
+    assert search(v1, "星空") == []
+    assert len(v1.search.doc_lengths) == 1
+    assert search(v2, "星空") == ["pack_2"]
+    assert search(v3, "星空") == ["pack_3"]
+    assert search(v2, "物語") == ["pack_1", "pack_2"]
+
+    # Replacing a pack leaves its old ordinal dead, not matching
+    v4 = v2.with_published(4, make_pack("pack_2", name="夜明けの歌"), [])
+    assert search(v4, "星空") == []
+    assert search(v4, "夜明") == ["pack_2"]
+    assert search(v2, "星空") == ["pack_2"]
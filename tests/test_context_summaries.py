@@ -0,0 +1,117 @@
+"""Rolling summaries: one summary and watermark per thread, also for threads of the same user and character"""
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+from app.services.context_summaries import ContextSummarizer
+from app.services.llm import LLMCompletion
+from app.services.turn_pipeline import Turn
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class SummaryProvider:
+    """Summarizes as the earlier summary followed by the contents of the new messages"""
+
+    def __init__(self) -> None:
+        self.transcripts: List[str] = []
+
+    async def complete(self, messages, max_tokens=None) -> LLMCompletion:
+        transcript = messages[-1].content
+        self.transcripts.append(transcript)
+        summary, log = transcript[len("# これまでの要約\n"):].split("\n# 新しい会話ログ\n", 1)
+        parts = [] if summary == "（なし）" else [summary]
+        parts += [line.split(": ", 1)[1] for line in log.splitlines()]
+        return LLMCompletion(content=" ".join(parts), finish_reason="stop")
+
+
+async def add_messages(messages: List[tuple]) -> None:
+    """(thread_id, content) in order, one second apart"""
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            ConversationMessage(session_id=thread_id, role="user", content=content, created_at=START + timedelta(seconds=i))
+            for i, (thread_id, content) in enumerate(messages)
+        )
+        await db.commit()
+
+
+async def load(thread_id: str):
+    async with AsyncSessionLocal() as db:
+        thread = await db.get(ConversationSession, thread_id)
+        rows = (await db.scalars(
+            select(ConversationMessage)
+            .where(ConversationMessage.session_id == thread_id)
+            .order_by(ConversationMessage.created_at)
+        )).all()
+    return thread, list(rows)
+
+
+async def drain(summarizer: ContextSummarizer) -> None:
+    while summarizer._jobs:
+        await next(iter(summarizer._jobs.values()))
+
+
+async def test_interleaving_threads_keep_their_own_watermark(database, create_threads):
+    thread_a, thread_b = create_threads(2)
+    # Same user and character, messages interleaved in time
+    await add_messages([(thread_a, f"a{n}") if i % 2 == 0 else (thread_b, f"b{n}") for n in range(1, 5) for i in range(2)])
+    provider = SummaryProvider()
+    summarizer = ContextSummarizer(provider=provider, session_factory=AsyncSessionLocal, batch_messages=2)
+
+    # a1..a3 fold in two runs; b is not touched, though b1 and b2 are older than a3
+    _, rows_a = await load(thread_a)
+    summarizer.schedule(thread_a, rows_a[2].created_at)
+    await drain(summarizer)
+
+    thread, rows = await load(thread_a)
+    assert thread.summary == "a1 a2 a3"
+    assert thread.summarized_until == rows[2].created_at
+    assert [m.content for m in Turn.from_rows(thread, rows, window=10).history] == ["a4"]
+    thread, rows = await load(thread_b)
+    assert thread.summary is None and thread.summarized_until is None
+    assert [m.content for m in Turn.from_rows(thread, rows, window=10).history] == ["b1", "b2", "b3", "b4"]
+
+    # b folds only its own messages, from its own empty summary
+    summarizer.schedule(thread_b, rows[1].created_at)
+    await drain(summarizer)
+    thread, rows = await load(thread_b)
+    assert thread.summary == "b1 b2"
+    assert [m.content for m in Turn.from_rows(thread, rows, window=10).history] == ["b3", "b4"]
+    assert "a" not in provider.transcripts[-1].split("# 新しい会話ログ", 1)[1]
+    assert "（なし）" in provider.transcripts[-1]
+
+    # Both at once: one job per thread, each from its own watermark
+    _, rows_a = await load(thread_a)
+    summarizer.schedule(thread_a, rows_a[3].created_at)
+    summarizer.schedule(thread_b, rows[3].created_at)
+    assert set(summarizer._jobs) == {thread_a, thread_b}
+    await drain(summarizer)
+    assert (await load(thread_a))[0].summary == "a1 a2 a3 a4"
+    assert (await load(thread_b))[0].summary == "b1 b2 b3 b4"
+    assert (summarizer.folded, summarizer.conflicts, summarizer.failed) == (8, 0, 0)
+
+
+async def test_a_moved_watermark_is_not_overwritten(database, create_threads):
+    (thread_id,) = create_threads(1)
+    await add_messages([(thread_id, "m1"), (thread_id, "m2")])
+    summarizer = ContextSummarizer(provider=SummaryProvider(), session_factory=AsyncSessionLocal, batch_messages=10)
+    _, rows = await load(thread_id)
+
+    # Another worker folded m1 while this run was summarizing
+    async with AsyncSessionLocal() as db:
+        thread = await db.get(ConversationSession, thread_id)
+
+        async def fold_elsewhere(messages, max_tokens=None):
+            thread.summary, thread.summarized_until = "m1", rows[0].created_at
+            await db.commit()
+            return LLMCompletion(content="m1 m2", finish_reason="stop")
+
+        summarizer.provider.complete = fold_elsewhere
+        assert not await summarizer._compact(thread_id, rows[1].created_at)
+
+    thread, _ = await load(thread_id)
+    assert thread.summary == "m1"
+    assert summarizer.conflicts == 1
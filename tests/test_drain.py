@@ -0,0 +1,128 @@
+"""Graceful shutdown: SIGTERM while replies are streaming (NFR-A06)"""
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+
+import httpx
+import pytest
+
+from app.core.drain import drain_coordinator
+from app.db import database as db_module
+from app.main import app
+from tests.conftest import serve, server_url
+
+STREAMS = 100
+DRAIN_TIMEOUT_SECONDS = 1.0
+
+
+class DisposeSpy:
+    """Stands in for the engine in the lifespan; records what was stored when it is disposed"""
+
+    def __init__(self, engine, database) -> None:
+        self.engine = engine
+        self.database = database
+        self.disposed = []
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    async def dispose(self) -> None:
+        with sqlite3.connect(self.database) as db:
+            interrupted = db.execute(
+                "SELECT COUNT(*) FROM conversation_messages WHERE role = 'character' AND finish_reason = 'interrupted'"
+            ).fetchone()[0]
+        self.disposed.append({"active_streams": drain_coordinator.active_streams, "interrupted": interrupted})
+        await self.engine.dispose()
+
+
+@pytest.fixture
+def draining(monkeypatch, database):
+    """
+    Short drain deadline and a spied engine; the coordinator is reset afterwards
+
+    uvicorn raises the captured SIGTERM again once it has stopped, so the
+    test process ignores it meanwhile.
+    """
+    state = dict(vars(drain_coordinator))
+    drain_coordinator.timeout_seconds = DRAIN_TIMEOUT_SECONDS
+    spy = DisposeSpy(db_module.engine, database)
+    monkeypatch.setattr(db_module, "engine", spy)
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    yield spy
+    signal.signal(signal.SIGTERM, previous)
+    vars(drain_coordinator).clear()
+    vars(drain_coordinator).update(state)
+
+
+async def read_stream(client: httpx.AsyncClient, thread_id: str, streaming: asyncio.Semaphore) -> list:
+    """(event, data) pairs of one reply; releases `streaming` at its first content_delta"""
+    events = []
+    event = None
+    async with client.stream("POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": "こんにちは"}) as response:
+        assert response.status_code == 200
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+                if event == "content_delta" and sum(e == "content_delta" for e, _ in events) == 1:
+                    streaming.release()
+    return events
+
+
+async def test_sigterm_drains_live_streams(stub_llm, create_threads, auth_headers, draining):
+    threads = create_threads(STREAMS)
+    streaming = asyncio.Semaphore(0)
+    local = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async with serve(app, capture_signals=True) as server:
+        async with httpx.AsyncClient(
+            base_url=server_url(server),
+            headers=auth_headers,
+            limits=httpx.Limits(max_connections=STREAMS + 10),
+            timeout=30,
+        ) as client:
+            streams = [asyncio.create_task(read_stream(client, thread_id, streaming)) for thread_id in threads]
+            for _ in range(STREAMS):
+                await asyncio.wait_for(streaming.acquire(), timeout=20)
+            ready = (await client.get("/ready")).json()
+            assert ready == {"status": "ready", "active_streams": STREAMS}
+
+            os.kill(os.getpid(), signal.SIGTERM)
+            for _ in range(100):
+                if drain_coordinator.is_draining:
+                    break
+                await asyncio.sleep(0.01)
+
+            # Not ready while the streams are still being drained
+            assert (await local.get("/ready")).status_code == 503
+            assert drain_coordinator.active_streams == STREAMS
+            assert stub_llm["active"] == STREAMS
+
+            results = await asyncio.wait_for(asyncio.gather(*streams), timeout=DRAIN_TIMEOUT_SECONDS + 10)
+        # The lifespan shutdown finishes when the server task does (leaving serve())
+    await local.aclose()
+
+    for events in results:
+        names = [name for name, _ in events]
+        assert names[0] == "message_start"
+        assert "content_delta" in names
+        assert "message_done" not in names
+        name, error = events[-1]
+        assert name == "error"
+        assert error["code"] == "service_unavailable"
+        assert error["resumable"] is True
+        assert error["assistant_message_id"] == events[0][1]["assistant_message_id"]
+
+    # Partial answers were stored before the engine went away, and nothing was still streaming
+    assert draining.disposed == [{"active_streams": 0, "interrupted": STREAMS}]
+    with sqlite3.connect(draining.database) as db:
+        rows = db.execute(
+            "SELECT id, content FROM conversation_messages WHERE role = 'character' AND finish_reason = 'interrupted'"
+        ).fetchall()
+    stored = {message_id: content for message_id, content in rows}
+    assert {events[0][1]["assistant_message_id"] for events in results} <= set(stored)
+    assert all(stored[events[0][1]["assistant_message_id"]] for events in results)
+    assert stub_llm["active"] == 0
@@ -0,0 +1,324 @@
+"""Generation leases: memory and Redis backends, reject / queue / supersede policies, cooperative supersede"""
+import asyncio
+import uuid
+from typing import List
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.errors import ConflictException, ErrorCode
+from app.main import app
+from app.services.generation_guard import (
+    ACQUIRED,
+    THREAD_BUSY,
+    USER_BUSY,
+    GenerationGuard,
+    GenerationLease,
+    MemoryGenerationLocks,
+    RedisGenerationLocks,
+    generation_guard,
+)
+
+
+class CountingLocks(MemoryGenerationLocks):
+    """Memory backend counting try_acquire() calls (waiters woken to re-check)"""
+
+    tries = 0
+
+    async def try_acquire(self, lease: GenerationLease):
+        self.tries += 1
+        return await super().try_acquire(lease)
+
+
+def guard(policy: str, max_per_user: int = 2, timeout: float = 2.0) -> GenerationGuard:
+    return GenerationGuard(CountingLocks(max_per_user), policy=policy, queue_timeout_seconds=timeout)
+
+
+def lease(locks, user_id: str, thread_id: str) -> GenerationLease:
+    return GenerationLease(locks, user_id, thread_id, uuid.uuid4().hex)
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def queue_up(g: GenerationGuard, requests: List[tuple], acquired: list) -> List[asyncio.Task]:
+    """Acquire tasks in arrival order; `acquired` gets their index once they hold the lease"""
+
+    async def acquire(index: int, user_id: str, thread_id: str) -> GenerationLease:
+        held = await g.acquire(user_id, thread_id)
+        acquired.append(index)
+        return held
+
+    tasks = []
+    for index, (user_id, thread_id) in enumerate(requests):
+        tasks.append(asyncio.create_task(acquire(index, user_id, thread_id)))
+        await settle()
+    return tasks
+
+
+# =============================================================================
+# Memory backend
+# =============================================================================
+
+
+async def test_memory_backend_limits_threads_and_users():
+    locks = MemoryGenerationLocks(max_per_user=2)
+    first = lease(locks, "user_a", "thread_1")
+    assert await locks.try_acquire(first) is ACQUIRED
+    assert await locks.try_acquire(lease(locks, "user_b", "thread_1")) == THREAD_BUSY
+    assert await locks.try_acquire(lease(locks, "user_a", "thread_2")) is ACQUIRED
+    assert await locks.try_acquire(lease(locks, "user_a", "thread_3")) == USER_BUSY
+    assert await locks.try_acquire(lease(locks, "user_b", "thread_3")) is ACQUIRED
+
+    # Only the holding lease releases the thread
+    await locks.release(lease(locks, "user_a", "thread_1"))
+    assert locks.held() == 3
+    changed = locks.wait_changed(1.0)
+    await locks.release(first)
+    await asyncio.wait_for(changed, 0.1)
+    assert locks.held() == 2
+    assert await locks.try_acquire(lease(locks, "user_a", "thread_1")) is ACQUIRED
+
+
+# =============================================================================
+# Policies
+# =============================================================================
+
+
+async def test_reject_policy():
+    g = guard("reject")
+    held = await g.acquire("user_a", "thread_1")
+    with pytest.raises(ConflictException) as exc:
+        await g.acquire("user_a", "thread_1")
+    assert exc.value.code == ErrorCode.REQUEST_IN_PROGRESS
+
+    await held.release()
+    await held.release()
+    await (await g.acquire("user_a", "thread_1")).release()
+    assert (g.acquired, g.rejected, g.queued) == (2, 1, 0)
+
+
+async def test_queue_policy_is_fifo_and_wakes_the_first_in_line():
+    g = guard("queue")
+    held = await g.acquire("user_a", "thread_1")
+    acquired: list = []
+    tasks = await queue_up(g, [("user_a", "thread_1")] * 3, acquired)
+    assert g.stats()["waiting"] == 3
+
+    tries = g.backend.tries
+    await held.release()
+    await settle()
+    assert acquired == [0]
+    # Only the first in line re-checked the backend
+    assert g.backend.tries == tries + 1
+
+    # A send arriving right after a release queues behind the waiters
+    await (await tasks[0]).release()
+    tasks += await queue_up(g, [("user_a", "thread_1")], [])
+    await settle()
+    assert acquired == [0, 1]
+
+    for index in (1, 2):
+        await (await tasks[index]).release()
+        await settle()
+    assert acquired == [0, 1, 2]
+    await (await tasks[3]).release()
+    assert g.stats()["waiting"] == 0 and g.backend.held() == 0
+
+
+async def test_queue_policy_user_limit_in_arrival_order():
+    g = guard("queue", max_per_user=1)
+    held = await g.acquire("user_a", "thread_1")
+    acquired: list = []
+    tasks = await queue_up(g, [("user_a", "thread_2"), ("user_a", "thread_3"), ("user_b", "thread_4")], acquired)
+    # Other users are not held up
+    assert acquired == [2]
+
+    await held.release()
+    await settle()
+    assert acquired == [2, 0]
+    await (await tasks[0]).release()
+    await settle()
+    assert acquired == [2, 0, 1]
+    for task in tasks[1:]:
+        await (await task).release()
+
+
+async def test_queue_policy_times_out():
+    g = guard("queue", timeout=0.05)
+    held = await g.acquire("user_a", "thread_1")
+    with pytest.raises(ConflictException):
+        await g.acquire("user_a", "thread_1")
+    assert g.stats()["waiting"] == 0 and g.rejected == 1
+    await held.release()
+
+
+async def test_supersede_policy():
+    g = guard("supersede", max_per_user=2)
+    held = await g.acquire("user_a", "thread_1")
+    stopped = []
+    held.bind(lambda: stopped.append("generation"))
+
+    acquired: list = []
+    tasks = await queue_up(g, [("user_a", "thread_1")], acquired)
+    assert stopped == ["generation"] and held.superseded
+    # The holder stops and releases; the newer send takes over
+    await held.release()
+    await settle()
+    assert acquired == [0]
+
+    # A send still waiting for the thread is dropped by a newer one
+    waiting = await queue_up(g, [("user_a", "thread_1")], acquired)
+    newest = await queue_up(g, [("user_a", "thread_1")], acquired)
+    with pytest.raises(ConflictException):
+        await waiting[0]
+    await (await tasks[0]).release()
+    await settle()
+    assert acquired == [0, 0]
+    await (await newest[0]).release()
+
+    # A user at the limit on other threads is rejected, not superseding anything
+    others = [await g.acquire("user_a", thread_id) for thread_id in ("thread_2", "thread_3")]
+    with pytest.raises(ConflictException):
+        await g.acquire("user_a", "thread_4")
+    assert not any(other.superseded for other in others)
+    for other in others:
+        await other.release()
+    assert g.superseded == 3
+
+
+# =============================================================================
+# Cooperative supersede
+# =============================================================================
+
+
+async def test_hold_supersede_cancels_only_the_generation():
+    g = guard("supersede")
+    async with g.hold("user_a", "thread_1") as held:
+        assert await held.until_superseded(asyncio.ensure_future(asyncio.sleep(0, "reply"))) == "reply"
+
+        generation = asyncio.create_task(asyncio.sleep(10))
+        contender = asyncio.create_task(g.acquire("user_a", "thread_1"))
+        with pytest.raises(ConflictException) as exc:
+            await held.until_superseded(generation)
+        assert exc.value.code == ErrorCode.REQUEST_IN_PROGRESS
+        assert generation.cancelled()
+        # This task goes on and still holds the lease until the block ends
+        await settle()
+        assert not contender.done()
+    await (await asyncio.wait_for(contender, 1)).release()
+
+
+async def test_superseded_send_answers_409(stub_llm, create_threads, auth_headers, monkeypatch):
+    monkeypatch.setattr(generation_guard, "policy", "supersede")
+    (thread_id,) = create_threads(1)
+    path = f"/v1/threads/{thread_id}/messages"
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=auth_headers, timeout=30) as client:
+        first = asyncio.create_task(client.post(path, json={"content": "こんにちは"}))
+        while not stub_llm["active"]:
+            await asyncio.sleep(0.01)
+        second = asyncio.create_task(client.post(path, json={"content": "やっぱりこっち"}))
+
+        response = await asyncio.wait_for(first, 5)
+        assert response.status_code == 409
+        assert response.json()["error"]["code"] == "request_in_progress"
+
+        while stub_llm["requests"] < 2:
+            await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+    for _ in range(100):
+        if not stub_llm["active"]:
+            break
+        await asyncio.sleep(0.01)
+    assert stub_llm["active"] == 0 and stub_llm["cancelled"] == 2
+    assert generation_guard.backend.held() == 0
+
+
+# =============================================================================
+# Redis backend (needs the redis package and a server at REDIS_URL)
+# =============================================================================
+
+
+@pytest.fixture
+async def redis_nodes():
+    """Two nodes' Redis backends with a short lease TTL"""
+    aioredis = pytest.importorskip("redis.asyncio")
+    client = aioredis.from_url(settings.REDIS_URL)
+    try:
+        await client.ping()
+    except Exception:
+        pytest.skip(f"Redis is not reachable at {settings.REDIS_URL}")
+    finally:
+        await client.aclose()
+    nodes = [RedisGenerationLocks(settings.REDIS_URL, max_per_user=2, ttl_seconds=0.3, poll_seconds=0.02) for _ in range(2)]
+    yield nodes
+    for node in nodes:
+        await node.aclose()
+
+
+async def test_redis_lua_acquire_and_release(redis_nodes):
+    a, b = redis_nodes
+    user, thread = f"user_{uuid.uuid4().hex}", f"thread_{uuid.uuid4().hex}"
+    first = lease(a, user, thread)
+    assert await a.try_acquire(first) is ACQUIRED
+    assert await b.try_acquire(lease(b, user, thread)) == THREAD_BUSY
+    second = lease(b, user, f"{thread}_2")
+    assert await b.try_acquire(second) is ACQUIRED
+    assert await b.try_acquire(lease(b, user, f"{thread}_3")) == USER_BUSY
+
+    # Another token does not free the thread
+    await b.release(lease(b, user, thread))
+    assert await b.try_acquire(lease(b, f"{user}_other", thread)) == THREAD_BUSY
+    await a.release(first)
+    third = lease(b, user, thread)
+    assert await b.try_acquire(third) is ACQUIRED
+    for held in (second, third):
+        await b.release(held)
+
+
+async def test_redis_leases_are_renewed_and_lost_ones_superseded(redis_nodes):
+    a, b = redis_nodes
+    user, thread = f"user_{uuid.uuid4().hex}", f"thread_{uuid.uuid4().hex}"
+    held = lease(a, user, thread)
+    assert await a.try_acquire(held) is ACQUIRED
+
+    # Held past its TTL: renewed every TTL / 3
+    await asyncio.sleep(0.6)
+    assert await b.try_acquire(lease(b, user, thread)) == THREAD_BUSY
+
+    # Expired behind the holder's back and taken elsewhere: the holder stops
+    await a._client.delete(f"gen:thread:{thread}")
+    taker = lease(b, user, thread)
+    assert await b.try_acquire(taker) is ACQUIRED
+    for _ in range(50):
+        if held.superseded:
+            break
+        await asyncio.sleep(0.02)
+    assert held.superseded and a.lost == 1
+    await b.release(taker)
+
+
+async def test_redis_supersede_reaches_the_holding_node(redis_nodes):
+    a, b = redis_nodes
+    user, thread = f"user_{uuid.uuid4().hex}", f"thread_{uuid.uuid4().hex}"
+    held = lease(a, user, thread)
+    assert await a.try_acquire(held) is ACQUIRED
+    stopped = asyncio.Event()
+    held.bind(stopped.set)
+
+    # Published until the holder's subscription is up
+    for _ in range(50):
+        await b.supersede(thread)
+        try:
+            await asyncio.wait_for(stopped.wait(), 0.05)
+            break
+        except asyncio.TimeoutError:
+            pass
+    assert stopped.is_set()
+    await a.release(held)
@@ -0,0 +1,226 @@
+"""LLM dispatch: hedging, fallthrough, first-token deadline, circuit breakers"""
+import asyncio
+from typing import AsyncIterator, Optional
+
+import pytest
+
+from app.services.llm.base import ChatMessage, LLMChunk, LLMError, LLMTimeoutError, LLMUnavailableError
+from app.services.llm.dispatch import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMDispatcher
+
+MESSAGES = [ChatMessage(role="user", content="こんにちは")]
+
+
+class FakeProvider:
+    """Provider whose first token takes `first_token_seconds`, or that fails with `error` instead"""
+
+    def __init__(self, name: str, first_token_seconds: float = 0.0, error: Optional[LLMError] = None) -> None:
+        self.name = name
+        self.first_token_seconds = first_token_seconds
+        self.error = error
+        self.started_at = []
+        self.cancelled = 0
+        self.closed = 0
+
+    def stream(self, messages, max_tokens=None) -> AsyncIterator[LLMChunk]:
+        return self._stream()
+
+    async def _stream(self) -> AsyncIterator[LLMChunk]:
+        self.started_at.append(asyncio.get_running_loop().time())
+        try:
+            await asyncio.sleep(self.first_token_seconds)
+            if self.error is not None:
+                raise self.error
+            yield LLMChunk(delta=f"{self.name}:")
+            yield LLMChunk(delta="ok")
+            yield LLMChunk(finish_reason="stop")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.closed += 1
+
+    async def warm(self, connections: int) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"provider": self.name}
+
+
+def dispatcher(*providers: FakeProvider, **options) -> LLMDispatcher:
+    defaults = dict(
+        first_token_deadline_seconds=2.0,
+        hedge_percentile=0.9,
+        hedge_delay_seconds=1.0,
+        hedge_min_delay_seconds=0.01,
+        hedge_min_samples=20,
+        breaker_failures=3,
+        breaker_reset_seconds=30.0,
+    )
+    return LLMDispatcher(providers, **{**defaults, **options})
+
+
+async def reply(llm: LLMDispatcher) -> str:
+    return (await llm.complete(MESSAGES)).content
+
+
+# =============================================================================
+# Hedging
+# =============================================================================
+
+
+def test_hedge_delay_follows_the_configured_percentile():
+    llm = dispatcher(FakeProvider("primary"), FakeProvider("fallback"))
+    # Too few samples: the configured delay
+    for ms in range(1, 20):
+        llm.latencies[0].record(ms / 1000)
+    assert llm.hedge_after(0) == 1.0
+
+    for ms in range(20, 101):
+        llm.latencies[0].record(ms / 1000)
+    assert llm.hedge_after(0) == pytest.approx(0.091)
+
+    # Clamped to the minimum delay and the first-token deadline
+    assert dispatcher(FakeProvider("p"), hedge_delay_seconds=0.0).hedge_after(0) == 0.01
+    assert dispatcher(FakeProvider("p"), first_token_deadline_seconds=0.5).hedge_after(0) == 0.5
+
+
+async def test_hedge_fires_at_the_percentile_and_cancels_the_loser():
+    primary = FakeProvider("primary", first_token_seconds=5.0)
+    fallback = FakeProvider("fallback", first_token_seconds=0.01)
+    llm = dispatcher(primary, fallback)
+    for ms in range(1, 101):
+        llm.latencies[0].record(ms / 1000)
+    hedge_after = llm.hedge_after(0)
+
+    assert await reply(llm) == "fallback:ok"
+
+    hedged_at = fallback.started_at[0] - primary.started_at[0]
+    assert hedge_after <= hedged_at < hedge_after + 0.05
+    assert primary.cancelled == 1 and primary.closed == 1
+    assert fallback.cancelled == 0 and fallback.closed == 1
+    assert (llm.hedges, llm.hedge_wins, llm.fallbacks) == (1, 1, 0)
+    assert [breaker.state for breaker in llm.breakers] == [CLOSED, CLOSED]
+
+
+async def test_no_hedge_when_the_primary_answers_in_time():
+    primary = FakeProvider("primary", first_token_seconds=0.01)
+    fallback = FakeProvider("fallback")
+    llm = dispatcher(primary, fallback, hedge_delay_seconds=0.2)
+
+    assert await reply(llm) == "primary:ok"
+    assert fallback.started_at == []
+    assert llm.hedges == 0
+
+
+# =============================================================================
+# Fallthrough
+# =============================================================================
+
+
+async def test_retryable_error_falls_through_without_waiting_for_the_hedge():
+    primary = FakeProvider("primary", error=LLMUnavailableError("primary: HTTP 503"))
+    fallback = FakeProvider("fallback")
+    llm = dispatcher(primary, fallback, hedge_delay_seconds=1.0)
+
+    started = asyncio.get_running_loop().time()
+    assert await reply(llm) == "fallback:ok"
+    assert fallback.started_at[0] - started < 0.1
+    assert (llm.fallbacks, llm.hedges) == (1, 0)
+    assert llm.breakers[0].failures == 1
+
+
+async def test_non_retryable_error_is_raised():
+    primary = FakeProvider("primary", error=LLMError("primary: HTTP 400"))
+    fallback = FakeProvider("fallback")
+    llm = dispatcher(primary, fallback)
+
+    with pytest.raises(LLMError, match="HTTP 400"):
+        await reply(llm)
+    assert fallback.started_at == []
+
+
+async def test_last_error_is_raised_when_every_provider_fails():
+    llm = dispatcher(
+        FakeProvider("primary", error=LLMUnavailableError("primary: HTTP 503")),
+        FakeProvider("fallback", error=LLMUnavailableError("fallback: HTTP 429")),
+    )
+    with pytest.raises(LLMUnavailableError, match="HTTP 429"):
+        await reply(llm)
+
+
+# =============================================================================
+# First-token deadline
+# =============================================================================
+
+
+async def test_first_token_deadline_cancels_every_attempt():
+    primary = FakeProvider("primary", first_token_seconds=5.0)
+    fallback = FakeProvider("fallback", first_token_seconds=5.0)
+    llm = dispatcher(primary, fallback, first_token_deadline_seconds=0.2, hedge_delay_seconds=0.05)
+
+    started = asyncio.get_running_loop().time()
+    with pytest.raises(LLMTimeoutError):
+        await reply(llm)
+    assert asyncio.get_running_loop().time() - started < 0.3
+    assert primary.cancelled == fallback.cancelled == 1
+    assert llm.deadline_timeouts == 1
+    assert [breaker.failures for breaker in llm.breakers] == [1, 1]
+
+
+# =============================================================================
+# Circuit breakers
+# =============================================================================
+
+
+async def test_breaker_opens_then_probes_and_closes():
+    breaker = CircuitBreaker(failures=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    await asyncio.sleep(0.06)
+    # One probe at a time
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    await asyncio.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow() and breaker.allow()
+    assert breaker.stats() == {"state": CLOSED, "consecutive_failures": 0, "opens": 2}
+
+
+async def test_open_circuit_skips_the_provider_until_the_probe():
+    primary = FakeProvider("primary", error=LLMUnavailableError("primary: HTTP 503"))
+    fallback = FakeProvider("fallback")
+    llm = dispatcher(primary, fallback, breaker_failures=2, breaker_reset_seconds=0.05)
+
+    for _ in range(2):
+        assert await reply(llm) == "fallback:ok"
+    assert llm.breakers[0].state == OPEN
+    assert await reply(llm) == "fallback:ok"
+    assert len(primary.started_at) == 2
+
+    await asyncio.sleep(0.06)
+    primary.error = None
+    assert await reply(llm) == "primary:ok"
+    assert len(primary.started_at) == 3
+    assert llm.breakers[0].state == CLOSED
+
+
+async def test_every_circuit_open_fails_at_once():
+    primary = FakeProvider("primary", error=LLMUnavailableError("primary: HTTP 503"))
+    llm = dispatcher(primary, breaker_failures=1)
+
+    with pytest.raises(LLMUnavailableError, match="HTTP 503"):
+        await reply(llm)
+    with pytest.raises(LLMUnavailableError, match="circuits open"):
+        await reply(llm)
+    assert len(primary.started_at) == 1
+    assert llm.rejected == 1
@@ -0,0 +1,82 @@
+"""Admission control: what is counted as in flight, and what may be shed"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app.core.load_shedding import (
+    AdmissionController,
+    AdmissionMiddleware,
+    LoopLagMonitor,
+    Priority,
+    admission_controller,
+    router_dependencies,
+)
+from app.main import app
+
+
+def build_app(controller: AdmissionController, release: asyncio.Event) -> FastAPI:
+    """A long-lived critical route (like a reply stream) and a low-priority one"""
+    test_app = FastAPI()
+    stream = APIRouter()
+    catalog = APIRouter()
+
+    @stream.get("/stream")
+    async def long_stream():
+        await release.wait()
+        return {}
+
+    @catalog.get("/catalog")
+    async def browse():
+        await release.wait()
+        return {}
+
+    test_app.include_router(stream, dependencies=router_dependencies("conversation", controller))
+    test_app.include_router(catalog, dependencies=router_dependencies("catalog", controller))
+    test_app.add_middleware(AdmissionMiddleware, controller=controller)
+    return test_app
+
+
+@pytest.fixture
+def controller() -> AdmissionController:
+    return AdmissionController(
+        monitor=LoopLagMonitor(interval_seconds=0.05),
+        lag_thresholds_ms={"low": 100, "normal": 300},
+        max_in_flight={"low": 20, "normal": 50},
+        retry_after_seconds=2,
+    )
+
+
+async def test_open_streams_do_not_shed_low_priority(controller):
+    release = asyncio.Event()
+    transport = httpx.ASGITransport(app=build_app(controller, release))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        streams = [asyncio.create_task(client.get("/stream")) for _ in range(100)]
+        await asyncio.sleep(0.05)
+        assert controller.in_flight == {Priority.LOW: 0, Priority.NORMAL: 0}
+
+        browsing = [asyncio.create_task(client.get("/catalog")) for _ in range(20)]
+        await asyncio.sleep(0.05)
+        assert controller.in_flight[Priority.LOW] == 20
+        shed = await client.get("/catalog")
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "2"
+
+        release.set()
+        responses = await asyncio.gather(*streams, *browsing)
+    assert all(response.status_code == 200 for response in responses)
+    assert controller.in_flight == {Priority.LOW: 0, Priority.NORMAL: 0}
+    assert controller.shed_count[Priority.LOW] == 1
+
+
+async def test_refresh_is_critical_login_is_not(database, monkeypatch):
+    monkeypatch.setitem(admission_controller.in_flight, Priority.NORMAL, 10_000)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        login = await client.post("/v1/auth/login", json={"email": "test@example.com", "password": "password123"})
+        register = await client.post("/v1/auth/register", json={"email": "new@example.com", "password": "password123"})
+        refresh = await client.post("/v1/auth/refresh", json={"refresh_token": "invalid"})
+    assert login.status_code == 503
+    assert register.status_code == 503
+    assert refresh.status_code == 401
@@ -0,0 +1,192 @@
+"""Write-behind message queue: batched flushes, the queue bound, the spill log, crash recovery, merge()"""
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import pytest
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+from app.services.message_writes import MessageWriteQueue, SpillLog
+
+
+def queue(spill: SpillLog = None, **kwargs) -> MessageWriteQueue:
+    """A queue without its writer task: tests flush it themselves"""
+    return MessageWriteQueue(session_factory=AsyncSessionLocal, enabled=True, spill=spill, **kwargs)
+
+
+async def stored(thread_id: str) -> List[str]:
+    async with AsyncSessionLocal() as db:
+        return list((await db.scalars(
+            select(ConversationMessage.content)
+            .where(ConversationMessage.session_id == thread_id)
+            .order_by(ConversationMessage.created_at)
+        )).all())
+
+
+async def message_count(thread_id: str) -> int:
+    async with AsyncSessionLocal() as db:
+        return (await db.get(ConversationSession, thread_id)).message_count
+
+
+def segments(directory: Path) -> List[Path]:
+    return sorted(directory.glob("*.jsonl"))
+
+
+# =============================================================================
+# Flush
+# =============================================================================
+
+
+async def test_flush_writes_batches_and_counts_inserted_rows(create_threads):
+    thread_a, thread_b = create_threads(2)
+    writes = queue(batch_max=2)
+    messages = [await writes.put(thread_id, "user", content)
+                for thread_id, content in ((thread_a, "a1"), (thread_b, "b1"), (thread_a, "a2"))]
+    assert await stored(thread_a) == []
+
+    assert await writes.flush() == 3
+    assert (writes.batches, writes.written) == (2, 3)
+    assert await stored(thread_a) == ["a1", "a2"] and await stored(thread_b) == ["b1"]
+    assert (await message_count(thread_a), await message_count(thread_b)) == (2, 1)
+
+    # Replayed (already stored) messages are skipped and not counted again
+    await writes._write(messages + [ConversationMessage(
+        id="replayed-new", session_id=thread_b, role="user", content="b2", created_at=writes._now(),
+    )])
+    assert await stored(thread_a) == ["a1", "a2"] and await stored(thread_b) == ["b1", "b2"]
+    assert (await message_count(thread_a), await message_count(thread_b)) == (2, 2)
+
+
+# =============================================================================
+# Queue bound
+# =============================================================================
+
+
+async def test_a_full_queue_waits_for_the_next_flush(create_threads):
+    (thread_id,) = create_threads(1)
+    writes = queue(queue_max=2, enqueue_timeout_seconds=1.0)
+    await writes.put(thread_id, "user", "m1")
+    await writes.put(thread_id, "character", "m2")
+
+    waiting = asyncio.create_task(writes.put(thread_id, "user", "m3"))
+    await asyncio.sleep(0.05)
+    assert not waiting.done() and writes.waits == 1
+
+    await writes.flush()
+    await asyncio.wait_for(waiting, 1)
+    await writes.flush()
+    assert await stored(thread_id) == ["m1", "m2", "m3"]
+    assert writes.dropped == 0
+
+
+async def test_a_full_queue_gives_up_after_the_enqueue_timeout(create_threads):
+    (thread_id,) = create_threads(1)
+    writes = queue(queue_max=1, enqueue_timeout_seconds=0.05)
+    await writes.put(thread_id, "user", "m1")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await writes.put(thread_id, "character", "lost")
+    assert (writes.waits, writes.dropped, writes.enqueued) == (1, 1, 1)
+    await writes.flush()
+    assert await stored(thread_id) == ["m1"]
+
+
+# =============================================================================
+# merge()
+# =============================================================================
+
+
+async def test_merge_adds_uncommitted_messages_in_order(create_threads):
+    (thread_id,) = create_threads(1)
+    writes = queue()
+    first = await writes.put(thread_id, "user", "m1")
+    await writes.flush()
+    rows = [first]
+
+    # Another thread's messages stay out
+    await writes.put("other-thread", "user", "elsewhere")
+    second = await writes.put(thread_id, "character", "m2")
+    third = await writes.put(thread_id, "user", "m3")
+    assert writes.merge(thread_id, rows, 10) == [first, second, third]
+    assert writes.merge(thread_id, rows, 2) == [second, third]
+    # A message both stored and still in the overlay is listed once
+    assert writes.merge(thread_id, rows + [second], 10) == [first, second, third]
+
+    await writes.flush()
+    assert writes.merge(thread_id, rows, 10) is rows
+    assert writes.stats()["overlay_threads"] == 0
+
+
+# =============================================================================
+# Spill log / crash recovery
+# =============================================================================
+
+
+def logged(content: str, offset: int = 0) -> ConversationMessage:
+    return ConversationMessage(
+        id=content, session_id="thread", role="user", content=content,
+        created_at=datetime(2026, 1, 1) + timedelta(seconds=offset),
+    )
+
+
+def test_spill_log_rotates_and_drops_committed_segments(tmp_path):
+    spill = SpillLog(tmp_path, segment_bytes=1, fsync=False)
+    numbers = [spill.append(logged(f"m{n}")) for n in range(3)]
+    assert numbers == [0, 1, 2] and len(segments(tmp_path)) == 3
+    with segments(tmp_path)[0].open("rb") as file:
+        assert [m.content for m in SpillLog.read(file)] == ["m0"]
+
+    # Committed segments go; the current one is emptied in place
+    spill.committed({0: 1, 2: 1})
+    assert len(segments(tmp_path)) == 2
+    assert spill.stats()["segments"] == 2
+    assert spill._current.size == 0
+
+    # Closing keeps only segments with uncommitted messages
+    spill.close()
+    with segments(tmp_path)[0].open("rb") as file:
+        assert [m.content for m in SpillLog.read(file)] == ["m1"]
+    assert len(segments(tmp_path)) == 1
+
+
+async def test_recovery_requeues_unstored_messages_of_a_dead_worker(create_threads, tmp_path):
+    (thread_id,) = create_threads(1)
+    crashed = queue(SpillLog(tmp_path, fsync=False))
+    for content in ("m1", "m2", "m3"):
+        await crashed.put(thread_id, "user", content)
+    # m1 made it to the database before the crash
+    await crashed._write([crashed._queue[0].message])
+
+    # A live worker's segments are locked: nothing to recover
+    survivor = queue(SpillLog(tmp_path, fsync=False))
+    assert await survivor.recover() == 0
+
+    # The worker dies (its segment stays, unlocked) with a torn last line
+    crashed.spill.close()
+    (orphan,) = segments(tmp_path)
+    with orphan.open("ab") as file:
+        file.write(b'{"id":"torn","session_')
+
+    assert await survivor.recover() == 2
+    assert orphan not in segments(tmp_path)
+    assert [m.content for m in survivor.merge(thread_id, [], 10)] == ["m2", "m3"]
+    await survivor.flush()
+    assert await stored(thread_id) == ["m1", "m2", "m3"]
+    assert await message_count(thread_id) == 3
+    survivor.spill.close()
+    assert segments(tmp_path) == []
+
+
+async def test_stop_writes_the_queue_and_removes_the_spill_log(create_threads, tmp_path):
+    (thread_id,) = create_threads(1)
+    writes = queue(SpillLog(tmp_path, fsync=False), flush_ms=1000)
+    await writes.start()
+    await writes.put(thread_id, "user", "m1")
+    await asyncio.sleep(0)
+
+    await writes.stop()
+    assert await stored(thread_id) == ["m1"]
+    assert segments(tmp_path) == []
@@ -0,0 +1,32 @@
+"""GET /metrics is internal: token-protected, or only served with DEBUG"""
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.main import create_app
+
+
+async def get_metrics(monkeypatch, debug: bool, token: str, headers: dict) -> httpx.Response:
+    monkeypatch.setattr(settings, "DEBUG", debug)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", token)
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/metrics", headers=headers)
+
+
+@pytest.mark.parametrize(
+    "debug, token, headers, expected",
+    [
+        (False, "", {}, 404),
+        (True, "", {}, 200),
+        (False, "secret", {}, 401),
+        (False, "secret", {"X-Metrics-Token": "wrong"}, 401),
+        (False, "secret", {"X-Metrics-Token": "secret"}, 200),
+        (True, "secret", {}, 401),
+    ],
+)
+async def test_metrics_access(monkeypatch, debug, token, headers, expected):
+    response = await get_metrics(monkeypatch, debug, token, headers)
+    assert response.status_code == expected
+    if expected == 200:
+        assert "admission" in response.json()
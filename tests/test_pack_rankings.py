@@ -0,0 +1,52 @@
+"""Pack ranking job: events folded once per watermark, scores reloaded into the index"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.catalog_index import CatalogIndex, CatalogIndexManager
+from app.services.pack_rankings import PackRankingJob, fold
+from tests.conftest import make_pack
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def session_source(events: list):
+    """Event source over a list of (pack_id, occurred_at, event_id), keyset-paged like the SQL loaders"""
+
+    async def load(db, watermark, until, limit):
+        rows = [e for e in events if (e[1], e[2]) > watermark and e[1] < until]
+        rows.sort(key=lambda e: (e[1], e[2]))
+        rows = rows[:limit]
+        if not rows:
+            return [], None
+        return [(pack_id, at, 1.0) for pack_id, at, _ in rows], (rows[-1][1], rows[-1][2])
+
+    return load
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SADeprecationWarning")
+async def test_runs_fold_new_events_once_and_reload_them(database):
+    index = CatalogIndexManager(interval_seconds=300)
+    index._index = CatalogIndex.build(index._next_version(), [make_pack("pack_rank_a"), make_pack("pack_rank_b")], {})
+    events = [("pack_rank_a", NOW - timedelta(minutes=m), f"rank_{m}") for m in range(1, 6)]
+    job = PackRankingJob(
+        interval_seconds=300,
+        half_lives={"trending": 3600.0},
+        batch_size=2,
+        settle_seconds=0,
+        sources={"test_rank_sessions": session_source(events)},
+        index=index,
+    )
+
+    assert await job.run(until=NOW) == 5
+    assert job.batches == 3
+    assert job.scores["trending"]["pack_rank_a"] == pytest.approx(fold([(p, at, 1.0) for p, at, _ in events], 3600.0)["pack_rank_a"])
+
+    # Only events past the watermark are folded, onto the stored score
+    events.append(("pack_rank_b", NOW + timedelta(minutes=1), "rank_b"))
+    events.append(("pack_rank_a", NOW + timedelta(minutes=1), "rank_a"))
+    assert await job.run(until=NOW + timedelta(minutes=2)) == 2
+    assert await job.run(until=NOW + timedelta(minutes=2)) == 0
+    expected = fold([(p, at, 1.0) for p, at, _ in events], 3600.0)
+    assert job.scores["trending"] == pytest.approx(expected)
+    assert index.current.rankings["trending"] == pytest.approx(expected)
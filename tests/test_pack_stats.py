@@ -0,0 +1,165 @@
+"""Pack stats counters: readable deltas, batches applied once, conversation recount"""
+import asyncio
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.models import ConversationSession, PackStat, PackStatsBatch
+from app.schemas.catalog import PackItem
+from app.services.pack_stats import PackStatsCounters
+from tests.conftest import USER, make_pack
+
+
+def blocking_sessions(writing: asyncio.Event, release: asyncio.Event):
+    """Session factory whose sessions wait for `release` before they are used"""
+
+    @contextlib.asynccontextmanager
+    async def factory():
+        writing.set()
+        await release.wait()
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    return factory
+
+
+def failing_after_commit(failures: list):
+    """Session factory whose commit succeeds and then raises, once per entry of failures"""
+
+    @contextlib.asynccontextmanager
+    async def factory():
+        async with AsyncSessionLocal() as db:
+            if failures:
+                commit = db.commit
+
+                async def commit_then_fail():
+                    await commit()
+                    failures.pop()
+                    raise ConnectionError("connection lost after COMMIT")
+
+                db.commit = commit_then_fail
+            yield db
+
+    return factory
+
+
+async def stored(pack_id: str, column=PackStat.favorite_count) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(column).where(PackStat.pack_id == pack_id))
+
+
+async def test_get_includes_deltas_being_flushed(database):
+    writing = asyncio.Event()
+    release = asyncio.Event()
+    counters = PackStatsCounters(shards=4, flush_seconds=5, session_factory=blocking_sessions(writing, release))
+    for _ in range(3):
+        counters.record_favorite("pack_flushing", True)
+
+    flush = asyncio.create_task(counters.flush())
+    await writing.wait()
+    # The shard is swapped out and its UPSERT has not committed yet
+    assert counters.pending_packs == 0
+    assert counters.get("pack_flushing").favorites == 3
+    counters.record_favorite("pack_flushing", False)
+    assert counters.get("pack_flushing").favorites == 2
+
+    release.set()
+    assert await flush == 1
+    assert counters.get("pack_flushing").favorites == 2
+    assert await stored("pack_flushing") == 3
+
+
+async def test_failed_flush_keeps_deltas(database):
+    class Broken:
+        async def __aenter__(self):
+            raise ConnectionError("database unavailable")
+
+        async def __aexit__(self, *exc):
+            return False
+
+    counters = PackStatsCounters(shards=4, flush_seconds=5, session_factory=Broken)
+    counters.record_favorite("pack_failing", True)
+    try:
+        await counters.flush()
+    except ConnectionError:
+        pass
+    counters.record_favorite("pack_failing", True)
+
+    assert counters.flush_failures == 1
+    assert counters.get("pack_failing").favorites == 2
+    counters.session_factory = AsyncSessionLocal
+    await counters.flush()
+    assert await stored("pack_failing") == 2
+
+
+async def test_batch_committed_before_an_error_is_applied_once(database):
+    counters = PackStatsCounters(shards=4, flush_seconds=5, session_factory=failing_after_commit([1]))
+    for _ in range(3):
+        counters.record_favorite("pack_retried", True)
+    try:
+        await counters.flush()
+    except ConnectionError:
+        pass
+    counters.record_favorite("pack_retried", True)
+    assert counters.get("pack_retried").favorites == 4
+
+    # The retry finds its batch id and skips the deltas already stored
+    await counters.flush()
+    assert counters.duplicate_batches == 1
+    assert await stored("pack_retried") == 4
+    assert counters.get("pack_retried").favorites == 4
+
+
+async def test_old_batch_ids_are_pruned(database):
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            PackStatsBatch(batch_id="batch_old", applied_at=now - timedelta(days=2)),
+            PackStatsBatch(batch_id="batch_new", applied_at=now),
+        ])
+        await db.commit()
+
+    counters = PackStatsCounters(shards=4, flush_seconds=5)
+    assert await counters.prune_batches() >= 1
+    async with AsyncSessionLocal() as db:
+        kept = set((await db.execute(select(PackStatsBatch.batch_id))).scalars())
+    assert "batch_new" in kept and "batch_old" not in kept
+
+
+async def test_recount_sets_conversation_count_from_sessions(database, catalog):
+    def character(pack_id: str, character_id: str) -> PackItem:
+        return PackItem(id=f"{pack_id}_{character_id}", item_type="character", item_id=character_id, name="キャラ")
+
+    catalog(
+        [make_pack("pack_recount_a"), make_pack("pack_recount_b"), make_pack("pack_recount_c")],
+        {
+            "pack_recount_a": [character("a", "character_recount_1")],
+            "pack_recount_b": [character("b", "character_recount_1"), character("b", "character_recount_2")],
+        },
+    )
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            [ConversationSession(user_id=USER, character_id="character_recount_1") for _ in range(3)]
+            + [ConversationSession(user_id=USER, character_id="character_recount_2") for _ in range(2)]
+        )
+        # Stale counts: pack_recount_c has no sessions; pack_recount_x is not in the index
+        db.add_all([
+            PackStat(pack_id="pack_recount_c", favorite_count=4, conversation_count=9, review_count=0, rating_sum=0),
+            PackStat(pack_id="pack_recount_x", favorite_count=0, conversation_count=7, review_count=0, rating_sum=0),
+        ])
+        await db.commit()
+
+    counters = PackStatsCounters(shards=4, flush_seconds=5)
+    assert await counters.recount() == 3
+    assert await stored("pack_recount_a", PackStat.conversation_count) == 3
+    assert await stored("pack_recount_b", PackStat.conversation_count) == 5
+    assert await stored("pack_recount_c", PackStat.conversation_count) == 0
+    assert await stored("pack_recount_c") == 4
+    assert await stored("pack_recount_x", PackStat.conversation_count) == 7
+
+    # Nothing changed: nothing written
+    assert await counters.recount() == 0
+    await counters.reload()
+    assert counters.get("pack_recount_b").conversations == 5
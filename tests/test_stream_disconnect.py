@@ -0,0 +1,79 @@
+"""Client disconnect mid-reply: the upstream LLM request is torn down promptly"""
+import asyncio
+import json
+import sqlite3
+import time
+
+import httpx
+
+from app.core.config import Settings, settings
+from app.main import app
+from tests.conftest import serve, server_url
+
+STREAMS = 20
+TEARDOWN_BOUND_SECONDS = 1.0
+
+
+async def disconnect_after_first_delta(client: httpx.AsyncClient, thread_id: str) -> str:
+    """Close the reply stream at its first content_delta; returns the assistant message id"""
+    message_id = None
+    async with client.stream("POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": "こんにちは"}) as response:
+        assert response.status_code == 200
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "message_start":
+                    message_id = json.loads(line[len("data: "):])["assistant_message_id"]
+                elif event == "content_delta":
+                    break
+    return message_id
+
+
+async def wait_for_teardown(stub: dict, cancelled: int) -> float:
+    """Seconds until the stub has no active request and `cancelled` cancellations, capped at the bound"""
+    started = time.perf_counter()
+    while stub["active"] or stub["cancelled"] < cancelled:
+        if time.perf_counter() - started > TEARDOWN_BOUND_SECONDS:
+            break
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - started
+
+
+def test_generation_stops_at_once_by_default():
+    # Keeping a generation alive for a resume is opt-in; this suite runs on the default
+    assert Settings.model_fields["SSE_RESUME_GRACE_SECONDS"].default == 0
+    assert settings.SSE_RESUME_GRACE_SECONDS == 0
+
+
+async def test_disconnect_cancels_upstream_within_bound(stub_llm, create_threads, auth_headers, database):
+    threads = create_threads(STREAMS + 1)
+
+    async with serve(app) as server:
+        async with httpx.AsyncClient(
+            base_url=server_url(server),
+            headers=auth_headers,
+            limits=httpx.Limits(max_connections=STREAMS + 10),
+            timeout=30,
+        ) as client:
+            # One reply on its own
+            message_ids = [await disconnect_after_first_delta(client, threads[0])]
+            elapsed = await wait_for_teardown(stub_llm, 1)
+            assert elapsed < TEARDOWN_BOUND_SECONDS
+            assert stub_llm["active"] == 0 and stub_llm["cancelled"] == 1
+
+            # Concurrent replies, all closed at about the same time
+            message_ids += await asyncio.gather(
+                *(disconnect_after_first_delta(client, thread_id) for thread_id in threads[1:])
+            )
+            elapsed = await wait_for_teardown(stub_llm, STREAMS + 1)
+            assert elapsed < TEARDOWN_BOUND_SECONDS
+            assert stub_llm["active"] == 0 and stub_llm["cancelled"] == STREAMS + 1
+
+    # The partial answers were kept
+    with sqlite3.connect(database) as db:
+        rows = dict(db.execute(
+            "SELECT id, content FROM conversation_messages WHERE role = 'character' AND finish_reason = 'interrupted'"
+        ).fetchall())
+    assert all(rows.get(message_id) for message_id in message_ids)
@@ -0,0 +1,236 @@
+"""Replay buffers: Last-Event-ID resume, reader backpressure, dropped and expired buffers, Redis failures"""
+import asyncio
+import json
+from typing import List, Tuple
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.drain import drain_coordinator
+from app.core.errors import ConflictException, NotFoundException, ServiceUnavailableException
+from app.main import app
+from app.services import stream_replay as replay_module
+from app.services.stream_replay import READ_AHEAD, RedisReplayReader, ReplayBuffer, StreamReplay
+from tests.conftest import serve, server_url
+
+
+def frame(n: int) -> str:
+    return f"event: content_delta\ndata: {n}\n\n"
+
+
+def ids(events: List[str]) -> List[int]:
+    return [int(event.split("\n", 1)[0][len("id: "):]) for event in events]
+
+
+async def collect(reader) -> List[str]:
+    return [event async for event in reader.events()]
+
+
+# =============================================================================
+# ReplayBuffer / ReplayReader
+# =============================================================================
+
+
+async def test_reader_resumes_after_its_last_event_id():
+    buffer = ReplayBuffer("msg_resume", "user_a", "thread_a", capacity=10)
+    for n in range(1, 4):
+        await buffer.append(frame(n))
+
+    reader = buffer.reader(after=1)
+    events = asyncio.create_task(collect(reader))
+    # Live events follow the buffered ones
+    await buffer.append(frame(4))
+    await buffer.close()
+
+    received = await events
+    assert ids(received) == [2, 3, 4]
+    assert received[0] == f"id: 2\n{frame(2)}"
+    assert buffer.readers == 0
+
+    # From the start, once complete
+    assert ids(await collect(buffer.reader(after=0))) == [1, 2, 3, 4]
+
+
+async def test_append_waits_for_a_lagging_reader():
+    buffer = ReplayBuffer("msg_backpressure", "user_a", "thread_a", capacity=10)
+    reader = buffer.reader(after=0)
+    events = reader.events()
+
+    for n in range(1, READ_AHEAD + 1):
+        await buffer.append(frame(n))
+    append = asyncio.create_task(buffer.append(frame(READ_AHEAD + 1)))
+    await asyncio.sleep(0.05)
+    assert not append.done()
+
+    # The cursor moves once the client asks for the next event
+    assert ids([await events.__anext__(), await events.__anext__()]) == [1, 2]
+    await asyncio.wait_for(append, 1)
+    assert buffer.last_seq == READ_AHEAD + 1
+
+    # A reader that left does not hold the generation back
+    append = asyncio.create_task(buffer.append(frame(READ_AHEAD + 2)))
+    await asyncio.sleep(0.05)
+    assert not append.done()
+    reader.close()
+    await asyncio.wait_for(append, 1)
+    await events.aclose()
+
+
+async def test_idle_callback_when_the_last_reader_leaves():
+    buffer = ReplayBuffer("msg_idle", "user_a", "thread_a", capacity=10)
+    idle = []
+    buffer.on_idle = lambda: idle.append(buffer.readers)
+
+    first, second = buffer.reader(after=0), buffer.reader(after=0)
+    first.close()
+    assert idle == []
+    second.close()
+    second.close()
+    assert idle == [0]
+
+
+async def test_dropped_events_cannot_be_resumed():
+    buffer = ReplayBuffer("msg_dropped", "user_a", "thread_a", capacity=3)
+    for n in range(1, 6):
+        await buffer.append(frame(n))
+    await buffer.close()
+
+    assert buffer.first_seq == 3
+    with pytest.raises(ConflictException):
+        buffer.reader(after=1)
+    assert ids(await collect(buffer.reader(after=2))) == [3, 4, 5]
+
+
+# =============================================================================
+# StreamReplay
+# =============================================================================
+
+
+async def test_resume_checks_the_owner_and_expires():
+    replay = StreamReplay(capacity=10, ttl_seconds=0)
+    buffer = replay.open("msg_expire", "user_a", "thread_a")
+    await buffer.append(frame(1))
+    await buffer.close()
+
+    for user_id, thread_id in (("user_b", "thread_a"), ("user_a", "thread_b")):
+        with pytest.raises(NotFoundException):
+            await replay.resume("msg_expire", user_id, thread_id, 0)
+    assert ids(await collect(await replay.resume("msg_expire", "user_a", "thread_a", 0))) == [1]
+
+    replay.release(buffer)
+    await asyncio.sleep(0.01)
+    with pytest.raises(NotFoundException):
+        await replay.resume("msg_expire", "user_a", "thread_a", 0)
+    assert replay.stats()["buffers"] == 0
+
+
+class FlakyRedis:
+    """Redis client whose XREAD returns `batches` in turn, then fails"""
+
+    def __init__(self, batches: List[List[Tuple[str, dict]]]) -> None:
+        self.batches = batches
+        self.attached = 0
+
+    async def set(self, key, value, px=None):
+        self.attached += 1
+
+    async def xread(self, streams, count=None, block=None):
+        if not self.batches:
+            raise replay_module.RedisError("connection lost")
+        return [(next(iter(streams)), self.batches.pop(0))]
+
+    async def exists(self, key):
+        return 1
+
+
+class FailingMirror:
+    async def owner(self, message_id):
+        raise replay_module.RedisError("connection lost")
+
+
+async def test_redis_reader_ends_with_a_resumable_error():
+    client = FlakyRedis([[("0-4", {"event": "e4"}), ("0-5", {"event": "e5"})]])
+    reader = RedisReplayReader(client, "msg_redis", "sse:replay:msg_redis", after=3)
+
+    received = await collect(reader)
+    assert received[:2] == ["e4", "e5"]
+    assert len(received) == 3 and received[2].startswith("event: error\n")
+    error = json.loads(received[2].rsplit("data: ", 1)[1])
+    assert error["code"] == "service_unavailable"
+    assert error["resumable"] is True and error["assistant_message_id"] == "msg_redis"
+    # Resumes from the last event delivered
+    assert reader.failed and reader.cursor == 5
+
+
+async def test_redis_lookup_failure_is_unavailable():
+    replay = StreamReplay(capacity=10, ttl_seconds=60, mirror=FailingMirror())
+    with pytest.raises(ServiceUnavailableException):
+        await replay.resume("msg_remote", "user_a", "thread_a", 0)
+
+
+# =============================================================================
+# GET /threads/{thread_id}/messages/{message_id}:stream
+# =============================================================================
+
+
+async def read_ids(response: httpx.Response, stop_at: int) -> Tuple[List[int], str]:
+    """Event ids up to `stop_at`, and the assistant message id of message_start (if seen)"""
+    seen, message_id, event = [], None, None
+    async for line in response.aiter_lines():
+        if line.startswith("id: "):
+            seen.append(int(line[len("id: "):]))
+        elif line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event == "message_start":
+            message_id = json.loads(line[len("data: "):])["assistant_message_id"]
+        elif not line and seen and seen[-1] >= stop_at:
+            break
+    return seen, message_id
+
+
+@pytest.fixture
+def accepting():
+    """Coordinator accepting streams again (an earlier server's shutdown left it draining); reset afterwards"""
+    state = dict(vars(drain_coordinator))
+    drain_coordinator._draining = drain_coordinator._interrupting = False
+    yield
+    vars(drain_coordinator).clear()
+    vars(drain_coordinator).update(state)
+
+
+async def test_last_event_id_resume(stub_llm, create_threads, auth_headers, accepting, monkeypatch):
+    monkeypatch.setattr(settings, "SSE_RESUME_GRACE_SECONDS", 1.0)
+    (thread_id,) = create_threads(1)
+
+    async with serve(app) as server:
+        async with httpx.AsyncClient(base_url=server_url(server), headers=auth_headers, timeout=30) as client:
+            async with client.stream(
+                "POST", f"/v1/threads/{thread_id}/messages:stream", json={"content": "こんにちは"}
+            ) as response:
+                assert response.status_code == 200
+                seen, message_id = await read_ids(response, stop_at=3)
+            assert seen == [1, 2, 3]
+            path = f"/v1/threads/{thread_id}/messages/{message_id}:stream"
+
+            # The same generation goes on after the last id the client got
+            async with client.stream("GET", path, headers={"Last-Event-ID": "2"}) as response:
+                assert response.status_code == 200
+                seen, _ = await read_ids(response, stop_at=6)
+            assert seen == [3, 4, 5, 6]
+            async with client.stream("GET", path) as response:
+                seen, _ = await read_ids(response, stop_at=2)
+            assert seen == [1, 2]
+            assert stub_llm["requests"] == 1
+
+            response = await client.get(path, headers={"Last-Event-ID": "abc"})
+            assert response.status_code == 400
+            response = await client.get(f"/v1/threads/{thread_id}/messages/unknown:stream")
+            assert response.status_code == 404
+
+            # Abandoned: cancelled after the grace period
+            for _ in range(300):
+                if not stub_llm["active"]:
+                    break
+                await asyncio.sleep(0.01)
+            assert stub_llm["active"] == 0 and stub_llm["cancelled"] == 1
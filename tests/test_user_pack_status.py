@@ -0,0 +1,180 @@
+"""Per-user owned / favorited sets: shared loads, writes during a load, bounded numbering, GET /packs/user-status"""
+import asyncio
+from typing import Dict, Iterator, Optional, Set
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.user_pack_status import UserPackStatusLoader, user_pack_status
+from tests.conftest import USER
+
+
+class Store:
+    """Owned / favorited pack ids per user; `release` (when set) holds every load after it read its rows"""
+
+    def __init__(self) -> None:
+        self.owned: Dict[str, Set[str]] = {}
+        self.favorited: Dict[str, Set[str]] = {}
+        self.loads = 0
+        self.loading = asyncio.Event()
+        self.release: Optional[asyncio.Event] = None
+
+    async def load_owned(self, db, user_id: str) -> Set[str]:
+        self.loads += 1
+        owned = set(self.owned.get(user_id, ()))
+        self.loading.set()
+        if self.release is not None:
+            await self.release.wait()
+        return owned
+
+    async def load_favorited(self, db, user_id: str) -> Set[str]:
+        return set(self.favorited.get(user_id, ()))
+
+
+def loader(store: Store, **options) -> UserPackStatusLoader:
+    return UserPackStatusLoader(
+        ttl_seconds=options.pop("ttl_seconds", 60),
+        max_users=options.pop("max_users", 10),
+        load_owned=store.load_owned,
+        load_favorited=store.load_favorited,
+        **options,
+    )
+
+
+def flags(statuses) -> dict:
+    return {pack_id: (status.owned, status.favorited) for pack_id, status in statuses.items()}
+
+
+async def test_statuses_come_from_one_load_per_user(database):
+    store = Store()
+    store.owned["user_a"] = {"pack_1", "pack_2"}
+    store.favorited["user_a"] = {"pack_2", "pack_3"}
+    statuses = loader(store)
+
+    page = ["pack_1", "pack_2", "pack_3", "pack_unknown"]
+    expected = {
+        "pack_1": (True, False),
+        "pack_2": (True, True),
+        "pack_3": (False, True),
+        "pack_unknown": (False, False),
+    }
+    assert flags(await statuses.load("user_a", page)) == expected
+    assert flags(await statuses.load("user_a", page)) == expected
+    assert (statuses.loads, statuses.misses, statuses.hits) == (1, 1, 1)
+    # Ids seen only in requests get no number
+    assert statuses.packs.get("pack_unknown") is None
+
+
+async def test_concurrent_misses_share_the_load(database):
+    store = Store()
+    store.owned["user_a"] = {"pack_1"}
+    store.release = asyncio.Event()
+    statuses = loader(store)
+
+    pending = [asyncio.create_task(statuses.load("user_a", ["pack_1"])) for _ in range(5)]
+    await store.loading.wait()
+    store.release.set()
+    results = await asyncio.gather(*pending)
+
+    assert store.loads == 1
+    assert all(flags(result) == {"pack_1": (True, False)} for result in results)
+
+
+async def test_write_during_a_load_is_not_cached(database):
+    store = Store()
+    store.owned["user_a"] = {"pack_1"}
+    store.release = asyncio.Event()
+    statuses = loader(store)
+
+    load = asyncio.create_task(statuses.load("user_a", ["pack_1", "pack_2"]))
+    await store.loading.wait()
+    # Committed after the load read its rows
+    store.owned["user_a"].add("pack_2")
+    statuses.on_purchase("user_a", "pack_2")
+    assert statuses._loading == {"user_a": 1}
+    store.release.set()
+
+    # The possibly stale result is served once, not cached
+    assert flags(await load) == {"pack_1": (True, False), "pack_2": (False, False)}
+    assert statuses._loading == {}
+    assert flags(await statuses.load("user_a", ["pack_1", "pack_2"])) == {"pack_1": (True, False), "pack_2": (True, False)}
+    assert store.loads == 2
+
+    # Once cached, writes go through without another load
+    statuses.on_favorite("user_a", "pack_1", True)
+    statuses.on_entitlement_revoked("user_a", "pack_2")
+    assert flags(await statuses.load("user_a", ["pack_1", "pack_2"])) == {"pack_1": (True, True), "pack_2": (False, False)}
+    assert store.loads == 2
+
+
+async def test_numbering_starts_over_at_the_bound(database):
+    store = Store()
+    store.owned["user_a"] = {"pack_1", "pack_2"}
+    store.owned["user_b"] = {"pack_3", "pack_4"}
+    statuses = loader(store, max_pack_numbers=3)
+
+    a = await statuses.load("user_a", ["pack_1", "pack_3"])
+    first = statuses.packs
+    assert len(first) == 2
+
+    # user_b's load would pass the bound: new numbering, user_a dropped
+    b = await statuses.load("user_b", ["pack_1", "pack_3"])
+    assert statuses.packs is not first and statuses.renumberings == 1
+    assert len(statuses.packs) == 2
+    assert flags(a) == {"pack_1": (True, False), "pack_3": (False, False)}
+    assert flags(b) == {"pack_1": (False, False), "pack_3": (True, False)}
+
+    assert flags(await statuses.load("user_a", ["pack_1", "pack_3"])) == {"pack_1": (True, False), "pack_3": (False, False)}
+    assert store.loads == 3
+
+
+async def test_expired_sets_are_loaded_again(database):
+    store = Store()
+    store.owned["user_a"] = {"pack_1"}
+    statuses = loader(store, ttl_seconds=0)
+
+    await statuses.load("user_a", ["pack_1"])
+    store.owned["user_a"] = set()
+    assert flags(await statuses.load("user_a", ["pack_1"])) == {"pack_1": (False, False)}
+    assert store.loads == 2
+
+
+# =============================================================================
+# GET /packs/user-status
+# =============================================================================
+
+
+@pytest.fixture
+def store(monkeypatch) -> Iterator[Store]:
+    store = Store()
+    monkeypatch.setattr(user_pack_status, "load_owned", store.load_owned)
+    monkeypatch.setattr(user_pack_status, "load_favorited", store.load_favorited)
+    user_pack_status.invalidate(USER)
+    yield store
+    user_pack_status.invalidate(USER)
+
+
+async def test_user_status_endpoint(database, auth_headers, store):
+    store.owned[USER] = {"pack_owned"}
+    store.favorited[USER] = {"pack_owned", "pack_favorited"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=auth_headers) as client:
+        response = await client.get(
+            "/v1/packs/user-status", params={"pack_ids": "pack_owned, pack_favorited,pack_other,pack_owned"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "data": [
+                {"pack_id": "pack_owned", "owned": True, "favorited": True},
+                {"pack_id": "pack_favorited", "owned": False, "favorited": True},
+                {"pack_id": "pack_other", "owned": False, "favorited": False},
+            ]
+        }
+
+        too_many = ",".join(f"pack_{i}" for i in range(101))
+        for pack_ids in (too_many, " , "):
+            response = await client.get("/v1/packs/user-status", params={"pack_ids": pack_ids})
+            assert response.status_code == 400
+    assert store.loads == 1